@@ -1,19 +1,37 @@
 import argparse
-from misc.archive import parse_cli_archive
+import sys
+from misc.archive import add_archive_subcommands, default_archive_action
 
 def main():
     parser = argparse.ArgumentParser(description="TM2PY CLI tool")
     parser.add_argument('--version', action='version', version='tm2py-utils 1.0')
 
     subparsers = parser.add_subparsers(dest="command", required=True)
+    argv = sys.argv[1:]
+    command = argv[0] if argv else None
 
     # Archive subcommand
-    archive_parser = subparsers.add_parser("archive", help="Archive a model run by compressing important model files")
-    archive_parser.add_argument("model_directory", help="Directory of model run to archive")
-    archive_parser.add_argument("archive_directory", help="Destination to dump the archived files")
-    archive_parser.add_argument("-n", "--name", help="Optional model run name", default="")
-    archive_parser.set_defaults(func=parse_cli_archive)
+    archive_parser = subparsers.add_parser("archive", help="Archive a model run by compressing important model files, "
+                                                           "list archived runs (ls) or restore files (extract)")
+    add_archive_subcommands(archive_parser)
 
-    # Parse and dispatch
-    args = parser.parse_args()
+    # Perf subcommand
+    # (perf and sample need pandas / psutil, so they are imported only when run)
+    perf_parser = subparsers.add_parser("perf", help="Step timings of a tm2py run log, optionally against a baseline run")
+    if command == "perf":
+        from misc.perf_log import add_perf_arguments, parse_cli_perf
+        add_perf_arguments(perf_parser)
+        perf_parser.set_defaults(func=parse_cli_perf)
+
+    # Sample subcommand
+    sample_parser = subparsers.add_parser("sample", help="Sample CPU, memory and disk I/O of a command or process tree")
+    if command == "sample":
+        from misc.resource_sampler import add_sample_arguments, parse_cli_sample
+        add_sample_arguments(sample_parser)
+        sample_parser.set_defaults(func=parse_cli_sample)
+
+    # Parse and dispatch; "archive <model> <dest>" is short for "archive create <model> <dest>"
+    if command == "archive":
+        argv = default_archive_action(argv, position=1)
+    args = parser.parse_args(argv)
     args.func(args)
\ No newline at end of file
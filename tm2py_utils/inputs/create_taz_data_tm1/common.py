@@ -4,6 +4,7 @@ import numpy as np
 import os
 import yaml
 from typing import List, Dict, Tuple, Union, Optional
+from tm2py_utils.misc.census_fetch import CacheMissError
 
 # Load configuration from config.yaml
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.yaml')
@@ -31,41 +32,46 @@ def retrieve_census_variables(
     for_geo_id=None, state=None, county=None
 ):
     """
-    Retrieve data from Census API, logging the exact URL.
+    Retrieve data from Census API through the shared fetch client, logging the exact URL.
+
+    Parameters:
+        c: CensusFetchClient (see tm2py_utils/misc/census_fetch.py)
+        county: a single county FIPS code or a list of them; lists are fetched concurrently
+    Returns:
+        list of dicts, one per geography
     """
-    # Build geo dict
-    geo = {}
-    if for_geo:
-        geo['for'] = f"{for_geo}:*"
-    if for_geo_id:
-        geo['for'] = f"{for_geo}:{for_geo_id}"
-    if in_geo:
-        geo['in'] = f"{in_geo}:*"
+    # 'acs5' / 'acs1' shorthands used by the census package map to acs/acs5, acs/acs1
+    if dataset in ('acs1', 'acs5'):
+        dataset = f"acs/{dataset}"
+
+    # Build geo clauses
+    for_clause = f"{for_geo}:{for_geo_id}" if for_geo_id else f"{for_geo}:*"
+    counties = [county] if isinstance(county, str) else county
+    extra = {}
+    if in_geo and not state:
+        extra['in'] = f"{in_geo}:*"
+
+    in_clause = extra.get('in', '')
     if state:
-        geo['in'] = f"state:{state}"
-    if county:
-        geo['in'] = geo.get('in', '') + f"+county:{county}"
-
+        in_clause = f"state:{state}" + (f" county:{','.join(counties)}" if counties else '')
+
+    base = f"{c.base_url}/{year}/{dataset}"
+    params = {
+        'get': ','.join(variables),
+        'for': for_clause,
+        'in': in_clause
+    }
+    param_str = '&'.join(f"{k}={v}" for k, v in params.items() if v)
     try:
-        # Map dataset name to valid attribute (e.g. 'dec/pl' -> 'dec_pl')
-        ds_attr = dataset.split('/')[-1]
-        api = getattr(c, ds_attr)
-        
-        # Build and log the full URL + query string
-        base = f"https://api.census.gov/data/{year}/{dataset}"
-        params = {
-            'get': ','.join(variables),
-            'for': geo.get('for', ''),
-            'in': geo.get('in', '')
-        }
-        param_str = '&'.join(f"{k}={v}" for k, v in params.items() if v)
         logging.info(f"CALLING URL: {base}?{param_str}")
-
-        # Execute the request
-        response = api.get(variables, geo=geo, year=year)
+        response = c.census_records(year, dataset, variables, for_clause, state=state,
+                                    counties=counties, extra_params=extra)
         logging.info(f"Retrieved {len(response)} records")
         return response
 
+    except CacheMissError:
+        # replay mode must fail loudly rather than return an empty result
+        raise
     except Exception as e:
         # Log the error with URL and parameters
         logging.error(f"Error retrieving Census data: {e}")
@@ -73,7 +79,7 @@ def retrieve_census_variables(
         logging.error(f"Parameters: {params}")
         if 'bad request' in str(e).lower():
             logging.error(f"Variables: {variables}")
-            logging.error(f"Geo: {geo}")
+            logging.error(f"Geo: {for_clause}")
         return []
 
 
@@ -139,37 +145,29 @@ def download_acs_blocks(
     
     If dataset == 'dec/pl', this uses the 2020 PL data (only available for 2020).
     Otherwise it uses the passed-in year for ACS calls.
+    Counties are requested concurrently by the fetch client.
     """
     # Decennial PL is only available for 2020
     call_year = 2020 if dataset.lower() == 'dec/pl' else year
 
-    # Default to all Bay Area counties
+    # Default to the Bay Area counties
     if states is None:
-        states = list(set(BA_COUNTY_FIPS_CODES.values()))
+        states = [STATE_CODE]
+    if counties is None:
+        counties = list(BA_COUNTY_FIPS_CODES.keys())
 
     all_blocks = []
-
     for st in states:
-        if counties is not None:
-            state_counties = counties
-        else:
-            state_counties = [
-                cnty
-                for cnty, s in BA_COUNTY_FIPS_CODES.items()
-                if s == st
-            ]
-
-        for cnty in state_counties:
-            blocks = retrieve_census_variables(
-                c,
-                call_year,
-                dataset,
-                ['P1_001N'],      # total population
-                for_geo='block',
-                state=st,
-                county=cnty
-            )
-            all_blocks.extend(blocks)
+        blocks = retrieve_census_variables(
+            c,
+            call_year,
+            dataset,
+            ['P1_001N'],      # total population
+            for_geo='block',
+            state=st,
+            county=counties
+        )
+        all_blocks.extend(blocks)
 
     df = pd.DataFrame(all_blocks)
     if df.empty:
@@ -183,6 +181,222 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def controlled_round(values, totals) -> np.ndarray:
+    """
+    Round each row of `values` to integers that sum exactly to its row total.
+
+    Rows are first rescaled to their (rounded) total, floored, and the remaining
+    units go to the cells with the largest fractional parts (largest-remainder
+    rounding, ranked with argsort). Non-negative inputs stay non-negative.
+    Rows whose values sum to zero are only rounded, since there is nothing to
+    distribute the total over.
+
+    Parameters:
+        values: 2-D array (rows x cells) of non-negative values
+        totals: 1-D array of row totals
+    Returns:
+        2-D int64 array with the same shape as `values`
+    """
+    values = np.asarray(values, dtype=float)
+    totals = np.rint(np.asarray(totals, dtype=float))
+    if values.ndim != 2 or values.shape[1] == 0:
+        return np.rint(values).astype(np.int64)
+
+    row_sums = values.sum(axis=1)
+    scalable = row_sums > 0
+    scale = np.divide(totals, row_sums, out=np.ones_like(row_sums), where=scalable)
+    scaled = values * scale[:, None]
+
+    floors = np.floor(scaled)
+    remainder = np.where(scalable, totals - floors.sum(axis=1), 0).astype(np.int64)
+
+    # rank cells within each row by fractional part (0 = largest), ties by column order
+    order = np.argsort(-(scaled - floors), axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(values.shape[1])[None, :].repeat(len(values), axis=0), axis=1)
+
+    rounded = floors + (ranks < remainder[:, None])
+    rounded[~scalable] = np.rint(values[~scalable])
+    return rounded.astype(np.int64)
+
+
+def _group_controlled_round(values, groups, totals) -> np.ndarray:
+    """
+    Largest-remainder rounding of a 1-D array within groups.
+
+    `values` are rounded so that, for every group, they sum exactly to the
+    rounded group total in `totals` (given per row). Units left over after
+    flooring go to the rows with the largest fractional parts in each group.
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups)
+    floors = np.floor(values)
+    frac = values - floors
+
+    # rows sorted by group, then by descending fractional part
+    order = np.lexsort((-frac, groups))
+    sorted_groups = groups[order]
+    starts = np.r_[0, np.flatnonzero(sorted_groups[1:] != sorted_groups[:-1]) + 1]
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+
+    group_floor = np.add.reduceat(floors[order], starts) if len(order) else np.array([])
+    remainder = np.rint(np.asarray(totals, dtype=float)[order][starts]) - group_floor
+
+    rounded = floors.copy()
+    rounded[order] += rank < np.repeat(remainder, sizes)
+    return rounded
+
+
+def reconcile_to_targets(
+    disagg_df: pd.DataFrame,
+    target_df: pd.DataFrame,
+    group_var: str,
+    target_cols: Union[str, List[str]],
+    target_suffix: str = "_target",
+    integer: bool = True
+) -> pd.DataFrame:
+    """
+    Distribute group-level differences to disaggregate rows in one vectorized pass.
+
+    For each column in `target_cols`, rows of `disagg_df` are rescaled so that
+    their sum within each `group_var` value equals f"{col}{target_suffix}" in
+    `target_df`. Differences are spread in proportion to the current values;
+    groups whose current total is zero are filled with equal shares. With
+    `integer=True` the result is rounded with largest-remainder rounding per
+    group, so group totals match their (rounded) targets exactly and
+    non-negative inputs stay non-negative. Groups without a target are left
+    unchanged (the column stays float if any of their values is fractional).
+
+    Parameters:
+        disagg_df: disaggregate rows (e.g. TAZs), must include group_var and target_cols
+        target_df: one row per group with group_var and the target columns
+        group_var: grouping key shared by both frames (e.g. 'County_Name')
+        target_cols: column name or list of column names to reconcile
+        target_suffix: suffix of the target columns in target_df
+        integer: whether to return integer-preserving results
+    Returns:
+        A copy of disagg_df with target_cols reconciled
+    """
+    if isinstance(target_cols, str):
+        target_cols = [target_cols]
+
+    result = disagg_df.copy()
+    groups = result[group_var]
+    group_codes = groups.factorize()[0]
+    group_size = groups.map(groups.value_counts()).to_numpy(dtype=float)
+    targets = target_df.drop_duplicates(group_var).set_index(group_var)
+
+    for col in target_cols:
+        target = groups.map(targets[f"{col}{target_suffix}"]).to_numpy(dtype=float)
+        has_target = ~np.isnan(target)
+        if not has_target.any():
+            logger.warning(f"reconcile_to_targets: no {group_var} targets for {col}")
+            continue
+
+        values = result[col].to_numpy(dtype=float)
+        current = result.groupby(group_var)[col].transform('sum').to_numpy(dtype=float)
+        share = np.divide(values, current, out=1.0 / group_size, where=current != 0)
+        new_values = np.where(has_target, target * share, values)
+
+        if integer:
+            rows = np.flatnonzero(has_target)
+            new_values[rows] = _group_controlled_round(new_values[rows], group_codes[rows], target[rows])
+
+        logger.debug(
+            f"reconcile_to_targets: {col} total {values[has_target].sum():,.0f} -> "
+            f"{new_values[has_target].sum():,.0f} over {len(np.unique(group_codes[has_target]))} group(s)"
+        )
+        # untargeted rows keep their values, so the column is only cast when they are whole numbers too
+        if integer and np.all(np.isfinite(new_values) & (new_values == np.round(new_values))):
+            new_values = new_values.astype(np.int64)
+        result[col] = new_values
+
+    return result
+
+
+def ipf_to_marginals(
+    disagg_df: pd.DataFrame,
+    group_targets: pd.DataFrame,
+    group_var: str,
+    partial_vars: List[str],
+    sum_var: Optional[str] = None,
+    target_suffix: str = "_target",
+    max_iterations: int = 50,
+    tolerance: float = 1e-6,
+    integer: bool = True
+) -> pd.DataFrame:
+    """
+    Iterative proportional fitting of a rows x partial_vars table to several marginals.
+
+    Alternately scales (a) each partial_var within each group so its group sum
+    matches f"{var}{target_suffix}" in `group_targets` (the group x variable
+    marginal, e.g. county x income quartile), and (b) each row so its partials
+    sum to `sum_var` (the row marginal, e.g. TAZ households), until the largest
+    relative error is below `tolerance` or `max_iterations` is reached. Row
+    marginals are held exactly; group x variable marginals are matched as
+    closely as the row totals allow. With `integer=True` the partials are
+    rounded per row with controlled_round so they still sum to `sum_var`.
+
+    Parameters:
+        disagg_df: disaggregate rows, must include group_var, partial_vars and sum_var
+        group_targets: one row per group with group_var and the target columns
+        group_var: grouping key (e.g. 'County_Name')
+        partial_vars: the columns of the table being fitted
+        sum_var: row-total column; if None, only the group marginals are fitted
+        target_suffix: suffix of the target columns in group_targets
+        max_iterations: maximum number of IPF iterations
+        tolerance: convergence threshold on the maximum relative marginal error
+        integer: whether to integerize the fitted table
+    Returns:
+        A copy of disagg_df with partial_vars fitted
+    """
+    result = disagg_df.copy()
+    codes, uniques = result[group_var].factorize()
+    targets = (
+        group_targets.drop_duplicates(group_var).set_index(group_var)
+        .reindex(uniques)[[f"{var}{target_suffix}" for var in partial_vars]]
+        .to_numpy(dtype=float)
+    )
+    has_target = ~np.isnan(targets)
+    table = result[partial_vars].to_numpy(dtype=float)
+    row_totals = None if sum_var is None else result[sum_var].to_numpy(dtype=float)
+
+    for iteration in range(1, max_iterations + 1):
+        # (a) group x variable marginal
+        group_sums = np.zeros_like(targets)
+        np.add.at(group_sums, codes, table)
+        factor = np.divide(targets, group_sums, out=np.ones_like(targets), where=has_target & (group_sums > 0))
+        table *= factor[codes]
+
+        # (b) row marginal
+        if row_totals is not None:
+            row_sums = table.sum(axis=1)
+            table *= np.divide(row_totals, row_sums, out=np.ones_like(row_sums), where=row_sums > 0)[:, None]
+
+        group_sums = np.zeros_like(targets)
+        np.add.at(group_sums, codes, table)
+        error = np.abs(group_sums - targets) / np.maximum(np.abs(targets), 1)
+        max_error = error[has_target & (group_sums > 0)].max(initial=0.0)
+        if row_totals is None or max_error < tolerance:
+            break
+
+    logger.info(f"ipf_to_marginals: {iteration} iteration(s), max relative error {max_error:.2e}")
+
+    if integer:
+        if row_totals is not None:
+            table = controlled_round(table, row_totals)
+        else:
+            table = np.column_stack([
+                _group_controlled_round(table[:, j], codes, np.where(has_target[:, j], targets[:, j], group_sums[:, j])[codes])
+                for j in range(table.shape[1])
+            ]).astype(np.int64)
+
+    for j, var in enumerate(partial_vars):
+        result[var] = table[:, j]
+    return result
+
+
 def fix_rounding_artifacts(
     df: pd.DataFrame,
     id_var: str,
@@ -190,9 +404,12 @@ def fix_rounding_artifacts(
     partial_vars: List[str]
 ) -> pd.DataFrame:
     """
-    After scaling and rounding, ensure that for each group (by id_var),
+    After scaling and rounding, ensure that for each row (by id_var),
     the sum_var exactly equals the sum of its partial_vars by distributing
     any small discrepancies across the largest partials.
+
+    Vectorized over all rows with controlled_round: only rows with a
+    discrepancy are touched, and partials never go negative.
     """
     logger = logging.getLogger(__name__)
     result = df.copy()
@@ -201,96 +418,71 @@ def fix_rounding_artifacts(
     dup_ids = result[id_var][result[id_var].duplicated(keep=False)].unique()
     logger.debug(f"fix_rounding_artifacts: {len(dup_ids)} {id_var}(s) duplicated before adjustment")
 
-    for idx, group in result.groupby(id_var):
-        # all values are already ints (after rounding)
-        current_total = int(group[sum_var].iloc[0])
-        partial_vals  = group[partial_vars].iloc[0].astype(int)
-        partial_total = partial_vals.sum()
-
-        discrepancy = current_total - partial_total
-        if discrepancy == 0:
-            continue
-
-        # find partials sorted by their original size
-        sorted_vars = (
-            df.loc[df[id_var] == idx, partial_vars]
-              .iloc[0]
-              .sort_values(ascending=False)
-              .index
-              .tolist()
-        )
-
-        mask = (result[id_var] == idx)
-
-        if discrepancy > 0:
-            # add +1 to the top 'discrepancy' partials
-            for var in sorted_vars[:discrepancy]:
-                result.loc[mask, var] = result.loc[mask, var] + 1
-        else:
-            # subtract 1 from the smallest partials if negative
-            for var in sorted_vars[-discrepancy:]:
-                result.loc[mask, var] = result.loc[mask, var] - 1
-
-        logger.debug(
-            f"Adjusted {id_var}={idx}: "
-            f"{sum_var}={current_total}, partial_sum={partial_total}, "
-            f"discrepancy={discrepancy}"
-        )
-
-    # final check
-    post_dups = result[id_var][result[id_var].duplicated(keep=False)].nunique()
-    logger.debug(f"fix_rounding_artifacts: {post_dups} {id_var}(s) still duplicated after adjustment")
-
+    partials = result[partial_vars].to_numpy(dtype=float)
+    totals = result[sum_var].to_numpy(dtype=float)
+    discrepancy = np.rint(totals) - np.rint(partials).sum(axis=1)
+    needs_fix = (discrepancy != 0) & (partials.sum(axis=1) > 0)
+    if not needs_fix.any():
+        return result
+
+    fixed = controlled_round(partials[needs_fix], totals[needs_fix])
+    rows = np.flatnonzero(needs_fix)
+    for j, var in enumerate(partial_vars):
+        result.iloc[rows, result.columns.get_loc(var)] = fixed[:, j]
+
+    logger.debug(
+        f"fix_rounding_artifacts: adjusted {int(needs_fix.sum())} row(s) of {sum_var}, "
+        f"total discrepancy={int(discrepancy[needs_fix].sum())}"
+    )
     return result
 
 
 def scale_data_to_targets(source_df, target_df, id_var, sum_var, partial_vars, logging_on=False):
     """
     Scale data in source_df to match targets in target_df.
+
+    For every id with a positive source total, sum_var is set to its target and the
+    partial_vars are scaled by target / source and rounded with controlled_round,
+    so the partials sum exactly to the target. Ids without a target or with a
+    non-positive source total are left unchanged.
     """
     result_df = source_df.copy()
     target_col = f"{sum_var}_target"
-    merged = pd.merge(source_df[[id_var] + partial_vars + [sum_var]], target_df[[id_var, target_col]], on=id_var)
-    for _, row in merged.iterrows():
-        idx = result_df[result_df[id_var] == row[id_var]].index[0]
-        source_sum = row[sum_var]
-        target_sum = row[target_col]
-        if source_sum <= 0:
-            continue
-        scale_factor = target_sum / source_sum
+
+    # scale factors by merge, aligned to the source rows
+    targets = target_df.drop_duplicates(id_var).set_index(id_var)[target_col]
+    target_sum = result_df[id_var].map(targets).to_numpy(dtype=float)
+    source_sum = result_df[sum_var].to_numpy(dtype=float)
+    scaled_rows = ~np.isnan(target_sum) & (source_sum > 0)
+
+    if scaled_rows.any():
+        scale_factor = target_sum[scaled_rows] / source_sum[scaled_rows]
         if logging_on:
-            logging.info(f"Scaling {id_var}={row[id_var]}: {sum_var}={source_sum} to {target_col}={target_sum} (factor={scale_factor:.4f})")
-        result_df.at[idx, sum_var] = target_sum
-        for var in partial_vars:
-            result_df.at[idx, var] = round(row[var] * scale_factor)
-    result_df = fix_rounding_artifacts(result_df, id_var, sum_var, partial_vars, logging_on)
+            for id_value, src, tgt, factor in zip(result_df.loc[scaled_rows, id_var], source_sum[scaled_rows],
+                                                  target_sum[scaled_rows], scale_factor):
+                logging.info(f"Scaling {id_var}={id_value}: {sum_var}={src} to {target_col}={tgt} (factor={factor:.4f})")
+
+        scaled = result_df.loc[scaled_rows, partial_vars].to_numpy(dtype=float) * scale_factor[:, None]
+        rounded = controlled_round(scaled, target_sum[scaled_rows])
+        rows = np.flatnonzero(scaled_rows)
+        result_df.iloc[rows, result_df.columns.get_loc(sum_var)] = target_sum[scaled_rows]
+        for j, var in enumerate(partial_vars):
+            result_df.iloc[rows, result_df.columns.get_loc(var)] = rounded[:, j]
+
+    result_df = fix_rounding_artifacts(result_df, id_var, sum_var, partial_vars)
     return result_df
 
 
 def update_disaggregate_data_to_aggregate_targets(source_df, target_df, disagg_id_var, agg_id_var, col_name):
     """
     Update disaggregate data to match aggregate targets.
+
+    Differences between the current aggregate totals and f"{col_name}_target" are
+    distributed proportionally over the disaggregate units with reconcile_to_targets.
     """
-    result_df = source_df.copy()
-    current_totals = source_df.groupby(agg_id_var)[col_name].sum().reset_index()
-    diff_df = pd.merge(current_totals, target_df[[agg_id_var, f"{col_name}_target"]], on=agg_id_var)
-    diff_df['diff'] = diff_df[f"{col_name}_target"] - diff_df[col_name]
-    for _, row in diff_df[diff_df['diff'] != 0].iterrows():
-        agg_id = row[agg_id_var]
-        difference = row['diff']
-        disagg_units = source_df[source_df[agg_id_var] == agg_id]
-        if disagg_units.empty:
-            continue
-        total = row[col_name]
-        if total > 0:
-            for idx, unit in disagg_units.iterrows():
-                prop = unit[col_name] / total
-                result_df.at[idx, col_name] += round(difference * prop)
-        else:
-            equal_adj = difference / len(disagg_units)
-            for idx in disagg_units.index:
-                result_df.at[idx, col_name] += equal_adj
-    return result_df
+    if source_df[disagg_id_var].duplicated().any():
+        logger.warning(f"update_disaggregate_data_to_aggregate_targets: duplicate {disagg_id_var} values")
+    return reconcile_to_targets(source_df, target_df, agg_id_var, col_name)
 
 
 def map_acs5year_household_income_to_tm1_categories(acs_year):
@@ -336,6 +528,8 @@ def update_tazdata_to_county_target(
         TAZ-level data, must include 'County_Name', the `sum_var`, and any `partial_vars`.
     target_df : DataFrame
         County-level targets, must include 'County_Name' and a column named f'{sum_var}_target'.
+        If it also has f'{var}_target' for every partial var (county x variable marginals),
+        the partials are fitted to those with ipf_to_marginals.
     sum_var : str
         The column in source_df to match to the county total (e.g. 'TOTHH' or 'sum_age').
     partial_vars : list of str
@@ -344,78 +538,31 @@ def update_tazdata_to_county_target(
     Returns
     -------
     DataFrame
-        A new DataFrame in which for each county, sum_var and each partial_var
-        have been multiplied by the factor = county_target / county_current.
-        Rounding artifacts are corrected via fix_rounding_artifacts.
-    """
-    # 1) Compute current county sums of sum_var
-def update_tazdata_to_county_target(source_df: pd.DataFrame,
-                                   target_df: pd.DataFrame,
-                                   sum_var: str,
-                                   partial_vars: list) -> pd.DataFrame:
-    """
-    Scale TAZ-level data so county-level totals for `sum_var` match the targets in `target_df`.
-    Also scales the specified `partial_vars` proportionally.
-    """
-    # 1) Compute current county sums of sum_var
-    current = (
-        source_df
-        .groupby('County_Name')[sum_var]
-        .sum()
-        .reset_index()
-    )
-
-    # 2) Extract target column
+        A new DataFrame in which for each county, sum_var has been reconciled to the
+        county target with reconcile_to_targets, and the partial_vars of every TAZ
+        have been rescaled with controlled_round so they sum exactly to the new sum_var
+        (or fitted to both the new sum_var and the county x variable marginals).
+    """
     target_col = f"{sum_var}_target"
-    target_key = target_df[['County_Name', target_col]]
-
-    # —— DEBUG BLOCK START —— #
-
-
-    dup_curr = current['County_Name'][current['County_Name'].duplicated(keep=False)]
-    dup_targ = target_key['County_Name'][target_key['County_Name'].duplicated(keep=False)]
-
-    # —— DEBUG BLOCK END —— #
+    if target_df['County_Name'].duplicated().any():
+        logger.warning("update_tazdata_to_county_target: duplicate County_Name rows in targets for %s", sum_var)
 
-    # 3) Merge them
-    merged = pd.merge(current, target_key, on='County_Name')
+    result = reconcile_to_targets(source_df, target_df[['County_Name', target_col]], 'County_Name', sum_var)
 
+    partial_targets = [f"{var}_target" for var in partial_vars]
+    if partial_vars and all(col in target_df.columns for col in partial_targets):
+        return ipf_to_marginals(result, target_df[['County_Name'] + partial_targets], 'County_Name',
+                                partial_vars, sum_var=sum_var)
 
-
-    # 4) Compute scale factors
-    try:
-        merged['scale'] = merged[target_col] / merged[sum_var]
-    except ValueError as err:
-        logger.error("Failed to align for sum_var=%s; merged index: %s",
-                     sum_var, list(merged.index))
-        raise
-
-    # 5) Apply scaling to each TAZ in the county
-    result = source_df.copy()
-    for _, row in merged.iterrows():
-        county = row['County_Name']
-        scale = row['scale']
-        # If scale is essentially 1, skip
-        if abs(scale - 1) < 1e-4:
-            continue
-
-        mask = result['County_Name'] == county
-        # Scale the sum_var and each partial_var
-        result.loc[mask, sum_var] *= scale
-        for var in partial_vars:
-            result.loc[mask, var] *= scale
-
-        # Round to integers
-        cols = [sum_var] + partial_vars
-        result.loc[mask, cols] = result.loc[mask, cols].round(0)
-
-        # Fix any rounding artifacts so components sum exactly
-        result = fix_rounding_artifacts(
-            result,
-            id_var='TAZ1454',
-            sum_var=sum_var,
-            partial_vars=partial_vars,
+    if partial_vars:
+        changed = (result[sum_var].to_numpy() != source_df[sum_var].to_numpy()) | (
+            result[partial_vars].sum(axis=1).to_numpy() != result[sum_var].to_numpy()
         )
+        if changed.any():
+            rows = np.flatnonzero(changed)
+            rounded = controlled_round(result[partial_vars].to_numpy(dtype=float)[rows], result[sum_var].to_numpy()[rows])
+            for j, var in enumerate(partial_vars):
+                result.iloc[rows, result.columns.get_loc(var)] = rounded[:, j]
 
     return result
 
@@ -2,10 +2,9 @@ import logging
 import os
 import sys
 import yaml
-import requests
 from pathlib import Path
 import pandas as pd
-from census import Census
+from tm2py_utils.misc.census_fetch import CensusFetchClient
 from common import (
     retrieve_census_variables,
     census_to_df,
@@ -16,7 +15,6 @@ from common import (
     update_tazdata_to_county_target,
     make_hhsizes_consistent_with_population,
 )
-import time
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -32,9 +30,11 @@ GEO = cfg['geo_constants']
 PATHS = cfg['paths']
 VARIABLES = cfg['variables']
 
-# Census API Key
-with open(PATHS['census_api_key_file'], 'r') as f:
-    CENSUS_API_KEY = f.read().strip()
+# Census API Key (not needed when replaying cached responses offline)
+CENSUS_API_KEY = None
+if os.path.exists(PATHS['census_api_key_file']):
+    with open(PATHS['census_api_key_file'], 'r') as f:
+        CENSUS_API_KEY = f.read().strip()
 
 # Default processing years and geographic constants
 YEAR = CONSTANTS['years'][0]
@@ -43,21 +43,15 @@ ACS_5YR_LATEST = CONSTANTS['ACS_5YEAR_LATEST']
 STATE_CODE = GEO['STATE_CODE']
 BAYCOUNTIES = GEO['BAYCOUNTIES']
 
-# Initialize Census API client
-census_client = Census(CENSUS_API_KEY)
+# Initialize the shared, cached Census API client
+census_client = CensusFetchClient.from_config(cfg.get('census_fetch', {}), CENSUS_API_KEY)
 
 def fetch_block_data(census_client):
-    """Fetch block-level total population from decennial census."""
-    records = []
-    for county in BAYCOUNTIES:
-        try:
-            recs = retrieve_census_variables(
-                census_client, DECENNIAL_YEAR, 'dec/pl', ['P1_001N'],
-                for_geo='block', state=STATE_CODE, county=county
-            )
-            records.extend(recs)
-        except Exception as e:
-            logger.error(f"Error fetching data for county {county}: {e}")
+    """Fetch block-level total population from decennial census (all counties concurrently)."""
+    records = retrieve_census_variables(
+        census_client, DECENNIAL_YEAR, 'dec/pl', ['P1_001N'],
+        for_geo='block', state=STATE_CODE, county=BAYCOUNTIES
+    )
 
     df = pd.DataFrame(records)
 
@@ -88,21 +82,14 @@ def fetch_acs_bg(c, year):
     # 2) Build the list of API vars with the "E" suffix
     fetch_vars = [f"{code}E" for code in VARIABLES['ACS_BG_VARIABLES'].values()]
 
-    # 3) Retrieve records
-    records = []
-    for county in county_codes:
-        try:
-            recs = retrieve_census_variables(
-                c, year, 'acs5',
-                fetch_vars,
-                for_geo='block group',
-                state=state_code,
-                county=county
-            )
-            records.extend(recs)
-        except Exception as e:
-            logger.error(f"Error retrieving ACS BG for county {county}: {e}")
-            continue
+    # 3) Retrieve records (counties and variable chunks fetched concurrently)
+    records = retrieve_census_variables(
+        c, year, 'acs/acs5',
+        fetch_vars,
+        for_geo='block group',
+        state=state_code,
+        county=county_codes
+    )
 
     df = pd.DataFrame(records)
 
@@ -210,7 +197,7 @@ def compute_bg_vars(df: pd.DataFrame) -> pd.DataFrame:
 # ------------------------------
 # STEP 3: Fetch ACS tract variables
 # ------------------------------
-def fetch_acs_tract(c, year=YEAR, max_retries=3, backoff=5):
+def fetch_acs_tract(c, year=YEAR):
     var_map  = VARIABLES.get('ACS_TRACT_VARIABLES', {})
     if not var_map:
         raise ValueError('CONFIG ERROR: ACS_TRACT_VARIABLES empty')
@@ -220,25 +207,16 @@ def fetch_acs_tract(c, year=YEAR, max_retries=3, backoff=5):
     state_code = GEO['STATE_CODE']
     counties   = list(GEO['BA_COUNTY_FIPS_CODES'].keys())
 
-    # 2) Fetch with retries
-    records = []
-    for county in counties:
-        for attempt in range(1, max_retries+1):
-            try:
-                logging.info(f"[STEP3] attempt {attempt} → fetching {fetch_vars} for tract in {state_code}/{county}")
-                recs = retrieve_census_variables(
-                    c, year, 'acs5', fetch_vars,
-                    for_geo='tract', state=state_code, county=county
-                )
-                if not recs:
-                    raise RuntimeError("empty response")
-                records.extend(recs)
-                break
-            except Exception as e:
-                logging.warning(f"[STEP3] county {county}, attempt {attempt} failed: {e}")
-                if attempt == max_retries:
-                    raise RuntimeError(f"Failed after {max_retries} tries for {state_code}/{county}")
-                time.sleep(backoff)
+    # 2) Fetch (retries are handled by the fetch client's shared retry policy)
+    logging.info(f"[STEP3] fetching {fetch_vars} for tract in {state_code}/{counties}")
+    records = retrieve_census_variables(
+        c, year, 'acs/acs5', fetch_vars,
+        for_geo='tract', state=state_code, county=counties
+    )
+    fetched = {rec.get('county') for rec in records}
+    missing = [county for county in counties if county not in fetched]
+    if missing:
+        raise RuntimeError(f"ACS tract fetch returned no records for {state_code}/{missing}")
 
     # 3) Assemble DataFrame
     df = census_to_df(records)
@@ -283,30 +261,21 @@ def fetch_acs_tract(c, year=YEAR, max_retries=3, backoff=5):
 
 def fetch_dhc_tract(census_client):
     """Fetch and assemble DHC tract group-quarters variables."""
-    import requests, logging, pandas as pd
+    import logging, pandas as pd
     logger = logging.getLogger(__name__)
 
     # Map of clean variable names to DHC API codes
     var_map = VARIABLES['DHC_TRACT_VARIABLES']
-    rows = []
 
-    # Fetch DHC data for each Bay Area county
+    # Fetch DHC data for every Bay Area county concurrently
+    rows = retrieve_census_variables(
+        census_client, DECENNIAL_YEAR, 'dec/dhc', list(var_map.values()),
+        for_geo='tract', state=STATE_CODE, county=BAYCOUNTIES
+    )
+    fetched = {row.get('county') for row in rows}
     for cnt in BAYCOUNTIES:
-        resp = requests.get(
-            f"https://api.census.gov/data/{DECENNIAL_YEAR}/dec/dhc",
-            params={
-                'get': ",".join(var_map.values()),
-                'for': 'tract:*',
-                'in': f"state:{STATE_CODE}+county:{cnt}",
-                'key': CENSUS_API_KEY
-            }
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            cols = data[0]
-            rows.extend([dict(zip(cols, vals)) for vals in data[1:]])
-        else:
-            logger.error(f"Failed to fetch DHC for county {cnt}: {resp.status_code}")
+        if cnt not in fetched:
+            logger.error(f"Failed to fetch DHC for county {cnt}")
 
     # Build DataFrame
     df = pd.DataFrame(rows)
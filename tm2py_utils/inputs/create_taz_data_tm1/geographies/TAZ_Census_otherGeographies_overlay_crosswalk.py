@@ -33,6 +33,8 @@ import numpy as np
 import geopandas as gpd
 import argparse, os, sys, logging, time
 
+from tm2py_utils.misc.geo_overlay import largest_overlap_assignment
+
 today = time.strftime('%Y_%m_%d')
 analysis_crs = "EPSG:26910"
 
@@ -63,11 +65,12 @@ def geo_assign_fields(id_df, id_field, overlay_df, overlay_fields, return_inters
 
     Methodology:
     Assigns based on the area with the largest intersection with each id_field (where there are
-    duplicate assignments).
+    duplicate assignments). The intersection areas come from
+    tm2py_utils.misc.geo_overlay.largest_overlap_assignment rather than a full gpd.overlay.
 
     Notes:
     - This is primarily used for generating correspondences, such as new parcel id : old parcel id
-    - If any overlay_fields also occur in the id_df, append a _y suffix to the overlay field
+    - If an overlay field has the same name as id_field, a _y suffix is appended to the overlay field
 
     Args:
         id_df (geopandas GeoDataFrame): The ID GeoDataFrame
@@ -90,24 +93,11 @@ def geo_assign_fields(id_df, id_field, overlay_df, overlay_fields, return_inters
         id_df = project_to_analysis_crs(id_df)
         overlay_df = project_to_analysis_crs(overlay_df)
 
-    join_df = gpd.overlay(id_df, overlay_df, how="intersection")
-    join_df["intersection_sq_m"] = join_df.geometry.area
-    join_df["idx"] = join_df.index
-
-    max_idxs = (
-        join_df.groupby(id_field, as_index=False)
-        .agg({"intersection_sq_m": "idxmax"})
-        .rename(columns={"intersection_sq_m": "idx"})
-    )
-    join_df = join_df.merge(max_idxs)
-
+    # candidate pairs from an STRtree query, intersection areas only for boundary pairs
+    final_assignment = largest_overlap_assignment(id_df, id_field, overlay_df, overlay_fields)
+    overlay_fields = [i + '_y' if i == id_field else i for i in overlay_fields]
     final_fields = [id_field] + overlay_fields
 
-    # calculate intersection area and share of id_df in intersection
-    id_df['base_sq_m'] = id_df.geometry.area
-    final_assignment = id_df[[id_field, 'base_sq_m']].merge(join_df[final_fields+['intersection_sq_m']], how="left")
-    final_assignment['area_share'] = final_assignment['intersection_sq_m'] / final_assignment['base_sq_m']
-
     # set the assignment to NaN if no more than 50%
     if use_half_area_rule:
         for i in overlay_fields:
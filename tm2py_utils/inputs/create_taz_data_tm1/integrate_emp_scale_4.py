@@ -15,11 +15,10 @@ from pathlib import Path
 import pandas as pd
 import yaml
 from typing import List, Sequence
-from census import Census
 import logging
-import time
 from common import update_tazdata_to_county_target
 from common import make_hhsizes_consistent_with_population
+from tm2py_utils.misc.census_fetch import CacheMissError
 import numpy as np
 
 
@@ -43,7 +42,7 @@ def _apply_acs_adjustment(county_targets: pd.DataFrame,
                           census_client,
                           acs_year: int,
                           pums_year: int) -> pd.DataFrame:
-    import logging, time
+    import logging
     logger = logging.getLogger(__name__)
     logger.info(f"applying acs1 adjustment for pums_year={pums_year}")
 
@@ -66,51 +65,37 @@ def _apply_acs_adjustment(county_targets: pd.DataFrame,
         .str.zfill(5)
     )
 
-    records = []
-    for cnt in county_targets['county_fips']:
-        logger.info(f"about to call acs1 for county_fips={cnt}")
-        county_arg = cnt[-3:]
-        logger.info(f"fetching acs1 for county {county_arg}")
-
+    # one concurrent, cached fetch for every county (shared retry policy in the client)
+    county_args = [cnt[-3:] for cnt in county_targets['county_fips']]
+    logger.info(f"fetching acs1 for counties {county_args}")
+    try:
+        recs = census_client.census_records(
+            pums_year,
+            'acs/acs1',
+            list(var_map.values()),
+            f"county:{','.join(county_args)}",
+            state=GEO['STATE_CODE']
+        )
+    except CacheMissError:
+        raise
+    except Exception as e:
+        logger.error(f"acs1 failure for counties {county_args}: {e}")
         recs = []
-        for attempt in range(1, 4):
+
+    records = []
+    for r in recs:
+        row = {'county_fips': f"{GEO['STATE_CODE']}{r.get('county', '')}"}
+        for out_col, code in var_map.items():
             try:
-                logger.debug(
-                    f"acs1 call: vars={list(var_map.values())}, state={GEO['STATE_CODE']},"
-                    f" county={county_arg}, year={pums_year}"
-                )
-                recs = census_client.acs1.state_county(
-                    list(var_map.values()),
-                    GEO['STATE_CODE'],
-                    county_arg,
-                    year=pums_year
-                )
-                logger.debug(f"acs1 response for {cnt} (arg {county_arg}): {recs}")
-                break
-            except Exception as e:
-                logger.error(f"acs1 failure for {county_arg} attempt {attempt}: {e}")
-                time.sleep(2 ** (attempt - 1))
-
-        if not recs:
-            logger.error(f"no acs1 data for county {county_arg} after retries, skipping adjustment")
-            continue
+                row[out_col] = int(float(r.get(code, 0)))
+            except (ValueError, TypeError):
+                logger.warning(f"invalid value for {code} in county {row['county_fips']}: {r.get(code)}; default 0")
+                row[out_col] = 0
+        records.append(row)
 
-        # normalize header/value or dict format
-        if isinstance(recs[0], list):
-            header, values = recs[0], (recs[1] if len(recs) > 1 else [])
-            recs_to_process = [dict(zip(header, values))]
-        else:
-            recs_to_process = recs
-
-        for r in recs_to_process:
-            row = {'county_fips': cnt}
-            for out_col, code in var_map.items():
-                try:
-                    row[out_col] = int(float(r.get(code, 0)))
-                except (ValueError, TypeError):
-                    logger.warning(f"invalid value for {code} in county {cnt}: {r.get(code)}; default 0")
-                    row[out_col] = 0
-            records.append(row)
+    missing = set(county_targets['county_fips']) - {r['county_fips'] for r in records}
+    for cnt in sorted(missing):
+        logger.error(f"no acs1 data for county {cnt[-3:]}, skipping adjustment")
 
     logger.info(f"total acs records: {len(records)}")
     df_acs = pd.DataFrame(records)
@@ -185,8 +170,8 @@ def build_county_targets(
         ACS 5-year vintage (e.g. 2023).
     acs_pums_1year : int
         PUMS 1-year vintage (e.g. 2023).
-    census_client :
-        Your Census API client instance.
+    census_client : CensusFetchClient
+        Shared census fetch client (tm2py_utils/misc/census_fetch.py).
 
 
     Returns
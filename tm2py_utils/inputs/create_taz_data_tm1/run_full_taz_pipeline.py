@@ -11,7 +11,7 @@ import sys
 import logging
 from pathlib import Path
 import yaml
-from census import Census
+from tm2py_utils.misc.census_fetch import CensusFetchClient
 import pandas as pd
 from common import sanity_check_df, apply_county_targets_to_taz
 
@@ -70,12 +70,16 @@ from finalize_pipeline_5 import (
 def main():
     
     logging.basicConfig(level=logging.INFO)
-    # Load API key
+    # Load API key (not needed when replaying cached responses offline)
     import os
     key_path = os.path.expandvars(PATHS['census_api_key_file'])
-    with open(key_path) as f:
-        api_key = f.read().strip()
-    c = Census(api_key, year=None)
+    api_key = None
+    if os.path.exists(key_path):
+        with open(key_path) as f:
+            api_key = f.read().strip()
+    # Shared concurrent, cached census client; set census_fetch.mode (or
+    # TM2PY_CENSUS_FETCH_MODE) to 'replay' to rerun from the cache offline
+    c = CensusFetchClient.from_config(cfg.get('census_fetch', {}), api_key)
 
 
     # fetch Census data
@@ -149,6 +153,7 @@ def main():
     df_pba  = pd.read_excel(pba_path, sheet_name="census2015", dtype=str)
 
     write_out_all(taz_scaled, df_pba, baseline_year=BASELINE_YEAR, target_year=YEAR)
+    c.log_stats()
     logging.info("Pipeline complete")
  
 if __name__ == '__main__':
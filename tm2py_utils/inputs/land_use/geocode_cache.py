@@ -0,0 +1,257 @@
+"""
+Cached, batched geocoding for the parking scrape addresses.
+
+Used by parking_geocode.geocode_parking_data and parking_scrape.geocode_address.
+
+- addresses are keyed on their normalized form (parenthetical notes dropped, whitespace
+  collapsed, case folded), so "123 Main St (enter on Oak), Oakland, CA, USA" and
+  "123  MAIN ST, Oakland, CA, USA" share one lookup
+- every resolved key is stored in an on-disk SQLite cache together with the backend that
+  resolved it; re-runs only send addresses the cache has never seen
+- lookups go through a pluggable backend: any geopy geocoder (Nominatim by default,
+  rate limited per its usage policy), or an offline lookup table read from CSV/Parquet
+  for tests and for rebuilding without network access
+- misses are deduplicated, resolved concurrently up to the backend's worker limit and
+  committed to the cache batch by batch, so an interrupted run keeps its progress
+
+Usage:
+    from geocode_cache import GeocodeCache, NominatimBackend, geocode_addresses
+
+    with GeocodeCache(INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE) as cache:
+        coords = geocode_addresses(df['full_address'], NominatimBackend(USER_AGENT), cache)
+
+The result has one row per input address (in order) with latitude, longitude and
+status ('found', 'not_found' or 'error').
+"""
+import logging
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+
+BATCH_SIZE = 100
+
+FOUND = 'found'
+NOT_FOUND = 'not_found'
+ERROR = 'error'
+
+
+def normalize_address(address):
+    """
+    Cache key for an address string: parenthetical notes removed, whitespace collapsed
+    (also around commas) and case folded. Returns '' for missing or blank addresses.
+    """
+    if address is None or pd.isna(address):
+        return ''
+    address = re.sub(r'\([^)]*\)?', ' ', str(address))
+    address = re.sub(r'\s*,\s*', ', ', address)
+    address = re.sub(r'\s+', ' ', address).strip(' ,')
+    return address.casefold()
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class GeopyBackend:
+    """
+    Geocode with a geopy geocoder.
+
+    Args:
+        geocoder: geopy geocoder instance (e.g. Nominatim)
+        min_delay_seconds (float): minimum delay between requests (geopy RateLimiter)
+        max_workers (int): concurrent requests allowed by the provider
+    """
+
+    def __init__(self, geocoder, min_delay_seconds=0.0, max_workers=1):
+        from geopy.extra.rate_limiter import RateLimiter
+
+        self.name = type(geocoder).__name__.lower()
+        self.max_workers = max_workers
+        self._geocode = RateLimiter(geocoder.geocode, min_delay_seconds=min_delay_seconds,
+                                    swallow_exceptions=False)
+
+    def geocode(self, address):
+        """(latitude, longitude) for an address, or None if the provider has no match."""
+        location = self._geocode(address)
+        if location is None:
+            return None
+        return location.latitude, location.longitude
+
+
+def NominatimBackend(user_agent, timeout=10):
+    """OpenStreetMap Nominatim: one request per second, no parallel requests."""
+    from geopy.geocoders import Nominatim
+
+    return GeopyBackend(Nominatim(user_agent=user_agent, timeout=timeout),
+                        min_delay_seconds=1.0, max_workers=1)
+
+
+class FileBackend:
+    """
+    Offline geocoder backed by a lookup table.
+
+    Args:
+        path (Path): CSV or Parquet with address, latitude and longitude columns; a previous
+            geocode cache exported with GeocodeCache.to_frame() also works
+        address_col (str): address column, matched on normalize_address
+    """
+
+    name = 'file'
+    max_workers = 8
+
+    def __init__(self, path, address_col='address'):
+        path = Path(path)
+        table = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+        table = table.dropna(subset=['latitude', 'longitude'])
+        self.lookup = {
+            normalize_address(address): (float(lat), float(lon))
+            for address, lat, lon in zip(table[address_col], table['latitude'], table['longitude'])
+        }
+        self.name = f"file:{path.name}"
+
+    def geocode(self, address):
+        return self.lookup.get(normalize_address(address))
+
+
+# ============================================================================
+# Cache
+# ============================================================================
+
+class GeocodeCache:
+    """
+    SQLite store of geocoded addresses keyed on normalize_address.
+
+    Both hits and misses are recorded; only 'found' and 'not_found' results are written
+    (errors such as timeouts are retried on the next run).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS geocode (
+            key TEXT PRIMARY KEY,
+            address TEXT,
+            latitude REAL,
+            longitude REAL,
+            status TEXT NOT NULL,
+            backend TEXT,
+            geocoded_at REAL
+        )
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(self.SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def get_many(self, keys):
+        """key -> (latitude, longitude, status) for the keys present in the cache."""
+        keys = list(keys)
+        found = {}
+        # stay below SQLite's host parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, latitude, longitude, status FROM geocode "
+                f"WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            found.update({key: (lat, lon, status) for key, lat, lon, status in rows})
+        return found
+
+    def put_many(self, records, backend):
+        """Store (key, address, latitude, longitude, status) records and commit."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*record, backend, now) for record in records])
+
+    def to_frame(self):
+        """Cache contents as a DataFrame (usable as a FileBackend table)."""
+        return pd.read_sql_query("SELECT * FROM geocode ORDER BY key", self.conn)
+
+
+# ============================================================================
+# Batch geocoding
+# ============================================================================
+
+def _lookup(backend, address):
+    try:
+        coords = backend.geocode(address)
+    except Exception as e:
+        logging.warning(f"Geocoding error for '{address}': {e}")
+        return None, None, ERROR
+    if coords is None:
+        return None, None, NOT_FOUND
+    return coords[0], coords[1], FOUND
+
+
+def geocode_addresses(addresses, backend, cache=None, max_workers=None, batch_size=BATCH_SIZE,
+                      retry_not_found=False):
+    """
+    Geocode addresses through the cache, resolving only unseen addresses with the backend.
+
+    Args:
+        addresses (iterable): address strings; missing/blank addresses get status 'not_found'
+        backend: object with geocode(address) -> (latitude, longitude) or None, and a
+            max_workers attribute bounding concurrent requests
+        cache (GeocodeCache): if given, read before and written after each batch
+        max_workers (int): thread pool size, capped by backend.max_workers
+        batch_size (int): addresses resolved between cache commits
+        retry_not_found (bool): send cached 'not_found' addresses to the backend again
+
+    Returns:
+        DataFrame: address, key, latitude, longitude, status; one row per input address
+    """
+    addresses = pd.Series(list(addresses), dtype=object)
+    keys = addresses.map(normalize_address)
+
+    # first spelling of each unique key is the one sent to the backend
+    unique = {}
+    for key, address in zip(keys, addresses):
+        if key and key not in unique:
+            unique[key] = address
+
+    resolved = cache.get_many(unique) if cache is not None else {}
+    if retry_not_found:
+        resolved = {key: value for key, value in resolved.items() if value[2] == FOUND}
+    pending = [key for key in unique if key not in resolved]
+    logging.info(f"Geocoding {len(addresses)} addresses: {len(unique)} unique, "
+                 f"{len(resolved)} cached, {len(pending)} to geocode with {backend.name}")
+
+    workers = max(1, min(max_workers or backend.max_workers, backend.max_workers))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            results = list(pool.map(lambda key: _lookup(backend, unique[key]), batch))
+            resolved.update(zip(batch, results))
+            if cache is not None:
+                cache.put_many([(key, unique[key], *result) for key, result in zip(batch, results)
+                                if result[2] != ERROR], backend.name)
+            logging.info(f"  geocoded {min(start + batch_size, len(pending))}/{len(pending)}")
+
+    missing = (None, None, NOT_FOUND)
+    values = [resolved.get(key, missing) for key in keys]
+    return pd.DataFrame({
+        'address': addresses,
+        'key': keys,
+        'latitude': pd.Series([value[0] for value in values], dtype=float),
+        'longitude': pd.Series([value[1] for value in values], dtype=float),
+        'status': [value[2] for value in values],
+    })
@@ -11,12 +11,17 @@ High-Level Steps:
 3. Parking: Integrate observed costs, capacity, and estimated costs for unobserved areas
 
 
+The steps form a DAG (see build_pipeline_graph and step_graph.py): independent branches
+run concurrently and each step's output is cached by a content hash of its inputs,
+parameters and upstream steps, so a re-run only recomputes what changed.
+
 Outputs:
 - Interim cache: jobs_maz_*.gpkg, enrollment_maz_*.gpkg, parking_capacity.gpkg
+- Step cache: interim_cache/step_cache/<step>-<hash>.parquet
 - Final: maz_data_v{VERSION}_{VINTAGE}.csv with all attributes
 
 Usage:
-    python -m tm2py_utils.inputs.land_use.land_use_pipeline [--no-cache] [--validate-parking]
+    python -m tm2py_utils.inputs.land_use.land_use_pipeline [--no-cache] [--no-validate-parking] [--max-workers N]
     OR
     from land_use_pipeline import run_pipeline
     landuse_maz = run_pipeline(use_cache=True)
@@ -27,10 +32,16 @@ import numpy as np
 from pathlib import Path
 import argparse
 import logging
+import sys
 from datetime import datetime
 
 # Import configuration
 from setup import (
+    MAZ_TAZ_DIR,
+    MAZ_VERSION,
+    EMPLOYMENT_RAW_DATA_DIR,
+    ENROLLMENT_RAW_DATA_DIR,
+    PARKING_RAW_DATA_DIR,
     ANALYSIS_CRS,
     WGS84_CRS,
     SQUARE_METERS_PER_ACRE,
@@ -48,10 +59,21 @@ from utils import (
     get_output_filename,
     redirect_stdout_to_logger,
     load_bay_area_places,
-    spatial_join_maz_to_place
+    spatial_join_maz_to_place,
+    mean_by_maz
 )
 
 # Import core modules
+import utils
+import job_counts
+import naics_xwalk
+import enrollment_counts
+import parking_capacity
+import parking_published
+import parking_area
+import parking_estimation
+import local_moran
+from step_graph import Step, StepGraph
 from job_counts import get_jobs_maz
 from enrollment_counts import get_enrollment_maz
 from parking_published import published_cost
@@ -70,13 +92,14 @@ from parking_estimation import (
 # Define merging functions
 # ============================================================================
 
-def merge_employment_data(maz, use_cache=False):
+def merge_employment_data(maz, use_cache=False, jobs_maz=None):
     """
     Merge employment data into MAZ.
     
     Args:
         maz (GeoDataFrame): MAZ data
         use_cache (bool): If True, reads from interim cache. If False, regenerates data.
+        jobs_maz (DataFrame, optional): Precomputed employment by MAZ (e.g. from the step graph)
     
     Returns:
         GeoDataFrame: MAZ with employment columns added
@@ -85,7 +108,9 @@ def merge_employment_data(maz, use_cache=False):
     print(f"Adding Employment Data")
     print(f"{'='*70}\n")
     
-    if use_cache:
+    if jobs_maz is not None:
+        print(f"  Using employment for {len(jobs_maz):,} MAZs from the employment step")
+    elif use_cache:
         cache_file = get_output_filename("jobs_maz", extension="gpkg", spatial=True)
         if cache_file.exists():
             print(f"  Loading employment from cache: {cache_file}")
@@ -120,13 +145,14 @@ def merge_employment_data(maz, use_cache=False):
     return maz
 
 
-def merge_enrollment_data(maz, use_cache=False):
+def merge_enrollment_data(maz, use_cache=False, enroll_maz=None):
     """
     Merge enrollment data into MAZ.
 
     Args:
         maz (GeoDataFrame): MAZ data
         use_cache (bool): If True, reads from interim cache. If False, regenerates data.
+        enroll_maz (DataFrame, optional): Precomputed enrollment by MAZ (e.g. from the step graph)
 
     Returns:
         GeoDataFrame: MAZ with enrollment columns added
@@ -135,7 +161,9 @@ def merge_enrollment_data(maz, use_cache=False):
     print(f"Adding Enrollment Data")
     print(f"{'='*70}\n")
     
-    if use_cache:
+    if enroll_maz is not None:
+        print(f"  Using enrollment for {len(enroll_maz):,} MAZs from the enrollment step")
+    elif use_cache:
         cache_file = get_output_filename("enrollment_maz", extension="gpkg", spatial=True)
         if cache_file.exists():
             print(f"  Loading enrollment from cache: {cache_file}")
@@ -226,19 +254,15 @@ def merge_scraped_cost(maz):
     
     print(f"  Loaded {len(daily):,} daily parking locations and {len(monthly):,} monthly parking locations")
     
-    # Spatial join to MAZ
+    # Locate parking points in MAZ (shared MAZ locator)
     if len(daily) > 0:
-        daily_maz = gpd.sjoin(maz[['MAZ_NODE', 'geometry']], daily, how='left', predicate='intersects')
-        daily_avg = daily_maz.groupby('MAZ_NODE')['price_value'].mean().reset_index()
-        daily_avg = daily_avg.rename(columns={'price_value': 'dparkcost'})
+        daily_avg = mean_by_maz(daily, maz, 'price_value', 'dparkcost')
         maz = maz.merge(daily_avg, on='MAZ_NODE', how='left')
     else:
         maz['dparkcost'] = None
     
     if len(monthly) > 0:
-        monthly_maz = gpd.sjoin(maz[['MAZ_NODE', 'geometry']], monthly, how='left', predicate='intersects')
-        monthly_avg = monthly_maz.groupby('MAZ_NODE')['price_value'].mean().reset_index()
-        monthly_avg = monthly_avg.rename(columns={'price_value': 'mparkcost'})
+        monthly_avg = mean_by_maz(monthly, maz, 'price_value', 'mparkcost')
         maz = maz.merge(monthly_avg, on='MAZ_NODE', how='left')
     else:
         maz['mparkcost'] = None
@@ -256,12 +280,13 @@ def merge_scraped_cost(maz):
     return maz
 
 
-def merge_published_cost(maz):
+def merge_published_cost(maz, hparkcost_maz=None):
     """
     Merge published parking meter costs from SF, Oakland, San Jose.
-    python
+    
     Args:
         maz (GeoDataFrame): MAZ data
+        hparkcost_maz (DataFrame, optional): Precomputed published_cost() output (e.g. from the step graph)
     
     Returns:
         GeoDataFrame: MAZ with hparkcost column added
@@ -270,7 +295,8 @@ def merge_published_cost(maz):
     print(f"Merging Published Parking Meter Costs")
     print(f"{'='*70}\n")
     
-    hparkcost_maz = published_cost()
+    if hparkcost_maz is None:
+        hparkcost_maz = published_cost()
     # Ensure MAZ_NODE is string for merge
     hparkcost_maz['MAZ_NODE'] = hparkcost_maz['MAZ_NODE'].astype(str)
     maz = maz.merge(hparkcost_maz[['MAZ_NODE', 'hparkcost']], on='MAZ_NODE', how='left')
@@ -285,13 +311,14 @@ def merge_published_cost(maz):
     return maz
 
 
-def merge_capacity(maz, use_cache=False):
+def merge_capacity(maz, use_cache=False, capacity=None):
     """
     Merge parking capacity data to MAZ and create stall columns.
     
     Args:
         maz (GeoDataFrame): MAZ data
         use_cache (bool): If True, reads from interim cache. If False, regenerates data.
+        capacity (DataFrame, optional): Precomputed get_parking_maz() output (e.g. from the step graph)
     
     Returns:
         GeoDataFrame: MAZ with parking stall columns added
@@ -306,7 +333,9 @@ def merge_capacity(maz, use_cache=False):
     capacity_file = get_output_filename("parking_capacity", extension="gpkg", spatial=True)
     
     # Check if capacity file exists in cache
-    if use_cache and capacity_file.exists():
+    if capacity is not None:
+        capacity = pd.DataFrame(capacity.drop(columns=['geometry', 'emp_total'], errors='ignore'))
+    elif use_cache and capacity_file.exists():
         print(f"  Loading capacity from cache: {capacity_file}")
         capacity = gpd.read_file(capacity_file)
         capacity = pd.DataFrame(capacity.drop(columns='geometry'))
@@ -462,6 +491,148 @@ def merge_estimated_cost(
     return maz
 
 
+# ============================================================================
+# Pipeline Step Graph
+# ============================================================================
+
+# Source files read by each step; their content hashes are part of the step cache keys
+MAZ_SHAPEFILE = MAZ_TAZ_DIR / f"mazs_TM2_{MAZ_VERSION}.shp"
+MAZ_INPUTS = [MAZ_SHAPEFILE.with_suffix(ext) for ext in (".shp", ".shx", ".dbf", ".prj")]
+EMPLOYMENT_INPUTS = [
+    EMPLOYMENT_RAW_DATA_DIR / "Businesses_2023.gdb",
+    Path(r"M:/Crosswalks/NAICS") / "2022_NAICS_Descriptions.xlsx",  # read by naics_xwalk.create_naics_xwalk
+]
+ENROLLMENT_INPUTS = [
+    ENROLLMENT_RAW_DATA_DIR / "SchoolSites2425.gpkg",
+    ENROLLMENT_RAW_DATA_DIR / "cprs_2324.gpkg",
+    ENROLLMENT_RAW_DATA_DIR / "bayarea_postsec_2324.shp",
+    ENROLLMENT_RAW_DATA_DIR / "postsec_enroll_2324.csv",
+]
+CAPACITY_INPUTS = [
+    PARKING_RAW_DATA_DIR / "2123-Dataset" / "parking_density_Employee_Capita" / "parking_density_Employee_Capita.shp",
+    PARKING_RAW_DATA_DIR / "2123-Dataset" / "parking_density_Employee_Capita" / "parking_density_Employee_Capita.dbf",
+]
+PUBLISHED_COST_INPUTS = [
+    PARKING_RAW_DATA_DIR / "City_of_Oakland_Parking_Meters_20260107.geojson",
+    PARKING_RAW_DATA_DIR / "Parking_Meters.geojson",
+    PARKING_RAW_DATA_DIR / "January 2026 Parking Meter Rate Change Data.csv",
+    PARKING_RAW_DATA_DIR / "Parking_Management_Districts_20260203.geojson",
+]
+SCRAPED_COST_FILE = INTERIM_CACHE_DIR / "parking_scrape_location_cost.parquet"
+STEP_CACHE_DIR = INTERIM_CACHE_DIR / "step_cache"
+LOCAL_MORAN_CACHE_DIR = INTERIM_CACHE_DIR / "local_moran"
+
+
+def _drop_geometry(df):
+    return pd.DataFrame(df.drop(columns='geometry', errors='ignore'))
+
+
+def scraped_cost_step(maz):
+    """Average scraped daily/monthly costs by MAZ (MAZ_NODE, dparkcost, mparkcost)."""
+    return _drop_geometry(merge_scraped_cost(maz[['MAZ_NODE', 'geometry']]))
+
+
+def capacity_step(jobs):
+    """Block group parking capacity allocated to MAZ, reusing the employment step output."""
+    from parking_capacity import get_parking_maz
+    return _drop_geometry(get_parking_maz(write=True, jobs_maz=jobs))
+
+
+def assemble_step(maz, jobs, enrollment, places, scraped_cost, published_cost, capacity):
+    """Merge the branch outputs onto the MAZ polygons, in the original pipeline order."""
+    maz = merge_employment_data(maz, jobs_maz=jobs)
+    maz = merge_enrollment_data(maz, enroll_maz=enrollment)
+    maz = merge_population_data(maz)
+    maz = spatial_join_maz_to_place(maz, places)
+    maz = maz.merge(scraped_cost, on='MAZ_NODE', how='left')
+    maz = merge_published_cost(maz, hparkcost_maz=published_cost)
+    maz = merge_capacity(maz, capacity=capacity)
+    return maz
+
+
+def parking_area_step(assemble, min_place_employment, significance_level, permutations, seed):
+    return merge_parking_area(assemble, min_place_employment=min_place_employment,
+                              significance_level=significance_level,
+                              permutations=permutations, seed=seed,
+                              cache_dir=LOCAL_MORAN_CACHE_DIR)
+
+
+def estimated_cost_step(parking_area, **params):
+    return merge_estimated_cost(parking_area, **params)
+
+
+def finalize_step(estimated_cost, from_year, to_year):
+    """Backfill downtown daily costs, deflate costs, and update stalls and parkarea."""
+    maz = backfill_downtown_daily_costs(estimated_cost)
+    maz = deflate_parking_costs(maz, from_year=from_year, to_year=to_year)
+    maz = update_monthly_stalls_with_predicted_costs(maz)
+    maz = update_parkarea_with_predicted_costs(maz)
+    return maz
+
+
+def build_pipeline_graph(
+    use_cache=True,
+    validate_parking=True,
+    compare_parking_models=True,
+    commercial_density_threshold=1.0,
+    daily_percentile=0.95,
+    monthly_percentile=0.99,
+    probability_threshold=0.3
+):
+    """
+    Build the land use pipeline as a StepGraph.
+
+    The employment, enrollment, capacity, places, scraped cost and published cost
+    branches are independent of each other and run concurrently; assemble merges them
+    onto the MAZ polygons, followed by parking areas, cost estimation and finalize.
+    Each step is cached under INTERIM_CACHE_DIR/step_cache by a hash of its inputs,
+    parameters, code and upstream steps.
+
+    Args:
+        use_cache (bool): If False, every step is recomputed
+        (remaining args): See run_pipeline / merge_estimated_cost
+
+    Returns:
+        StepGraph: The pipeline graph
+    """
+    graph = StepGraph(STEP_CACHE_DIR, use_cache=use_cache)
+    # steps whose functions live in this module hash it too, so editing them invalidates their outputs
+    pipeline = sys.modules[__name__]
+    graph.add(Step("maz", load_maz_shp, inputs=MAZ_INPUTS, code=[utils]))
+    graph.add(Step("jobs", lambda: get_jobs_maz(write=True),
+                   inputs=MAZ_INPUTS + EMPLOYMENT_INPUTS, code=[job_counts, naics_xwalk, utils]))
+    graph.add(Step("enrollment", lambda: get_enrollment_maz(write=True),
+                   inputs=MAZ_INPUTS + ENROLLMENT_INPUTS, code=[enrollment_counts, utils]))
+    graph.add(Step("capacity", capacity_step, deps=["jobs"],
+                   inputs=MAZ_INPUTS + CAPACITY_INPUTS, code=[parking_capacity, utils]))
+    graph.add(Step("places", load_bay_area_places, params={}, code=[utils], version="acs2021"))
+    graph.add(Step("scraped_cost", scraped_cost_step, deps=["maz"], inputs=[SCRAPED_COST_FILE],
+                   code=[pipeline]))
+    graph.add(Step("published_cost", published_cost,
+                   inputs=MAZ_INPUTS + PUBLISHED_COST_INPUTS, code=[parking_published, utils]))
+    graph.add(Step("assemble", assemble_step,
+                   deps=["maz", "jobs", "enrollment", "places", "scraped_cost", "published_cost", "capacity"],
+                   inputs=[SYNTH_POP_FILE], code=[pipeline, utils]))
+    graph.add(Step("parking_area", parking_area_step, deps=["assemble"],
+                   params={"min_place_employment": 100, "significance_level": 0.05,
+                           "permutations": local_moran.PERMUTATIONS, "seed": local_moran.DEFAULT_SEED},
+                   code=[parking_area, local_moran]))
+    graph.add(Step("estimated_cost", estimated_cost_step, deps=["parking_area"],
+                   params={
+                       "validate_parking": validate_parking,
+                       "compare_parking_models": compare_parking_models,
+                       "commercial_density_threshold": commercial_density_threshold,
+                       "daily_percentile": daily_percentile,
+                       "monthly_percentile": monthly_percentile,
+                       "probability_threshold": probability_threshold,
+                   },
+                   inputs=[SCRAPED_COST_FILE], code=[pipeline, parking_estimation]))
+    graph.add(Step("finalize", finalize_step, deps=["estimated_cost"],
+                   params={"from_year": 2023, "to_year": 2010},
+                   code=[pipeline, parking_estimation, utils]))
+    return graph
+
+
 # ============================================================================
 # Main Pipeline Orchestration
 # ============================================================================
@@ -473,19 +644,25 @@ def run_pipeline(
     commercial_density_threshold=1.0,
     daily_percentile=0.95,
     monthly_percentile=0.99,
-    output_format="csv"
+    output_format="csv",
+    max_workers=4
 ):
     """
     Execute the complete MAZ land use input creation pipeline.
     
+    Steps are run through the step graph (see build_pipeline_graph): a step is loaded
+    from the step cache when its inputs, parameters and upstream steps are unchanged, so
+    re-running after a parameter tweak only recomputes the affected downstream steps.
+    
     Args:
-        use_cache (bool): If True, reads employment/enrollment from interim cache when available
+        use_cache (bool): If True, reuses cached step outputs whose cache key matches
         validate_parking (bool): If True, performs leave-one-city-out cross-validation for parking cost estimation
         compare_parking_models (bool): If True, compares multiple ML models for parking cost estimation
         commercial_density_threshold (float): Minimum commercial employment density for paid parking (jobs/acre)
         daily_percentile (float): County-level percentile threshold for daily parking cost estimation
         monthly_percentile (float): County-level percentile threshold for monthly parking cost estimation
         output_format (str): Output file format - either "csv" or "gpkg" (default: "csv")
+        max_workers (int): Number of steps that may run concurrently
     
     Returns:
         GeoDataFrame: Complete MAZ land use dataset with employment, enrollment, parking, and synthesized population
@@ -504,7 +681,7 @@ def run_pipeline(
     log_file = get_output_filename("maz_data", extension="log", spatial=False)
     fh = logging.FileHandler(log_file, mode='w', encoding='utf-8')
     fh.setLevel(logging.DEBUG)
-    fh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', 
+    fh.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(levelname)s - %(message)s', 
                                       datefmt='%Y-%m-%d %H:%M:%S'))
     logger.addHandler(fh)
     
@@ -516,6 +693,7 @@ def run_pipeline(
     print(f"  Cache enabled: {use_cache}")
     print(f"  Validation: {validate_parking}")
     print(f"  Model comparison: {compare_parking_models}")
+    print(f"  Concurrent steps: {max_workers}")
     print(f"  Output format: {output_format}\n")
     
     # Detailed logging
@@ -523,7 +701,8 @@ def run_pipeline(
     logging.info("MAZ LAND USE INPUT CREATION PIPELINE")
     logging.info("="*80)
     logging.info(f"Configuration:")
-    logging.info(f"  Use cached interim data: {use_cache}")
+    logging.info(f"  Use cached step outputs: {use_cache}")
+    logging.info(f"  Step cache: {STEP_CACHE_DIR}")
     logging.info(f"  Validate parking estimation: {validate_parking}")
     logging.info(f"  Compare parking models: {compare_parking_models}")
     logging.info(f"  Commercial density threshold: {commercial_density_threshold}")
@@ -531,129 +710,29 @@ def run_pipeline(
     logging.info(f"  Monthly cost percentile: {monthly_percentile}")
     logging.info(f"  Output format: {output_format}")
     
-    # Step 1: Load MAZ data
-    print("▶ Step 1/13: Loading MAZ data...")
-    logging.info("="*80)
-    logging.info("STEP 1: Loading MAZ data")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = load_maz_shp()
-    # Step 2: Merge employment data
-    print("▶ Step 2/13: Processing employment data...")
-    logging.info("="*80)
-    logging.info("STEP 2: Processing employment data")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_employment_data(maz, use_cache=use_cache)
-    print(f"  ✓ Employment data merged\n")
-    
-    # Step 3: Merge enrollment data
-    print("▶ Step 3/13: Processing enrollment data...")
-    logging.info("="*80)
-    logging.info("STEP 3: Processing enrollment data")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_enrollment_data(maz, use_cache=use_cache)
-    print(f"  ✓ Enrollment data merged\n")
-    
-    # Step 4: Merge population data
-    print("▶ Step 4/13: Processing population data...")
-    logging.info("="*80)
-    logging.info("STEP 4: Processing population data")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_population_data(maz)
-    print(f"  ✓ Population data merged\n")
-    
-    # Step 5: Spatial join to Census places (for parking analysis)
-    print("▶ Step 5/13: Joining Census place boundaries...")
-    logging.info("="*80)
-    logging.info("STEP 5: Joining Census place boundaries")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        places = load_bay_area_places()
-        logging.info(f"Loaded {len(places):,} places")
-        maz = spatial_join_maz_to_place(maz, places)
-    print(f"  ✓ Joined {len(places):,} places\n")
-    
-    # Step 6: Merge parking data
-    print("▶ Step 6/13: Merging parking cost data...")
-    logging.info("="*80)
-    logging.info("STEP 6: Merging parking cost data")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_scraped_cost(maz)
-        maz = merge_published_cost(maz)
-        maz = merge_capacity(maz, use_cache=use_cache)
-    print(f"  ✓ Parking cost data merged\n")
-    
-    # Step 7: Assign initial parking areas
-    print("▶ Step 7/13: Assigning parking areas...")
-    logging.info("="*80)
-    logging.info("STEP 7: Assigning parking areas")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_parking_area(maz, min_place_employment=100, significance_level=0.05)
-    print(f"  ✓ Parking areas assigned\n")
-    
-    # Step 8: Estimate parking costs for unobserved areas
-    print("▶ Step 8/13: Estimating parking costs...")
-    logging.info("="*80)
-    logging.info("STEP 8: Estimating parking costs")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = merge_estimated_cost(
-            maz,
-            validate_parking=validate_parking,
-            compare_parking_models=compare_parking_models,
-            commercial_density_threshold=commercial_density_threshold,
-            daily_percentile=daily_percentile,
-            monthly_percentile=monthly_percentile,
-            probability_threshold=0.3  # Optimized via cross-validation
-        )
-    
-    print(f"  ✓ Parking costs estimated\n")
-    
-    # Step 9: Backfill downtown daily costs
-    print("▶ Step 9/13: Backfilling downtown daily costs...")
-    logging.info("="*80)
-    logging.info("STEP 9: Backfilling downtown daily costs")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = backfill_downtown_daily_costs(maz)
-    print(f"  ✓ Downtown daily costs backfilled\n")
-    
-    # Step 10: Deflate parking costs to 2010 dollars
-    print("▶ Step 10/13: Deflating parking costs to 2010 dollars...")
-    logging.info("="*80)
-    logging.info("STEP 10: Deflating parking costs to 2010 dollars")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = deflate_parking_costs(maz, from_year=2023, to_year=2010)
-    print(f"  ✓ Parking costs deflated to 2010 dollars\n")
-    
-    # Step 11: Update monthly stalls with predicted costs
-    print("▶ Step 11/13: Updating monthly stalls with predicted costs...")
-    logging.info("="*80)
-    logging.info("STEP 11: Updating monthly stalls with predicted costs")
-    logging.info("="*80)
-    with redirect_stdout_to_logger():
-        maz = update_monthly_stalls_with_predicted_costs(maz)
-    print(f"  ✓ Monthly stalls updated\n")
+    graph = build_pipeline_graph(
+        use_cache=use_cache,
+        validate_parking=validate_parking,
+        compare_parking_models=compare_parking_models,
+        commercial_density_threshold=commercial_density_threshold,
+        daily_percentile=daily_percentile,
+        monthly_percentile=monthly_percentile,
+        probability_threshold=0.3  # Optimized via cross-validation
+    )
     
-    # Step 11: Update parkarea classification with predicted costs (parkarea 3)
-    print("▶ Step 12/13: Updating parkarea classifications...")
-    logging.info("="*80)
-    logging.info("STEP 12: Updating parkarea classifications")
-    logging.info("="*80)
+    # Steps 1-12: run the step graph (branches concurrently, cached steps reloaded)
+    print(f"▶ Running {len(graph.steps)} pipeline steps...")
     with redirect_stdout_to_logger():
-        maz = update_parkarea_with_predicted_costs(maz)
-    print(f"  ✓ Parkarea classifications updated\n")
-    
-    # Step 12: Write final output
-    print("▶ Step 13/13: Writing final output...")
+        outputs = graph.run(max_workers=max_workers)
+    for name, stat in graph.stats.items():
+        print(f"  ✓ {name}: {stat['status']} ({stat['seconds']}s)")
+    print()
+    maz = outputs["finalize"]
+    
+    # Step 13: Write final output
+    print("▶ Writing final output...")
     logging.info("="*80)
-    logging.info("STEP 13: Writing final output")
+    logging.info("Writing final output")
     logging.info("="*80)
     
     # Clean up any duplicate TAZ_NODE columns in maz before creating output
@@ -727,7 +806,7 @@ def main():
         "--no-cache",
         action="store_false",
         dest="use_cache",
-        help="Skip cached employment/enrollment data and regenerate from raw sources"
+        help="Ignore cached step outputs and regenerate every step from raw sources"
     )
     parser.add_argument(
         "--no-validate-parking",
@@ -741,6 +820,12 @@ def main():
         dest="compare_parking_models",
         help="Skip comparison of multiple ML models for parking cost estimation"
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="Number of pipeline steps that may run concurrently (default: 4)"
+    )
     parser.add_argument(
         "--output-format",
         type=str,
@@ -755,7 +840,8 @@ def main():
         use_cache=args.use_cache,
         validate_parking=args.validate_parking,
         compare_parking_models=args.compare_parking_models,
-        output_format=args.output_format
+        output_format=args.output_format,
+        max_workers=args.max_workers
     )
     
     print(f"\nPipeline execution complete!")
@@ -36,7 +36,8 @@ LISA Categories:
 
 Dependencies:
 - libpysal: Spatial weights matrix construction
-- esda: Local Moran's I statistics
+- local_moran: Batched, seeded Local Moran's I (same statistic as esda.Moran_Local)
+- scipy: Sparse adjacency and connected components of candidate clusters
 
 Entry Point:
 - merge_parking_area(): Main function called from parking_prep.py
@@ -45,47 +46,105 @@ Entry Point:
 import pandas as pd
 import geopandas as gpd
 import numpy as np
-import networkx as nx
+import shapely
 import warnings
-import sys
-import os
-from contextlib import contextmanager
-from shapely.ops import unary_union
+from scipy.sparse.csgraph import connected_components
 from libpysal.weights import Queen
-from esda.moran import Moran_Local
 
+from local_moran import DEFAULT_SEED, PERMUTATIONS, local_moran, local_moran_by_place
 
-@contextmanager
-def suppress_output():
-    """Context manager to suppress stdout and stderr."""
-    old_stdout = sys.stdout
-    old_stderr = sys.stderr
-    
-    try:
-        # Flush any pending output first
-        sys.stdout.flush()
-        sys.stderr.flush()
-        
-        # Redirect to devnull
-        sys.stdout = open(os.devnull, 'w')
-        sys.stderr = open(os.devnull, 'w')
-        yield
-    finally:
-        # Close devnull files
-        if sys.stdout != old_stdout:
-            sys.stdout.close()
-        if sys.stderr != old_stderr:
-            sys.stderr.close()
-        
-        # Restore original streams
-        sys.stdout = old_stdout
-        sys.stderr = old_stderr
+
+def queen_adjacency(w, index):
+    """
+    Binary CSR adjacency matrix of Queen contiguity weights, rows/columns in `index` order.
+
+    Args:
+        w: libpysal W built with use_index=True
+        index: MAZ index labels (the GeoDataFrame index w was built from)
+
+    Returns:
+        scipy.sparse.csr_matrix: int8 adjacency with 1 where two MAZs share a boundary point
+    """
+    adjacency = w.sparse.tocsr()
+    if list(w.id_order) != list(index):
+        order = pd.Index(w.id_order).get_indexer(index)
+        adjacency = adjacency[order][:, order]
+    adjacency = (adjacency != 0).astype(np.int8)
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    return adjacency
+
+
+def fill_cluster_holes(adjacency, in_cluster):
+    """
+    Add MAZs whose neighbors are all in the cluster, repeating until no more are added.
+
+    A MAZ qualifies when it has at least one neighbor and every neighbor is already in the
+    cluster, so enclosed groups of MAZs are picked up as they become surrounded.
+
+    Args:
+        adjacency: binary CSR adjacency (see queen_adjacency)
+        in_cluster: boolean array, True for cluster MAZs
+
+    Returns:
+        tuple: (in_cluster with holes added, number of MAZs added)
+    """
+    in_cluster = in_cluster.copy()
+    n_neighbors = np.asarray(adjacency.sum(axis=1)).ravel()
+    n_filled = 0
+    while True:
+        n_cluster_neighbors = adjacency @ in_cluster.astype(np.int32)
+        holes = ~in_cluster & (n_neighbors > 0) & (n_cluster_neighbors == n_neighbors)
+        n_new = int(holes.sum())
+        if n_new == 0:
+            return in_cluster, n_filled
+        in_cluster |= holes
+        n_filled += n_new
+
+
+def place_contiguity(mazs_gdf, max_area_percentile=0.90):
+    """
+    Drop the largest MAZs of a place and build Queen contiguity for the rest.
+    
+    Args:
+        mazs_gdf: GeoDataFrame of MAZs within a single place
+        max_area_percentile: Exclude MAZs larger than this percentile (default: 0.90 = top 10%)
+    
+    Returns:
+        tuple: (mazs_gdf, adjacency, area_threshold, n_filtered)
+            - mazs_gdf: The MAZs kept after the area filter
+            - adjacency: Binary CSR adjacency (see queen_adjacency), None if fewer than 3 MAZs are kept
+            - area_threshold: Area cutoff in m²
+            - n_filtered: Number of MAZs dropped by the area filter
+    """
+    # Calculate area and filter out very large MAZs (top 10% by default)
+    if 'area_m2' not in mazs_gdf.columns:
+        mazs_gdf = mazs_gdf.copy()
+        mazs_gdf['area_m2'] = mazs_gdf.geometry.area
+    
+    area_threshold = mazs_gdf['area_m2'].quantile(max_area_percentile)
+    n_before_filter = len(mazs_gdf)
+    mazs_gdf = mazs_gdf[mazs_gdf['area_m2'] <= area_threshold].copy()
+    n_filtered = n_before_filter - len(mazs_gdf)
+    
+    # Local Moran's I requires at least 3 observations
+    if len(mazs_gdf) < 3:
+        return mazs_gdf, None, area_threshold, n_filtered
+    
+    # Build spatial weights matrix using Queen contiguity (suppress warnings about islands/disconnected components)
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore')
+        w = Queen.from_dataframe(mazs_gdf, use_index=True, silence_warnings=True)
+    
+    return mazs_gdf, queen_adjacency(w, mazs_gdf.index), area_threshold, n_filtered
 
 
 def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp', 
                                        significance_level=0.05,
                                        max_area_percentile=0.90, min_cluster_mazs=5,
-                                       min_cluster_employment=100):
+                                       min_cluster_employment=100,
+                                       permutations=PERMUTATIONS, seed=DEFAULT_SEED,
+                                       contiguity=None, moran=None):
     """
     Assign parkarea=1 using Local Moran's I analysis.
     
@@ -100,6 +159,10 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
         max_area_percentile: Exclude MAZs larger than this percentile (default: 0.90 = top 10%)
         min_cluster_mazs: Minimum MAZs required for valid cluster (default: 5)
         min_cluster_employment: Minimum employment required for valid cluster (default: 100)
+        permutations: Conditional randomizations for the p-values (default: 999)
+        seed: Random seed for the permutations
+        contiguity: Precomputed place_contiguity(mazs_gdf, max_area_percentile) result
+        moran: Precomputed LocalMoranResult for the filtered MAZs (see local_moran_by_place)
     
     Returns:
         tuple: (parkarea_mask, moran_categories, metrics_dict)
@@ -107,18 +170,12 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
             - moran_categories: Series with LISA categories ('HH', 'HL', 'LH', 'LL', 'NS')
             - metrics_dict: Dict with Local Moran's I statistics and cluster info
     """
-    # Calculate area and filter out very large MAZs (top 10% by default)
-    if 'area_m2' not in mazs_gdf.columns:
-        mazs_gdf = mazs_gdf.copy()
-        mazs_gdf['area_m2'] = mazs_gdf.geometry.area
-    
-    area_threshold = mazs_gdf['area_m2'].quantile(max_area_percentile)
-    n_before_filter = len(mazs_gdf)
-    mazs_gdf = mazs_gdf[mazs_gdf['area_m2'] <= area_threshold].copy()
-    n_filtered = n_before_filter - len(mazs_gdf)
+    if contiguity is None:
+        contiguity = place_contiguity(mazs_gdf, max_area_percentile)
+    mazs_gdf, adjacency, area_threshold, n_filtered = contiguity
     
     # Check for minimum MAZ count (Local Moran's I requires at least 3 observations)
-    if len(mazs_gdf) < 3:
+    if adjacency is None:
         # Return empty results for places with too few MAZs
         category_counts = {'HH': 0, 'HL': 0, 'LH': 0, 'LL': 0, 'NS': len(mazs_gdf)}
         return pd.Series(False, index=mazs_gdf.index), pd.Series('NS', index=mazs_gdf.index), {
@@ -132,35 +189,25 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
             'lisa_counts': category_counts
         }
     
-    # Build spatial weights matrix using Queen contiguity (suppress warnings about islands/disconnected components)
-    with warnings.catch_warnings(), suppress_output():
-        warnings.filterwarnings('ignore', category=UserWarning)
-        warnings.filterwarnings('ignore')  # Suppress all warnings during this operation
-        w = Queen.from_dataframe(mazs_gdf, use_index=True, silence_warnings=True)
-    
-    # Calculate Local Moran's I statistic for each MAZ (suppress division warnings)
-    employment_values = mazs_gdf[emp_col].values
-    with warnings.catch_warnings():
-        warnings.filterwarnings('ignore', category=RuntimeWarning)
-        moran_local = Moran_Local(employment_values, w, transformation='r', permutations=999)
+    # Calculate Local Moran's I statistic for each MAZ
+    employment_values = mazs_gdf[emp_col].to_numpy(dtype=float)
+    if moran is None:
+        moran = local_moran(employment_values, adjacency, permutations, seed=seed)
     
     # Map LISA quadrants to categories
     # q=1: HH (High-High), q=2: LH (Low-High), q=3: LL (Low-Low), q=4: HL (High-Low)
-    lisa_categories = pd.Series('NS', index=mazs_gdf.index)
-    
     # Only assign category if statistically significant
-    is_significant = moran_local.p_sim <= significance_level
+    is_significant = moran.p_sim <= significance_level
     
-    quadrant_map = {1: 'HH', 2: 'LH', 3: 'LL', 4: 'HL'}
-    for idx, (quad, sig) in enumerate(zip(moran_local.q, is_significant)):
-        if sig:
-            lisa_categories.iloc[idx] = quadrant_map.get(quad, 'NS')
+    quadrant_labels = np.array(['NS', 'HH', 'LH', 'LL', 'HL'])
+    quadrants = np.where(is_significant, moran.q, 0)
+    lisa_categories = pd.Series(quadrant_labels[quadrants], index=mazs_gdf.index)
     
     # Identify High-High and High-Low clusters
     # HH: high employment surrounded by high employment (downtown core)
     # HL: high employment surrounded by low employment (edge of downtown)
-    is_high_high = (moran_local.q == 1) & (moran_local.p_sim <= significance_level)
-    is_high_low = (moran_local.q == 4) & (moran_local.p_sim <= significance_level)
+    is_high_high = (moran.q == 1) & (moran.p_sim <= significance_level)
+    is_high_low = (moran.q == 4) & (moran.p_sim <= significance_level)
     
     # Combine HH and HL for downtown cluster identification
     is_downtown_candidate = is_high_high | is_high_low
@@ -186,25 +233,10 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
             'lisa_counts': category_counts
         }
     
-    # Build graph of HH+HL MAZs to find contiguous clusters
-    downtown_indices = mazs_gdf[is_downtown_candidate].index.tolist()
-    G = nx.Graph()
-    
-    for idx in downtown_indices:
-        G.add_node(idx)
-    
-    # Add edges between spatially adjacent HH/HL MAZs
-    for idx1 in downtown_indices:
-        for idx2 in downtown_indices:
-            if idx1 < idx2:
-                geom1 = mazs_gdf.loc[idx1, 'geometry']
-                geom2 = mazs_gdf.loc[idx2, 'geometry']
-                if geom1.touches(geom2) or geom1.intersects(geom2):
-                    G.add_edge(idx1, idx2)
-    
-    # Find all connected components
-    components = list(nx.connected_components(G))
-    n_components = len(components)
+    # Contiguous clusters of HH+HL MAZs: connected components of the candidate subgraph
+    candidate_positions = np.flatnonzero(is_downtown_candidate)
+    candidate_adjacency = adjacency[candidate_positions][:, candidate_positions]
+    n_components, component_labels = connected_components(candidate_adjacency, directed=False)
     
     if n_components == 0:
         return pd.Series(False, index=mazs_gdf.index), lisa_categories, {
@@ -215,22 +247,19 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
             'n_valid_components': 0,
             'n_filtered_by_area': n_filtered,
             'largest_component_size': 0,
-            'mean_moran_i': moran_local.Is[is_downtown_candidate].mean(),
-            'max_moran_i': moran_local.Is[is_downtown_candidate].max(),
+            'mean_moran_i': moran.Is[is_downtown_candidate].mean(),
+            'max_moran_i': moran.Is[is_downtown_candidate].max(),
             'lisa_counts': category_counts
         }
     
     # Filter components by size constraints
-    valid_components = []
-    for comp in components:
-        comp_list = list(comp)
-        comp_size = len(comp_list)
-        comp_emp = mazs_gdf.loc[comp_list, emp_col].sum()
-        
-        if comp_size >= min_cluster_mazs and comp_emp >= min_cluster_employment:
-            valid_components.append((comp, comp_size, comp_emp))
+    component_sizes = np.bincount(component_labels, minlength=n_components)
+    component_emp = np.bincount(component_labels, weights=employment_values[candidate_positions],
+                                minlength=n_components)
+    is_valid_component = (component_sizes >= min_cluster_mazs) & (component_emp >= min_cluster_employment)
+    n_valid_components = int(is_valid_component.sum())
     
-    if not valid_components:
+    if n_valid_components == 0:
         # No components meet minimum size criteria
         return pd.Series(False, index=mazs_gdf.index), lisa_categories, {
             'n_high_high': n_high_high,
@@ -240,84 +269,50 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
             'n_valid_components': 0,
             'n_filtered_by_area': n_filtered,
             'largest_component_size': 0,
-            'mean_moran_i': moran_local.Is[is_downtown_candidate].mean(),
-            'max_moran_i': moran_local.Is[is_downtown_candidate].max(),
+            'mean_moran_i': moran.Is[is_downtown_candidate].mean(),
+            'max_moran_i': moran.Is[is_downtown_candidate].max(),
             'lisa_counts': category_counts
         }
     
     # Select largest valid component by total employment (ONLY ONE PER PLACE)
-    largest_component, largest_size, largest_emp = max(valid_components, 
-                                                       key=lambda x: x[2])
-    largest_component = largest_component
+    largest_label = np.flatnonzero(is_valid_component)[np.argmax(component_emp[is_valid_component])]
+    in_cluster = np.zeros(len(mazs_gdf), dtype=bool)
+    in_cluster[candidate_positions[component_labels == largest_label]] = True
     
     # Fill holes: include MAZs completely surrounded by the cluster
     # This captures isolated MAZs that should logically be part of downtown
-    cluster_indices = set(largest_component)
-    n_filled = 0
-    
-    for idx in mazs_gdf.index:
-        if idx not in cluster_indices:
-            # Check if this MAZ is completely surrounded by cluster MAZs
-            geom = mazs_gdf.loc[idx, 'geometry']
-            neighbors = []
-            
-            # Find all touching/adjacent MAZs
-            for cluster_idx in cluster_indices:
-                cluster_geom = mazs_gdf.loc[cluster_idx, 'geometry']
-                if geom.touches(cluster_geom) or geom.intersects(cluster_geom):
-                    neighbors.append(cluster_idx)
-            
-            # If this MAZ has neighbors, check if ALL its spatial neighbors are in cluster
-            if neighbors:
-                all_neighbors_in_cluster = True
-                for other_idx in mazs_gdf.index:
-                    if other_idx != idx and other_idx not in cluster_indices:
-                        other_geom = mazs_gdf.loc[other_idx, 'geometry']
-                        if geom.touches(other_geom) or geom.intersects(other_geom):
-                            # Found a neighbor NOT in cluster
-                            all_neighbors_in_cluster = False
-                            break
-                
-                # If all neighbors are in cluster, add this MAZ
-                if all_neighbors_in_cluster:
-                    cluster_indices.add(idx)
-                    n_filled += 1
+    in_cluster, n_filled = fill_cluster_holes(adjacency, in_cluster)
     
     # Spatial containment: iteratively include MAZs within convex hull of cluster
     # Run until no new MAZs are added (convex hull stops expanding)
+    geometries = np.asarray(mazs_gdf.geometry.values)
+    vertices = shapely.get_coordinates(geometries)
+    vertex_owner = np.repeat(np.arange(len(geometries)), shapely.get_num_coordinates(geometries))
+    centroid_xy = shapely.get_coordinates(shapely.centroid(geometries))
     n_spatially_contained = 0
     max_iterations = 10
     iteration = 0
     
     while iteration < max_iterations:
         iteration += 1
-        new_indices_added = []
         
-        # Create convex hull of current cluster geometries
-        cluster_union = mazs_gdf.loc[list(cluster_indices), 'geometry'].unary_union
-        cluster_convex_hull = cluster_union.convex_hull
+        # Convex hull of the cluster's vertices (= convex hull of the cluster union)
+        cluster_convex_hull = shapely.convex_hull(shapely.multipoints(vertices[in_cluster[vertex_owner]]))
         
-        # Check each non-cluster MAZ for containment within convex hull
-        for idx in mazs_gdf.index:
-            if idx not in cluster_indices:
-                maz_geom = mazs_gdf.loc[idx, 'geometry']
-                maz_centroid = maz_geom.centroid
-                
-                # Check if MAZ centroid falls within cluster convex hull
-                if cluster_convex_hull.contains(maz_centroid):
-                    new_indices_added.append(idx)
+        # Check every non-cluster MAZ centroid for containment within convex hull in one query
+        contained = shapely.contains_xy(cluster_convex_hull, centroid_xy[:, 0], centroid_xy[:, 1]) & ~in_cluster
         
         # Add newly contained MAZs to cluster
-        if new_indices_added:
-            cluster_indices.update(new_indices_added)
-            n_spatially_contained += len(new_indices_added)
+        n_new = int(contained.sum())
+        if n_new:
+            in_cluster |= contained
+            n_spatially_contained += n_new
         else:
             # No new MAZs added, convergence reached
             break
     
     # Create mask for parkarea=1
-    parkarea_mask = pd.Series(False, index=mazs_gdf.index)
-    parkarea_mask[list(cluster_indices)] = True
+    parkarea_mask = pd.Series(in_cluster, index=mazs_gdf.index)
     
     # Collect metrics
     metrics = {
@@ -325,16 +320,16 @@ def assign_parkarea_by_local_morans_i(mazs_gdf, emp_col='downtown_emp',
         'n_high_low': n_high_low,
         'n_downtown_candidate': n_downtown_candidate,
         'n_components': n_components,
-        'n_valid_components': len(valid_components),
+        'n_valid_components': n_valid_components,
         'n_filtered_by_area': n_filtered,
         'n_filled_holes': n_filled,
         'n_spatially_contained': n_spatially_contained,
         'containment_iterations': iteration,
         'area_threshold_m2': area_threshold,
-        'largest_component_size': len(cluster_indices),
-        'mean_moran_i': moran_local.Is[is_downtown_candidate].mean(),
-        'max_moran_i': moran_local.Is[is_downtown_candidate].max(),
-        'mean_p_value': moran_local.p_sim[is_downtown_candidate].mean(),
+        'largest_component_size': int(in_cluster.sum()),
+        'mean_moran_i': moran.Is[is_downtown_candidate].mean(),
+        'max_moran_i': moran.Is[is_downtown_candidate].max(),
+        'mean_p_value': moran.p_sim[is_downtown_candidate].mean(),
         'lisa_counts': category_counts
     }
     
@@ -356,7 +351,9 @@ def cat_names(cat):
 def merge_parking_area(maz, min_place_employment=100, 
                        significance_level=0.05,
                        max_area_percentile=0.90, min_cluster_mazs=5,
-                       min_cluster_employment=100, emp_col='downtown_emp'):
+                       min_cluster_employment=100, emp_col='downtown_emp',
+                       permutations=PERMUTATIONS, seed=DEFAULT_SEED,
+                       max_workers=None, cache_dir=None):
     """
     Merge parking area classifications to MAZ data - main entry point called from parking_prep.py.
     
@@ -373,6 +370,10 @@ def merge_parking_area(maz, min_place_employment=100,
         min_place_employment: Minimum total downtown_emp for place to have parkarea=1 (default: 100)
         significance_level: P-value threshold for LISA significance (default: 0.05)
         emp_col: Employment column name for weighting (default: 'downtown_emp')
+        permutations: Conditional randomizations for the LISA p-values (default: 999)
+        seed: Base random seed; each place's permutations are seeded from (seed, place_name)
+        max_workers: Processes for the Local Moran's I batch (default: os.cpu_count())
+        cache_dir: Optional directory caching Local Moran's I results per place
     
     Returns:
         GeoDataFrame: maz with parkarea and moran_category columns added
@@ -385,7 +386,9 @@ def merge_parking_area(maz, min_place_employment=100,
     
     # Call the core assignment function
     maz = assign_parking_areas(maz, min_place_employment, significance_level,
-                              max_area_percentile, min_cluster_mazs, min_cluster_employment, emp_col)
+                              max_area_percentile, min_cluster_mazs, min_cluster_employment, emp_col,
+                              permutations=permutations, seed=seed,
+                              max_workers=max_workers, cache_dir=cache_dir)
     
     return maz
 
@@ -393,7 +396,9 @@ def merge_parking_area(maz, min_place_employment=100,
 def assign_parking_areas(maz, min_place_employment=100, 
                          significance_level=0.05,
                          max_area_percentile=0.90, min_cluster_mazs=5,
-                         min_cluster_employment=100, emp_col='downtown_emp'):
+                         min_cluster_employment=100, emp_col='downtown_emp',
+                         permutations=PERMUTATIONS, seed=DEFAULT_SEED,
+                         max_workers=None, cache_dir=None):
     """
     Assign parkarea field to MAZ zones using Local Moran's I analysis.
     
@@ -414,7 +419,7 @@ def assign_parking_areas(maz, min_place_employment=100,
     print("PARKING AREA ASSIGNMENT - LOCAL MORAN'S I ANALYSIS")
     print("="*80)
     print(f"Minimum place employment: {min_place_employment:,} {emp_col}")
-    print(f"Significance level: {significance_level} (p-value threshold)")
+    print(f"Significance level: {significance_level} (p-value threshold, {permutations:,} permutations, seed {seed})")
     print(f"LISA categories: HH (High-High), HL (High-Low), LH (Low-High), LL (Low-Low), NS (Not Significant)")
     
     # Ensure downtown_emp exists
@@ -444,6 +449,19 @@ def assign_parking_areas(maz, min_place_employment=100,
         print("\nWARNING: No places meet minimum employment threshold. All parkarea = 0.")
         return maz
     
+    # Queen contiguity for each eligible place, then Local Moran's I for all places in one batch
+    place_contiguities = {
+        place_name: place_contiguity(maz_in_cities[maz_in_cities['place_name'] == place_name],
+                                     max_area_percentile)
+        for place_name in eligible_places.index
+    }
+    place_morans = local_moran_by_place(
+        {place_name: (mazs_gdf[emp_col].to_numpy(dtype=float), adjacency)
+         for place_name, (mazs_gdf, adjacency, _, _) in place_contiguities.items()
+         if adjacency is not None},
+        permutations=permutations, seed=seed, max_workers=max_workers, cache_dir=cache_dir
+    )
+    
     # Process each eligible place
     place_results = []
     
@@ -460,7 +478,8 @@ def assign_parking_areas(maz, min_place_employment=100,
         # Assign parkarea using Local Moran's I analysis
         parkarea_mask, moran_categories, moran_metrics = assign_parkarea_by_local_morans_i(
             place_mazs, emp_col, significance_level,
-            max_area_percentile, min_cluster_mazs, min_cluster_employment
+            max_area_percentile, min_cluster_mazs, min_cluster_employment,
+            contiguity=place_contiguities[place_name], moran=place_morans.get(place_name)
         )
         
         # Reset parkarea for this place, then update with selected cluster only
@@ -12,117 +12,91 @@ from job_counts import get_jobs_maz
 from setup import (
     PARKING_RAW_DATA_DIR,
     ANALYSIS_CRS,
-    SQUARE_METERS_PER_ACRE,
     ensure_directories
 )
-from utils import load_maz_shp, get_output_filename
+from utils import load_maz_shp, get_output_filename, get_maz_area_weights
 
 
 def overlay_maz_blockgroups(maz, parking_capacity):
     """
-    Spatially overlay MAZ and block group geometries to create MAZ-BlockGroup mapping.
+    Intersect MAZ and block group geometries into a sparse MAZ x block group area matrix.
+    
+    The matrix is persisted in the interim cache (keyed by both layers' geometries), so
+    later runs and other block group attributes reuse it.
     
     Parameters:
-        maz (GeoDataFrame): MAZ polygons with geometry
-        parking_capacity (GeoDataFrame): Block group parking data with geometry
+        maz (GeoDataFrame): MAZ polygons with MAZ_NODE and geometry
+        parking_capacity (GeoDataFrame): Block group parking data with blkgrpid and geometry
         
     Returns:
-        GeoDataFrame: MAZ-BlockGroup intersections with calculated areas
+        MazAreaWeights: MAZ x block group intersection areas in acres
     """
     print(f"Performing spatial overlay of MAZ and block groups...")
     print(f"  Number of MAZs: {len(maz):,}")
     print(f"  Number of block groups: {len(parking_capacity):,}")
     
-    # Spatial overlay to find intersections
-    overlay = gpd.overlay(maz, parking_capacity, how='intersection')
-    print(f"  Number of MAZ-BlockGroup intersections: {len(overlay):,}")
-    
-    # Calculate intersection area in acres
-    overlay['maz_acres'] = overlay.geometry.area / SQUARE_METERS_PER_ACRE
+    # Sparse intersection areas (STRtree candidates + vectorized intersections)
+    area_weights = get_maz_area_weights(maz, parking_capacity, 'blkgrpid', name='maz_blockgroup')
+    print(f"  Number of MAZ-BlockGroup intersections: {area_weights.matrix.nnz:,}")
     
     # Check for MAZs spanning multiple block groups
-    mazs_multiple_bg = overlay.groupby('MAZ_NODE')['blkgrpid'].nunique()
-    mazs_spanning = (mazs_multiple_bg > 1).sum()
+    mazs_spanning = (area_weights.maz_zone_counts > 1).sum()
     if mazs_spanning > 0:
         print(f"  ⚠ Warning: {mazs_spanning:,} MAZs span multiple block groups")
         print(f"    (This is handled by summing allocated parking across contributing block groups)")
     
-    return overlay
+    return area_weights
 
 
-def calculate_allocation_weights(overlay_df, jobs_maz):
+def calculate_allocation_weights(area_weights, jobs_maz):
     """
-    Calculate allocation weights for distributing block group parking to MAZs.
-    Uses employment-based weights with area fallback for off-street non-residential,
-    and pure area weights for on-street parking.
+    Calculate allocation shares for distributing block group parking to MAZs.
+    Uses employment-based shares with area fallback for off-street non-residential,
+    and pure area shares for on-street parking.
     
     Parameters:
-        overlay_df (GeoDataFrame): MAZ-BlockGroup intersections with areas
+        area_weights (MazAreaWeights): MAZ x block group intersection areas
         jobs_maz (DataFrame): MAZ employment data with emp_total
         
     Returns:
-        DataFrame: overlay_df with allocation weights added
+        dict: 'emp_total' (employment per MAZ, in area_weights MAZ order) and the
+              MAZ x block group share matrices 'weight_offnres' and 'weight_onall'
     """
     print(f"Calculating allocation weights...")
     
-    # Ensure consistent data types for merge (jobs_maz has string MAZ_NODE)
-    overlay_df['MAZ_NODE'] = overlay_df['MAZ_NODE'].astype(str)
-    overlay_df['TAZ_NODE'] = overlay_df['TAZ_NODE'].astype(str)
-    
-    # Merge employment data
-    weights_df = overlay_df.merge(
-        jobs_maz[['MAZ_NODE', 'TAZ_NODE', 'emp_total']], 
-        on='MAZ_NODE', 
-        how='left',
-        suffixes=('', '_emp')
+    # Employment per MAZ in matrix row order (jobs_maz has string MAZ_NODE); missing = 0
+    emp_total = (
+        jobs_maz.assign(MAZ_NODE=jobs_maz['MAZ_NODE'].astype(str))
+        .drop_duplicates('MAZ_NODE')
+        .set_index('MAZ_NODE')['emp_total']
+        .reindex(area_weights.maz_ids.astype(str))
+        .fillna(0)
+        .to_numpy()
     )
     
-    # Fill any missing employment with 0
-    weights_df['emp_total'] = weights_df['emp_total'].fillna(0)
-    
-    # Calculate block group totals
-    weights_df['bg_total_acres'] = weights_df.groupby('blkgrpid')['maz_acres'].transform('sum')
-    weights_df['bg_total_emp'] = weights_df.groupby('blkgrpid')['emp_total'].transform('sum')
-    
-    # Calculate raw shares
-    weights_df['area_share'] = np.where(
-        weights_df['bg_total_acres'] > 0,
-        weights_df['maz_acres'] / weights_df['bg_total_acres'],
-        0
-    )
-    
-    weights_df['emp_share'] = np.where(
-        weights_df['bg_total_emp'] > 0,
-        weights_df['emp_total'] / weights_df['bg_total_emp'],
-        0
-    )
-    
-    # Create hybrid weight for off-street non-residential:
-    # Use employment share when available, area share as fallback
-    weights_df['weight_offnres'] = np.where(
-        weights_df['bg_total_emp'] > 0,
-        weights_df['emp_share'],
-        weights_df['area_share']
-    )
-    
-    # Use pure area weight for on-street parking
-    weights_df['weight_onall'] = weights_df['area_share']
+    # Hybrid share for off-street non-residential: employment share when the block group
+    # has employment, area share as fallback; pure area share for on-street parking
+    weight_offnres = area_weights.shares(maz_weights=emp_total)
+    weight_onall = area_weights.shares()
     
     # Report on fallback usage
-    zero_emp_bgs = (weights_df['bg_total_emp'] == 0).sum()
-    if zero_emp_bgs > 0:
-        unique_zero_emp_bgs = weights_df[weights_df['bg_total_emp'] == 0]['blkgrpid'].nunique()
+    overlaps = area_weights.matrix > 0
+    bg_total_emp = overlaps.T @ emp_total
+    unique_zero_emp_bgs = ((bg_total_emp == 0) & (np.diff(overlaps.tocsc().indptr) > 0)).sum()
+    if unique_zero_emp_bgs > 0:
         print(f"  {unique_zero_emp_bgs:,} block groups have zero employment - using area fallback")
     
-    return weights_df
+    return {'emp_total': emp_total, 'weight_offnres': weight_offnres, 'weight_onall': weight_onall}
 
 
-def allocate_parking_to_maz(weights_df, maz_gdf):
+def allocate_parking_to_maz(area_weights, allocation_weights, parking_capacity, maz_gdf):
     """
-    Normalize weights within each block group and allocate parking to MAZ level.
+    Allocate block group parking to MAZ level as sparse matrix-vector products.
     
     Parameters:
-        weights_df (DataFrame): MAZ-BlockGroup data with raw weights and parking values
+        area_weights (MazAreaWeights): MAZ x block group intersection areas
+        allocation_weights (dict): Output of calculate_allocation_weights
+        parking_capacity (GeoDataFrame): Block group parking data with blkgrpid, on_all, off_nres
         maz_gdf (GeoDataFrame): MAZ polygons with geometry
         
     Returns:
@@ -130,62 +104,31 @@ def allocate_parking_to_maz(weights_df, maz_gdf):
     """
     print(f"Normalizing weights and allocating parking to MAZ level...")
     
-    # Normalize weights to sum to 1.0 within each block group
-    weights_df['weight_offnres_norm'] = (
-        weights_df['weight_offnres'] / 
-        weights_df.groupby('blkgrpid')['weight_offnres'].transform('sum')
-    )
-    
-    weights_df['weight_onall_norm'] = (
-        weights_df['weight_onall'] / 
-        weights_df.groupby('blkgrpid')['weight_onall'].transform('sum')
-    )
-    
-    # Apply weights to allocate parking
-    weights_df['off_nres_allocated'] = weights_df['off_nres'] * weights_df['weight_offnres_norm']
-    weights_df['on_all_allocated'] = weights_df['on_all'] * weights_df['weight_onall_norm']
-    
-    # Aggregate to MAZ level (summing across multiple block groups if MAZ spans them)
-    parking_maz = weights_df.groupby(['MAZ_NODE', 'TAZ_NODE'], as_index=False).agg({
-        'off_nres_allocated': 'sum',
-        'on_all_allocated': 'sum',
-        'emp_total': 'first'  # Employment is constant per MAZ, take first value
-    })
-    
-    # Rename to final column names
-    parking_maz = parking_maz.rename(columns={
-        'off_nres_allocated': 'off_nres',
-        'on_all_allocated': 'on_all'
-    })
-    
-    # Fill any NaN with 0
-    parking_maz = parking_maz.fillna(0)
-    
-    # Clip any negative values to 0 (safety check)
-    parking_maz['off_nres'] = parking_maz['off_nres'].clip(lower=0)
-    parking_maz['on_all'] = parking_maz['on_all'].clip(lower=0)
-    
-    # Merge with MAZ geometry to create GeoDataFrame
-    # Ensure MAZ_NODE types match
-    maz_gdf_copy = maz_gdf.copy()
-    maz_gdf_copy['MAZ_NODE'] = maz_gdf_copy['MAZ_NODE'].astype(str)
-    parking_maz = parking_maz.merge(
-        maz_gdf_copy[['MAZ_NODE', 'geometry']], 
-        on='MAZ_NODE', 
-        how='left'
-    )
-    parking_maz = gpd.GeoDataFrame(parking_maz, geometry='geometry', crs=ANALYSIS_CRS)
-    
-    # Reorder columns for clarity
-    column_order = ['MAZ_NODE', 'TAZ_NODE', 'emp_total', 'off_nres', 'on_all', 'geometry']
-    parking_maz = parking_maz[column_order]
+    # Block group values in matrix column order
+    bg_values = parking_capacity.set_index('blkgrpid').reindex(area_weights.zone_ids)
+    
+    # Allocate (summing across multiple block groups if MAZ spans them)
+    off_nres = allocation_weights['weight_offnres'] @ bg_values['off_nres'].fillna(0).to_numpy()
+    on_all = allocation_weights['weight_onall'] @ bg_values['on_all'].fillna(0).to_numpy()
+    
+    # MAZs intersecting at least one block group
+    has_overlap = area_weights.maz_zone_counts > 0
+    parking_maz = gpd.GeoDataFrame({
+        'MAZ_NODE': maz_gdf['MAZ_NODE'].astype(str).to_numpy()[has_overlap],
+        'TAZ_NODE': maz_gdf['TAZ_NODE'].astype(str).to_numpy()[has_overlap],
+        'emp_total': allocation_weights['emp_total'][has_overlap],
+        # Clip any negative values to 0 (safety check)
+        'off_nres': np.clip(off_nres[has_overlap], 0, None),
+        'on_all': np.clip(on_all[has_overlap], 0, None),
+    }, geometry=maz_gdf.geometry.to_numpy()[has_overlap], crs=ANALYSIS_CRS)
+    parking_maz = parking_maz.sort_values(['MAZ_NODE', 'TAZ_NODE'], ignore_index=True)
     
     print(f"  Total MAZs with allocated parking: {len(parking_maz):,}")
     
     return parking_maz
 
 
-def get_parking_maz(write=False):
+def get_parking_maz(write=False, jobs_maz=None):
     """
     Main function to allocate block group parking capacity to MAZ level.
     Uses hybrid allocation: employment-weighted for off-street non-residential,
@@ -193,6 +136,7 @@ def get_parking_maz(write=False):
     
     Parameters:
         write (bool): If True, writes output to interim cache as GeoPackage
+        jobs_maz (DataFrame, optional): Employment by MAZ from get_jobs_maz(); computed if not given
         
     Returns:
         DataFrame: MAZ-level parking with columns [MAZ_NODE, TAZ_NODE, off_nres, on_all]
@@ -231,17 +175,18 @@ def get_parking_maz(write=False):
     
     # Load employment data
     print(f"\nLoading MAZ employment data...")
-    jobs_maz = get_jobs_maz(write=False)
+    if jobs_maz is None:
+        jobs_maz = get_jobs_maz(write=False)
     print(f"  Loaded employment for {len(jobs_maz):,} MAZs")
     
-    # Spatial overlay
-    overlay_df = overlay_maz_blockgroups(maz, parking_capacity)
+    # Spatial overlay (sparse MAZ x block group area matrix, cached)
+    area_weights = overlay_maz_blockgroups(maz, parking_capacity)
     
     # Calculate weights
-    weights_df = calculate_allocation_weights(overlay_df, jobs_maz)
+    allocation_weights = calculate_allocation_weights(area_weights, jobs_maz)
     
     # Allocate parking
-    parking_maz = allocate_parking_to_maz(weights_df, maz)
+    parking_maz = allocate_parking_to_maz(area_weights, allocation_weights, parking_capacity, maz)
     
     # Validation
     print(f"\nValidating results...")
@@ -0,0 +1,199 @@
+"""
+Leave-one-city-out cross-validation engine for the hourly parking classifiers.
+
+Used by parking_estimation.validate_parking_cost_estimation and compare_models.
+
+- the feature matrix (density features, paid/free label, city, commercial density) is
+  built once from the MAZ table
+- each (model, held-out city) fold is fit once; its held-out probabilities are then scored
+  for every commercial density threshold (a boolean mask over the held-out rows) and every
+  probability threshold (a vectorized cut), with no refitting
+- folds are fanned out over joblib workers and memoized on disk with joblib.Memory, keyed
+  by the estimator parameters and the fold's training and test data, so re-runs and
+  widened threshold grids only fit folds that are new
+
+Usage:
+    from parking_cv import cross_validate_models, default_models
+
+    metrics = cross_validate_models(maz, default_models(), density_thresholds=[0.5, 1.0, 2.0])
+
+The result is a tidy DataFrame with one row per
+(model, held_out_city, density_threshold, probability_threshold).
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+from joblib import Memory, Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+
+# Cities with observed parking cost data
+TARGET_CITIES = ['San Francisco', 'Oakland', 'San Jose']
+
+# Feature columns (emp_total_den removed due to multicollinearity with downtown_emp_den)
+FEATURE_COLS = ['commercial_emp_den', 'downtown_emp_den', 'pop_den']
+
+PROBABILITY_THRESHOLDS = [0.3, 0.4, 0.5, 0.6, 0.7]
+
+METRIC_COLS = [
+    'model', 'held_out_city', 'density_threshold', 'probability_threshold',
+    'n_train', 'n_test', 'n_actual_paid', 'n_actual_free', 'n_predicted_paid', 'n_predicted_free',
+    'accuracy', 'precision', 'recall', 'f1',
+]
+
+
+def default_models():
+    """The classifiers compared for hourly parking, by display name."""
+    return {
+        'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
+        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10),
+        'Gradient Boosting': GradientBoostingClassifier(n_estimators=100, random_state=42, max_depth=5, learning_rate=0.1),
+        'SVM (RBF)': SVC(probability=True, random_state=42, kernel='rbf', C=1.0),
+    }
+
+
+def build_feature_matrix(maz, cost_type='hparkcost', capacity_col='on_all', cities=TARGET_CITIES):
+    """
+    Features and labels for every MAZ with capacity in the observed cities.
+
+    Args:
+        maz (DataFrame): MAZ zones with density features, observed costs and capacity
+        cost_type (str): observed cost column; > 0 is paid, 0 or NaN is free
+        capacity_col (str): capacity column; only MAZs with capacity > 0 are used
+        cities (list): cities with observed data
+
+    Returns:
+        dict with X (n x features, NaN filled with 0), y (0/1), city and commercial_emp_den arrays
+    """
+    rows = (maz[capacity_col] > 0) & maz['place_name'].isin(cities)
+    return {
+        'X': np.nan_to_num(maz.loc[rows, FEATURE_COLS].to_numpy(dtype=float), nan=0.0),
+        'y': (maz.loc[rows, cost_type].fillna(0) > 0).to_numpy().astype(int),
+        'city': maz.loc[rows, 'place_name'].to_numpy(),
+        'commercial_emp_den': maz.loc[rows, 'commercial_emp_den'].to_numpy(dtype=float),
+    }
+
+
+def fit_fold(model, X_train, y_train, X_test):
+    """Fit a standardized model on the training cities and return held-out P(paid)."""
+    scaler = StandardScaler()
+    model = clone(model)
+    model.fit(scaler.fit_transform(X_train), y_train)
+    return model.predict_proba(scaler.transform(X_test))[:, 1]
+
+
+def score_thresholds(y_true, proba, thresholds):
+    """
+    Classification metrics of y_true against (proba >= t) for every threshold t.
+
+    Matches sklearn's accuracy/precision/recall/f1 with zero_division=0.
+
+    Returns:
+        DataFrame with one row per threshold
+    """
+    thresholds = np.asarray(thresholds, dtype=float)
+    predicted = proba[None, :] >= thresholds[:, None]
+    actual = y_true.astype(bool)[None, :]
+    tp = (predicted & actual).sum(axis=1)
+    fp = (predicted & ~actual).sum(axis=1)
+    fn = (~predicted & actual).sum(axis=1)
+    n = len(y_true)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+    return pd.DataFrame({
+        'probability_threshold': thresholds,
+        'n_predicted_paid': tp + fp,
+        'n_predicted_free': n - (tp + fp),
+        'accuracy': (n - fp - fn) / n if n else np.nan,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+    })
+
+
+def cross_validate_models(maz, models=None, probability_thresholds=None, density_thresholds=(1.0,),
+                          cities=None, n_jobs=-1, cache_dir=None):
+    """
+    Leave-one-city-out cross-validation of hourly parking classifiers.
+
+    Trains on all capacity MAZs of the other cities and tests on the held-out city's MAZs
+    with capacity and commercial_emp_den >= density threshold. Folds with fewer than 10
+    training or 5 test MAZs, or without both paid and free training MAZs, are skipped.
+
+    Args:
+        maz (DataFrame): MAZ zones with density features, observed costs and capacity
+        models (dict): model name -> unfitted sklearn classifier (default: default_models())
+        probability_thresholds (list): classification thresholds to score
+        density_thresholds (list): minimum commercial_emp_den of test MAZs
+        cities (list): cities to hold out in turn (default: TARGET_CITIES)
+        n_jobs (int): joblib workers for the fold fits (-1 = all cores)
+        cache_dir (Path): if given, fold probabilities are memoized here
+
+    Returns:
+        DataFrame: tidy metrics, columns METRIC_COLS
+    """
+    models = default_models() if models is None else models
+    probability_thresholds = PROBABILITY_THRESHOLDS if probability_thresholds is None else probability_thresholds
+    cities = TARGET_CITIES if cities is None else cities
+    data = build_feature_matrix(maz, cities=cities)
+    X, y, city, density = data['X'], data['y'], data['city'], data['commercial_emp_den']
+
+    # folds that can be evaluated for at least one density threshold
+    folds = []
+    for held_out_city in cities:
+        train = np.isin(city, [c for c in cities if c != held_out_city])
+        held_out = city == held_out_city
+        n_test_max = int((held_out & (density >= min(density_thresholds))).sum())
+        if train.sum() < 10 or n_test_max < 5:
+            logging.info(f"CV: insufficient data holding out {held_out_city}, skipping")
+            continue
+        if y[train].sum() in (0, train.sum()):
+            logging.info(f"CV: no paid/free variation training without {held_out_city}, skipping")
+            continue
+        folds.append((held_out_city, train, held_out))
+
+    fit = Memory(cache_dir, verbose=0).cache(fit_fold) if cache_dir is not None else fit_fold
+    tasks = [(name, fold) for name in models for fold in folds]
+    logging.info(f"CV: fitting {len(tasks)} folds ({len(models)} models x {len(folds)} held-out cities)")
+    probabilities = Parallel(n_jobs=n_jobs)(
+        delayed(fit)(models[name], X[train], y[train], X[held_out])
+        for name, (_, train, held_out) in tasks
+    )
+
+    frames = []
+    for (name, (held_out_city, train, held_out)), proba in zip(tasks, probabilities):
+        y_held_out, density_held_out = y[held_out], density[held_out]
+        for density_threshold in density_thresholds:
+            test = density_held_out >= density_threshold
+            if test.sum() < 5:
+                continue
+            scores = score_thresholds(y_held_out[test], proba[test], probability_thresholds)
+            n_actual_paid = int(y_held_out[test].sum())
+            frames.append(scores.assign(
+                model=name,
+                held_out_city=held_out_city,
+                density_threshold=density_threshold,
+                n_train=int(train.sum()),
+                n_test=int(test.sum()),
+                n_actual_paid=n_actual_paid,
+                n_actual_free=int(test.sum()) - n_actual_paid,
+            ))
+
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLS)
+    return pd.concat(frames, ignore_index=True)[METRIC_COLS]
+
+
+def best_thresholds(metrics, by=('model', 'held_out_city', 'density_threshold')):
+    """Row with the highest F1 (first threshold on ties) for each group of the metrics table."""
+    if metrics.empty:
+        return metrics
+    best = metrics.groupby(list(by), sort=False)['f1'].idxmax()
+    return metrics.loc[best].reset_index(drop=True)
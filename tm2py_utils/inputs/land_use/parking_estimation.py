@@ -45,9 +45,19 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.svm import SVC
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 from setup import INTERIM_CACHE_DIR
+from parking_cv import (
+    PROBABILITY_THRESHOLDS,
+    TARGET_CITIES,
+    best_thresholds,
+    cross_validate_models,
+    default_models,
+)
+
+# Memoized cross-validation fold fits and the tidy model comparison metrics
+CV_CACHE_DIR = INTERIM_CACHE_DIR / "parking_cv"
+CV_METRICS_FILE = INTERIM_CACHE_DIR / "parking_model_cv_metrics.csv"
 
 
 def get_observed_cities_from_scraped_data(scraped_file_path):
@@ -439,12 +449,14 @@ def apply_hourly_parking_model(maz, commercial_density_threshold=1.0, probabilit
     return maz
 
 
-def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test_thresholds=None):
+def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test_thresholds=None,
+                                     n_jobs=-1, cache_dir=CV_CACHE_DIR):
     """
     Perform leave-one-city-out cross-validation for hourly parking cost estimation using logistic regression.
     
     Trains binary classification models on 2 cities and tests on the 3rd to evaluate generalization.
     Explicitly validates on San Francisco, Oakland, and San Jose (cities with observed data).
+    Each fold is fit once and scored for all thresholds (see parking_cv.cross_validate_models).
     
     Note: Only validates hourly parking (hparkcost) since daily/monthly use county-level thresholds.
     
@@ -452,6 +464,8 @@ def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test
         maz (GeoDataFrame): MAZ zones with density features, observed costs, and capacity
         commercial_density_threshold (float): Minimum commercial_emp_den for paid parking
         test_thresholds (list): List of probability thresholds to test
+        n_jobs (int): joblib workers for the fold fits (-1 = all cores)
+        cache_dir (Path): Directory memoizing fold fits (None disables)
     
     Returns:
         dict: Validation metrics for each cost type, threshold, and held-out city
@@ -463,16 +477,10 @@ def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test
     
     # Default thresholds to test
     if test_thresholds is None:
-        test_thresholds = [0.3, 0.4, 0.5, 0.6, 0.7]
+        test_thresholds = PROBABILITY_THRESHOLDS
     
     print(f"Testing probability thresholds: {test_thresholds}")
     
-    # Cities with observed parking cost data
-    TARGET_CITIES = ['San Francisco', 'Oakland', 'San Jose']
-    
-    # Feature columns for regression (emp_total_den removed due to multicollinearity with downtown_emp_den)
-    feature_cols = ['commercial_emp_den', 'downtown_emp_den', 'pop_den']
-    
     results = {}
     
     # Only validate hourly parking (hparkcost) - daily/monthly use thresholds
@@ -483,12 +491,7 @@ def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test
         
         # Count observed data by city (including free parking)
         # For SF/Oakland/SJ, treat any MAZ with capacity as "observed" (paid or free)
-        has_capacity = maz[capacity_col] > 0
-        has_place = maz['place_name'].notna()
-        in_target_cities = maz['place_name'].isin(TARGET_CITIES)
-        
-        # "Observed" = has capacity in target cities (we know it's either paid or free)
-        has_observed = has_capacity & has_place & in_target_cities
+        has_observed = (maz[capacity_col] > 0) & maz['place_name'].isin(TARGET_CITIES)
         
         # Count by city
         city_counts = maz[has_observed]['place_name'].value_counts()
@@ -503,123 +506,45 @@ def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test
         print(f"  Validating on cities: {', '.join(cities_to_test)}")
         print(f"  Observations per city: {dict(city_counts[cities_to_test])}")
         
+        # Leave-one-city-out cross-validation, every threshold scored from one fit per city
+        metrics = cross_validate_models(
+            maz, {'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000)},
+            probability_thresholds=test_thresholds,
+            density_thresholds=[commercial_density_threshold],
+            cities=cities_to_test, n_jobs=n_jobs, cache_dir=cache_dir
+        )
+        
         results[cost_type] = {}
         
-        # Leave-one-city-out cross-validation
-        for held_out_city in cities_to_test:
-            # Determine training cities (all target cities except held-out)
+        for held_out_city, city_metrics in metrics.groupby('held_out_city', sort=False):
             training_cities = [city for city in cities_to_test if city != held_out_city]
+            first = city_metrics.iloc[0]
             
             print(f"\n  {'─'*70}")
             print(f"  TRAINING ON: {', '.join(training_cities)}")
             print(f"  TESTING ON:  {held_out_city}")
             print(f"  {'─'*70}")
+            print(f"    Training samples (other cities): {first['n_train']:,}")
+            print(f"    Test samples ({held_out_city}): {first['n_test']:,}")
             
-            # For training cities: all MAZs with capacity are "observed" (ground truth)
-            # Paid = cost > 0, Free = cost <= 0 or NaN (but has capacity)
-            train_mask = (
-                has_capacity & has_place & 
-                (maz['place_name'].isin(training_cities))
-            )
-            
-            # For test city: same logic
-            test_mask = (
-                has_capacity & has_place & 
-                (maz['place_name'] == held_out_city) &
-                (maz['commercial_emp_den'] >= commercial_density_threshold)
-            )
-            
-            n_train = train_mask.sum()
-            n_test = test_mask.sum()
-            
-            print(f"    Training samples (other cities): {n_train:,}")
-            print(f"    Test samples ({held_out_city}): {n_test:,}")
-            
-            if n_train < 10 or n_test < 5:
-                print(f"    Insufficient data for validation. Skipping.")
-                continue
-            
-            # Extract training data
-            X_train = maz.loc[train_mask, feature_cols].values
-            y_train_raw = maz.loc[train_mask, cost_type].values
-            
-            # Handle NaN values in features (fill with 0 for density columns)
-            X_train = np.nan_to_num(X_train, nan=0.0)
-            
-            # Convert to binary: paid (1) or free (0)
-            # Treat NaN and 0 as free parking, > 0 as paid
-            y_train_binary = (pd.Series(y_train_raw).fillna(0) > 0).astype(int).values
-            
-            # Debug: show distribution of paid vs free
-            n_train_paid = y_train_binary.sum()
-            n_train_free = len(y_train_binary) - n_train_paid
-            print(f"    Training data: {n_train_paid:,} paid, {n_train_free:,} free")
-            
-            # Check for variation
-            if y_train_binary.sum() == 0 or y_train_binary.sum() == len(y_train_binary):
-                print(f"    WARNING: No variation in paid/free parking. Skipping.")
-                continue
-            
-            # Extract test data
-            X_test = maz.loc[test_mask, feature_cols].values
-            y_test_raw = maz.loc[test_mask, cost_type].values
-            y_test_binary = (pd.Series(y_test_raw).fillna(0) > 0).astype(int).values
-            
-            # Handle NaN values in test features
-            X_test = np.nan_to_num(X_test, nan=0.0)
-            
-            # Standardize features
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-            
-            # Train logistic regression model
-            model = LogisticRegression(random_state=42, max_iter=1000)
-            model.fit(X_train_scaled, y_train_binary)
-            
-            # Predict probabilities once
-            y_pred_proba = model.predict_proba(X_test_scaled)[:, 1]
-            
-            # Test multiple thresholds
-            threshold_results = {}
-            for threshold in test_thresholds:
-                y_pred_binary = (y_pred_proba >= threshold).astype(int)
-                
-                # Calculate classification metrics
-                accuracy = accuracy_score(y_test_binary, y_pred_binary)
-                
-                # Handle case where there are no positive predictions
-                if y_pred_binary.sum() == 0:
-                    precision = 0.0
-                    recall = 0.0
-                    f1 = 0.0
-                else:
-                    precision = precision_score(y_test_binary, y_pred_binary, zero_division=0)
-                    recall = recall_score(y_test_binary, y_pred_binary, zero_division=0)
-                    f1 = f1_score(y_test_binary, y_pred_binary, zero_division=0)
-                
-                # Count predictions
-                n_actual_paid = y_test_binary.sum()
-                n_actual_free = len(y_test_binary) - n_actual_paid
-                n_predicted_paid = y_pred_binary.sum()
-                n_predicted_free = len(y_pred_binary) - n_predicted_paid
-                
-                # Store results for this threshold
-                threshold_results[threshold] = {
-                    'accuracy': accuracy,
-                    'precision': precision,
-                    'recall': recall,
-                    'f1': f1,
-                    'n_predicted_paid': n_predicted_paid,
-                    'n_predicted_free': n_predicted_free,
+            threshold_results = {
+                row['probability_threshold']: {
+                    'accuracy': row['accuracy'],
+                    'precision': row['precision'],
+                    'recall': row['recall'],
+                    'f1': row['f1'],
+                    'n_predicted_paid': row['n_predicted_paid'],
+                    'n_predicted_free': row['n_predicted_free'],
                 }
+                for _, row in city_metrics.iterrows()
+            }
             
             # Store results for all thresholds
             results[cost_type][held_out_city] = {
-                'n_train': n_train,
-                'n_test': n_test,
-                'n_actual_paid': y_test_binary.sum(),
-                'n_actual_free': len(y_test_binary) - y_test_binary.sum(),
+                'n_train': first['n_train'],
+                'n_test': first['n_test'],
+                'n_actual_paid': first['n_actual_paid'],
+                'n_actual_free': first['n_actual_free'],
                 'thresholds': threshold_results,
             }
             
@@ -690,17 +615,22 @@ def validate_parking_cost_estimation(maz, commercial_density_threshold=1.0, test
     return results
 
 
-def compare_models(maz, commercial_density_threshold=1.0, test_thresholds=None):
+def compare_models(maz, commercial_density_threshold=1.0, test_thresholds=None,
+                   n_jobs=-1, cache_dir=CV_CACHE_DIR):
     """
     Compare multiple model types using leave-one-city-out cross-validation.
     
     Tests Logistic Regression, Random Forest, Gradient Boosting, and SVM to find
-    the best-performing model for parking cost classification.
+    the best-performing model for parking cost classification. The (model × held-out city)
+    folds are fit in parallel and memoized (see parking_cv.cross_validate_models); the full
+    tidy metrics table is written to CV_METRICS_FILE.
     
     Args:
         maz (GeoDataFrame): MAZ zones with density features, observed costs, and capacity
         commercial_density_threshold (float): Minimum commercial_emp_den for paid parking
         test_thresholds (list): List of probability thresholds to test
+        n_jobs (int): joblib workers for the fold fits (-1 = all cores)
+        cache_dir (Path): Directory memoizing fold fits (None disables)
     
     Returns:
         dict: Performance metrics for each model and city combination
@@ -710,120 +640,43 @@ def compare_models(maz, commercial_density_threshold=1.0, test_thresholds=None):
     print("="*80)
     
     if test_thresholds is None:
-        test_thresholds = [0.3, 0.4, 0.5, 0.6, 0.7]
+        test_thresholds = PROBABILITY_THRESHOLDS
     
     # Define models to test
-    models = {
-        'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
-        'Random Forest': RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10),
-        'Gradient Boosting': GradientBoostingClassifier(n_estimators=100, random_state=42, max_depth=5, learning_rate=0.1),
-        'SVM (RBF)': SVC(probability=True, random_state=42, kernel='rbf', C=1.0)
-    }
+    models = default_models()
     
-    TARGET_CITIES = ['San Francisco', 'Oakland', 'San Jose']
-    feature_cols = ['commercial_emp_den', 'downtown_emp_den', 'pop_den']
+    metrics = cross_validate_models(
+        maz, models, probability_thresholds=test_thresholds,
+        density_thresholds=[commercial_density_threshold],
+        n_jobs=n_jobs, cache_dir=cache_dir
+    )
+    CV_METRICS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    metrics.to_csv(CV_METRICS_FILE, index=False)
+    print(f"  Wrote {len(metrics):,} cross-validation metric rows to {CV_METRICS_FILE}")
     
-    results = {}
+    results = {model_name: {} for model_name in models}
     
-    for model_name, model in models.items():
-        print(f"\n{'='*80}")
-        print(f"TESTING: {model_name}")
-        print(f"{'='*80}")
+    for _, best in best_thresholds(metrics).iterrows():
+        model_name, held_out_city = best['model'], best['held_out_city']
+        training_cities = [c for c in TARGET_CITIES if c != held_out_city]
         
-        results[model_name] = {}
+        results[model_name][held_out_city] = {
+            'best_f1': best['f1'],
+            'best_threshold': best['probability_threshold'],
+            'best_metrics': {
+                'accuracy': best['accuracy'],
+                'precision': best['precision'],
+                'recall': best['recall'],
+                'f1': best['f1'],
+                'threshold': best['probability_threshold']
+            },
+            'n_train': best['n_train'],
+            'n_test': best['n_test']
+        }
         
-        # Leave-one-city-out cross-validation
-        for held_out_city in TARGET_CITIES:
-            training_cities = [c for c in TARGET_CITIES if c != held_out_city]
-            
-            print(f"\n  Training on {', '.join(training_cities)} → Testing on {held_out_city}")
-            
-            # Prepare data
-            has_capacity = maz['on_all'] > 0
-            has_place = maz['place_name'].notna()
-            
-            train_mask = has_capacity & has_place & maz['place_name'].isin(training_cities)
-            test_mask = (
-                has_capacity & has_place & 
-                (maz['place_name'] == held_out_city) &
-                (maz['commercial_emp_den'] >= commercial_density_threshold)
-            )
-            
-            n_train = train_mask.sum()
-            n_test = test_mask.sum()
-            
-            if n_train < 10 or n_test < 5:
-                print(f"    Insufficient data. Skipping.")
-                continue
-            
-            # Extract and prepare data
-            X_train = maz.loc[train_mask, feature_cols].values
-            y_train = (pd.Series(maz.loc[train_mask, 'hparkcost'].values).fillna(0) > 0).astype(int).values
-            
-            X_test = maz.loc[test_mask, feature_cols].values
-            y_test = (pd.Series(maz.loc[test_mask, 'hparkcost'].values).fillna(0) > 0).astype(int).values
-            
-            # Handle NaN values in features (fill with 0 for density columns)
-            X_train = np.nan_to_num(X_train, nan=0.0)
-            X_test = np.nan_to_num(X_test, nan=0.0)
-            
-            # Check for variation
-            if y_train.sum() == 0 or y_train.sum() == len(y_train):
-                print(f"    No variation in training data. Skipping.")
-                continue
-            
-            # Standardize
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
-            
-            # Train model
-            print(f"    Training {model_name}...")
-            model.fit(X_train_scaled, y_train)
-            
-            # Get probabilities
-            y_pred_proba = model.predict_proba(X_test_scaled)[:, 1]
-            
-            # Test all thresholds and find best
-            best_f1 = 0
-            best_threshold = 0.5
-            best_metrics = {}
-            
-            for threshold in test_thresholds:
-                y_pred = (y_pred_proba >= threshold).astype(int)
-                
-                accuracy = accuracy_score(y_test, y_pred)
-                
-                if y_pred.sum() == 0:
-                    precision = 0.0
-                    recall = 0.0
-                    f1 = 0.0
-                else:
-                    precision = precision_score(y_test, y_pred, zero_division=0)
-                    recall = recall_score(y_test, y_pred, zero_division=0)
-                    f1 = f1_score(y_test, y_pred, zero_division=0)
-                
-                if f1 > best_f1:
-                    best_f1 = f1
-                    best_threshold = threshold
-                    best_metrics = {
-                        'accuracy': accuracy,
-                        'precision': precision,
-                        'recall': recall,
-                        'f1': f1,
-                        'threshold': threshold
-                    }
-            
-            results[model_name][held_out_city] = {
-                'best_f1': best_f1,
-                'best_threshold': best_threshold,
-                'best_metrics': best_metrics,
-                'n_train': n_train,
-                'n_test': n_test
-            }
-            
-            print(f"    Best F1: {best_f1:.3f} at threshold {best_threshold:.2f}")
-            print(f"    Accuracy: {best_metrics['accuracy']:.1%}, Precision: {best_metrics['precision']:.1%}, Recall: {best_metrics['recall']:.1%}")
+        print(f"\n  {model_name}: Training on {', '.join(training_cities)} → Testing on {held_out_city}")
+        print(f"    Best F1: {best['f1']:.3f} at threshold {best['probability_threshold']:.2f}")
+        print(f"    Accuracy: {best['accuracy']:.1%}, Precision: {best['precision']:.1%}, Recall: {best['recall']:.1%}")
     
     # Summary comparison
     print(f"\n{'='*80}")
@@ -4,16 +4,20 @@ Geocode parking scrape data using GeoPandas
 This script:
 1. Reads parking scrape CSV data from interim cache
 2. Cleans addresses (removes parenthetical content)
-3. Geocodes addresses using Nominatim via GeoPandas
+3. Geocodes addresses through the persistent geocode cache (geocode_cache.py); only
+   addresses never resolved before are sent to Nominatim
 4. Saves results as GeoPackage with geometry column to interim cache
 5. Flags failed geocodes while keeping all records
 
 Dependencies:
 - geopandas
+- geopy
 - pandas
 - tqdm
 """
 
+import argparse
+
 import pandas as pd
 import geopandas as gpd
 from tqdm import tqdm
@@ -21,10 +25,12 @@ import time
 
 # Import configuration
 from setup import INTERIM_CACHE_DIR, ensure_directories
+from geocode_cache import FileBackend, GeocodeCache, NominatimBackend, geocode_addresses
 
 # Configuration
 INPUT_FILE = 'parking_scrape_location_cost.csv'
 OUTPUT_FILE = 'parking_scrape_location_cost.parquet'
+GEOCODE_CACHE_FILE = 'geocode_cache.sqlite'
 
 
 # Nominatim configuration
@@ -61,8 +67,15 @@ def build_full_address(row):
     return f"{cleaned}, {row['city']}, CA, USA"
 
 
-def geocode_parking_data():
-    """Main function to geocode parking data"""
+def geocode_parking_data(backend=None, cache_path=None, max_workers=None):
+    """Main function to geocode parking data
+
+    Args:
+        backend: geocoder backend (default: Nominatim with USER_AGENT and TIMEOUT); pass
+            geocode_cache.FileBackend(path) to geocode offline from a lookup table
+        cache_path (Path): SQLite geocode cache (default: INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE)
+        max_workers (int): concurrent lookups, capped by what the backend allows
+    """
     
     ensure_directories()
     
@@ -101,33 +114,34 @@ def geocode_parking_data():
         return
     
     # Geocode addresses
-    print(f"\nGeocoding addresses using Nominatim (OpenStreetMap)...")
-    print(f"  Provider: Nominatim")
-    print(f"  User agent: {USER_AGENT}")
-    print(f"  Timeout: {TIMEOUT}s")
-    print(f"  Note: This may take several minutes due to rate limiting...")
+    if backend is None:
+        backend = NominatimBackend(USER_AGENT, timeout=TIMEOUT)
+    cache_path = INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE if cache_path is None else cache_path
+    print(f"\nGeocoding addresses...")
+    print(f"  Backend: {backend.name}")
+    print(f"  Cache: {cache_path}")
     
     # Filter to only rows with valid addresses
     df_to_geocode = df[df['full_address'].notna()].copy()
     
     try:
-        # Geocode using geopandas
         print(f"\n  Geocoding {len(df_to_geocode)} addresses...")
         start_time = time.time()
         
-        # GeoPandas geocode returns a GeoDataFrame with geometry column
-        geocoded_gdf = gpd.tools.geocode(
-            df_to_geocode['full_address'],
-            provider='nominatim',
-            user_agent=USER_AGENT,
-            timeout=TIMEOUT
-        )
+        # Cached addresses are reused; only new ones go to the backend (rate limited)
+        with GeocodeCache(cache_path) as cache:
+            n_cached = len(cache)
+            coords = geocode_addresses(df_to_geocode['full_address'], backend, cache,
+                                       max_workers=max_workers)
+            n_new = len(cache) - n_cached
         
         elapsed = time.time() - start_time
-        print(f"  ✓ Geocoding completed in {elapsed/60:.1f} minutes")
+        print(f"  ✓ Geocoding completed in {elapsed/60:.1f} minutes ({n_new} new addresses cached)")
         
         # Merge geometry back to original DataFrame
-        df_to_geocode['geometry'] = geocoded_gdf['geometry'].values
+        points = gpd.points_from_xy(coords['longitude'], coords['latitude'])
+        df_to_geocode['geometry'] = [point if found else None
+                                     for point, found in zip(points, coords['status'] == 'found')]
         
         # For rows that weren't geocoded, add empty geometry
         df_not_geocoded = df[df['full_address'].isna()].copy()
@@ -214,8 +228,14 @@ def geocode_parking_data():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode scraped parking addresses")
+    parser.add_argument("--lookup", help="Geocode offline from a CSV/Parquet of address, latitude, longitude")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent lookups (capped by the backend)")
+    args = parser.parse_args()
+
     # Run geocoding
-    geocode_parking_data()
+    geocode_parking_data(backend=FileBackend(args.lookup) if args.lookup else None,
+                         max_workers=args.workers)
 
 
 #%% Load parquet and create simple map
@@ -34,7 +34,7 @@ def published_cost():
     Returns:
         DataFrame: MAZ_NODE and hparkcost columns
     """
-    from utils import load_maz_shp
+    from utils import load_maz_shp, mean_by_maz
     
     print("Loading published parking meter cost data...")
     
@@ -89,16 +89,12 @@ def published_cost():
     
     # Spatial join: Oakland point meters to MAZ
     print("  Spatial join: Oakland meters to MAZ...")
-    oak_joined = gpd.sjoin(maz, oak_meters, how="inner", predicate="intersects")
-    oak_by_maz = oak_joined.groupby('MAZ_NODE')['hparkcost'].mean().reset_index()
-    oak_by_maz.columns = ['MAZ_NODE', 'hparkcost_oak']
+    oak_by_maz = mean_by_maz(oak_meters, maz, 'hparkcost', 'hparkcost_oak')
     print(f"    Oakland: {len(oak_by_maz):,} MAZs with parking meter costs")
     
     # Spatial join: San Jose point meters to MAZ
     print("  Spatial join: San Jose meters to MAZ...")
-    sj_joined = gpd.sjoin(maz, sj_meters, how="inner", predicate="intersects")
-    sj_by_maz = sj_joined.groupby('MAZ_NODE')['hparkcost'].mean().reset_index()
-    sj_by_maz.columns = ['MAZ_NODE', 'hparkcost_sj']
+    sj_by_maz = mean_by_maz(sj_meters, maz, 'hparkcost', 'hparkcost_sj')
     print(f"    San Jose: {len(sj_by_maz):,} MAZs with parking meter costs")
     
     # Spatial join: SF polygon meter areas to MAZ (50% area threshold)
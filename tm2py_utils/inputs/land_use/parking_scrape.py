@@ -14,11 +14,10 @@ import pandas as pd
 from collections import defaultdict
 import time
 import re
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 
 # Import configuration
 from setup import INTERIM_CACHE_DIR, ensure_directories
+from geocode_cache import GeocodeCache, NominatimBackend, geocode_addresses
 
 
 # ============================================================================
@@ -39,10 +38,10 @@ cities = {
     'Concord': {'id': 61991, 'kind': 'destination'}
 }
 
-# Initialize geocoder (Nominatim from OpenStreetMap)
-# TEMPORARILY DISABLED - geocoding will be done in a separate step
-# geolocator = Nominatim(user_agent="bay_area_parking_scraper")
-# geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+# Geocoder (Nominatim from OpenStreetMap), shared on-disk cache with parking_geocode.py
+# Geocoding is normally done in the separate parking_geocode.py step
+GEOCODER_USER_AGENT = "bay_area_parking_scraper"
+GEOCODE_CACHE_FILE = 'geocode_cache.sqlite'
 
 # Time window for parking search (Feb 4, 2026, 8am-6pm)
 start_time = '2026-02-04T08:00'
@@ -178,12 +177,50 @@ def parse_price(price_text):
 # Geocoding Functions
 # ============================================================================
 
-def geocode_address(address, city_name):
+def geocode_spots(df, backend=None, cache_path=None):
+    """Add latitude/longitude to scraped spots through the shared geocode cache
+    
+    Each unique address is geocoded once as "{address}, {city}, CA, USA"; addresses
+    without a match are retried as "{address}, CA, USA". Addresses already in the
+    cache are never sent to the geocoder again.
+    
+    Args:
+        df: DataFrame with address and city columns
+        backend: geocode_cache backend (default: rate-limited Nominatim)
+        cache_path: SQLite geocode cache (default: INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE)
+        
+    Returns:
+        DataFrame: copy of df with latitude and longitude (NaN if geocoding fails)
+    """
+    backend = NominatimBackend(GEOCODER_USER_AGENT) if backend is None else backend
+    cache_path = INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE if cache_path is None else cache_path
+    address = df['address'].fillna('').astype(str).str.strip()
+    has_address = address != ''
+    
+    df = df.copy()
+    with GeocodeCache(cache_path) as cache:
+        # Append city and state for better accuracy
+        coords = geocode_addresses(
+            (address + ', ' + df['city'].astype(str) + ', CA, USA').where(has_address), backend, cache)
+        # Try without city name if first attempt fails
+        retry = has_address.to_numpy() & (coords['status'] != 'found').to_numpy()
+        if retry.any():
+            fallback = geocode_addresses(address[retry] + ', CA, USA', backend, cache)
+            coords.loc[retry, ['latitude', 'longitude']] = fallback[['latitude', 'longitude']].to_numpy()
+    
+    df['latitude'] = coords['latitude'].to_numpy()
+    df['longitude'] = coords['longitude'].to_numpy()
+    return df
+
+
+def geocode_address(address, city_name, backend=None, cache_path=None):
     """Convert address to latitude/longitude coordinates
     
     Args:
         address: Street address
         city_name: City name to append for better geocoding accuracy
+        backend: geocode_cache backend (default: rate-limited Nominatim)
+        cache_path: SQLite geocode cache (default: INTERIM_CACHE_DIR / GEOCODE_CACHE_FILE)
         
     Returns:
         tuple: (latitude, longitude) or (None, None) if geocoding fails
@@ -191,22 +228,11 @@ def geocode_address(address, city_name):
     if not address or address.strip() == '':
         return None, None
     
-    # Append city and state for better accuracy
-    full_address = f"{address}, {city_name}, CA, USA"
-    
-    try:
-        location = geocode(full_address)
-        if location:
-            return location.latitude, location.longitude
-        else:
-            # Try without city name if first attempt fails
-            location = geocode(f"{address}, CA, USA")
-            if location:
-                return location.latitude, location.longitude
-    except Exception as e:
-        print(f"  Geocoding error for '{address}': {e}")
-    
-    return None, None
+    row = geocode_spots(pd.DataFrame({'address': [address], 'city': [city_name]}),
+                        backend, cache_path).iloc[0]
+    if pd.isna(row['latitude']):
+        return None, None
+    return row['latitude'], row['longitude']
 
 
 # ============================================================================
@@ -0,0 +1,302 @@
+"""
+Content-hashed step cache and DAG scheduler for the land use pipeline.
+
+A pipeline is a set of named Steps. Each step declares what its output depends on:
+- deps: upstream step names; their outputs are passed to the step function as keyword arguments
+- inputs: source files (or directories, e.g. a .gdb) read by the step
+- params: parameter values (thresholds, percentiles, years, ...)
+- code: modules whose source changes should invalidate the step
+
+The cache key of a step is a sha256 over its name, version, params, the content hashes
+of its inputs and code, and the cache keys of its upstream steps. Outputs are stored as
+Parquet (GeoParquet for GeoDataFrames) named by that key, so a re-run after a parameter
+tweak reloads every step whose key is unchanged and recomputes only the affected steps
+downstream of the change.
+
+Steps whose dependencies are complete run concurrently in a thread pool, so independent
+branches (jobs, enrollment, capacity, scraped and published cost) overlap.
+
+Usage:
+    from step_graph import Step, StepGraph
+
+    graph = StepGraph(cache_dir=INTERIM_CACHE_DIR / "step_cache")
+    graph.add(Step("jobs", get_jobs, inputs=[BUSINESS_GDB]))
+    graph.add(Step("maz", assemble, deps=["jobs"], params={"threshold": 1.0}))
+    outputs = graph.run(max_workers=4)
+"""
+import hashlib
+import inspect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+import geopandas as gpd
+
+
+# bump to invalidate every cached step after a change to the cache format
+CACHE_FORMAT_VERSION = 1
+
+
+@dataclass
+class Step:
+    """
+    A named pipeline step.
+
+    Attributes:
+        name (str): unique step name; also the keyword its output is passed under downstream
+        func (callable): called as func(**{dep: output for dep in deps}, **params);
+            must return a DataFrame or GeoDataFrame
+        deps (list): upstream step names
+        inputs (list): source files or directories read by the step
+        params (dict): parameters passed to func and included in the cache key
+        code (list): modules (or source file paths) whose contents are part of the cache key
+        version (str): manual version, bump to invalidate the step
+        cache (bool): if False the step always runs and its output is not written
+    """
+    name: str
+    func: object
+    deps: list = field(default_factory=list)
+    inputs: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    code: list = field(default_factory=list)
+    version: str = "1"
+    cache: bool = True
+
+
+class FileFingerprints:
+    """
+    Content hashes of input files, memoized on (path, size, mtime) in a JSON sidecar so
+    unchanged large inputs are not re-read on every run.
+    """
+
+    def __init__(self, memo_file):
+        self.memo_file = Path(memo_file)
+        self._lock = threading.Lock()
+        try:
+            self._memo = json.loads(self.memo_file.read_text())
+        except (OSError, ValueError):
+            self._memo = {}
+
+    def _hash_file(self, path):
+        stat = path.stat()
+        memo_key = str(path.resolve())
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        with self._lock:
+            cached = self._memo.get(memo_key)
+        if cached and cached["stamp"] == stamp:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        sha = digest.hexdigest()
+        with self._lock:
+            self._memo[memo_key] = {"stamp": stamp, "sha256": sha}
+        return sha
+
+    def fingerprint(self, path):
+        """Content hash of a file, of every file under a directory, or 'missing'."""
+        path = Path(path)
+        if path.is_dir():
+            digest = hashlib.sha256()
+            for child in sorted(p for p in path.rglob("*") if p.is_file()):
+                digest.update(child.relative_to(path).as_posix().encode())
+                digest.update(self._hash_file(child).encode())
+            return digest.hexdigest()
+        if path.is_file():
+            return self._hash_file(path)
+        return "missing"
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self._memo, indent=1)
+        self.memo_file.parent.mkdir(parents=True, exist_ok=True)
+        _atomic_write_text(self.memo_file, payload)
+
+
+def _atomic_write_text(path, text):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _code_source(module):
+    """Source text of a module object or source file path."""
+    if isinstance(module, (str, Path)):
+        return Path(module).read_text(encoding="utf-8")
+    return inspect.getsource(module)
+
+
+def _jsonable(value):
+    """Stable JSON-compatible form of a parameter value for hashing."""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple, set)):
+        items = [_jsonable(v) for v in value]
+        return sorted(items, key=repr) if isinstance(value, set) else items
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+class StepGraph:
+    """
+    A DAG of Steps with a content-hashed Parquet cache.
+
+    Args:
+        cache_dir (Path): directory for cached step outputs and manifests
+        use_cache (bool): if False, every step is recomputed (outputs are still written)
+    """
+
+    def __init__(self, cache_dir, use_cache=True):
+        self.cache_dir = Path(cache_dir)
+        self.use_cache = use_cache
+        self.steps = {}
+        self.fingerprints = FileFingerprints(self.cache_dir / "_input_fingerprints.json")
+        self._code_hashes = {}
+        self.stats = {}
+
+    def add(self, step):
+        """Add a step; its deps must already be in the graph."""
+        if step.name in self.steps:
+            raise ValueError(f"Duplicate step name: {step.name}")
+        missing = [dep for dep in step.deps if dep not in self.steps]
+        if missing:
+            raise ValueError(f"Step '{step.name}' depends on unknown step(s): {missing}")
+        self.steps[step.name] = step
+        return step
+
+    # ------------------------------------------------------------------
+    # Cache keys
+    # ------------------------------------------------------------------
+
+    def _code_hash(self, module):
+        name = str(module) if isinstance(module, (str, Path)) else module.__name__
+        if name not in self._code_hashes:
+            self._code_hashes[name] = hashlib.sha256(_code_source(module).encode()).hexdigest()
+        return self._code_hashes[name]
+
+    def cache_key(self, step, dep_keys):
+        """sha256 of everything the step's output depends on."""
+        payload = {
+            "format": CACHE_FORMAT_VERSION,
+            "step": step.name,
+            "version": step.version,
+            "params": _jsonable(step.params),
+            "inputs": {str(p): self.fingerprints.fingerprint(p) for p in step.inputs},
+            "code": {
+                (str(m) if isinstance(m, (str, Path)) else m.__name__): self._code_hash(m)
+                for m in step.code
+            },
+            "deps": {dep: dep_keys[dep] for dep in step.deps},
+        }
+        text = json.dumps(payload, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest(), payload
+
+    def _cache_file(self, step, key):
+        return self.cache_dir / f"{step.name}-{key[:16]}.parquet"
+
+    # ------------------------------------------------------------------
+    # Cache I/O
+    # ------------------------------------------------------------------
+
+    def _load(self, path):
+        try:
+            return gpd.read_parquet(path)
+        except (ValueError, TypeError):
+            # no geometry metadata: plain table
+            return pd.read_parquet(path)
+
+    def _store(self, step, key, payload, output):
+        if not isinstance(output, pd.DataFrame):
+            raise TypeError(f"Step '{step.name}' returned {type(output).__name__}; expected a DataFrame")
+        path = self._cache_file(step, key)
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".parquet.tmp")
+        os.close(fd)
+        output.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        manifest = dict(payload, key=key, rows=len(output), created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        _atomic_write_text(path.with_suffix(".json"), json.dumps(manifest, indent=2, sort_keys=True))
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _ancestors(self, targets):
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name in needed:
+                continue
+            if name not in self.steps:
+                raise KeyError(f"Unknown step: {name}")
+            needed.add(name)
+            stack.extend(self.steps[name].deps)
+        return needed
+
+    def _execute(self, step, key, payload, dep_outputs):
+        start = time.perf_counter()
+        path = self._cache_file(step, key)
+        if step.cache and self.use_cache and path.exists():
+            output = self._load(path)
+            status = "cached"
+        else:
+            logging.info(f"Step '{step.name}': running")
+            # copies, so a step mutating its input can't change another step's view of it
+            kwargs = {dep: dep_outputs[dep].copy() for dep in step.deps}
+            kwargs.update(step.params)
+            output = step.func(**kwargs)
+            if step.cache:
+                self._store(step, key, payload, output)
+            status = "computed"
+        elapsed = time.perf_counter() - start
+        logging.info(f"Step '{step.name}': {status} in {elapsed:.1f}s ({len(output):,} rows, key {key[:12]})")
+        return output, status, elapsed
+
+    def run(self, targets=None, max_workers=4):
+        """
+        Run the steps needed for `targets` (default: all steps), loading cached outputs
+        where the cache key matches and running independent steps concurrently.
+
+        Returns:
+            dict: step name -> output frame
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        needed = self._ancestors(targets or list(self.steps))
+        keys, outputs, pending = {}, {}, {}
+        remaining = {name for name in self.steps if name in needed}
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                while remaining or pending:
+                    ready = [
+                        name for name in self.steps
+                        if name in remaining and all(dep in outputs for dep in self.steps[name].deps)
+                    ]
+                    for name in ready:
+                        step = self.steps[name]
+                        keys[name], payload = self.cache_key(step, keys)
+                        pending[pool.submit(self._execute, step, keys[name], payload, outputs)] = name
+                        remaining.discard(name)
+
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = pending.pop(future)
+                        outputs[name], status, elapsed = future.result()
+                        self.stats[name] = {"status": status, "seconds": round(elapsed, 1), "key": keys[name]}
+        finally:
+            self.fingerprints.save()
+
+        computed = [name for name, s in self.stats.items() if s["status"] == "computed"]
+        logging.info(f"Step graph complete: {len(computed)} computed {computed}, "
+                     f"{len(self.stats) - len(computed)} loaded from cache")
+        return outputs
@@ -1,12 +1,16 @@
 
 from pathlib import Path
+import hashlib
 import os
 import sys
-from io import StringIO
+import threading
 from contextlib import contextmanager
 import logging
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
+from scipy import sparse
 import pytidycensus
 
 # Import configuration from setup module
@@ -28,20 +32,42 @@ from setup import (
 # Logging Utilities
 # ============================================================================
 
+class _LoggerStream:
+    """File-like object that logs each complete line written to it, buffered per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def write(self, text):
+        lines = (getattr(self._local, "partial", "") + text).split("\n")
+        self._local.partial = lines.pop()
+        for line in lines:
+            if line.strip():
+                logging.info(line)
+        return len(text)
+
+    def flush(self):
+        partial = getattr(self._local, "partial", "")
+        if partial.strip():
+            logging.info(partial)
+        self._local.partial = ""
+
+
 @contextmanager
 def redirect_stdout_to_logger():
-    """Context manager to redirect stdout (print statements) to logger."""
+    """
+    Context manager to redirect stdout (print statements) to logger.
+
+    Lines are logged as they are printed (not at exit), so output from steps running
+    concurrently in threads is logged as it happens.
+    """
     old_stdout = sys.stdout
-    sys.stdout = StringIO()
+    sys.stdout = _LoggerStream()
     try:
         yield
     finally:
-        output = sys.stdout.getvalue()
+        sys.stdout.flush()
         sys.stdout = old_stdout
-        if output.strip():
-            for line in output.splitlines():
-                if line.strip():
-                    logging.info(line)
 
 
 
@@ -103,6 +129,169 @@ def load_maz_shp():
     return maz
 
 
+# ============================================================================
+# MAZ Point Locator
+# ============================================================================
+
+class MazLocator:
+    """
+    Locates points in MAZ polygons with a packed STRtree built once over the MAZs.
+
+    Queries take whole coordinate arrays, run in chunks of vectorized shapely calls,
+    and return positional MAZ indices (-1 where a point is not located), so no
+    intermediate GeoDataFrames are built. Points outside every MAZ can fall back to
+    the nearest MAZ.
+
+    Example:
+        locator = get_maz_locator(maz)
+        idx = locator.locate_geometries(firms.geometry)
+        firms['MAZ_NODE'] = locator.ids['MAZ_NODE'][idx]
+    """
+
+    def __init__(self, geometries, ids, crs=None):
+        """
+        Args:
+            geometries (array-like): MAZ polygons
+            ids (DataFrame): One row per polygon with the MAZ id columns (e.g. MAZ_NODE, TAZ_NODE)
+            crs: CRS of the polygons
+        """
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.ids = ids.reset_index(drop=True)
+        self.crs = crs
+        self.tree = shapely.STRtree(self.geometries)
+        shapely.prepare(self.geometries)
+
+    @classmethod
+    def from_gdf(cls, maz_gdf, id_cols=("MAZ_NODE", "TAZ_NODE")):
+        id_cols = [col for col in id_cols if col in maz_gdf.columns]
+        return cls(maz_gdf.geometry.values, pd.DataFrame(maz_gdf[id_cols]), crs=maz_gdf.crs)
+
+    def save(self, path):
+        """Persist the MAZ polygons and ids (Parquet) so the locator can be rebuilt without the shapefile."""
+        gdf = gpd.GeoDataFrame(self.ids, geometry=self.geometries, crs=self.crs)
+        gdf.to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        gdf = gpd.read_parquet(path)
+        return cls.from_gdf(gdf, id_cols=[col for col in gdf.columns if col != gdf.geometry.name])
+
+    def locate(self, x, y, nearest=True, chunk_size=250_000, near_distance=1000.0, points=None):
+        """
+        Return the positional index of the MAZ containing each (x, y) point.
+
+        Points strictly inside a MAZ get that MAZ (the first one by index if MAZs overlap).
+        With nearest=True, points inside no MAZ get the nearest MAZ; otherwise -1.
+
+        Args:
+            x, y (array-like): Point coordinates in the locator's CRS
+            nearest (bool): Whether to fall back to the nearest MAZ
+            chunk_size (int): Number of points per vectorized query
+            near_distance (float): Search radius of the first, cheaper nearest pass;
+                points farther away than this get an unbounded search
+            points (array-like, optional): Point geometries for x, y, if already built
+        Returns:
+            np.ndarray: int64 MAZ indices, -1 where unmatched
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(len(x), -1, dtype=np.int64)
+        for start in range(0, len(x), chunk_size):
+            stop = start + chunk_size
+            chunk_points = shapely.points(x[start:stop], y[start:stop]) if points is None \
+                else np.asarray(points[start:stop], dtype=object)
+            chunk = result[start:stop]
+            self._within(chunk_points, chunk)
+            if nearest:
+                self._nearest(chunk_points, chunk, near_distance)
+        return result
+
+    def _within(self, points, chunk):
+        """Fill chunk with the MAZ strictly containing each point (boundary points stay unmatched)."""
+        point_idx, maz_idx = self.tree.query(points, predicate="within")
+        # one MAZ per point: with candidates sorted by descending MAZ index the last
+        # write, i.e. the lowest MAZ index, wins for points in overlapping polygons
+        order = np.lexsort((-maz_idx, point_idx))
+        chunk[point_idx[order]] = maz_idx[order]
+
+    def _nearest(self, points, chunk, near_distance):
+        """Fill unmatched entries of chunk with the nearest MAZ, trying a bounded search first."""
+        for max_distance in (near_distance, None):
+            missing = np.flatnonzero((chunk < 0) & ~shapely.is_empty(points) & ~shapely.is_missing(points))
+            if not len(missing):
+                return
+            near_point, near_maz = self.tree.query_nearest(
+                points[missing], max_distance=max_distance, all_matches=False
+            )
+            chunk[missing[near_point]] = near_maz
+
+    def nearest(self, x, y, chunk_size=250_000, near_distance=1000.0):
+        """Return the positional index of the nearest MAZ to each (x, y) point."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(len(x), -1, dtype=np.int64)
+        for start in range(0, len(x), chunk_size):
+            stop = start + chunk_size
+            self._nearest(shapely.points(x[start:stop], y[start:stop]), result[start:stop], near_distance)
+        return result
+
+    def locate_geometries(self, geometries, nearest=True, chunk_size=250_000):
+        """
+        Same as locate() for a GeoSeries/array of geometries; non-point geometries are
+        located by a representative point on their surface.
+        """
+        points = self._as_points(geometries)
+        return self.locate(shapely.get_x(points), shapely.get_y(points), nearest=nearest,
+                           chunk_size=chunk_size, points=points)
+
+    @staticmethod
+    def _as_points(geometries):
+        geoms = np.asarray(geometries, dtype=object)
+        is_point = shapely.get_type_id(geoms) == 0
+        if not is_point.all():
+            geoms = geoms.copy()
+            geoms[~is_point] = shapely.point_on_surface(geoms[~is_point])
+        return geoms
+
+
+_MAZ_LOCATORS = {}
+
+
+def get_maz_locator(maz_gdf=None, persist=False):
+    """
+    Return a MazLocator for the MAZ polygons, built once per process.
+
+    Args:
+        maz_gdf (GeoDataFrame, optional): MAZ polygons; if None, the MAZ shapefile (or the
+            persisted locator in the interim cache, if present and newer) is used
+        persist (bool): If True, writes the locator polygons to the interim cache for later runs
+    Returns:
+        MazLocator
+    """
+    persisted = INTERIM_CACHE_DIR / f"maz_locator_v{MAZ_VERSION}.parquet"
+    if maz_gdf is None:
+        maz_shp = Path(MAZ_TAZ_DIR) / f"mazs_TM2_{MAZ_VERSION}.shp"
+        key = ("file", str(maz_shp))
+        if key not in _MAZ_LOCATORS:
+            if persisted.exists() and (not maz_shp.exists() or persisted.stat().st_mtime >= maz_shp.stat().st_mtime):
+                _MAZ_LOCATORS[key] = MazLocator.load(persisted)
+            else:
+                _MAZ_LOCATORS[key] = MazLocator.from_gdf(load_maz_shp())
+                if persist:
+                    _MAZ_LOCATORS[key].save(persisted)
+        return _MAZ_LOCATORS[key]
+
+    key = (
+        "gdf", len(maz_gdf), tuple(np.round(maz_gdf.total_bounds, 3)), str(maz_gdf.crs),
+        int(pd.util.hash_pandas_object(maz_gdf["MAZ_NODE"], index=False).sum()),
+    )
+    if key not in _MAZ_LOCATORS:
+        _MAZ_LOCATORS[key] = MazLocator.from_gdf(maz_gdf)
+        if persist:
+            _MAZ_LOCATORS[key].save(persisted)
+    return _MAZ_LOCATORS[key]
+
+
 def spatial_join_to_maz(points_gdf, maz_gdf):
     """
     Spatially joins point features to MAZ polygons using a two-step approach:
@@ -110,56 +299,210 @@ def spatial_join_to_maz(points_gdf, maz_gdf):
     2. Join remaining points to nearest MAZ (catches edge cases)
     
     This ensures every point gets assigned to a MAZ, even if slightly outside polygon boundaries
-    due to geocoding errors or topology issues.
+    due to geocoding errors or topology issues. Both steps use the shared MazLocator
+    (one STRtree per process); each point is assigned to exactly one MAZ.
     
     Args:
         points_gdf (GeoDataFrame): Point features to join to MAZ (e.g., firms, schools).
         maz_gdf (GeoDataFrame): MAZ polygons with MAZ_NODE and TAZ_NODE columns.
     
     Returns:
-        DataFrame: Input points with added MAZ_NODE and TAZ_NODE columns (geometry dropped).
+        DataFrame: Input points with added MAZ_NODE and TAZ_NODE columns (and any other
+            non-geometry MAZ columns).
     """
     print(f"Spatially joining {len(points_gdf)} points to MAZ...")
     
-    # Step 1: Spatial join using 'within' predicate (points inside MAZ polygons)
-    joined = gpd.sjoin(points_gdf, maz_gdf, how="left", predicate="within")
-    joined = joined.drop(columns=['index_right'], errors='ignore')
+    if points_gdf.crs != maz_gdf.crs:
+        points_gdf = points_gdf.to_crs(maz_gdf.crs)
     
-    matched_count = joined["MAZ_NODE"].notnull().sum()
-    print(f"  Step 1 (within): {matched_count:,} / {len(points_gdf):,} points matched to MAZ")
+    locator = get_maz_locator(maz_gdf)
+    within_idx = locator.locate_geometries(points_gdf.geometry, nearest=False)
+    print(f"  Step 1 (within): {(within_idx >= 0).sum():,} / {len(points_gdf):,} points matched to MAZ")
     
-    # Step 2: Nearest neighbor join for unmatched points
-    unmatched = joined[joined["MAZ_NODE"].isnull()]
+    maz_idx = within_idx
+    unmatched = np.flatnonzero(within_idx < 0)
     if len(unmatched) > 0:
         print(f"  Step 2 (nearest): Assigning {len(unmatched):,} unmatched points to nearest MAZ...")
-        
-        # Prepare unmatched subset as GeoDataFrame, drop null MAZ/TAZ columns
-        unmatched_gdf = gpd.GeoDataFrame(
-            unmatched, 
-            geometry="geometry", 
-            crs=points_gdf.crs
-        ).drop(columns=["MAZ_NODE", "TAZ_NODE"], errors='ignore')
-        
-        # Nearest neighbor spatial join
-        nearest_joined = gpd.sjoin_nearest(unmatched_gdf, maz_gdf, how="left")
-        nearest_joined = nearest_joined.drop(columns=['index_right'], errors='ignore')
-        
-        # Convert to DataFrame and concatenate with successfully matched points
-        nearest_joined = pd.DataFrame(nearest_joined)
-        matched = pd.DataFrame(joined[joined["MAZ_NODE"].notnull()])
-        joined = pd.concat([matched, nearest_joined], ignore_index=True)
-        
-        still_unmatched = joined["MAZ_NODE"].isnull().sum()
+        points = locator._as_points(points_gdf.geometry.values[unmatched])
+        maz_idx[unmatched] = locator.nearest(shapely.get_x(points), shapely.get_y(points))
+        still_unmatched = (maz_idx < 0).sum()
         if still_unmatched > 0:
             print(f"  WARNING: {still_unmatched} points still unmatched after nearest join!")
         else:
             print(f"  Step 2 complete: All points now assigned to MAZ")
     
-    total_matched = joined["MAZ_NODE"].notnull().sum()
-    print(f"  Final: {total_matched:,} / {len(points_gdf):,} points assigned to MAZ")
+    maz_cols = [col for col in maz_gdf.columns if col != maz_gdf.geometry.name]
+    matched = maz_idx >= 0
+    joined = pd.DataFrame(points_gdf.drop(columns=[col for col in maz_cols if col in points_gdf.columns]))
+    for col in maz_cols:
+        values = maz_gdf[col].to_numpy()[np.where(matched, maz_idx, 0)]
+        joined[col] = pd.Series(values, index=joined.index).where(matched)
+    
+    print(f"  Final: {matched.sum():,} / {len(points_gdf):,} points assigned to MAZ")
     
     return joined
 
+def mean_by_maz(points_gdf, maz_gdf, value_col, out_col=None):
+    """
+    Average a point attribute by the MAZ each point falls in.
+
+    Points outside every MAZ are dropped, and so are points on a MAZ boundary (the
+    locator matches points strictly within a MAZ, where the old sjoin kept them).
+
+    Args:
+        points_gdf (GeoDataFrame): Points with value_col
+        maz_gdf (GeoDataFrame): MAZ polygons with MAZ_NODE
+        value_col (str): Column to average
+        out_col (str, optional): Name of the output column (default: value_col)
+    Returns:
+        DataFrame: MAZ_NODE and out_col for MAZs containing at least one point
+    """
+    if points_gdf.crs != maz_gdf.crs:
+        points_gdf = points_gdf.to_crs(maz_gdf.crs)
+    maz_idx = get_maz_locator(maz_gdf).locate_geometries(points_gdf.geometry, nearest=False)
+    located = maz_idx >= 0
+    df = pd.DataFrame({
+        'MAZ_NODE': maz_gdf['MAZ_NODE'].to_numpy()[maz_idx[located]],
+        out_col or value_col: points_gdf[value_col].to_numpy()[located],
+    })
+    return df.groupby('MAZ_NODE', as_index=False)[out_col or value_col].mean()
+
+
+# ============================================================================
+# MAZ Area Weights
+# ============================================================================
+
+class MazAreaWeights:
+    """
+    Sparse MAZ x zone intersection areas (acres) for allocating zone attributes to MAZs.
+
+    Built once from an STRtree candidate query plus vectorized intersection areas
+    (tm2py_utils.misc.geo_overlay.overlap_pairs). Allocating a zone attribute is then a
+    sparse matrix-vector product, so the same matrix serves every block group (or other
+    zone) attribute: parking stalls, population, households...
+
+    Example:
+        weights = get_maz_area_weights(maz, blockgroups, 'blkgrpid', name='maz_blockgroup')
+        maz['on_all'] = weights.allocate(blockgroups['on_all'])
+    """
+
+    def __init__(self, maz_ids, zone_ids, maz_idx, zone_idx, acres):
+        """
+        Args:
+            maz_ids (array-like): MAZ ids, defining the row order
+            zone_ids (array-like): Zone ids, defining the column order
+            maz_idx, zone_idx (array-like): Positional indices of each overlapping pair
+            acres (array-like): Intersection area of each pair in acres
+        """
+        self.maz_ids = np.asarray(maz_ids)
+        self.zone_ids = np.asarray(zone_ids)
+        self.matrix = sparse.csr_matrix(
+            (np.asarray(acres, dtype=float), (np.asarray(maz_idx), np.asarray(zone_idx))),
+            shape=(len(self.maz_ids), len(self.zone_ids)),
+        )
+
+    @classmethod
+    def from_gdfs(cls, maz_gdf, zone_gdf, zone_id, maz_id="MAZ_NODE", max_workers=None):
+        from tm2py_utils.misc.geo_overlay import overlap_pairs
+        if zone_gdf.crs != maz_gdf.crs:
+            zone_gdf = zone_gdf.to_crs(maz_gdf.crs)
+        maz_idx, zone_idx, area = overlap_pairs(
+            np.asarray(maz_gdf.geometry.values), np.asarray(zone_gdf.geometry.values), max_workers=max_workers
+        )
+        return cls(maz_gdf[maz_id].to_numpy(), zone_gdf[zone_id].to_numpy(),
+                   maz_idx, zone_idx, area / SQUARE_METERS_PER_ACRE)
+
+    def to_frame(self, maz_id="MAZ_NODE", zone_id="zone_id"):
+        """Long table of the overlapping pairs: maz_id, zone_id, acres."""
+        coo = self.matrix.tocoo()
+        return pd.DataFrame({maz_id: self.maz_ids[coo.row], zone_id: self.zone_ids[coo.col], "acres": coo.data})
+
+    def save(self, path):
+        """Persist the pairs as positional indices plus acres (Parquet)."""
+        coo = self.matrix.tocoo()
+        pd.DataFrame({"maz_idx": coo.row, "zone_idx": coo.col, "acres": coo.data}).to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path, maz_ids, zone_ids):
+        pairs = pd.read_parquet(path)
+        return cls(maz_ids, zone_ids, pairs["maz_idx"], pairs["zone_idx"], pairs["acres"])
+
+    @property
+    def maz_zone_counts(self):
+        """Number of zones each MAZ overlaps."""
+        return np.diff(self.matrix.indptr)
+
+    def allocate(self, zone_values, maz_weights=None):
+        """
+        Split zone values to MAZs.
+
+        Each zone's value is shared among the MAZs overlapping it in proportion to
+        maz_weights (e.g. MAZ employment), or in proportion to overlap area for zones
+        whose overlapping MAZs have zero total weight (or when maz_weights is None).
+
+        Args:
+            zone_values (array-like): One value per zone, in zone_ids order
+            maz_weights (array-like, optional): One non-negative weight per MAZ, in maz_ids order
+        Returns:
+            np.ndarray: Allocated value per MAZ, in maz_ids order
+        """
+        return self.shares(maz_weights) @ np.nan_to_num(np.asarray(zone_values, dtype=float))
+
+    def shares(self, maz_weights=None):
+        """Column-normalized MAZ x zone share matrix used by allocate()."""
+        area = self.matrix
+        area_totals = np.asarray(area.sum(axis=0)).ravel()
+        area_share = area @ sparse.diags(np.divide(1.0, area_totals, out=np.zeros_like(area_totals),
+                                                   where=area_totals > 0))
+        if maz_weights is None:
+            return area_share.tocsr()
+
+        # every overlapping MAZ counts with its full weight, as in an overlay + groupby
+        weighted = sparse.diags(np.nan_to_num(np.asarray(maz_weights, dtype=float))) @ (area > 0).astype(float)
+        weight_totals = np.asarray(weighted.sum(axis=0)).ravel()
+        use_weight = weight_totals > 0
+        weight_share = weighted @ sparse.diags(np.divide(1.0, weight_totals, out=np.zeros_like(weight_totals),
+                                                         where=use_weight))
+        return (weight_share + area_share @ sparse.diags((~use_weight).astype(float))).tocsr()
+
+
+def get_maz_area_weights(maz_gdf, zone_gdf, zone_id, name, maz_id="MAZ_NODE", persist=True):
+    """
+    Return the MazAreaWeights of two polygon layers, loaded from the interim cache when built before.
+
+    The cache file is keyed by a hash of both layers' ids and geometries, so it is rebuilt
+    whenever either layer changes.
+
+    Args:
+        maz_gdf (GeoDataFrame): MAZ polygons with maz_id
+        zone_gdf (GeoDataFrame): Zone polygons (e.g. block groups) with zone_id
+        zone_id (str): Zone id column
+        name (str): Cache file prefix, e.g. 'maz_blockgroup'
+        maz_id (str): MAZ id column
+        persist (bool): If True, read and write the interim cache
+    Returns:
+        MazAreaWeights
+    """
+    if zone_gdf.crs != maz_gdf.crs:
+        zone_gdf = zone_gdf.to_crs(maz_gdf.crs)
+    digest = hashlib.sha256(str(maz_gdf.crs).encode())
+    for gdf, id_col in [(maz_gdf, maz_id), (zone_gdf, zone_id)]:
+        digest.update(pd.util.hash_pandas_object(gdf[id_col], index=False).to_numpy().tobytes())
+        digest.update(b"".join(shapely.to_wkb(np.asarray(gdf.geometry.values))))
+    cache_file = INTERIM_CACHE_DIR / f"{name}_weights_{digest.hexdigest()[:16]}.parquet"
+
+    if persist and cache_file.exists():
+        logging.info(f"Loading {name} area weights from {cache_file}")
+        return MazAreaWeights.load(cache_file, maz_gdf[maz_id].to_numpy(), zone_gdf[zone_id].to_numpy())
+
+    weights = MazAreaWeights.from_gdfs(maz_gdf, zone_gdf, zone_id, maz_id=maz_id)
+    if persist:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        weights.save(cache_file)
+        logging.info(f"Wrote {name} area weights to {cache_file}")
+    return weights
+
+
 def load_bay_area_places():
     """Load Census place boundaries for Bay Area counties."""
     # Set Census API key
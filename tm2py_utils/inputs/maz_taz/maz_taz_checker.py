@@ -30,6 +30,14 @@ The script attempts to fix them with split_taz_for_tract()
 
 This draft update is saved into blocks_mazs_tazs_v{version}.csv
 
+Incremental mode (--incremental previous_version):
+  - Compares the crosswalk with blocks_mazs_tazs_{previous_version}.csv and finds the changed blocks
+  - The affected MAZs/TAZs are those of the changed blocks (before and after the edit), of their neighboring
+    blocks, the TAZs of those MAZs and the MAZs of those TAZs
+  - Only the affected MAZs/TAZs are checked and fixed, re-dissolved, and re-joined to superdistricts/PUMAs
+  - The previous version's shapefiles and mapping CSVs are patched with the affected zones (and MAZ_SEQ/TAZ_SEQ
+    renumbered) and written as this version; if the versions are the same, they're patched in place
+
   Notes:
   - Block "06 075 017902 1009" (maz 10186, taz 592) is the little piece of Alameda island that the Census 2010
     calls San Francisco.  Left in SF as its own maz.
@@ -58,6 +66,7 @@ Input files:
   - CENSUS_BLOCK_NEIGHBOR_CSV
   - CENSUS_TRACT_PUMA
   - SUPERDISTRICT_FILE
+  - for incremental mode, blocks_mazs_tazs_{previous_version}.csv and the previous version's output files
 Output files:
   - shapefiles\\mazs_TM2_{version}.shp with columns:
     MAZ_NODE, COUNTYFP10, ALAND10, AWATER10, blockcount, TAZ_NODE, partcount, PERIM_MI, AREA_SQMI, psq_overa, acres, MAZ_X, MAZ_Y, MAZ_SEQ
@@ -92,6 +101,9 @@ import argparse, csv, logging, os, pathlib, sys, numpy, shutil
 import pandas
 import geopandas
 import pyproj
+import scipy.sparse
+
+from tm2py_utils.misc.zone_dissolve import dissolve_zones, shape_metrics
 
 # The script should be run from the tm2py-utils directory
 WORKSPACE          = pathlib.Path(".")
@@ -100,6 +112,8 @@ CROSSWALK_ROOT     = "blocks_mazs_tazs"
 # Set directory to the Census Block Version
 CENSUS_BLOCK_SHP   = pathlib.Path("M:\\Data\\Census\\Geography\\tl_2020_06_tabblock10\\tl_2020_06_tabblock10_9CBA.shp")
 CENSUS_BLOCK_COLS  = ["STATEFP10", "COUNTYFP10", "TRACTCE10", "BLOCKCE10", "GEOID10", "ALAND10", "AWATER10"]
+# GeoParquet copy of CENSUS_BLOCK_SHP in WGS84, refreshed when the shapefile is newer
+CENSUS_BLOCK_CACHE = WORKSPACE / "cache" / f"{CENSUS_BLOCK_SHP.stem}.parquet"
 
 CENSUS_BLOCK_NEIGHBOR_CSV = "E:\\GitHub\\tm2\\tm2py-utils\\tm2py_utils\\inputs\\maz_taz\\tl_2020_06_tabblock10_9CBA_neighbors.csv"
 CENSUS_TRACT_PUMA  = pathlib.Path("M:\\Data\\Census\\Geography\\tl_2010_06_puma10\\2010_Census_Tract_to_2010_PUMA.txt")
@@ -107,8 +121,15 @@ CENSUS_TRACT_PUMA_SHP = pathlib.Path("M:\\Data\\GIS layers\\Census\\2020\\tl_202
 
 SUPERDISTRICT_FILE = "E:\\GitHub\\tm2\\tm2py-utils\\tm2py_utils\\inputs\\maz_taz\\shapefiles\\travel_model_super_districts.shp"
 
+# dissolved MAZ/TAZ layers, cached by a hash of the crosswalk and block geometries
+DISSOLVE_CACHE_DIR = WORKSPACE / "cache" / "dissolve"
+
 MAZS_SHP           = "mazs_TM2"
 TAZS_SHP           = "tazs_TM2"
+MAZS_MAPPING_CSV   = "mazs_tazs_county_tract_PUMA"
+TAZS_MAPPING_CSV   = "tazs_county_tract_PUMA"
+# string columns of the mapping CSVs, to keep their leading zeros when patching
+MAPPING_STR_COLS   = {"COUNTYFP10":str, "TRACTCE10":str, "PUMA10":str, "PUMA20":str}
 
 # Default CRS for analysis
 LOCAL_CRS_FEET = "EPSG:2227"
@@ -119,85 +140,188 @@ FEET_PER_MILE = 5280
 NUM_ITER = 5
 
 
+def read_census_blocks() -> geopandas.GeoDataFrame:
+    """
+    Read CENSUS_BLOCK_SHP in WGS84_CRS.
+    The shapefile is read and reprojected once; later runs read the GeoParquet copy in CENSUS_BLOCK_CACHE.
+    """
+    if CENSUS_BLOCK_CACHE.exists() and CENSUS_BLOCK_CACHE.stat().st_mtime >= CENSUS_BLOCK_SHP.stat().st_mtime:
+        blocks_gdf = geopandas.read_parquet(CENSUS_BLOCK_CACHE)
+        logging.info(f"Reading {CENSUS_BLOCK_CACHE}; Read {len(blocks_gdf):,} rows")
+        return blocks_gdf
+
+    blocks_gdf = geopandas.read_file(CENSUS_BLOCK_SHP)
+    blocks_gdf.to_crs(WGS84_CRS,  inplace=True)
+    logging.info(f"Reading {CENSUS_BLOCK_SHP}; Read {len(blocks_gdf):,} rows")
+    CENSUS_BLOCK_CACHE.parent.mkdir(exist_ok=True)
+    blocks_gdf.to_parquet(CENSUS_BLOCK_CACHE)
+    logging.info(f"Cached blocks as {CENSUS_BLOCK_CACHE}")
+    return blocks_gdf
+
+class BlockNeighbors:
+    """
+    Census block neighbor table as a sparse adjacency keyed by integer block index.
+
+    Row i of `adjacency` holds the neighbors of block i with the shared border LENGTH as
+    the value; block i is `geoids[i]`.  Neighbor rows referring to blocks not in `geoids`
+    are dropped.  Block groups are stored as integer codes so same-block-group tests are
+    integer compares.
+    """
+    def __init__(self, geoids: numpy.ndarray, src: numpy.ndarray, nbr: numpy.ndarray, length: numpy.ndarray):
+        self.geoids = numpy.asarray(geoids, dtype=str)
+        self.index  = pandas.Index(self.geoids)
+        # the GEOID10 = state(2) + county(3) + tract(6) + block(4); block group is the first digit of the block
+        self.bg     = pandas.factorize(pandas.Series(self.geoids).str[:12])[0]
+
+        src_idx = self.index.get_indexer(src)
+        nbr_idx = self.index.get_indexer(nbr)
+        keep = (src_idx >= 0) & (nbr_idx >= 0)
+        if (~keep).any():
+            logging.debug(f"BlockNeighbors: dropping {(~keep).sum():,} neighbor rows for blocks not in the block table")
+        # stable sort by source block, so ties on LENGTH keep the neighbor file order
+        order = numpy.argsort(src_idx[keep], kind="stable")
+        self.nbr     = nbr_idx[keep][order]
+        self.length  = numpy.asarray(length, dtype=float)[keep][order]
+        self.indptr  = numpy.concatenate([[0], numpy.cumsum(numpy.bincount(src_idx[keep], minlength=len(self.geoids)))])
+        self.adjacency = scipy.sparse.csr_matrix((self.length, self.nbr, self.indptr), shape=(len(self.geoids), len(self.geoids)))
+
+    @classmethod
+    def from_csv(cls, neighbor_csv, geoids: numpy.ndarray):
+        """
+        Read the block neighbor file (src_GEOID10, nbr_GEOID10, LENGTH, NODE_COUNT) for the given blocks.
+        """
+        logging.info(f"Reading {neighbor_csv}")
+        neighbor_df = pandas.read_csv(neighbor_csv, usecols=["src_GEOID10","nbr_GEOID10","LENGTH"],
+                                      dtype={"src_GEOID10":str, "nbr_GEOID10":str, "LENGTH":float})
+        logging.debug(f"blocks_neighbor_df has length {len(neighbor_df):,}")
+        return cls(geoids, neighbor_df.src_GEOID10.to_numpy(), neighbor_df.nbr_GEOID10.to_numpy(), neighbor_df.LENGTH.to_numpy())
+
+    def longest_border_neighbor(self, blocks: numpy.ndarray, block_maz: numpy.ndarray) -> numpy.ndarray:
+        """
+        For each block index in blocks, the neighboring block in the same block group with a maz
+        (block_maz != 0) different from the block's own that shares the most border length.
+        Returns -1 for blocks without such a neighbor.
+        """
+        blocks = numpy.asarray(blocks, dtype=numpy.int64)
+        # expand the CSR rows of these blocks into one row per (candidate, edge)
+        counts  = self.indptr[blocks + 1] - self.indptr[blocks]
+        owner   = numpy.repeat(numpy.arange(len(blocks)), counts)
+        edges   = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts) + numpy.repeat(self.indptr[blocks], counts)
+        src     = blocks[owner]
+        nbr     = self.nbr[edges]
+        usable  = (self.bg[nbr] == self.bg[src]) & (block_maz[nbr] != 0) & (block_maz[nbr] != block_maz[src])
+        owner, nbr, length = owner[usable], nbr[usable], self.length[edges[usable]]
+
+        # longest border first within each block; first in file order on ties
+        order  = numpy.lexsort((-length, owner))
+        owner, nbr = owner[order], nbr[order]
+        first  = numpy.r_[True, owner[1:] != owner[:-1]] if len(owner) else numpy.zeros(0, dtype=bool)
+        best   = numpy.full(len(blocks), -1, dtype=numpy.int64)
+        best[owner[first]] = nbr[first]
+        return best
+
+
+def crosswalk_changes(
+        block_neighbors: BlockNeighbors,
+        previous_maz: numpy.ndarray,
+        previous_taz: numpy.ndarray,
+        crosswalk_maz: numpy.ndarray,
+        crosswalk_taz: numpy.ndarray
+    ) -> tuple:
+    """
+    Compares two block crosswalks, given as maz/taz arrays by block index.
+    Returns (changed block indices, affected mazs, affected tazs) where the affected zones are
+      - the previous and current zones of the changed blocks and the current zones of their neighboring blocks
+      - plus the tazs of those mazs, and then all mazs of those tazs
+    so that every affected maz has its taz affected and every affected taz has all its mazs affected.
+    """
+    changed = numpy.flatnonzero((previous_maz != crosswalk_maz) | (previous_taz != crosswalk_taz))
+    touched = numpy.union1d(changed, block_neighbors.adjacency[changed].indices)
+
+    mazs = numpy.union1d(previous_maz[changed], crosswalk_maz[touched])
+    tazs = numpy.union1d(previous_taz[changed], crosswalk_taz[touched])
+    tazs = numpy.union1d(tazs, crosswalk_taz[numpy.isin(crosswalk_maz, mazs)])
+    mazs = numpy.union1d(mazs, crosswalk_maz[numpy.isin(crosswalk_taz, tazs)])
+
+    # maz/taz 0 aren't real (and -1 is a block missing from the previous crosswalk)
+    return changed, mazs[mazs > 0], tazs[tazs > 0]
+
+def patch_zones(
+        previous_df: pandas.DataFrame,
+        zones_df: pandas.DataFrame,
+        node_col: str,
+        affected: numpy.ndarray
+    ) -> pandas.DataFrame:
+    """
+    Replaces the rows of previous_df for the affected zones (node_col in affected) with zones_df.
+    """
+    patched_df = pandas.concat([previous_df.loc[ ~previous_df[node_col].isin(affected)], zones_df], ignore_index=True)
+    logging.info(f"Patched {node_col}: dropped {previous_df[node_col].isin(affected).sum():,} previous rows, "
+                 f"added {len(zones_df):,} rows => {len(patched_df):,} rows")
+    return patched_df
+
 def move_small_block_to_neighbor(
         blocks_maz_df: pandas.DataFrame, 
-        blocks_neighbor_df: pandas.DataFrame,
+        block_neighbors: BlockNeighbors,
         maz_multiple_geo_df: pandas.DataFrame, 
         bigger_geo: str,
-        crosswalk_out_df: pandas.DataFrame
+        block_maz: numpy.ndarray,
+        crosswalk_maz: numpy.ndarray,
+        crosswalk_taz: numpy.ndarray
     ) -> int:
     """
     The simplest fix is to move small blocks to a neighboring maz/taz.
+
+    blocks_maz_df has the blocks with a maz and their integer block_index into block_neighbors;
+    block_maz is every block's maz at the start of this iteration (used to pick neighbors) and
+    crosswalk_maz/crosswalk_taz are the output crosswalk by block index, updated in place.
     Returns number of blocks moved.
     """
-    blocks_moved = 0
     logging.info(f"move_small_block_to_neighbor for {bigger_geo}")
-    for maz,row in maz_multiple_geo_df.iterrows():
-        logging.info(f"Attempting to fix maz {maz:6d}")
-
-        # these we'll leave; see Notes
-        if maz in EXEMPT_MAZ:
-            logging.info("Special exception -- skipping")
-            continue
-
-        # if it spans more than 3, leave it for now
-        if row[bigger_geo] > 3:
-            logging.info(f"Spans more than 3 {bigger_geo} elements {row[bigger_geo]} -- skipping")
-            continue
-
-        # if there's three, 25% or less of land area is ok to move
-        # if two, 32% or less of land area
-        if row[bigger_geo] == 3:
-            pct_threshold = 0.25
-        else:
-            pct_threshold = 0.32
-
-        # let's look at the blocks in this maz in the blocks_maz_df
-        this_maz_blocks_df = blocks_maz_df.loc[ blocks_maz_df.maz == maz]
-        logging.debug(f"\n{this_maz_blocks_df}")
-        this_maz_aland = this_maz_blocks_df.ALAND10.sum()
-
-        # check if the odd one or two out are smaller than the threshold
-        # Looping through the blocks in this maz and determining whichs are smaller than the threshold and can be moved to a neighboring block
-        this_maz_grouped = this_maz_blocks_df.groupby(bigger_geo)
-        for name,group in this_maz_grouped:
-            land_pct = group.ALAND10.sum()/this_maz_aland
-            logging.debug(f"group {name} has {len(group)} rows and {100.0*land_pct:.1f} percent of land")
-            logging.debug(f"\n{group}")
-
-            # is this land area too much to move?
-            if land_pct > pct_threshold: continue
-
-            # these blocks are candidates for moving -- let's look at where to move to
-            for block_index,block_row in group.iterrows():
-
-                # find the neighboring blocks
-                this_block_id = block_row["GEOID10"]
-                this_block_maz = block_row["maz"]
-                # look at neighbors for candidates
-                this_block_neighbors = blocks_neighbor_df.loc[blocks_neighbor_df.src_GEOID10 == this_block_id].copy()
-                # only neighbors in the same block group with maz/taz set and maz differs
-                this_block_neighbors = this_block_neighbors.loc[ (this_block_neighbors.nbr_GEOID10_BG == block_row["GEOID10_BG"]) &
-                                                                 (this_block_neighbors.maz != 0) &
-                                                                 (this_block_neighbors.maz != this_block_maz)]
-
-                if len(this_block_neighbors) == 0:
-                    logging.debug("  No neighbors in same block group with maz/taz")
-                    continue
-
-                # pick the neighboring block with the most length adjacent
-                this_block_neighbors.sort_values(by="LENGTH", ascending=False, inplace=True)
-                # print(this_block_neighbors)
-                this_neighbor_id = this_block_neighbors.nbr_GEOID10.iloc[0]
-                logging.info(f"  => block {this_block_id} picking up maz/taz from neighboring block {this_neighbor_id}")
-
-                # look up the neighbor's maz and taz to inherit
-                match_row = crosswalk_out_df.loc[ crosswalk_out_df.GEOID10 == this_neighbor_id]
-                crosswalk_out_df.loc[ crosswalk_out_df.GEOID10 == this_block_id, "maz"] = match_row["maz"].iloc[0]
-                crosswalk_out_df.loc[ crosswalk_out_df.GEOID10 == this_block_id, "taz"] = match_row["taz"].iloc[0]
-                blocks_moved += 1
-                logging.debug(f"\n{crosswalk_out_df.loc[ (crosswalk_out_df.GEOID10 == this_block_id)|(crosswalk_out_df.GEOID10 == this_neighbor_id) ]}")
 
+    # these we'll leave; see Notes
+    # if it spans more than 3, leave it for now
+    spans = maz_multiple_geo_df[bigger_geo]
+    spans = spans.loc[~spans.index.isin(EXEMPT_MAZ)]
+    for maz,span in spans.loc[spans > 3].items():
+        logging.info(f"maz {maz:6d} spans more than 3 {bigger_geo} elements {span} -- skipping")
+    spans = spans.loc[spans <= 3]
+
+    # if there's three, 25% or less of land area is ok to move
+    # if two, 32% or less of land area
+    blocks_df = blocks_maz_df.loc[blocks_maz_df.maz.isin(spans.index), ["maz", bigger_geo, "ALAND10", "block_index"]].copy()
+    blocks_df["pct_threshold"] = numpy.where(blocks_df.maz.map(spans) == 3, 0.25, 0.32)
+    blocks_df["row"]           = numpy.arange(len(blocks_df))
+    blocks_df["geo_code"]      = pandas.factorize(blocks_df[bigger_geo], sort=True)[0]
+
+    # check if the odd one or two out are smaller than the threshold
+    maz_aland   = blocks_df.groupby("maz").ALAND10.transform("sum")
+    group_aland = blocks_df.groupby(["maz", bigger_geo]).ALAND10.transform("sum")
+    land_pct    = group_aland / maz_aland
+    # (is this land area too much to move?  an maz without land area has no share to compare)
+    candidates_df = blocks_df.loc[~(land_pct > blocks_df.pct_threshold)]
+
+    # these blocks are candidates for moving -- pick the neighbor in the same block group with
+    # a different maz/taz that has the most length adjacent
+    neighbor = block_neighbors.longest_border_neighbor(candidates_df.block_index.to_numpy(), block_maz)
+    moves_df = candidates_df.assign(neighbor=neighbor).loc[neighbor >= 0]
+    logging.debug(f"{len(candidates_df):,} candidate blocks; {(neighbor < 0).sum():,} without neighbors in same block group with maz/taz")
+
+    # apply in maz, then bigger_geo, then block order so that a block whose chosen neighbor
+    # was moved earlier in this pass picks up the neighbor's new maz/taz
+    moves_df = moves_df.sort_values(["maz", "geo_code", "row"])
+    blocks, neighbors = moves_df.block_index.to_numpy(), moves_df.neighbor.to_numpy()
+    if numpy.isin(neighbors, blocks).any():
+        for block, neighbor in zip(blocks, neighbors):
+            crosswalk_maz[block] = crosswalk_maz[neighbor]
+            crosswalk_taz[block] = crosswalk_taz[neighbor]
+    else:
+        crosswalk_maz[blocks] = crosswalk_maz[neighbors]
+        crosswalk_taz[blocks] = crosswalk_taz[neighbors]
+    for block, neighbor in zip(blocks, neighbors):
+        logging.info(f"  => block {block_neighbors.geoids[block]} picking up maz/taz from neighboring block {block_neighbors.geoids[neighbor]}")
+
+    blocks_moved = len(moves_df)
     logging.info(f"====> moved {blocks_moved} blocks to neighbor")
     return blocks_moved
 
@@ -272,30 +396,39 @@ def split_taz_for_tract(
 
     return tazs_split
 
-def dissolve_into_shapefile(blocks_maz_gdf: geopandas.GeoDataFrame, maz_or_taz: str):
+def dissolve_into_shapefile(blocks_maz_gdf: geopandas.GeoDataFrame, maz_or_taz: str,
+                            previous_version: str = None, affected: numpy.ndarray = None):
     """
     Dissolve the blocks into final MAZ/TAZ shapefile
+
+    If previous_version is given, only the affected mazs/tazs are dissolved, and they replace
+    those zones in the previous version's shapefile.
     """
     try:
+        if previous_version:
+            blocks_maz_gdf = blocks_maz_gdf.loc[ blocks_maz_gdf[maz_or_taz].isin(affected)]
+            logging.info(f"Dissolving {len(affected):,} affected {maz_or_taz}s from {len(blocks_maz_gdf):,} blocks")
+
         # create maz_or_taz_gdf 
         if maz_or_taz == 'maz':
             agg_field = {'ALAND10':'sum', 'AWATER10':'sum', 'GEOID10':'count', 'taz':'first'}
         else:
             agg_field = {'ALAND10':'sum', 'AWATER10':'sum', 'GEOID10':'count', 'maz':'count'}
         
-        maz_or_taz_gdf = blocks_maz_gdf.dissolve(by = [maz_or_taz, 'COUNTYFP10'], aggfunc = agg_field, as_index = False)
+        # union the blocks county by county across a process pool; cached by the crosswalk
+        maz_or_taz_gdf = dissolve_zones(blocks_maz_gdf, [maz_or_taz, 'COUNTYFP10'], agg_field, partition='COUNTYFP10',
+                                        cache_dir=DISSOLVE_CACHE_DIR, name=f"{maz_or_taz}s")
         logging.debug(f"blocks_maz_gdf.crs:{blocks_maz_gdf.crs}")
         logging.debug(f"blocks_maz_gdf:\n{blocks_maz_gdf}")
-        # Calculate partcount -number of geometries in the multi
-        maz_or_taz_gdf['partcount'] = maz_or_taz_gdf.count_geometries()
-        logging.info(f'Calculated part count for {maz_or_taz}s')
 
-        # convert to local projected CRS first
-        maz_or_taz_gdf.to_crs(LOCAL_CRS_FEET, inplace=True)
+        # Calculate partcount -number of geometries in the multi, perimeter, area and centroid
+        # (lengths, areas and centroids in the local projected CRS; the boundaries stay in WGS84)
+        metrics_df = shape_metrics(maz_or_taz_gdf.geometry, LOCAL_CRS_FEET, WGS84_CRS)
+        maz_or_taz_gdf['partcount'] = metrics_df['partcount']
         # Add perimeter in miles and area in square miles
-        maz_or_taz_gdf['PERIM_MI'] = maz_or_taz_gdf.geometry.length / FEET_PER_MILE
-        maz_or_taz_gdf['AREA_SQMI']  = maz_or_taz_gdf.geometry.area / (FEET_PER_MILE*FEET_PER_MILE)
-        logging.info(f'Calculated perimeter length for {maz_or_taz}s')
+        maz_or_taz_gdf['PERIM_MI'] = metrics_df['perimeter'] / FEET_PER_MILE
+        maz_or_taz_gdf['AREA_SQMI']  = metrics_df['area'] / (FEET_PER_MILE*FEET_PER_MILE)
+        logging.info(f'Calculated part count, perimeter length and area for {maz_or_taz}s')
 
         # Add perimeter squared over area, or isoperimetric ratio
         # https://en.wikipedia.org/wiki/Isoperimetric_ratio - measure of how far from circular a shape is
@@ -307,32 +440,33 @@ def dissolve_into_shapefile(blocks_maz_gdf: geopandas.GeoDataFrame, maz_or_taz:
         maz_or_taz_gdf['acres'] = maz_or_taz_gdf['ALAND10'] / SQUARE_METERS_PER_ACRE
         logging.info(f'Calculated acres for {maz_or_taz}s')
 
+        # save centroid coords, created in LOCAL_CRS_FEET and transformed to WGS84
+        maz_or_taz_gdf[f'{maz_or_taz.upper()}_X'] = metrics_df['centroid_x']
+        maz_or_taz_gdf[f'{maz_or_taz.upper()}_Y'] = metrics_df['centroid_y']
+
         # Delete maz/taz = 0 since it is not a real maz/taz 
         maz_or_taz_gdf = maz_or_taz_gdf[maz_or_taz_gdf[maz_or_taz] != 0]
 
         # Rename fields for clarity
         maz_or_taz_gdf.rename(columns = {'GEOID10': 'blockcount'},inplace = True)
         if maz_or_taz == 'taz': maz_or_taz_gdf.rename(columns = {'maz': 'mazcount'}, inplace = True)
-
-        # Create centroids for mazs and tazs
-        logging.info(f"Creating centroids for {maz_or_taz}")
-        # create centroid in LOCAL_CRS_FEET and then transform back to WGS84
-        maz_or_taz_gdf["centroid"] = maz_or_taz_gdf.geometry.centroid.to_crs(WGS84_CRS)
-        # transform the boundary geometry back to WGS84
-        maz_or_taz_gdf.to_crs(WGS84_CRS, inplace=True)
         logging.debug(f"maz_or_taz_gdf with crs {WGS84_CRS}:\n{maz_or_taz_gdf}")
 
-        # save coords
-        maz_or_taz_gdf[f'{maz_or_taz.upper()}_X'] = maz_or_taz_gdf['centroid'].x
-        maz_or_taz_gdf[f'{maz_or_taz.upper()}_Y'] = maz_or_taz_gdf['centroid'].y
-        maz_or_taz_gdf.drop(columns=['centroid'],inplace=True)
-
         # rename to [MAZ,TAZ]_NODE or and create sequential version, [MAZ,TAZ]_SEQ
         maz_or_taz_gdf.sort_values(by=maz_or_taz, inplace=True)
         maz_or_taz_gdf.rename(columns={maz_or_taz:f"{maz_or_taz.upper()}_NODE"}, inplace=True)
         if maz_or_taz == "maz":
             maz_or_taz_gdf.rename(columns={"taz":f"TAZ_NODE"}, inplace=True)
 
+        shapefile_name = MAZS_SHP if maz_or_taz=="maz" else TAZS_SHP
+        output_dir = WORKSPACE / "shapefiles"
+        if previous_version:
+            previous_file = output_dir / f"{shapefile_name}_{previous_version.replace('.', '_')}.shp"
+            logging.info(f"Reading {previous_file}")
+            previous_gdf = geopandas.read_file(previous_file).to_crs(WGS84_CRS).drop(columns=[f"{maz_or_taz.upper()}_SEQ"])
+            maz_or_taz_gdf = patch_zones(previous_gdf, maz_or_taz_gdf[previous_gdf.columns], f"{maz_or_taz.upper()}_NODE", affected)
+            maz_or_taz_gdf.sort_values(by=f"{maz_or_taz.upper()}_NODE", inplace=True)
+
         maz_or_taz_gdf = maz_or_taz_gdf.reset_index(drop=True)
         maz_or_taz_gdf[f"{maz_or_taz.upper()}_SEQ"] = maz_or_taz_gdf.index + 1
         logging.debug(f"Final version of maz_or_taz_gdf for {maz_or_taz} len={len(maz_or_taz_gdf):,}:\n{maz_or_taz_gdf}")
@@ -345,8 +479,6 @@ def dissolve_into_shapefile(blocks_maz_gdf: geopandas.GeoDataFrame, maz_or_taz:
         logging.info(f"county_check_df for {maz_or_taz}:\n{county_check_df}")
 
         # Save the dissolved maz_or_taz_gdf
-        shapefile_name = MAZS_SHP if maz_or_taz=="maz" else TAZS_SHP
-        output_dir = WORKSPACE / "shapefiles"
         output_dir.mkdir(exist_ok=True)
         
         version_shp = VERSION.replace(".", "_")
@@ -364,9 +496,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=USAGE, formatter_class=argparse.RawDescriptionHelpFormatter,)
     parser.add_argument("crosswalk_csv", help = 'Block/MAZ/TAZ Crosswalk file to build the latest crosswalk from', metavar= 'blocks_mazs_tazs.csv' )
     parser.add_argument("version",help = 'Set the version of the MAZ/TAZs')
+    parser.add_argument("--incremental", metavar='previous_version',
+                        help = 'Only check, fix and re-dissolve the zones affected by changes since this version, patching its outputs')
     args = parser.parse_args()
 
     VERSION = args.version
+    PREVIOUS_VERSION = args.incremental
     CROSSWALK_CSV = pathlib.Path(args.crosswalk_csv)
     LOG_FILE = f"maz_taz_checker_{VERSION}.log"
     
@@ -397,9 +532,7 @@ if __name__ == '__main__':
      #######################################################
     # Create a GeoDataFrame from the 2010 block shapefile
     # and converting dataframe to the default analysis CRS
-    blocks_maz_shp = geopandas.read_file(CENSUS_BLOCK_SHP)
-    blocks_maz_shp.to_crs(WGS84_CRS,  inplace=True)
-    logging.info(f"Reading {CENSUS_BLOCK_SHP}; Read {len(blocks_maz_shp):,} rows")
+    blocks_maz_shp = read_census_blocks()
     logging.debug(blocks_maz_shp.head())
 
     logging.info(f"Reading crosswalk file: {CROSSWALK_CSV}")
@@ -416,8 +549,38 @@ if __name__ == '__main__':
     blocks_maz_shp = blocks_maz_shp.loc[ ~blocks_maz_shp.GEOID10.isin(FARALLON_ISLANDS)]
     block_count = len(blocks_maz_shp)
 
+    #####################################################
+    # Create a sparse adjacency from the 2010 block neighbor mapping, keyed by block index
+    # For use in move_small_block_to_neighbor()
+    block_neighbors = BlockNeighbors.from_csv(CENSUS_BLOCK_NEIGHBOR_CSV, blocks_maz_shp.GEOID10.to_numpy())
+
+    if PREVIOUS_VERSION:
+        # the previous crosswalk, by block index (-1 for blocks it doesn't have)
+        previous_csv = WORKSPACE / f"{CROSSWALK_ROOT}_{PREVIOUS_VERSION}.csv"
+        logging.info(f"Incremental mode: reading previous crosswalk file: {previous_csv}")
+        previous_df = pandas.read_csv(previous_csv).rename(columns={'MAZ_NODE':'maz','TAZ_NODE':'taz'})
+        previous_index = block_neighbors.index.get_indexer(previous_df['GEOID10'].astype(str).str.zfill(15))
+        previous_maz = numpy.full(block_count, -1, dtype=numpy.int64)
+        previous_taz = numpy.full(block_count, -1, dtype=numpy.int64)
+        previous_maz[previous_index[previous_index >= 0]] = previous_df['maz'].to_numpy()[previous_index >= 0]
+        previous_taz[previous_index[previous_index >= 0]] = previous_df['taz'].to_numpy()[previous_index >= 0]
+
     for x in range(1,NUM_ITER + 1,1):
         logging.info(f"Starting iteration {x} of {NUM_ITER}")
+
+        if PREVIOUS_VERSION:
+            # compared outside the try below, so changed_blocks and affected_* are always set
+            crosswalk_df['GEOID10'] = crosswalk_df['GEOID10'].astype(str).str.zfill(15)
+            current_index = block_neighbors.index.get_indexer(crosswalk_df['GEOID10'])
+            current_maz = numpy.zeros(block_count, dtype=numpy.int64)
+            current_taz = numpy.zeros(block_count, dtype=numpy.int64)
+            current_maz[current_index[current_index >= 0]] = crosswalk_df['maz'].to_numpy()[current_index >= 0]
+            current_taz[current_index[current_index >= 0]] = crosswalk_df['taz'].to_numpy()[current_index >= 0]
+            changed_blocks, affected_mazs, affected_tazs = crosswalk_changes(
+                block_neighbors, previous_maz, previous_taz, current_maz, current_taz)
+            logging.info(f"Incremental mode: {len(changed_blocks):,} blocks changed since {PREVIOUS_VERSION}; "
+                         f"checking {len(affected_mazs):,} mazs and {len(affected_tazs):,} tazs")
+
         try:        
 
             ########################################################
@@ -446,24 +609,14 @@ if __name__ == '__main__':
             blocks_maz_df["GEOID10_COUNTY"] = blocks_maz_df["GEOID10"].str[:5]
             logging.debug(f"\n{blocks_maz_df.head()}")
 
-            # this dataframe is the one we'll modify and output 
-            crosswalk_out_df = blocks_maz_df[["GEOID10","maz","taz","GEOID10_TRACT"]]
-
-            #####################################################
-            # Create a table from the 2010 block neighbor mapping
-            # For use in move_small_block_to_neighbor()
-            logging.info(f"Reading {CENSUS_BLOCK_NEIGHBOR_CSV}")
-            blocks_neighbor_df = pandas.read_csv(CENSUS_BLOCK_NEIGHBOR_CSV, dtype= {"src_GEOID10":str, "nbr_GEOID10":str, "LENGTH":float, "NODE_COUNT":int})
-            blocks_neighbor_df["nbr_GEOID10_BG"] = blocks_neighbor_df["nbr_GEOID10"].str[:12]
-            # get the maz/taz for these neighbors
-            blocks_neighbor_df = pandas.merge(
-                left    =blocks_neighbor_df,
-                right   =blocks_maz_df[["GEOID10","maz","taz"]],
-                how     ="left",
-                left_on ="nbr_GEOID10",
-                right_on="GEOID10")
-            logging.debug(f"blocks_neighbor_df has length {len(blocks_neighbor_df)}")
-            logging.debug(f"\n{blocks_neighbor_df.head()}")
+            # this crosswalk, by block index, is the one we'll modify and output
+            blocks_maz_df["block_index"] = block_neighbors.index.get_indexer(blocks_maz_df["GEOID10"])
+            crosswalk_maz = numpy.zeros(block_count, dtype=blocks_maz_df["maz"].dtype)
+            crosswalk_taz = numpy.zeros(block_count, dtype=blocks_maz_df["taz"].dtype)
+            crosswalk_maz[blocks_maz_df["block_index"]] = blocks_maz_df["maz"]
+            crosswalk_taz[blocks_maz_df["block_index"]] = blocks_maz_df["taz"]
+            # maz of every block as of the start of this iteration, for picking neighbors
+            block_maz = crosswalk_maz.copy()
 
         except Exception as err:
             logging.error(err.args[0])
@@ -501,6 +654,8 @@ if __name__ == '__main__':
         for bigger_geo in ["taz","GEOID10_COUNTY","GEOID10_TRACT","GEOID10_BG"]:
             maz_geo_df = blocks_maz_df[["maz",bigger_geo]].groupby(["maz"]).agg("nunique")
             maz_multiple_geo_df = maz_geo_df.loc[ (maz_geo_df[bigger_geo] > 1) & ( maz_geo_df.index.isin(EXEMPT_MAZ)==False) ]
+            if PREVIOUS_VERSION:
+                maz_multiple_geo_df = maz_multiple_geo_df.loc[ maz_multiple_geo_df.index.isin(affected_mazs)]
             if len(maz_multiple_geo_df) == 0:
                 logging.info(f"Verified one {bigger_geo} per maz")
                 continue
@@ -509,14 +664,21 @@ if __name__ == '__main__':
                 # warn and try to fix
                 logging.warning(f"Multiple {bigger_geo} for a single maz: {len(maz_multiple_geo_df)}")
                 logging.warning(f"\n{maz_multiple_geo_df.head(30)}")
-                blocks_moved += move_small_block_to_neighbor(blocks_maz_df, blocks_neighbor_df,
-                                                            maz_multiple_geo_df, bigger_geo, crosswalk_out_df)
+                blocks_moved += move_small_block_to_neighbor(blocks_maz_df, block_neighbors, maz_multiple_geo_df,
+                                                             bigger_geo, block_maz, crosswalk_maz, crosswalk_taz)
             else:
                 # fatal
                 logging.fatal(f"Multiple {bigger_geo} for a single maz: {len(maz_multiple_geo_df)}")
                 logging.fatal(f"\n{maz_multiple_geo_df.head(30)}")
                 sys.exit(2)
 
+        crosswalk_out_df = pandas.DataFrame({
+            "GEOID10"      : block_neighbors.geoids,
+            "maz"          : crosswalk_maz,
+            "taz"          : crosswalk_taz,
+            "GEOID10_TRACT": pandas.Series(block_neighbors.geoids).str[:11],
+        })
+
         # verify one TRACT/COUNTY per unique taz
         # error for COUNTY
         # warn/log for TRACT 
@@ -524,6 +686,8 @@ if __name__ == '__main__':
         for bigger_geo in ["GEOID10_TRACT","GEOID10_COUNTY"]:
             taz_geo_df = blocks_maz_df[["taz",bigger_geo]].groupby(["taz"]).agg("nunique")
             taz_multiple_geo_df = taz_geo_df.loc[ (taz_geo_df[bigger_geo] > 1) & (taz_geo_df.index.isin(EXEMPT_TAZ)==False) ]
+            if PREVIOUS_VERSION:
+                taz_multiple_geo_df = taz_multiple_geo_df.loc[ taz_multiple_geo_df.index.isin(affected_tazs)]
             if len(taz_multiple_geo_df) == 0:
                 logging.info(f"Verified one {bigger_geo} per taz")
                 continue
@@ -604,9 +768,28 @@ if __name__ == '__main__':
                                                                         'taz':['min','max']})
     logging.info(f"maz_taz_county_check:\n{maz_taz_county_check}")
 
+    if PREVIOUS_VERSION and len(changed_blocks) == 0:
+        logging.info(f"Incremental mode: no blocks changed since {PREVIOUS_VERSION} -- outputs are unchanged")
+        if VERSION != PREVIOUS_VERSION:
+            for shapefile_name in [MAZS_SHP, TAZS_SHP]:
+                previous_stem = f"{shapefile_name}_{PREVIOUS_VERSION.replace('.', '_')}"
+                for previous_file in (WORKSPACE / "shapefiles").glob(f"{previous_stem}.*"):
+                    shutil.copy(previous_file, previous_file.with_name(previous_file.name.replace(previous_stem, f"{shapefile_name}_{VERSION.replace('.', '_')}", 1)))
+            for mapping_csv in [MAZS_MAPPING_CSV, TAZS_MAPPING_CSV]:
+                logging.info(f"Copying {mapping_csv}_{PREVIOUS_VERSION}.csv to {mapping_csv}_{VERSION}.csv")
+                shutil.copy(f"{mapping_csv}_{PREVIOUS_VERSION}.csv", f"{mapping_csv}_{VERSION}.csv")
+        sys.exit(0)
+
     logging.info("Dissolving blocks into MAZs and TAZs")
-    maz_gdf = dissolve_into_shapefile(blocks_maz_gdf, "maz")
-    taz_gdf = dissolve_into_shapefile(blocks_maz_gdf, "taz")
+    maz_gdf = dissolve_into_shapefile(blocks_maz_gdf, "maz", PREVIOUS_VERSION, affected_mazs if PREVIOUS_VERSION else None)
+    taz_gdf = dissolve_into_shapefile(blocks_maz_gdf, "taz", PREVIOUS_VERSION, affected_tazs if PREVIOUS_VERSION else None)
+    # all mazs/tazs, for MAZ_SEQ/TAZ_SEQ; maz_gdf/taz_gdf become the (affected) zones joined to superdistricts and PUMAs
+    maz_seq_df = maz_gdf[['MAZ_NODE','MAZ_SEQ']]
+    taz_seq_df = taz_gdf[['TAZ_NODE','TAZ_SEQ']]
+    if PREVIOUS_VERSION:
+        maz_gdf = maz_gdf.loc[ maz_gdf.MAZ_NODE.isin(affected_mazs)]
+        taz_gdf = taz_gdf.loc[ taz_gdf.TAZ_NODE.isin(affected_tazs)]
+        blocks_maz_df = blocks_maz_df.loc[ blocks_maz_df.maz.isin(affected_mazs)]
 
     ## Join MAZs/TAZs to superdistricts and PUMA
     logging.info("Joining mazs/tazs to superdistricts and PUMA20")
@@ -698,7 +881,7 @@ if __name__ == '__main__':
     blocks_maz_df.rename(columns={'suprdistid':'DistID','taz':'TAZ_NODE'}, inplace=True)
     blocks_maz_df = pandas.merge(
         left=blocks_maz_df,
-        right=taz_gdf[['TAZ_NODE','TAZ_SEQ']],
+        right=taz_seq_df,
         how='left',
         on='TAZ_NODE',
         validate='many_to_one',
@@ -729,11 +912,24 @@ if __name__ == '__main__':
     logging.debug(f"dupe_maz:\n{dupe_maz}")
     assert(len(dupe_maz)==0)
 
-    output_mapping_file = f'mazs_tazs_county_tract_PUMA_{VERSION}.csv'
+    if PREVIOUS_VERSION:
+        previous_mapping_file = f'{MAZS_MAPPING_CSV}_{PREVIOUS_VERSION}.csv'
+        logging.info(f"Reading {previous_mapping_file}")
+        previous_mapping_df = pandas.read_csv(previous_mapping_file, dtype=MAPPING_STR_COLS)
+        blocks_maz_df = patch_zones(previous_mapping_df, blocks_maz_df, 'MAZ_NODE', affected_mazs)
+        # renumber to the patched shapefiles
+        blocks_maz_df['MAZ_SEQ'] = blocks_maz_df.MAZ_NODE.map(maz_seq_df.set_index('MAZ_NODE').MAZ_SEQ)
+        blocks_maz_df['TAZ_SEQ'] = blocks_maz_df.TAZ_NODE.map(taz_seq_df.set_index('TAZ_NODE').TAZ_SEQ)
+        blocks_maz_df.sort_values(by='MAZ_SEQ', inplace=True)
+        assert(blocks_maz_df['MAZ_NODE'].is_unique)
+
+    output_mapping_file = f'{MAZS_MAPPING_CSV}_{VERSION}.csv'
     logging.info(f"Writing {len(blocks_maz_df):,} rows to {output_mapping_file}")
     blocks_maz_df.to_csv(output_mapping_file, index=False)
 
     taz_tract_df = blocks_maz_df[['TAZ_NODE','TAZ_SEQ','COUNTY','county_name','COUNTYFP10','TRACTCE10','PUMA10', 'PUMA20','DistID', 'DistName']].drop_duplicates()
+    if PREVIOUS_VERSION:
+        taz_tract_df = taz_tract_df.loc[ taz_tract_df.TAZ_NODE.isin(affected_tazs)]
     logging.debug(f"taz_tract_df:\n{taz_tract_df}")
 
     # add taz centroid coordinates
@@ -747,11 +943,19 @@ if __name__ == '__main__':
     taz_tract_df = taz_tract_df.sort_values(by="TAZ_SEQ").reset_index(drop=True)
     logging.debug(f"taz_tract_df:\n{taz_tract_df}")
 
+    if PREVIOUS_VERSION:
+        previous_mapping_file = f'{TAZS_MAPPING_CSV}_{PREVIOUS_VERSION}.csv'
+        logging.info(f"Reading {previous_mapping_file}")
+        previous_mapping_df = pandas.read_csv(previous_mapping_file, dtype=MAPPING_STR_COLS)
+        taz_tract_df = patch_zones(previous_mapping_df, taz_tract_df, 'TAZ_NODE', affected_tazs)
+        taz_tract_df['TAZ_SEQ'] = taz_tract_df.TAZ_NODE.map(taz_seq_df.set_index('TAZ_NODE').TAZ_SEQ)
+        taz_tract_df = taz_tract_df.sort_values(by="TAZ_SEQ").reset_index(drop=True)
+
     # verify TAZs are unique
     dupe_taz = taz_tract_df.loc[ taz_tract_df['TAZ_NODE'].duplicated(keep=False)]
     assert(len(dupe_taz)==0)
 
-    output_mapping_file = f'tazs_county_tract_PUMA_{VERSION}.csv'
+    output_mapping_file = f'{TAZS_MAPPING_CSV}_{VERSION}.csv'
     logging.info(f"Writing {len(taz_tract_df):,} rows to {output_mapping_file}")
     taz_tract_df.to_csv(output_mapping_file, index=False)
     sys.exit(0)
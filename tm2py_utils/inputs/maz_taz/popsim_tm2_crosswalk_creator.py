@@ -132,6 +132,9 @@ import sys
 from pathlib import Path
 import logging
 
+from tm2py_utils.misc.geo_overlay import largest_overlap_assignment
+from tm2py_utils.misc.zone_dissolve import dissolve_zones
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -160,9 +163,12 @@ def add_aggregate_geography_columns(table_df):
         table_df["GEOID_tract"] = table_df["GEOID_block"].str[:11]
         table_df["GEOID_block group"] = table_df["GEOID_block"].str[:12]
 
-def create_basic_crosswalk(maz_shapefile, puma_shapefile, county_shapefile, output_file, verbose=True):
+def create_basic_crosswalk(maz_shapefile, puma_shapefile, county_shapefile, output_file, verbose=True, cache_dir=None):
     """
     Create basic TM2 crosswalk with area-based PUMA assignment
+
+    If cache_dir is given, the TAZ geometries dissolved from the MAZs are cached there,
+    keyed by the MAZ/TAZ assignment and MAZ geometries.
     """
     
     if verbose:
@@ -304,42 +310,23 @@ def create_basic_crosswalk(maz_shapefile, puma_shapefile, county_shapefile, outp
     if verbose:
         print(f"\\nStep 4: Assigning TAZs to PUMAs (area-based)...")
     
-    # Group MAZs by TAZ and union geometries
-    taz_geom = maz_gdf.dissolve(by=taz_col)
+    # Group MAZs by TAZ and union geometries (the MAZs are a coverage built from census blocks;
+    # unioned county by county in parallel when the county column is known)
+    taz_geom = dissolve_zones(maz_gdf, [taz_col], partition=county_col, cache_dir=cache_dir, name='tazs')
     
     if verbose:
         print(f"  Created {len(taz_geom)} TAZ geometries from {len(maz_gdf)} MAZs")
     
-    # Spatial join TAZs to PUMAs (area-based)
-    taz_puma_join = gpd.sjoin(taz_geom.reset_index(), puma_gdf[[puma_col, 'geometry']], 
-                              how='left', predicate='intersects')
+    # Assign each TAZ to the PUMA with the largest overlap (STRtree candidates, vectorized areas)
+    taz_puma = largest_overlap_assignment(taz_geom, taz_col, puma_gdf, [puma_col])
     
     if verbose:
-        print(f"  Initial TAZ-PUMA intersections: {len(taz_puma_join)}")
-    
-    # For TAZs that intersect multiple PUMAs, assign to the PUMA with largest overlap
-    taz_puma_areas = []
-    for taz_id in taz_puma_join[taz_col].unique():
-        taz_geom_single = taz_geom.loc[taz_id]
-        intersecting_pumas = taz_puma_join[taz_puma_join[taz_col] == taz_id]
-        
-        max_area = 0
-        best_puma = None
-        
-        for _, puma_row in intersecting_pumas.iterrows():
-            puma_geom = puma_gdf[puma_gdf[puma_col] == puma_row[puma_col]].geometry.iloc[0]
-            try:
-                intersection_area = taz_geom_single.geometry.intersection(puma_geom).area
-                if intersection_area > max_area:
-                    max_area = intersection_area
-                    best_puma = puma_row[puma_col]
-            except:
-                continue
-        
-        if best_puma:
-            taz_puma_areas.append({taz_col: taz_id, 'PUMA': best_puma})
+        print(f"  TAZs overlapping a PUMA: {taz_puma[puma_col].notna().sum()} of {len(taz_puma)}")
     
-    taz_puma_df = pd.DataFrame(taz_puma_areas)
+    taz_puma_df = (
+        taz_puma.dropna(subset=[puma_col])[[taz_col, puma_col]]
+        .rename(columns={puma_col: 'PUMA'})
+    )
     
     if verbose:
         print(f"  Final TAZ-PUMA assignments: {len(taz_puma_df)}")
@@ -349,36 +336,18 @@ def create_basic_crosswalk(maz_shapefile, puma_shapefile, county_shapefile, outp
     if verbose:
         print(f"\\nStep 4.5: Assigning PUMAs to counties (area-based)...")
     
-    # Get unique PUMAs from assignments
+    # Assign each assigned PUMA to the Bay Area county with the largest overlap
     unique_pumas = taz_puma_df['PUMA'].unique()
-    puma_county_assignments = []
-    
-    for puma_id in unique_pumas:
-        puma_geom = puma_gdf[puma_gdf[puma_col] == puma_id].geometry.iloc[0]
-        
-        max_area = 0
-        best_county = None
-        
-        # Calculate overlap with each Bay Area county
-        for _, county_row in county_gdf_filtered.iterrows():
-            try:
-                intersection = puma_geom.intersection(county_row.geometry)
-                if hasattr(intersection, 'area'):
-                    overlap_area = intersection.area
-                    if overlap_area > max_area:
-                        max_area = overlap_area
-                        best_county = county_row['fips_clean']
-            except:
-                continue
-        
-        if best_county:
-            puma_county_assignments.append({
-                'PUMA': puma_id, 
-                'COUNTY_FIPS': best_county,
-                'overlap_area': max_area
-            })
-    
-    puma_county_df = pd.DataFrame(puma_county_assignments)
+    puma_county = largest_overlap_assignment(
+        puma_gdf[puma_gdf[puma_col].isin(unique_pumas)], puma_col, county_gdf_filtered, ['fips_clean']
+    )
+    puma_county_df = (
+        puma_county.dropna(subset=['fips_clean'])
+        .sort_values('intersection_sq_m', ascending=False)
+        .drop_duplicates(puma_col)
+        .rename(columns={puma_col: 'PUMA', 'fips_clean': 'COUNTY_FIPS', 'intersection_sq_m': 'overlap_area'})
+        [['PUMA', 'COUNTY_FIPS', 'overlap_area']]
+    )
     
     if verbose:
         print(f"  PUMA-County assignments created: {len(puma_county_df)}")
@@ -737,6 +706,8 @@ def main():
                        help='Filename for basic crosswalk (default: geo_cross_walk_tm2_maz.csv)')
     parser.add_argument('--enhanced-output', type=str, default='geo_cross_walk_tm2_block10.csv',
                        help='Filename for enhanced crosswalk (default: geo_cross_walk_tm2_block10.csv)')
+    parser.add_argument('--cache-dir', type=Path, default=None,
+                       help='Directory to cache the TAZ geometries dissolved from the MAZ shapefile (default: no cache)')
     parser.add_argument('--verbose', action='store_true', default=True,
                        help='Print detailed progress information')
     
@@ -795,7 +766,8 @@ def main():
         args.puma_shapefile,
         args.county_shapefile,
         basic_output_file, 
-        args.verbose
+        args.verbose,
+        cache_dir=args.cache_dir
     )
     
     if basic_crosswalk is None:
@@ -1,147 +1,76 @@
-#transfer_truck_kfactors.py
+"""
+Scale the TM1 daily internal-external trip tables to the new TAZs.
 
-import os,sys
+Usage:
+    python scale_ix_to_new_tazs.py <base_dir>
 
-base_dir = sys.argv[1]
-ix_da_file = os.path.join(base_dir,'ix_trips','IXDailyDA.csv')
-ix_sr2_file = os.path.join(base_dir,'ix_trips','IXDailySR2.csv')
-ix_sr3_file = os.path.join(base_dir,'ix_trips','IXDailySR3.csv')
-ix_total_file = os.path.join(base_dir,'ix_trips','IXDailyTotal.csv')
-taz2old_file = os.path.join(base_dir,'output','taz_2_old.csv')
-taz_file = os.path.join(base_dir,'taz_data.csv')
-outfile = os.path.join(base_dir,'output','IXDaily2006x4.may2208.csv')
+Reads ix_trips/IXDaily{DA,SR2,SR3,Total}.csv (square matrices, first header cell is
+the mode), output/taz_2_old.csv (taz2old.py) and taz_data.csv under base_dir and
+writes output/IXDaily2006x4.may2208.csv: i, j (sequence numbers of the sorted new
+TAZs and externals) and one column per mode, for the OD pairs with trips.
 
-out_header = ['i','j'] #do this here so next step can get correct order
+Trips are split by the taz_2_old shares as a sparse product (C.T @ M @ C,
+zone_conversion) and rescaled per mode so the trips of old TAZs without new TAZs
+are not lost. Externals 1455-1475 map 1:1 to 900001-900021.
+"""
+import logging
+import os
+import sys
 
-print 'loading ix data'
-ix = {}
-for ix_file in [ix_da_file,ix_sr2_file,ix_sr3_file,ix_total_file]:
-    with open(ix_file) as f:
-        first = True
-        for row in f:
-            row = row.strip()
-            if len(row) == 0:
-                continue
-            row = row.split(',')
-            if first:
-                name = row[0]
-                out_header.append(name)
-                ix_data = {}
-                to_tazs = [0]
-                for i in range(1,len(row)):
-                    to_tazs.append(int(row[i]))
-                first = False
-                continue
-            from_taz = int(row[0])
-            for i in range(1,len(row)):
-                ix_data[(from_taz,to_tazs[i])] = float(row[i])
-        ix[name] = ix_data
+import numpy as np
+import pandas as pd
+from scipy import sparse
 
-old_tazs = to_tazs[1:]
+from zone_conversion import ZoneCorrespondence, read_square_matrix_csv
 
-print 'loading taz2old'
-taz2old = {}
-with open(taz2old_file) as f:
-    first = True
-    for row in f:
-        if first:
-            first = False
-            continue
-        row = row.strip()
-        if len(row) == 0:
-            continue
-        row = row.split(',')
-        taz = int(row[0])
-        oldtaz = int(row[1])
-        percentage = float(row[2])
-        taz2old[taz] = (oldtaz,percentage)
+logger = logging.getLogger(__name__)
 
-#add externals to taz2old)
-taz2old[900001] = (1455,1.0)
-taz2old[900002] = (1456,1.0)
-taz2old[900003] = (1457,1.0)
-taz2old[900004] = (1458,1.0)
-taz2old[900005] = (1459,1.0)
-taz2old[900006] = (1460,1.0)
-taz2old[900007] = (1461,1.0)
-taz2old[900008] = (1462,1.0)
-taz2old[900009] = (1463,1.0)
-taz2old[900010] = (1464,1.0)
-taz2old[900011] = (1465,1.0)
-taz2old[900012] = (1466,1.0)
-taz2old[900013] = (1467,1.0)
-taz2old[900014] = (1468,1.0)
-taz2old[900015] = (1469,1.0)
-taz2old[900016] = (1470,1.0)
-taz2old[900017] = (1471,1.0)
-taz2old[900018] = (1472,1.0)
-taz2old[900019] = (1473,1.0)
-taz2old[900020] = (1474,1.0)
-taz2old[900021] = (1475,1.0)
+# TM1 external stations (old TAZs) and their new TAZ numbers
+EXTERNALS_OLD = np.arange(1455, 1476)
+EXTERNALS_NEW = np.arange(900001, 900022)
 
 
-print 'loading taz data'
-tazs = []
-with open(taz_file) as f:
-    first = True
-    for row in f:
-        if first:
-            first = False
-            continue
-        row = row.strip()
-        if len(row) == 0:
-            continue
-        row = row.split(',')
-        tazs.append(int(row[1]))
-for taz in range(900001,900022):
-    tazs.append(taz)
+def main(base_dir):
+    ix_files = [os.path.join(base_dir, 'ix_trips', name) for name in
+                ['IXDailyDA.csv', 'IXDailySR2.csv', 'IXDailySR3.csv', 'IXDailyTotal.csv']]
+    taz2old_file = os.path.join(base_dir, 'output', 'taz_2_old.csv')
+    taz_file = os.path.join(base_dir, 'taz_data.csv')
+    outfile = os.path.join(base_dir, 'output', 'IXDaily2006x4.may2208.csv')
 
-print 'building rescale'
-#get not missing zones for rescaling
-not_missing_otazs = {}
-for taz in taz2old:
-    not_missing_otazs[taz2old[taz][0]] = None
+    logger.info('loading taz data')
+    tazs = np.sort(np.concatenate([pd.read_csv(taz_file).iloc[:, 1].to_numpy(), EXTERNALS_NEW]))
 
-rescale_factors = {}
-for mode in ix:
-    total = 0.0
-    captured = 0.0
-    ix_data = ix[mode]
-    for od in ix_data:
-        value = ix_data[od]
-        o,d = od
-        total += value
-        if (o in not_missing_otazs) and (d in not_missing_otazs):
-            captured += value
-    print str(total) + ':' + str(captured) + '  ' + mode
-    rescale_factors[mode] = total/captured
-print rescale_factors
+    logger.info('loading taz2old')
+    taz2old = pd.read_csv(taz2old_file)
+    externals = pd.DataFrame({'taz': EXTERNALS_NEW, 'oldtaz': EXTERNALS_OLD, 'percent': 1.0})
+    taz2old = pd.concat([taz2old, externals], ignore_index=True)
+    taz2old = taz2old[taz2old['taz'].isin(tazs)]
+    correspondence = ZoneCorrespondence.from_frame(taz2old, 'oldtaz', 'taz', 'percent', to_ids=tazs)
 
-print 'writing data'
-tazs.sort()
-modes = out_header[2:]
-with open(outfile,'wb') as f:
-    f.write(','.join(out_header) + os.linesep)
-    ocounter = 0
-    for otaz in tazs:
-        ocounter += 1
-        kotaz = -1
-        if otaz in taz2old:
-            kotaz,ofrac = taz2old[otaz]
-        dcounter = 0
-        for dtaz in tazs:
-            dcounter += 1
-            kdtaz = -1
-            if dtaz in taz2old:
-                kdtaz,dfrac = taz2old[dtaz]
-            kfactor = 1.0
-            if (kotaz > -1) and (kdtaz > -1): #skip if zero
-                line = [ocounter,dcounter]
-                vsum = 0.0
-                for mode in modes:
-                    value = ix[mode][(kotaz,kdtaz)]*ofrac*dfrac*rescale_factors[mode]
-                    line.append(value)
-                    vsum += value
-                if vsum > 0:
-                    f.write(','.join(map(str,line)) + os.linesep)
+    logger.info('loading ix data and rescaling')
+    modes, trips = [], []
+    for ix_file in ix_files:
+        mode, ids, ix = read_square_matrix_csv(ix_file)
+        # trips between old zones without new TAZs are redistributed over the captured ones
+        captured = correspondence.align_matrix(ids, ix)
+        total, captured_total = ix.sum(), captured.sum()
+        logger.info(f"{total}:{captured_total}  {mode}")
+        modes.append(mode)
+        trips.append(correspondence.convert_matrix(captured) * (total / captured_total))
 
+    logger.info('writing data')
+    # OD pairs with trips, as in the old vsum > 0 test
+    pairs = sum(trips).tocoo()
+    keep = pairs.data > 0
+    rows, cols = pairs.row[keep], pairs.col[keep]
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    out = pd.DataFrame({'i': rows + 1, 'j': cols + 1})
+    for mode, matrix in zip(modes, trips):
+        out[mode] = np.asarray(sparse.csr_matrix(matrix)[rows, cols]).ravel()
+    out.to_csv(outfile, index=False)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main(sys.argv[1])
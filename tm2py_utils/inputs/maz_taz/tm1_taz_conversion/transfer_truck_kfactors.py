@@ -1,68 +1,54 @@
-#transfer_truck_kfactors.py
+"""
+Transfer the TM1 truck k-factors to the new TAZs.
 
-import os,sys
+Usage:
+    python transfer_truck_kfactors.py <base_dir>
 
-base_dir = sys.argv[1]
-kfactor_file = os.path.join(base_dir,'truck_model','truck_kfactor.csv')
-taz2old_file = os.path.join(base_dir,'output','taz_2_old.csv')
-outfile = os.path.join(base_dir,'output','kfactors_taz.csv')
-taz_file = os.path.join(base_dir,'taz_data.csv')
+Reads truck_model/truck_kfactor.csv (one row per old TAZ, one column per old TAZ in
+order), output/taz_2_old.csv (taz2old.py) and taz_data.csv under base_dir and writes
+output/kfactors_taz.csv: i, j, kfactor for every pair of new TAZs.
 
-taz2old = {}
-with open(taz2old_file) as f:
-    first = True
-    for row in f:
-        if first:
-            first = False
-            continue
-        row = row.strip()
-        if len(row) == 0:
-            continue
-        row = row.split(',')
-        taz = int(row[0])
-        oldtaz = int(row[1])
-        taz2old[taz] = oldtaz
+Each new TAZ takes the k-factors of its old TAZ (A @ K @ A.T, zone_conversion); pairs
+with a new TAZ that has no old TAZ get 1.0.
+"""
+import logging
+import os
+import sys
 
-kfactors = {}
-with open(kfactor_file) as f:
-    first = True
-    for row in f:
-        if first:
-            first = False
-            continue
-        row = row.strip()
-        if len(row) == 0:
-            continue
-        row = row.split(',')
-        taz = int(row[0])
-        kfactors[taz] = [0] + map(float,row[1:])
+import numpy as np
+import pandas as pd
 
-tazs = []
-with open(taz_file) as f:
-    first = True
-    for row in f:
-        if first:
-            first = False
-            continue
-        row = row.strip()
-        if len(row) == 0:
-            continue
-        row = row.split(',')
-        tazs.append(int(row[1]))
+from zone_conversion import ZoneCorrespondence
 
-tazs.sort()
-with open(outfile,'wb') as f:
-    f.write(','.join(['i','j','kfactor']) + os.linesep)
-    for otaz in tazs:
-        kotaz = -1
-        if otaz in taz2old:
-            kotaz = taz2old[otaz]
-        for dtaz in tazs:
-            kdtaz = -1
-            if dtaz in taz2old:
-                kdtaz = taz2old[dtaz]
-            kfactor = 1.0
-            if (kotaz > -1) and (kdtaz > -1):
-                kfactor = kfactors[kotaz][kdtaz]
-            f.write(','.join(map(str,[otaz,dtaz,kfactor])) + os.linesep)
+logger = logging.getLogger(__name__)
 
+
+def main(base_dir):
+    kfactor_file = os.path.join(base_dir, 'truck_model', 'truck_kfactor.csv')
+    taz2old_file = os.path.join(base_dir, 'output', 'taz_2_old.csv')
+    outfile = os.path.join(base_dir, 'output', 'kfactors_taz.csv')
+    taz_file = os.path.join(base_dir, 'taz_data.csv')
+
+    tazs = np.sort(pd.read_csv(taz_file).iloc[:, 1].to_numpy())
+    taz2old = pd.read_csv(taz2old_file)
+    taz2old = taz2old[taz2old['taz'].isin(tazs)]
+    correspondence = ZoneCorrespondence.from_frame(taz2old, 'oldtaz', 'taz', to_ids=tazs)
+
+    # columns are old TAZs 1..n in order
+    kfactors = pd.read_csv(kfactor_file, index_col=0)
+    old_tazs = np.arange(1, kfactors.shape[1] + 1)
+    kfactors = kfactors.reindex(index=old_tazs, fill_value=0.0).to_numpy(dtype=float)
+    kfactors = correspondence.align_matrix(old_tazs, kfactors).toarray()
+
+    new_kfactors = correspondence.convert_attribute_matrix(kfactors, fill=1.0)
+    logger.info(f"writing {len(tazs)} x {len(tazs)} k-factors")
+    pd.DataFrame({
+        'i': np.repeat(tazs, len(tazs)),
+        'j': np.tile(tazs, len(tazs)),
+        'kfactor': new_kfactors.ravel(),
+    }).to_csv(outfile, index=False)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    main(sys.argv[1])
@@ -1,7 +1,7 @@
 @ECHO OFF
 
 SET TOTAL_TAZS_EXTERNALS=4709
-SET PYTHON=c:\Programs\Python27_32bit\python.exe
+SET PYTHON=python
 SET BASE_DIR=%~dp0
 
 %PYTHON% %BASE_DIR%\airport\taz2old.py %BASE_DIR%
@@ -0,0 +1,212 @@
+"""
+Zone system conversion of TM1 inputs: nearest-centroid correspondences and sparse re-scaling.
+
+Used by taz2old.py (airport trips), scale_ix_to_new_tazs.py (IX trips) and
+transfer_truck_kfactors.py (truck k-factors):
+
+    old = read_centroids("taz1454_lat_long.csv", "taz1454")
+    new = read_centroids("tazs_new_centroids.csv", "taz")
+    new2old = nearest_zone_ids(new, old)
+    correspondence = weighted_split(new2old, weights, fallback_weights)
+    new_trips = correspondence.convert_matrix(old_trips)
+
+- centroids are matched with a scipy.spatial.cKDTree (nearest or k nearest), in
+  the coordinates of the input files, replacing the all-pairs distance loop
+- a ZoneCorrespondence is a sparse (from zones x to zones) matrix of shares: the
+  share of a from zone's quantity that goes to each to zone
+- quantities (trips) convert as C.T @ M @ C; attributes (k-factors) are averaged
+  as A @ K @ A.T with A the row-normalized C.T, unmapped pairs get a fill value
+- zone ids are sorted and ties resolved by the order of the sorted ids, so the
+  same inputs always give the same outputs
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+
+def read_centroids(path, id_column, x_column="long", y_column="lat"):
+    """Centroid coordinates indexed by zone id, sorted by id."""
+    centroids = pd.read_csv(path, skipinitialspace=True)
+    centroids.columns = centroids.columns.str.strip()
+    return centroids.set_index(id_column)[[x_column, y_column]].astype(float).sort_index()
+
+
+def nearest_zones(points, centroids, k=1):
+    """
+    The k nearest centroids of each point.
+
+    Args:
+        points (DataFrame): coordinates (x, y columns) indexed by zone id
+        centroids (DataFrame): coordinates (x, y columns) indexed by zone id
+        k (int): neighbors per point
+
+    Returns:
+        DataFrame: zone, rank (1 = nearest), nearest (centroid zone id) and distance,
+        k rows per point
+    """
+    tree = cKDTree(centroids.to_numpy())
+    distances, indices = tree.query(points.to_numpy(), k=k)
+    distances, indices = distances.reshape(len(points), k), indices.reshape(len(points), k)
+    return pd.DataFrame({
+        "zone": np.repeat(points.index.to_numpy(), k),
+        "rank": np.tile(np.arange(1, k + 1), len(points)),
+        "nearest": centroids.index.to_numpy()[indices.ravel()],
+        "distance": distances.ravel(),
+    })
+
+
+def nearest_zone_ids(points, centroids):
+    """Series of the nearest centroid's zone id, indexed by the point zone ids."""
+    nearest = nearest_zones(points, centroids, k=1)
+    return pd.Series(nearest["nearest"].to_numpy(), index=nearest["zone"].to_numpy(), name="nearest")
+
+
+class ZoneCorrespondence:
+    """
+    Sparse share matrix from one zone system to another.
+
+    Args:
+        from_ids (array): sorted zone ids of the rows
+        to_ids (array): sorted zone ids of the columns
+        shares (sparse matrix): (from, to) share of the from zone going to the to zone
+    """
+
+    def __init__(self, from_ids, to_ids, shares):
+        self.from_ids = np.asarray(from_ids)
+        self.to_ids = np.asarray(to_ids)
+        self.shares = sparse.csr_matrix(shares)
+
+    @classmethod
+    def from_pairs(cls, from_zones, to_zones, shares=None, from_ids=None, to_ids=None):
+        """Correspondence from (from zone, to zone, share) triples; ids default to the zones present."""
+        from_zones, to_zones = np.asarray(from_zones), np.asarray(to_zones)
+        shares = np.ones(len(from_zones)) if shares is None else np.asarray(shares, dtype=float)
+        from_ids = np.unique(from_zones) if from_ids is None else np.sort(np.asarray(from_ids))
+        to_ids = np.unique(to_zones) if to_ids is None else np.sort(np.asarray(to_ids))
+        rows, cols = np.searchsorted(from_ids, from_zones), np.searchsorted(to_ids, to_zones)
+        if np.any(from_ids[np.minimum(rows, len(from_ids) - 1)] != from_zones) or \
+                np.any(to_ids[np.minimum(cols, len(to_ids) - 1)] != to_zones):
+            raise ValueError("Correspondence has zones missing from from_ids / to_ids")
+        matrix = sparse.coo_matrix((shares, (rows, cols)), shape=(len(from_ids), len(to_ids)))
+        return cls(from_ids, to_ids, matrix)
+
+    @classmethod
+    def from_frame(cls, df, from_column, to_column, share_column=None, **kwargs):
+        shares = None if share_column is None else df[share_column]
+        return cls.from_pairs(df[from_column], df[to_column], shares, **kwargs)
+
+    def to_frame(self, from_column="from", to_column="to", share_column="share"):
+        matrix = self.shares.tocoo()
+        df = pd.DataFrame({
+            from_column: self.from_ids[matrix.row],
+            to_column: self.to_ids[matrix.col],
+            share_column: matrix.data,
+        })
+        return df.sort_values([to_column, from_column], ignore_index=True)
+
+    def with_pairs(self, from_zones, to_zones, shares=None):
+        """Correspondence with extra pairs (e.g. externals kept 1:1) added."""
+        extra = pd.DataFrame({"from": from_zones, "to": to_zones, "share": 1.0 if shares is None else shares})
+        return self.from_frame(pd.concat([self.to_frame(), extra], ignore_index=True), "from", "to", "share")
+
+    def first_to_zone(self):
+        """Series of the lowest to zone id of each mapped from zone."""
+        df = self.to_frame()
+        return df.groupby("from")["to"].min()
+
+    def align_matrix(self, ids, values):
+        """Reorder a (ids x ids) matrix to from_ids x from_ids (from zones not in ids get zeros)."""
+        ids = np.asarray(ids)
+        positions = pd.Series(np.arange(len(self.from_ids)), index=self.from_ids).reindex(ids)
+        keep = positions.notna().to_numpy()
+        selector = sparse.coo_matrix(
+            (np.ones(keep.sum()), (positions[keep].astype(int).to_numpy(), np.flatnonzero(keep))),
+            shape=(len(self.from_ids), len(ids)),
+        ).tocsr()
+        values = sparse.csr_matrix(values)
+        return selector @ values @ selector.T
+
+    def convert_vector(self, values):
+        """Quantities of the from zones (array ordered as from_ids) split to the to zones."""
+        return self.shares.T @ np.asarray(values, dtype=float)
+
+    def convert_matrix(self, values):
+        """Quantity matrix of the from zones (ordered as from_ids) split to the to zones: C.T @ M @ C."""
+        values = sparse.csr_matrix(values)
+        return (self.shares.T @ values @ self.shares).tocsr()
+
+    def convert_attribute_matrix(self, values, fill=1.0):
+        """
+        Attribute matrix of the from zones (ordered as from_ids) for the to zones: A @ K @ A.T.
+
+        A is the transposed correspondence with rows normalized, so each to zone takes the
+        (share weighted) average of its from zones; pairs of unmapped to zones get fill.
+        """
+        weights = self.shares.T.tocsr()
+        totals = np.asarray(weights.sum(axis=1)).ravel()
+        mapped = totals > 0
+        weights = sparse.diags(np.where(mapped, 1 / np.where(mapped, totals, 1), 0)) @ weights
+        result = np.asarray(weights @ (weights @ np.asarray(values, dtype=float).T).T)
+        result[~mapped, :] = fill
+        result[:, ~mapped] = fill
+        return result
+
+
+def weighted_split(new2old, weights, fallback=None):
+    """
+    Correspondence from old to new zones splitting each old zone among the new zones nearest to it.
+
+    Args:
+        new2old (Series): old zone id of each new zone (indexed by new zone id)
+        weights (Series): weight of each new zone (e.g. population + 2.5 employment)
+        fallback (Series): weights used for old zones whose new zones all weigh 0 (e.g. area)
+
+    Returns:
+        ZoneCorrespondence: old -> new, each old zone's shares summing to 1 (the last new
+        zone takes the rounding remainder); old zones whose weights are all 0 split evenly
+    """
+    df = pd.DataFrame({"new": new2old.index.to_numpy(), "old": new2old.to_numpy()})
+    df["weight"] = weights.reindex(df["new"]).fillna(0).to_numpy()
+    if fallback is not None:
+        df["fallback"] = fallback.reindex(df["new"]).fillna(0).to_numpy()
+        use_fallback = df.groupby("old")["weight"].transform("sum") <= 0
+        df.loc[use_fallback, "weight"] = df.loc[use_fallback, "fallback"]
+    df = df.sort_values(["old", "new"], ignore_index=True)
+    totals = df.groupby("old")["weight"].transform("sum")
+    counts = df.groupby("old")["weight"].transform("size")
+    df["share"] = np.where(totals > 0, df["weight"] / totals.where(totals > 0, 1), 1 / counts)
+    # last new zone of each old zone takes the remainder so the shares sum to exactly 1
+    last = ~df["old"].duplicated(keep="last")
+    before = df.groupby("old")["share"].transform("sum") - df["share"]
+    df.loc[last, "share"] = 1.0 - before[last]
+    return ZoneCorrespondence.from_frame(df, "old", "new", "share")
+
+
+def inverse_distance_split(points, centroids, k=3, power=1.0):
+    """
+    Correspondence from centroids to points sharing each point among its k nearest centroids.
+
+    Each point takes its k nearest centroids with weights 1 / distance ** power (a centroid
+    on the point takes all); the result maps centroid zones (from) to point zones (to) and
+    is meant for attributes (convert_attribute_matrix), as centroid shares do not sum to 1.
+    """
+    nearest = nearest_zones(points, centroids, k)
+    exact = nearest["distance"] == 0
+    has_exact = exact.groupby(nearest["zone"]).transform("any")
+    weights = np.where(has_exact, exact.astype(float), 1 / np.maximum(nearest["distance"], 1e-300) ** power)
+    nearest["weight"] = weights / pd.Series(weights).groupby(nearest["zone"].to_numpy()).transform("sum").to_numpy()
+    return ZoneCorrespondence.from_frame(nearest, "nearest", "zone", "weight",
+                                         from_ids=centroids.index, to_ids=points.index)
+
+
+def read_square_matrix_csv(path):
+    """
+    (name, zone ids, sparse matrix) of a CSV with a header row of destination zones and
+    one row per origin zone; the first header cell is the matrix name.
+    """
+    df = pd.read_csv(path, index_col=0)
+    df.columns = df.columns.astype(int)
+    ids = np.union1d(df.index.astype(int), df.columns)
+    df = df.reindex(index=ids, columns=ids, fill_value=0.0)
+    return df.index.name, ids, sparse.csr_matrix(df.to_numpy(dtype=float))
@@ -1,124 +1,527 @@
+"""
+Archive a model run into a content-addressed store of 7z chunks.
+
+Used by ``tm2py-utils archive`` (cli.py) and runnable on its own:
+
+    python archive.py [create] <model_directory> <archive_directory> [-n name] [-j workers]
+    python archive.py ls <archive_directory> [run [pattern ...]]
+    python archive.py extract <archive_directory> <run> <target_directory> [pattern ...] [-j workers]
+
+- the selected run outputs (acceptance, CTRAMP, ctramp_output, demand_matrices,
+  emme_project without emmemat, inputs, logs, output_summaries) are hashed (sha256)
+  across a process pool
+- file contents are stored once per archive directory: a file whose hash is already
+  in any chunk of the archive directory (an earlier iteration, an earlier run of the
+  same inputs) is only recorded in the manifest, not compressed again
+- new contents are packed into chunks of up to CHUNK_SIZE files / CHUNK_BYTES bytes,
+  compressed with py7zr (zstd by default, or LZMA2 for chunks the bundled 7z.exe can
+  open) across a process pool, largest chunk first
+- the run manifest ``<archive_name>.manifest.json`` (path -> size, mtime, sha256,
+  chunk, offset) is rewritten atomically after every chunk, so an interrupted archive
+  is resumed by running the same command again: files already hashed or stored with
+  an unchanged size and mtime are skipped
+
+Layout of the archive directory:
+
+    <archive_directory>/
+        chunks/<chunk id>.7z                members are named by their sha256
+        <timestamp>_<name>.manifest.json    one per archived run
+
+Restoring reads the manifest, picks the files matching the glob patterns and
+extracts only the chunks holding them, in parallel, into the target directory
+(restore_files); a file in a 200 GB run costs one chunk of at most CHUNK_BYTES.
+"""
 #%%
-from itertools import chain, pairwise
-from pathlib import Path
 import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from fnmatch import fnmatchcase
+from itertools import chain
+from pathlib import Path
+
 import py7zr
 from tqdm import tqdm
-from datetime import datetime
-import subprocess
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+CHUNK_DIR = "chunks"
+
+# a chunk is closed at whichever limit it reaches first
+CHUNK_SIZE = 100
+CHUNK_BYTES = 512 * 2**20
+
+CODECS = {
+    "zstd": [{"id": py7zr.FILTER_ZSTD, "level": 3}],
+    "lzma2": [{"id": py7zr.FILTER_LZMA2, "preset": 6}],
+}
+
+# directories of the model run that are archived, and those excluded from them
+INCLUDED_GLOBS = [
+    "acceptance/**/*",
+    "CTRAMP/**/*",
+    "ctramp_output/**/*",
+    "demand_matrices/**/*",
+    "emme_project/**/*",
+    "inputs/**/*",
+    "logs/**/*",
+    "output_summaries/**/*",
+]
+EXCLUDED_GLOBS = [
+    "emme_project/*/emmemat",
+]
 
 #%%
 
-def archive(model_run_dir: Path | str, archive_dir: Path | str, name: str="", CHUNK_SIZE: int = 100):
+def files_to_archive(model_run_dir: Path) -> list[Path]:
+    """Files of the model run to archive, relative to model_run_dir."""
+    excluded_sub_directories = [
+        directory.resolve() for directory in chain(*(model_run_dir.glob(pattern) for pattern in EXCLUDED_GLOBS))
+    ]
+    files = []
+    for file in chain(*(model_run_dir.glob(pattern) for pattern in INCLUDED_GLOBS)):
+        if file.is_dir():
+            continue
+        resolved = file.resolve()
+        if any(resolved.is_relative_to(directory) for directory in excluded_sub_directories):
+            continue
+        files.append(file.relative_to(model_run_dir))
+    return sorted(set(files))
+
+
+def hash_file(path: Path | str) -> str:
+    """sha256 of a file's contents."""
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def _new_file_mode() -> int:
+    """Mode of a newly created file under the current umask; mkstemp files are 0600."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def compress_chunk(chunk_path: Path, members: list[tuple[str, str]], codec: str = "zstd") -> Path:
+    """
+    Write a 7z chunk with one member per (sha256, source file), named by the hash.
+
+    The chunk is written to a temporary file and moved into place, so a chunk that
+    exists is always complete.
+    """
+    fd, tmp = tempfile.mkstemp(dir=chunk_path.parent, suffix=".7z.tmp")
+    os.close(fd)
+    try:
+        with py7zr.SevenZipFile(tmp, "w", filters=CODECS[codec]) as seven_zip:
+            for digest, source in members:
+                seven_zip.write(source, arcname=digest)
+        os.chmod(tmp, _new_file_mode())
+        os.replace(tmp, chunk_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return chunk_path
+
+
+def read_manifest(path: Path) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def write_manifest(path: Path, manifest: dict):
+    """Atomically replace the manifest."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".json.tmp")
+    with os.fdopen(fd, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.chmod(tmp, _new_file_mode())
+    os.replace(tmp, path)
+
+
+def read_manifests(archive_dir: Path) -> dict[Path, dict]:
+    """All run manifests of an archive directory, by path."""
+    return {path: read_manifest(path) for path in sorted(archive_dir.glob(f"*{MANIFEST_SUFFIX}"))}
+
+
+def stored_blobs(manifests: dict[Path, dict], archive_dir: Path) -> dict[str, dict]:
+    """sha256 -> {chunk, offset} for every stored content whose chunk exists."""
+    blobs = {}
+    for manifest in manifests.values():
+        for entry in manifest["files"].values():
+            if entry.get("chunk") and entry["sha256"] not in blobs \
+                    and (archive_dir / entry["chunk"]).exists():
+                blobs[entry["sha256"]] = {"chunk": entry["chunk"], "offset": entry["offset"]}
+    return blobs
+
+
+def plan_chunks(pending: list[tuple[str, int, str]], chunk_size: int, chunk_bytes: int):
+    """
+    Group (sha256, size, source) contents into chunks, in the given order.
+
+    Returns:
+        list of (chunk id, [(sha256, source), ...], {sha256: offset}); the chunk id is
+        a hash of its members and the offset of a member is its position in the
+        uncompressed chunk
+    """
+    chunks, members, offsets, offset = [], [], {}, 0
+    for digest, size, source in pending:
+        if members and (len(members) >= chunk_size or offset + size > chunk_bytes):
+            chunks.append((members, offsets))
+            members, offsets, offset = [], {}, 0
+        members.append((digest, source))
+        offsets[digest] = offset
+        offset += size
+    if members:
+        chunks.append((members, offsets))
+    return [
+        (hashlib.sha256("".join(digest for digest, _ in members).encode()).hexdigest()[:16], members, offsets)
+        for members, offsets in chunks
+    ]
+
+
+def archive(model_run_dir: Path | str, archive_dir: Path | str, name: str="", CHUNK_SIZE: int = CHUNK_SIZE,
+            chunk_bytes: int = CHUNK_BYTES, codec: str = "zstd", max_workers: int | None = None) -> Path:
     """
     archive a model run by compressing a certain outputs of a model run and storing them in the archive folder
+
+    Contents already stored in the archive folder are not compressed again, and an unfinished
+    archive of the same model run (same folder) is resumed rather than started over.
+
+    Args:
+        model_run_dir: model run to archive
+        archive_dir: archive folder, shared by all archived runs
+        name: optional model run name, appended to the timestamp of the archive name
+        CHUNK_SIZE: maximum files per chunk
+        chunk_bytes: maximum uncompressed bytes per chunk (a larger file gets its own chunk)
+        codec: "zstd" or "lzma2"
+        max_workers: processes hashing and compressing; None uses os.cpu_count()
+    Returns:
+        path of the run manifest
     """
     # Coerce Types
-    if isinstance(model_run_dir, str):
-        model_run_dir = Path(model_run_dir).resolve()
-
-    if isinstance(archive_dir, str):
-        archive_dir = Path(archive_dir).resolve()
-    
-    # Get 7zip exe path, if you cant run this exe, you might be able to run another 
-    seven_zip_path = (Path(__file__).parent.parent / "bin" / "7z.exe").resolve()
-    assert seven_zip_path.exists(), f"expected to fine {seven_zip_path} but did not exist"
-    
-    # Get Name of the Archive File
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    if len(name) > 0:
-        archive_name = f"{timestamp}_{name}"
+    model_run_dir = Path(model_run_dir).resolve()
+    archive_dir = Path(archive_dir).resolve()
+    (archive_dir / CHUNK_DIR).mkdir(parents=True, exist_ok=True)
+    if codec not in CODECS:
+        raise ValueError(f"codec must be one of {list(CODECS)}, got {codec!r}")
+    workers = max_workers or os.cpu_count() or 1
+
+    manifests = read_manifests(archive_dir)
+    unfinished = [path for path, manifest in manifests.items()
+                  if manifest["source"] == str(model_run_dir) and not manifest["complete"]]
+    if unfinished:
+        manifest_path = unfinished[-1]
+        manifest = manifests[manifest_path]
+        archive_name = manifest["name"]
+        logger.info(f"Resuming archive {archive_name}")
     else:
-        archive_name = f"{timestamp}"
-    
-    archive_path = archive_dir / f"{archive_name}.7z"
-
-    
-    # Here we create all the subdirectories we explicitly want to include 
-    files_in_included_directories = list(
-        chain(
-            model_run_dir.glob("acceptance/**/*"), 
-            model_run_dir.glob("CTRAMP/**/*"), 
-            model_run_dir.glob("ctramp_output/**/*"), 
-            model_run_dir.glob("demand_matrices/**/*"), 
-            model_run_dir.glob("emme_project/**/*"), 
-            model_run_dir.glob("inputs/**/*"), 
-            model_run_dir.glob("logs/**/*"), 
-            model_run_dir.glob("output_summaries/**/*"), 
-        )
-    )
-    
-    # list of directories we want to exclude
-    excluded_sub_directories = list(
-        chain(
-            model_run_dir.glob("emme_project/*/emmemat"), 
-        )
-    )
-
-    # exclude everything that that is'nt a file, and is in an excluded sub directory 
-    files_to_archive = [file_to_archive.resolve() for file_to_archive in files_in_included_directories
-        if (
-            not any(
-                file_to_archive.resolve().is_relative_to(dir_to_exclude.resolve())
-                for dir_to_exclude in excluded_sub_directories
-            )
-        ) and (
-            not file_to_archive.is_dir()
-        )
-    ]
-    files_to_archive = [file.relative_to(model_run_dir) for file in files_to_archive]
-    
-    # using python bindings (above) is slower, we may be are better off just using 7z.exe
-    for start, end in tqdm(
-        list(
-            pairwise(
-                chain(
-                    range(0, len(files_to_archive), CHUNK_SIZE), 
-                    [len(files_to_archive)]
-                )
-            )
-        )
-    ):
-        # zip a chunk size 
-        cmd = [seven_zip_path, "a", str(archive_path)] + files_to_archive[start:end]
-
-        process = subprocess.Popen(
-            cmd,
-            cwd=model_run_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-
-        # Print or parse output line-by-line
-        for line in process.stdout:
-            print(line.strip())  # Could add parsing logic for progress indication
-
-        process.wait()
-
-        if process.returncode != 0:
-            raise RuntimeError("7z command failed.")
+        # Get Name of the Archive File
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        archive_name = f"{timestamp}_{name}" if len(name) > 0 else f"{timestamp}"
+        manifest_path = archive_dir / f"{archive_name}{MANIFEST_SUFFIX}"
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "name": archive_name,
+            "source": str(model_run_dir),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "codec": codec,
+            "complete": False,
+            "files": {},
+        }
+
+    # hashes of files unchanged since an earlier (or the interrupted) archive of this run
+    known = {}
+    for other in manifests.values():
+        if other["source"] == str(model_run_dir):
+            known.update({
+                (path, entry["size"], entry["mtime_ns"]): entry["sha256"] for path, entry in other["files"].items()
+            })
+
+    files = {}
+    for file in files_to_archive(model_run_dir):
+        stat = (model_run_dir / file).stat()
+        files[file.as_posix()] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    to_hash = [path for path, entry in files.items() if (path, entry["size"], entry["mtime_ns"]) not in known]
+    logger.info(f"Archiving {len(files):,} files of {model_run_dir} into {archive_dir}: "
+                f"{len(files) - len(to_hash):,} unchanged, {len(to_hash):,} to hash")
+
+    hashes = {}
+    if to_hash:
+        sources = [str(model_run_dir / path) for path in to_hash]
+        if workers <= 1:
+            digests = [hash_file(source) for source in tqdm(sources, desc="hashing")]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                digests = list(tqdm(pool.map(hash_file, sources, chunksize=16), total=len(sources), desc="hashing"))
+        hashes = dict(zip(to_hash, digests))
+    for path, entry in files.items():
+        entry["sha256"] = hashes.get(path) or known[(path, entry["size"], entry["mtime_ns"])]
+
+    # contents already in a chunk are only recorded; the rest is compressed once each
+    blobs = stored_blobs(manifests, archive_dir)
+    pending = {}
+    for path, entry in files.items():
+        if entry["sha256"] in blobs:
+            entry.update(blobs[entry["sha256"]])
+        else:
+            entry.update(chunk=None, offset=None)
+            pending.setdefault(entry["sha256"], (entry["size"], str(model_run_dir / path)))
+    manifest["files"] = files
+    write_manifest(manifest_path, manifest)
+
+    chunks = plan_chunks([(digest, size, source) for digest, (size, source) in pending.items()],
+                         CHUNK_SIZE, chunk_bytes)
+    logger.info(f"{len(files) - sum(entry['chunk'] is None for entry in files.values()):,} files already stored; "
+                f"compressing {len(pending):,} unique contents into {len(chunks):,} chunks")
+
+    paths_by_digest = {}
+    for path, entry in files.items():
+        paths_by_digest.setdefault(entry["sha256"], []).append(path)
+
+    def record(chunk_path, offsets):
+        chunk = chunk_path.relative_to(archive_dir).as_posix()
+        for digest, offset in offsets.items():
+            for path in paths_by_digest[digest]:
+                files[path].update(chunk=chunk, offset=offset)
+        write_manifest(manifest_path, manifest)
+
+    # largest chunks first so the pool isn't left waiting on one at the end
+    chunks.sort(key=lambda chunk: -sum(pending[digest][0] for digest, _ in chunk[1]))
+    progress = tqdm(total=len(chunks), desc="compressing")
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk_id, members, offsets in chunks:
+            record(compress_chunk(archive_dir / CHUNK_DIR / f"{chunk_id}.7z", members, codec), offsets)
+            progress.update()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(compress_chunk, archive_dir / CHUNK_DIR / f"{chunk_id}.7z", members, codec): offsets
+                for chunk_id, members, offsets in chunks
+            }
+            for future in as_completed(futures):
+                record(future.result(), futures[future])
+                progress.update()
+    progress.close()
+
+    manifest["complete"] = True
+    manifest["completed"] = datetime.now().isoformat(timespec="seconds")
+    write_manifest(manifest_path, manifest)
 
     # Success we want to mark the current directory as archived
     with open(model_run_dir / "ARCHIVED.txt", "w") as file:
         file.write(f"This model run {archive_name} has been archived into:\n")
-        file.write(f"{str(archive_path)}")
+        file.write(f"{str(manifest_path)}")
     print("Successfully Archived Model Run")
+    return manifest_path
+
+
+#%%
+
+def find_manifest(archive_dir: Path | str, run: str) -> Path:
+    """
+    Manifest of an archived run, by manifest path, archive name (``<timestamp>_<name>``)
+    or run name when that is unique in the archive folder.
+    """
+    if Path(run).suffix == ".json" and Path(run).exists():
+        return Path(run)
+    archive_dir = Path(archive_dir)
+    manifests = {path.name[:-len(MANIFEST_SUFFIX)]: path for path in sorted(archive_dir.glob(f"*{MANIFEST_SUFFIX}"))}
+    if run in manifests:
+        return manifests[run]
+    matches = [path for archive_name, path in manifests.items() if archive_name.endswith(f"_{run}")]
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        raise ValueError(f"{run!r} matches several archived runs: {[path.name for path in matches]}")
+    raise FileNotFoundError(f"No archived run {run!r} in {archive_dir}")
+
+
+def list_runs(archive_dir: Path | str) -> list[dict]:
+    """Name, source folder, creation time, completeness, file count and bytes of each archived run."""
+    return [
+        {
+            "name": manifest["name"],
+            "source": manifest["source"],
+            "created": manifest["created"],
+            "complete": manifest["complete"],
+            "files": len(manifest["files"]),
+            "bytes": sum(entry["size"] for entry in manifest["files"].values()),
+        }
+        for manifest in read_manifests(Path(archive_dir)).values()
+    ]
+
+
+def select_files(manifest: dict, patterns: list[str] | None = None) -> dict[str, dict]:
+    """
+    Manifest entries whose path matches any of the glob patterns (all entries if none).
+
+    Paths are relative to the model run with "/" separators; ``*`` also matches "/",
+    so ``*householdData_3.csv`` finds the file in any folder.
+    """
+    if not patterns:
+        return dict(manifest["files"])
+    return {
+        path: entry for path, entry in manifest["files"].items()
+        if any(fnmatchcase(path, pattern) for pattern in patterns)
+    }
+
+
+def extract_chunk(chunk_path: Path, targets: dict[str, list[tuple[str, int]]], target_dir: Path) -> int:
+    """
+    Extract members of one chunk to their model run paths.
 
+    Args:
+        chunk_path: 7z chunk
+        targets: member sha256 -> [(path relative to target_dir, mtime_ns), ...]
+        target_dir: folder the files are restored into
+    Returns:
+        number of files written
+    """
+    written = 0
+    with tempfile.TemporaryDirectory(dir=target_dir, prefix=".extract-") as tmp:
+        with py7zr.SevenZipFile(chunk_path) as seven_zip:
+            seven_zip.extract(path=tmp, targets=list(targets))
+        for digest, destinations in targets.items():
+            member = Path(tmp) / digest
+            for i, (path, mtime_ns) in enumerate(destinations):
+                destination = target_dir / path
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                # the last copy of a member is moved instead of copied
+                if i == len(destinations) - 1:
+                    os.replace(member, destination)
+                else:
+                    shutil.copyfile(member, destination)
+                os.utime(destination, ns=(mtime_ns, mtime_ns))
+                written += 1
+    return written
+
+
+def restore_files(archive_dir: Path | str, run: str, target_dir: Path | str, patterns: list[str] | None = None,
+                  max_workers: int | None = None) -> list[str]:
+    """
+    Extract the files of an archived run matching the glob patterns into target_dir.
+
+    Only the chunks holding the requested files are read, across a process pool;
+    restored files keep their relative paths and modification times.
+
+    Args:
+        archive_dir: archive folder
+        run: archived run (see find_manifest)
+        target_dir: folder to restore into, created if needed
+        patterns: glob patterns on the relative paths (see select_files); None restores the whole run
+        max_workers: processes extracting chunks; None uses os.cpu_count()
+    Returns:
+        relative paths of the restored files
+    """
+    archive_dir = Path(archive_dir).resolve()
+    target_dir = Path(target_dir).resolve()
+    target_dir.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(find_manifest(archive_dir, run))
+    selected = select_files(manifest, patterns)
+
+    unstored = sorted(path for path, entry in selected.items() if not entry.get("chunk"))
+    if unstored:
+        logger.warning(f"{len(unstored):,} matching files were not stored before the archive was interrupted, "
+                       f"e.g. {unstored[0]}")
+    by_chunk = {}
+    for path, entry in selected.items():
+        if entry.get("chunk"):
+            by_chunk.setdefault(entry["chunk"], {}).setdefault(entry["sha256"], []).append((path, entry["mtime_ns"]))
+    if not by_chunk:
+        logger.warning(f"No stored files of {manifest['name']} match {patterns}")
+        return []
+    logger.info(f"Restoring {sum(len(paths) for targets in by_chunk.values() for paths in targets.values()):,} "
+                f"files of {manifest['name']} from {len(by_chunk):,} chunks into {target_dir}")
+
+    workers = min(max_workers or os.cpu_count() or 1, len(by_chunk))
+    if workers <= 1:
+        for chunk, targets in by_chunk.items():
+            extract_chunk(archive_dir / chunk, targets, target_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(extract_chunk, archive_dir / chunk, targets, target_dir)
+                       for chunk, targets in by_chunk.items()]
+            for future in as_completed(futures):
+                future.result()
+    return sorted(path for path, entry in selected.items() if entry.get("chunk"))
+
+
+ARCHIVE_ACTIONS = ("create", "ls", "extract")
 
 
 def parse_cli_archive(args):
-    archive(args.model_directory, args.archive_directory, args.name)
+    archive(args.model_directory, args.archive_directory, args.name,
+            codec=args.codec, max_workers=args.workers)
 
-def main():
-    parser = argparse.ArgumentParser(description="Archive utility")
+def parse_cli_ls(args):
+    if args.run is None:
+        for run in list_runs(args.archive_directory):
+            status = "complete" if run["complete"] else "partial"
+            print(f"{run['name']:<40} {status:<9} {run['files']:>9,} files {run['bytes'] / 2**30:>9.2f} GB  {run['source']}")
+        return
+    manifest = read_manifest(find_manifest(args.archive_directory, args.run))
+    for path, entry in sorted(select_files(manifest, args.patterns).items()):
+        print(f"{entry['size']:>14,}  {entry.get('chunk') or '(not stored)':<30} {path}")
+
+def parse_cli_extract(args):
+    restored = restore_files(args.archive_directory, args.run, args.target_directory, args.patterns,
+                             max_workers=args.workers)
+    print(f"Restored {len(restored):,} files into {args.target_directory}")
+
+def add_archive_arguments(parser):
     parser.add_argument("model_directory", help="Directory of model run to archive")
     parser.add_argument("archive_directory", help="Directory where the models would like to be archived")
-    args = parser.parse_args()
+    parser.add_argument("-n", "--name", help="Optional model run name", default="")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Processes hashing and compressing files (default: all cores)")
+    parser.add_argument("--codec", choices=list(CODECS), default="zstd",
+                        help="Chunk compression; lzma2 chunks can also be opened with 7z.exe (default: zstd)")
+
+def add_archive_subcommands(parser):
+    """create / ls / extract actions of the archive command."""
+    actions = parser.add_subparsers(dest="archive_action", required=True)
+
+    create_parser = actions.add_parser("create", help="Archive a model run (the default action)")
+    add_archive_arguments(create_parser)
+    create_parser.set_defaults(func=parse_cli_archive)
+
+    ls_parser = actions.add_parser("ls", help="List archived runs, or the files of one run")
+    ls_parser.add_argument("archive_directory", help="Archive directory")
+    ls_parser.add_argument("run", nargs="?", help="Archived run name; lists the runs if omitted")
+    ls_parser.add_argument("patterns", nargs="*", help="Glob patterns on the file paths, e.g. '*householdData_3.csv'")
+    ls_parser.set_defaults(func=parse_cli_ls)
+
+    extract_parser = actions.add_parser("extract", help="Restore files of an archived run")
+    extract_parser.add_argument("archive_directory", help="Archive directory")
+    extract_parser.add_argument("run", help="Archived run name")
+    extract_parser.add_argument("target_directory", help="Directory to restore the files into")
+    extract_parser.add_argument("patterns", nargs="*", help="Glob patterns on the file paths (default: the whole run)")
+    extract_parser.add_argument("-j", "--workers", type=int, default=None,
+                                help="Processes extracting chunks (default: all cores)")
+    extract_parser.set_defaults(func=parse_cli_extract)
+
+def default_archive_action(argv, position=0):
+    """Insert "create" after the archive command so "archive <model> <dest>" keeps working."""
+    argv = list(argv)
+    if len(argv) > position and argv[position] not in ARCHIVE_ACTIONS + ("-h", "--help"):
+        argv.insert(position, "create")
+    return argv
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive utility")
+    add_archive_subcommands(parser)
+    args = parser.parse_args(default_archive_action(sys.argv[1:]))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
     # Your logic here
-    archive(args.model_directory, args.archive_directory)
+    args.func(args)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
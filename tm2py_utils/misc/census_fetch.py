@@ -0,0 +1,355 @@
+"""
+Shared Census / CTPP / PUMS fetch client.
+
+One client for every census pull in tm2py-utils (the TAZ data pipeline in
+inputs/create_taz_data_tm1 and the validation data builds in summary/data):
+
+- bounded-concurrency requests, e.g. one request per county and table
+- disk-backed response cache keyed by the full query (API keys excluded)
+- one retry policy (exponential backoff on connection errors, 429 and 5xx)
+- a replay mode that serves responses only from the cache, so builds can be
+  rerun offline
+
+Modes:
+    online   always call the API, never touch the cache
+    cache    read from the cache, call the API on a miss and store the response (default)
+    refresh  always call the API and overwrite the cache
+    replay   serve from the cache only; a miss raises CacheMissError
+
+The base url is configurable, so a local stand-in server can be used for testing.
+
+Example:
+    client = CensusFetchClient(api_key, cache_dir="cache/census_api")
+    records = client.census_by_county(2023, "acs/acs5", ["B01003_001E"], "tract", "06", ["001", "013"])
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CENSUS_API_URL = "https://api.census.gov/data"
+CTPP_API_URL = "https://ctppdata.transportation.org/api"
+
+MODES = ("online", "cache", "refresh", "replay")
+
+# The census API accepts at most 50 variables per call
+MAX_CENSUS_VARIABLES = 50
+
+# Query parameters and headers that never take part in the cache key
+SECRET_PARAMS = {"key"}
+SECRET_HEADERS = {"x-api-key", "authorization"}
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a query is not in the cache."""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry policy shared by every request made through the client.
+
+    Attributes:
+        max_retries: Number of retries after the first attempt
+        backoff: Seconds to wait before the first retry
+        backoff_factor: Multiplier applied to the wait after each retry
+        retry_statuses: HTTP status codes that are retried
+        timeout: Per-request timeout in seconds
+    """
+    max_retries: int = 3
+    backoff: float = 2.0
+    backoff_factor: float = 2.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    timeout: float = 120.0
+
+    def wait(self, attempt: int) -> float:
+        """Seconds to sleep before retry number `attempt` (1-based)."""
+        return self.backoff * self.backoff_factor ** (attempt - 1)
+
+
+@dataclass
+class FetchRequest:
+    """One GET request: url, query parameters and headers."""
+    url: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def cache_key(request: FetchRequest) -> str:
+    """Hash of the full query (url, sorted params, non-secret headers)."""
+    payload = {
+        "url": request.url,
+        "params": sorted((k, str(v)) for k, v in request.params.items() if k not in SECRET_PARAMS),
+        "headers": sorted((k.lower(), str(v)) for k, v in request.headers.items()
+                          if k.lower() not in SECRET_HEADERS),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CensusFetchClient:
+    """
+    Concurrent, retrying, cached HTTP client for Census-style JSON APIs.
+
+    Args:
+        api_key: Census API key, added as the `key` query parameter of census calls
+        cache_dir: Directory for cached responses. Required for cache/refresh/replay modes
+        mode: One of 'online', 'cache', 'refresh', 'replay'
+        max_workers: Maximum number of requests in flight
+        retry: Retry policy shared by all requests
+        base_url: Census API root; point at a local stand-in server for tests
+        session: Optional requests.Session to reuse
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache_dir: Optional[Path | str] = None,
+        mode: str = "cache",
+        max_workers: int = 8,
+        retry: Optional[RetryPolicy] = None,
+        base_url: str = CENSUS_API_URL,
+        session: Optional[requests.Session] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got '{mode}'")
+        if mode != "online" and cache_dir is None:
+            raise ValueError(f"mode '{mode}' requires a cache_dir")
+
+        self.api_key = api_key
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.mode = mode
+        self.max_workers = max(1, int(max_workers))
+        self.retry = retry or RetryPolicy()
+        self.base_url = base_url.rstrip("/")
+        self.session = session or requests.Session()
+        self.stats = {"hits": 0, "misses": 0, "requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, fetch_cfg: Dict[str, Any], api_key: Optional[str] = None, **kwargs) -> "CensusFetchClient":
+        """
+        Build a client from a `census_fetch:` config block.
+
+        The TM2PY_CENSUS_FETCH_MODE environment variable overrides the configured
+        mode, e.g. to replay a pipeline offline without editing the config.
+        """
+        fetch_cfg = fetch_cfg or {}
+        retry = RetryPolicy(
+            max_retries=fetch_cfg.get("max_retries", 3),
+            backoff=fetch_cfg.get("backoff_seconds", 2.0),
+        )
+        return cls(
+            api_key=api_key,
+            cache_dir=fetch_cfg.get("cache_dir"),
+            mode=os.environ.get("TM2PY_CENSUS_FETCH_MODE", fetch_cfg.get("mode", "cache")),
+            max_workers=fetch_cfg.get("max_workers", 8),
+            retry=retry,
+            base_url=fetch_cfg.get("base_url", CENSUS_API_URL),
+            **kwargs,
+        )
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    # ------------------------------------------------------------------
+    # cache
+    # ------------------------------------------------------------------
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _read_cache(self, request: FetchRequest) -> Tuple[bool, Any]:
+        path = self._cache_path(cache_key(request))
+        if not path.exists():
+            return False, None
+        with open(path, "r", encoding="utf-8") as f:
+            return True, json.load(f)["body"]
+
+    def _write_cache(self, request: FetchRequest, body: Any):
+        path = self._cache_path(cache_key(request))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "url": request.url,
+            "params": {k: v for k, v in request.params.items() if k not in SECRET_PARAMS},
+            "fetched": datetime.now().isoformat(timespec="seconds"),
+            "body": body,
+        }
+        # write to a temp file first so concurrent readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # requests
+    # ------------------------------------------------------------------
+    def _get(self, request: FetchRequest) -> Any:
+        for attempt in range(self.retry.max_retries + 1):
+            try:
+                self._count("requests")
+                response = self.session.get(
+                    request.url, params=request.params, headers=request.headers,
+                    timeout=self.retry.timeout,
+                )
+                if response.status_code in self.retry.retry_statuses and attempt < self.retry.max_retries:
+                    raise requests.exceptions.HTTPError(f"{response.status_code} from {request.url}")
+                response.raise_for_status()
+                return response.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                retryable = not isinstance(e, requests.exceptions.HTTPError) or (
+                    e.response is None or e.response.status_code in self.retry.retry_statuses
+                )
+                if not retryable or attempt == self.retry.max_retries:
+                    logger.error(f"Request failed after {attempt + 1} attempt(s): {request.url} {e}")
+                    raise
+                wait = self.retry.wait(attempt + 1)
+                self._count("retries")
+                logger.warning(f"Request attempt {attempt + 1} failed ({e}); retrying in {wait:.1f}s")
+                time.sleep(wait)
+
+    def fetch(self, request: FetchRequest) -> Any:
+        """Fetch one request as parsed JSON, honoring the cache mode."""
+        if self.mode in ("cache", "replay"):
+            hit, body = self._read_cache(request)
+            if hit:
+                self._count("hits")
+                return body
+            self._count("misses")
+            if self.mode == "replay":
+                raise CacheMissError(f"Not in cache (replay mode): {request.url} {request.params}")
+
+        body = self._get(request)
+        if self.mode in ("cache", "refresh"):
+            self._write_cache(request, body)
+        return body
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                 headers: Optional[Dict[str, str]] = None) -> Any:
+        """Fetch a single url with query parameters as parsed JSON."""
+        return self.fetch(FetchRequest(url, dict(params or {}), dict(headers or {})))
+
+    def fetch_many(self, fetch_requests: Sequence[FetchRequest]) -> List[Any]:
+        """
+        Fetch many requests with at most `max_workers` in flight.
+
+        Results are returned in the order of `fetch_requests`; the first failure is raised.
+        """
+        return self.map(self.fetch, fetch_requests)
+
+    def map(self, func: Callable[[Any], Any], items: Sequence[Any]) -> List[Any]:
+        """Apply `func` to every item on the client's worker pool, preserving order."""
+        items = list(items)
+        if len(items) <= 1 or self.max_workers == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            return list(pool.map(func, items))
+
+    # ------------------------------------------------------------------
+    # census api helpers
+    # ------------------------------------------------------------------
+    def census_request(
+        self,
+        year: int,
+        dataset: str,
+        variables: Sequence[str],
+        for_geo: str,
+        state: Optional[str] = None,
+        county: Optional[str] = None,
+        extra_params: Optional[Dict[str, Any]] = None,
+    ) -> FetchRequest:
+        """
+        Build one census API request, e.g. ACS tract variables for one county.
+
+        `for_geo` is either a geography name ('tract' -> 'tract:*') or a full
+        'geography:codes' clause.
+        """
+        params = {
+            "get": ",".join(variables),
+            "for": for_geo if ":" in for_geo else f"{for_geo}:*",
+        }
+        if state:
+            params["in"] = f"state:{state}" + (f" county:{county}" if county else "")
+        params.update(extra_params or {})
+        if self.api_key:
+            params["key"] = self.api_key
+        return FetchRequest(f"{self.base_url}/{year}/{dataset}", params)
+
+    @staticmethod
+    def records_from_array(body: List[List[Any]]) -> List[Dict[str, Any]]:
+        """Convert a census API array response (header row + rows) to a list of dicts."""
+        if not body:
+            return []
+        header = body[0]
+        return [dict(zip(header, row)) for row in body[1:]]
+
+    def census_records(
+        self,
+        year: int,
+        dataset: str,
+        variables: Sequence[str],
+        for_geo: str,
+        state: Optional[str] = None,
+        counties: Optional[Sequence[str]] = None,
+        extra_params: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch census variables as a list of dicts, one per geography.
+
+        Requests are split per county and into chunks of at most 50 variables,
+        all fetched concurrently; variable chunks are merged back on the
+        geography columns.
+        """
+        variables = list(variables)
+        chunk_size = MAX_CENSUS_VARIABLES - 1
+        chunks = [variables[i:i + chunk_size] for i in range(0, len(variables), chunk_size)] or [[]]
+        county_list = list(counties) if counties else [None]
+
+        fetch_requests = [
+            self.census_request(year, dataset, chunk, for_geo, state, county, extra_params)
+            for county in county_list
+            for chunk in chunks
+        ]
+        bodies = self.fetch_many(fetch_requests)
+
+        records: List[Dict[str, Any]] = []
+        for i in range(len(county_list)):
+            merged: Dict[Tuple, Dict[str, Any]] = {}
+            for chunk, body in zip(chunks, bodies[i * len(chunks):(i + 1) * len(chunks)]):
+                for rec in self.records_from_array(body):
+                    geo_key = tuple((k, v) for k, v in rec.items() if k not in chunk)
+                    merged.setdefault(geo_key, {}).update(rec)
+            records.extend(merged.values())
+        return records
+
+    def census_by_county(
+        self,
+        year: int,
+        dataset: str,
+        variables: Sequence[str],
+        for_geo: str,
+        state: str,
+        counties: Sequence[str],
+    ) -> List[Dict[str, Any]]:
+        """Fetch `for_geo` records within each county concurrently (one request per county and chunk)."""
+        return self.census_records(year, dataset, variables, for_geo, state, counties)
+
+    def log_stats(self):
+        """Log cache hits/misses and request counts."""
+        logger.info(
+            f"Census fetch ({self.mode}): {self.stats['hits']} cache hits, {self.stats['misses']} misses, "
+            f"{self.stats['requests']} requests, {self.stats['retries']} retries"
+        )
@@ -14,6 +14,9 @@ Features:
 - Comprehensive pattern matching and formula analysis
 - Detailed reporting with aggregation analysis
 
+The variable lists are shared with uec_index.py, which keeps a persistent index of
+every variable spelling per UEC workbook, sheet and cell for quick lookups.
+
 Author: Comprehensive Analysis
 Date: August 2025
 """
@@ -31,6 +34,92 @@ import argparse
 # Suppress openpyxl warnings
 warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
 
+# Official employment variable names from Bay Area Metro TM2 documentation
+OFFICIAL_EMPLOYMENT_VARIABLES = [
+    'ag',           # Agriculture employment
+    'art_rec',      # Arts & recreational employment  
+    'constr',       # Construction employment
+    'eat',          # Eating out employment
+    'ed_high',      # Higher education employment
+    'ed_k12',       # K-12 education employment
+    'ed_oth',       # Other education employment
+    'fire',         # Financial, Insurance, real estate employment
+    'gov',          # Government employment
+    'health',       # Health employment
+    'hotel',        # Hotel employment
+    'info',         # Information employment
+    'lease',        # Leasing employment
+    'logis',        # Logistics employment
+    'man_bio',      # Biological manufacturing employment
+    'man_hvy',      # Heavy manufacturing employment
+    'man_lgt',      # Light manufacturing employment
+    'man_tech',     # Technology manufacturing employment
+    'natres',       # Natural resources employment
+    'prof',         # Professional employment
+    'ret_loc',      # Local retail employment
+    'ret_reg',      # Regional retail employment
+    'serv_bus',     # Business services employment
+    'serv_pers',    # Personal services employment
+    'serv_soc',     # Social services employment
+    'transp',       # Transportation employment
+    'util'          # Utilities employment
+]
+
+# Common aggregated variables that might be used
+AGGREGATED_VARIABLES = [
+    'emp_total',     # Total employment
+    'empTotal',      # Alternative total employment
+    'totemp',        # Another total employment variant
+    'education',     # Aggregated education (ed_high + ed_k12 + ed_oth)
+    'retail',        # Aggregated retail (ret_loc + ret_reg)
+    'manufacturing', # Aggregated manufacturing (man_bio + man_hvy + man_lgt + man_tech)
+    'services',      # Aggregated services (serv_bus + serv_pers + serv_soc)
+    'empEduHealth',  # Education + Health aggregation
+]
+
+# Undocumented variables found in legacy analysis scripts
+UNDOCUMENTED_VARIABLES = [
+    # Construction variants (TM1 style)
+    'emp_ag', 'emp_const_non_bldg_prod', 'emp_const_non_bldg_office', 
+    'emp_const_bldg_prod', 'emp_const_bldg_office',
+    
+    # Manufacturing variants
+    'emp_mfg_prod', 'emp_mfg_office',
+    
+    # Retail/Wholesale variants
+    'emp_whsle_whs', 'emp_retail_loc', 'emp_retail_reg',
+    
+    # Professional services variants
+    'emp_prof_bus_svcs', 'emp_prof_bus_svcs_bldg_maint',
+    
+    # Education variants
+    'emp_pvt_ed_k12', 'emp_pvt_ed_post_k12_oth', 'emp_public_ed',
+    
+    # Other service variants
+    'emp_health', 'emp_hotel', 'emp_restaurant_bar',
+    'emp_personal_svcs_office', 'emp_personal_svcs_retail',
+    'emp_amusement', 'emp_othr_svcs',
+    
+    # Government variants
+    'emp_fed_non_mil', 'emp_fed_mil', 'emp_state_local_gov_blue', 'emp_state_local_gov_white',
+    
+    # Alternative patterns
+    'agriculture', 'construction', 'manufacturing_food', 'manufacturing_nonfood',
+    'wholesale', 'transport', 'information', 'finance', 'real_estate',
+    'professional', 'management', 'administrative', 'arts', 'accommodation', 
+    'food_service', 'other_services', 'military', 'utilities', 'office', 'industrial'
+]
+
+# Spellings searched for each variable: exact, emp_ prefix, _emp suffix, camelCase,
+# Employment suffix, accessibility and density variables
+PATTERN_VARIANTS = ['{}', 'emp_{}', '{}_emp', '{}Emp', '{}Employment', '{}Access', '{}Accessibility', '{}Density']
+
+
+def variable_patterns(variables):
+    """All spellings (PATTERN_VARIANTS) of the variables, without duplicates."""
+    return list(set(variant.format(var) for var in variables for variant in PATTERN_VARIANTS))
+
+
 class ComprehensiveEmploymentAnalyzer:
     def __init__(self, directory_path, tm2_directory=None, output_directory=None, verbose=False):
         """
@@ -59,80 +148,13 @@ class ComprehensiveEmploymentAnalyzer:
             print()
         
         # Official employment variable names from Bay Area Metro TM2 documentation
-        self.official_employment_variables = [
-            'ag',           # Agriculture employment
-            'art_rec',      # Arts & recreational employment  
-            'constr',       # Construction employment
-            'eat',          # Eating out employment
-            'ed_high',      # Higher education employment
-            'ed_k12',       # K-12 education employment
-            'ed_oth',       # Other education employment
-            'fire',         # Financial, Insurance, real estate employment
-            'gov',          # Government employment
-            'health',       # Health employment
-            'hotel',        # Hotel employment
-            'info',         # Information employment
-            'lease',        # Leasing employment
-            'logis',        # Logistics employment
-            'man_bio',      # Biological manufacturing employment
-            'man_hvy',      # Heavy manufacturing employment
-            'man_lgt',      # Light manufacturing employment
-            'man_tech',     # Technology manufacturing employment
-            'natres',       # Natural resources employment
-            'prof',         # Professional employment
-            'ret_loc',      # Local retail employment
-            'ret_reg',      # Regional retail employment
-            'serv_bus',     # Business services employment
-            'serv_pers',    # Personal services employment
-            'serv_soc',     # Social services employment
-            'transp',       # Transportation employment
-            'util'          # Utilities employment
-        ]
+        self.official_employment_variables = list(OFFICIAL_EMPLOYMENT_VARIABLES)
         
         # Common aggregated variables that might be used
-        self.aggregated_variables = [
-            'emp_total',     # Total employment
-            'empTotal',      # Alternative total employment
-            'totemp',        # Another total employment variant
-            'education',     # Aggregated education (ed_high + ed_k12 + ed_oth)
-            'retail',        # Aggregated retail (ret_loc + ret_reg)
-            'manufacturing', # Aggregated manufacturing (man_bio + man_hvy + man_lgt + man_tech)
-            'services',      # Aggregated services (serv_bus + serv_pers + serv_soc)
-            'empEduHealth',  # Education + Health aggregation
-        ]
+        self.aggregated_variables = list(AGGREGATED_VARIABLES)
         
         # Undocumented variables found in legacy analysis scripts
-        self.undocumented_variables = [
-            # Construction variants (TM1 style)
-            'emp_ag', 'emp_const_non_bldg_prod', 'emp_const_non_bldg_office', 
-            'emp_const_bldg_prod', 'emp_const_bldg_office',
-            
-            # Manufacturing variants
-            'emp_mfg_prod', 'emp_mfg_office',
-            
-            # Retail/Wholesale variants
-            'emp_whsle_whs', 'emp_retail_loc', 'emp_retail_reg',
-            
-            # Professional services variants
-            'emp_prof_bus_svcs', 'emp_prof_bus_svcs_bldg_maint',
-            
-            # Education variants
-            'emp_pvt_ed_k12', 'emp_pvt_ed_post_k12_oth', 'emp_public_ed',
-            
-            # Other service variants
-            'emp_health', 'emp_hotel', 'emp_restaurant_bar',
-            'emp_personal_svcs_office', 'emp_personal_svcs_retail',
-            'emp_amusement', 'emp_othr_svcs',
-            
-            # Government variants
-            'emp_fed_non_mil', 'emp_fed_mil', 'emp_state_local_gov_blue', 'emp_state_local_gov_white',
-            
-            # Alternative patterns
-            'agriculture', 'construction', 'manufacturing_food', 'manufacturing_nonfood',
-            'wholesale', 'transport', 'information', 'finance', 'real_estate',
-            'professional', 'management', 'administrative', 'arts', 'accommodation', 
-            'food_service', 'other_services', 'military', 'utilities', 'office', 'industrial'
-        ]
+        self.undocumented_variables = list(UNDOCUMENTED_VARIABLES)
         
         # Combine all variables to search for
         self.all_variables = (self.official_employment_variables + 
@@ -140,21 +162,7 @@ class ComprehensiveEmploymentAnalyzer:
                              self.undocumented_variables)
         
         # Generate variable patterns for comprehensive matching
-        self.variable_patterns = []
-        for var in self.all_variables:
-            self.variable_patterns.extend([
-                var,                    # exact match
-                f'emp_{var}',          # with emp_ prefix
-                f'{var}_emp',          # with _emp suffix
-                f'{var}Emp',           # camelCase
-                f'{var}Employment',    # with Employment suffix
-                f'{var}Access',        # accessibility variables
-                f'{var}Accessibility', # accessibility variables
-                f'{var}Density',       # density variables
-            ])
-        
-        # Remove duplicates
-        self.variable_patterns = list(set(self.variable_patterns))
+        self.variable_patterns = variable_patterns(self.all_variables)
         
         # Results storage
         self.results = defaultdict(lambda: defaultdict(list))
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+UEC Workbook Token Index
+
+Indexes every employment variable spelling (the variable lists and PATTERN_VARIANTS of
+employment_analysis_comprehensive.py) found in the UEC Excel workbooks of a model
+directory, so questions like "which UECs use emp_total" are answered from the index
+instead of re-reading the workbooks.
+
+Usage:
+    python uec_index.py build --model-dir "C:/GitHub/travel-model-two/model-files/model"
+    python uec_index.py query emp_total "ret_*" --model-dir "C:/GitHub/travel-model-two/model-files/model"
+    python uec_index.py query ag --cells
+
+- workbooks are streamed: openpyxl read-only mode for .xlsx/.xlsm (formulas kept as
+  text), xlrd on-demand sheets for .xls
+- each text cell is searched once with a single compiled, case-insensitive
+  alternation of all tokens (longest first, word boundaries as in the analyzer)
+- workbooks are scanned in parallel processes, largest first
+- the index (<index-dir>/uec_index.parquet: token, variable, variable_type,
+  workbook, sheet, cell, expression) is kept with a manifest of workbook size and
+  modification time (uec_index_files.csv); only new or changed workbooks are
+  rescanned, removed ones dropped, and everything is rescanned when the token
+  list changes
+- query refreshes the index first (a stat per workbook when nothing changed)
+  and matches tokens or base variables with globs, case-insensitively
+"""
+
+import argparse
+import fnmatch
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import openpyxl
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from employment_analysis_comprehensive import (
+    AGGREGATED_VARIABLES,
+    OFFICIAL_EMPLOYMENT_VARIABLES,
+    PATTERN_VARIANTS,
+    UNDOCUMENTED_VARIABLES,
+)
+
+# Suppress openpyxl warnings
+warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
+
+WORKBOOK_PATTERNS = ['*.xls', '*.xlsx', '*.xlsm']
+INDEX_FILE = 'uec_index.parquet'
+MANIFEST_FILE = 'uec_index_files.csv'
+COLUMNS = ['token', 'variable', 'variable_type', 'workbook', 'sheet', 'cell', 'expression']
+
+
+def token_variables():
+    """
+    Lowercase token -> (base variable, variable type) for every spelling of every variable.
+
+    A spelling shared by several variables belongs to the first in official, aggregated,
+    undocumented order, as in ComprehensiveEmploymentAnalyzer.get_base_variable.
+    """
+    tokens = {}
+    for variable_type, variables in [('official', OFFICIAL_EMPLOYMENT_VARIABLES),
+                                     ('aggregated', AGGREGATED_VARIABLES),
+                                     ('undocumented', UNDOCUMENTED_VARIABLES)]:
+        for variable in variables:
+            for variant in PATTERN_VARIANTS:
+                tokens.setdefault(variant.format(variable).lower(), (variable, variable_type))
+    return tokens
+
+
+@functools.lru_cache(maxsize=None)
+def token_pattern(tokens):
+    """One compiled alternation of the tokens (a tuple), longest first, on word boundaries."""
+    alternatives = '|'.join(re.escape(token) for token in sorted(tokens, key=len, reverse=True))
+    return re.compile(r'\b(?:' + alternatives + r')\b', re.IGNORECASE)
+
+
+def iter_text_cells(path):
+    """Yield (sheet, cell, text) of the text cells of a workbook, streamed sheet by sheet."""
+    if path.suffix.lower() == '.xls':
+        import xlrd  # only needed for .xls workbooks, as for pandas.read_excel
+        book = xlrd.open_workbook(str(path), on_demand=True)
+        try:
+            for sheet_name in book.sheet_names():
+                sheet = book.sheet_by_name(sheet_name)
+                for row in range(sheet.nrows):
+                    for col, value in enumerate(sheet.row_values(row)):
+                        if isinstance(value, str) and value.strip():
+                            yield sheet_name, f'{get_column_letter(col + 1)}{row + 1}', value
+                book.unload_sheet(sheet_name)
+        finally:
+            book.release_resources()
+    else:
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=False)  # Keep formulas
+        try:
+            for ws in wb.worksheets:
+                for row, values in enumerate(ws.iter_rows(values_only=True), 1):
+                    for col, value in enumerate(values, 1):
+                        if isinstance(value, str) and value.strip():
+                            yield ws.title, f'{get_column_letter(col)}{row}', value
+        finally:
+            wb.close()
+
+
+def scan_workbook(path, workbook, tokens):
+    """Index rows (COLUMNS) of every token occurrence in one workbook."""
+    variables = token_variables()
+    pattern = token_pattern(tokens)
+    rows = []
+    for sheet, cell, text in iter_text_cells(path):
+        for token in {match.group(0).lower() for match in pattern.finditer(text)}:
+            variable, variable_type = variables[token]
+            rows.append((token, variable, variable_type, workbook, sheet, cell, text.strip()))
+    return rows
+
+
+def find_workbooks(model_dir):
+    """Workbook name -> path of the UEC workbooks in model_dir, skipping temporary and lock files."""
+    workbooks = {}
+    for pattern in WORKBOOK_PATTERNS:
+        for path in Path(model_dir).glob(pattern):
+            if path.name.startswith(('._', '~$')) or path.name.endswith('.tmp'):
+                continue
+            workbooks[path.name] = path
+    return dict(sorted(workbooks.items()))
+
+
+def read_index(index_dir):
+    """(index, manifest) of index_dir, empty when not built yet."""
+    index_path, manifest_path = Path(index_dir) / INDEX_FILE, Path(index_dir) / MANIFEST_FILE
+    if not (index_path.exists() and manifest_path.exists()):
+        return pd.DataFrame(columns=COLUMNS), pd.DataFrame(columns=['workbook', 'size', 'mtime_ns', 'tokens'])
+    return pd.read_parquet(index_path), pd.read_csv(manifest_path, dtype={'tokens': str})
+
+
+def _write_atomic(df, path, writer):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=path.suffix + '.tmp')
+    os.close(fd)
+    try:
+        writer(df, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def update_index(model_dir, index_dir, max_workers=None, verbose=False):
+    """
+    Bring the index of the model_dir workbooks up to date, scanning only new or changed workbooks.
+
+    Args:
+        model_dir (str|Path): Directory of the UEC workbooks
+        index_dir (str|Path): Directory of the index files
+        max_workers (int): Parallel scans; None uses os.cpu_count()
+        verbose (bool): Print each scanned workbook
+
+    Returns:
+        DataFrame: the index (COLUMNS), one row per token occurrence in a cell
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tokens = tuple(sorted(token_variables()))
+    tokens_key = hashlib.sha256('\n'.join(tokens).encode()).hexdigest()[:16]
+
+    index, manifest = read_index(index_dir)
+    known = {row.workbook: (row.size, row.mtime_ns, row.tokens) for row in manifest.itertuples()}
+    workbooks = find_workbooks(model_dir)
+    stats = {name: path.stat() for name, path in workbooks.items()}
+    current = {name: (stat.st_size, stat.st_mtime_ns, tokens_key) for name, stat in stats.items()}
+    changed = [name for name in workbooks if known.get(name) != current[name]]
+    removed = set(known) - set(workbooks)
+    if not changed and not removed:
+        return index
+
+    changed.sort(key=lambda name: stats[name].st_size, reverse=True)
+    rows, failed = [], set()
+    workers = min(max_workers or os.cpu_count() or 1, max(len(changed), 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(scan_workbook, workbooks[name], name, tokens) for name in changed}
+        for name, future in futures.items():
+            try:
+                rows.extend(future.result())
+                if verbose:
+                    print(f"Indexed: {name}")
+            except Exception as e:
+                # keep it out of the manifest so the next update retries it
+                failed.add(name)
+                print(f"Skipping {name}: {e}")
+
+    index = pd.concat([index[~index['workbook'].isin(set(changed) | removed)],
+                       pd.DataFrame(rows, columns=COLUMNS)], ignore_index=True)
+    index = index.sort_values(['workbook', 'sheet', 'cell', 'token'], ignore_index=True)
+    manifest = pd.DataFrame([(name, *current[name]) for name in workbooks if name not in failed],
+                            columns=['workbook', 'size', 'mtime_ns', 'tokens'])
+    _write_atomic(index, index_dir / INDEX_FILE, lambda df, path: df.to_parquet(path, index=False))
+    _write_atomic(manifest, index_dir / MANIFEST_FILE, lambda df, path: df.to_csv(path, index=False))
+    print(f"Indexed {len(changed) - len(failed)} changed workbooks ({len(removed)} removed); "
+          f"{len(index)} token occurrences in {index['workbook'].nunique()} workbooks")
+    return index
+
+
+def query_index(index, patterns):
+    """Index rows whose token or base variable matches any of the glob patterns (case-insensitive)."""
+    patterns = [pattern.lower() for pattern in patterns]
+    tokens, variables = index['token'].str.lower(), index['variable'].str.lower()
+    match = pd.Series(False, index=index.index)
+    for pattern in patterns:
+        match |= tokens.map(lambda value: fnmatch.fnmatchcase(value, pattern))
+        match |= variables.map(lambda value: fnmatch.fnmatchcase(value, pattern))
+    return index[match]
+
+
+def token_usage(matches):
+    """Cells per workbook, sheet and token of index rows."""
+    return (matches.groupby(['workbook', 'sheet', 'token'])
+            .agg(cells=('cell', 'size'), first_cell=('cell', 'first'))
+            .reset_index())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index employment variable tokens of the UEC workbooks')
+    default_model_dir = r"C:\GitHub\travel-model-two\model-files\model"
+    parser.add_argument('action', choices=['build', 'query'], help='build / refresh the index, or query it')
+    parser.add_argument('tokens', nargs='*', help='Tokens or variables to look up (globs allowed), for query')
+    parser.add_argument('--model-dir', '--model-directory', default=default_model_dir,
+                        help=f'Directory of the UEC workbooks (default: {default_model_dir})')
+    parser.add_argument('--index-dir', default=None, help='Directory of the index (default: <model-dir>/uec_index)')
+    parser.add_argument('--cells', action='store_true', help='List every cell and expression instead of counts')
+    parser.add_argument('--no-refresh', action='store_true', help='Query the index without checking for changed workbooks')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Parallel workbook scans (default: all cores)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Print each scanned workbook')
+    args = parser.parse_args()
+
+    index_dir = Path(args.index_dir) if args.index_dir else Path(args.model_dir) / 'uec_index'
+    if args.action == 'query' and args.no_refresh:
+        index, _ = read_index(index_dir)
+    else:
+        index = update_index(args.model_dir, index_dir, args.workers, args.verbose)
+    if args.action == 'build':
+        return 0
+    if not args.tokens:
+        parser.error('query needs at least one token')
+
+    matches = query_index(index, args.tokens)
+    if matches.empty:
+        print(f"No UEC uses {', '.join(args.tokens)}")
+        return 1
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', 120, 'display.width', 200):
+        if args.cells:
+            print(matches[['workbook', 'sheet', 'cell', 'token', 'expression']].to_string(index=False))
+        else:
+            print(token_usage(matches).to_string(index=False))
+            print(f"\n{matches['workbook'].nunique()} workbooks: {', '.join(sorted(matches['workbook'].unique()))}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
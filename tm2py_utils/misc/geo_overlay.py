@@ -0,0 +1,168 @@
+"""
+Largest-area overlay assignment shared by the crosswalk builders.
+
+Assigns every polygon of a base layer (blocks, MAZs, TAZs, PUMAs...) to the
+polygon of an overlay layer it shares the largest area with, e.g.
+TAZ -> tract, TAZ -> PUMA, PUMA -> county.
+
+Instead of a full ``gpd.overlay`` or a pairwise ``.intersection().area`` loop,
+candidate pairs come from one bulk STRtree query, base polygons that lie
+entirely inside their candidate take the base area directly, and the remaining
+boundary pairs are intersected with vectorized shapely 2 operations, split into
+chunks across a process pool when there are many of them.
+
+Usage:
+
+    from tm2py_utils.misc.geo_overlay import largest_overlap_assignment
+
+    taz_puma = largest_overlap_assignment(taz_gdf, 'TAZ_NODE', puma_gdf, ['PUMACE20'])
+
+The result has one row per base polygon with the base id, the overlay fields of
+the best match, base_sq_m, intersection_sq_m and area_share (intersection /
+base area). Base polygons that do not overlap anything get NaN overlay fields.
+An overlay field with the same name as the base id gets a ``_y`` suffix.
+Areas are in the units of the base layer's CRS, so project to an equal-area or
+local projected CRS (e.g. EPSG:26910) first.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# below this many boundary pairs the intersections are computed in-process
+PARALLEL_MIN_PAIRS = 20000
+CHUNK_SIZE = 5000
+
+
+def _intersection_area_chunk(left, right):
+    """Areas of the pairwise intersections of two equal-length geometry arrays."""
+    return shapely.area(shapely.intersection(left, right))
+
+
+def _valid_geometries(geoms):
+    """Return the geometry array with invalid polygons repaired."""
+    geoms = np.asarray(geoms, dtype=object)
+    invalid = ~shapely.is_valid(geoms)
+    if invalid.any():
+        logger.debug(f"Repairing {int(invalid.sum())} invalid geometries")
+        geoms = geoms.copy()
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+    return geoms
+
+
+def intersection_areas(left, right, max_workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Compute pairwise intersection areas, in parallel chunks for large inputs.
+
+    Args:
+        left, right: equal-length arrays of shapely geometries
+        max_workers: process pool size; None uses os.cpu_count(), 1 disables the pool
+        chunk_size: number of pairs per task
+    Returns:
+        np.ndarray of float areas
+    """
+    n = len(left)
+    workers = max_workers or os.cpu_count() or 1
+    if n < PARALLEL_MIN_PAIRS or workers <= 1:
+        return _intersection_area_chunk(left, right)
+
+    bounds = range(0, n, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(
+            _intersection_area_chunk,
+            [left[i:i + chunk_size] for i in bounds],
+            [right[i:i + chunk_size] for i in bounds],
+        )
+        return np.concatenate(list(parts))
+
+
+def overlap_pairs(base_geoms, overlay_geoms, max_workers=None):
+    """
+    Find all overlapping (base, overlay) pairs and their intersection areas.
+
+    Args:
+        base_geoms: array of base polygons
+        overlay_geoms: array of overlay polygons
+        max_workers: process pool size passed to intersection_areas
+    Returns:
+        (base_idx, overlay_idx, area): positional indices into the two arrays and the
+        intersection area of each pair; pairs that only touch are dropped
+    """
+    base_geoms = _valid_geometries(base_geoms)
+    overlay_geoms = _valid_geometries(overlay_geoms)
+
+    # index the more numerous layer and query it with the other one, so each query
+    # geometry is prepared once and reused across all of its candidates
+    if len(base_geoms) >= len(overlay_geoms):
+        overlay_idx, base_idx = shapely.STRtree(base_geoms).query(overlay_geoms, predicate='intersects')
+    else:
+        base_idx, overlay_idx = shapely.STRtree(overlay_geoms).query(base_geoms, predicate='intersects')
+    logger.debug(f"STRtree query: {len(base_idx):,} candidate pairs for {len(base_geoms):,} base polygons")
+
+    # group pairs by overlay polygon so pool chunks share (and pickle) few overlay geometries
+    order = np.lexsort((base_idx, overlay_idx))
+    base_idx, overlay_idx = base_idx[order], overlay_idx[order]
+    left = base_geoms[base_idx]
+    right = overlay_geoms[overlay_idx]
+    area = np.empty(len(base_idx), dtype=float)
+
+    # base polygons fully inside the overlay polygon don't need an intersection
+    shapely.prepare(right)
+    inside = shapely.contains_properly(right, left)
+    area[inside] = shapely.area(left[inside])
+    boundary = np.flatnonzero(~inside)
+    logger.debug(f"{int(inside.sum()):,} pairs fully contained, {len(boundary):,} boundary pairs to intersect")
+    area[boundary] = intersection_areas(left[boundary], right[boundary], max_workers=max_workers)
+
+    keep = area > 0
+    return base_idx[keep], overlay_idx[keep], area[keep]
+
+
+def largest_overlap_assignment(base_gdf, base_id, overlay_gdf, overlay_fields, max_workers=None):
+    """
+    Assign each base polygon to the overlay polygon with the largest intersection area.
+
+    Args:
+        base_gdf (GeoDataFrame): the base layer; one output row per row of this layer
+        base_id (str): id column of base_gdf
+        overlay_gdf (GeoDataFrame): the overlay layer, reprojected to base_gdf's CRS if needed
+        overlay_fields (list): overlay columns to carry over from the best match
+        max_workers (int, optional): process pool size for the intersections
+    Returns:
+        DataFrame with base_id, overlay_fields, base_sq_m, intersection_sq_m, area_share;
+        an overlay field named like base_id is returned as f"{base_id}_y"
+    """
+    if isinstance(overlay_fields, str):
+        overlay_fields = [overlay_fields]
+    if overlay_gdf.crs != base_gdf.crs:
+        logger.debug(f"Reprojecting overlay from {overlay_gdf.crs} to {base_gdf.crs}")
+        overlay_gdf = overlay_gdf.to_crs(base_gdf.crs)
+
+    base_geoms = np.asarray(base_gdf.geometry.values)
+    overlay_geoms = np.asarray(overlay_gdf.geometry.values)
+    base_idx, overlay_idx, area = overlap_pairs(base_geoms, overlay_geoms, max_workers=max_workers)
+
+    # best pair per base polygon: sort by base, then by descending area, keep the first
+    order = np.lexsort((-area, base_idx))
+    first = np.r_[True, base_idx[order][1:] != base_idx[order][:-1]] if len(order) else np.array([], dtype=bool)
+    best = order[first]
+
+    result = pd.DataFrame({base_id: base_gdf[base_id].to_numpy()})
+    result['base_sq_m'] = shapely.area(base_geoms)
+    out_fields = [f"{field}_y" if field == base_id else field for field in overlay_fields]
+    for field, out_field in zip(overlay_fields, out_fields):
+        values = pd.Series(overlay_gdf[field].to_numpy()[overlay_idx[best]], index=base_idx[best])
+        result[out_field] = values.reindex(result.index)
+    result['intersection_sq_m'] = pd.Series(area[best], index=base_idx[best]).reindex(result.index)
+    result['area_share'] = result['intersection_sq_m'] / result['base_sq_m']
+
+    logger.info(
+        f"Assigned {len(best):,} of {len(result):,} {base_id} to {', '.join(overlay_fields)} by largest overlap"
+    )
+    return result[[base_id] + out_fields + ['base_sq_m', 'intersection_sq_m', 'area_share']]
@@ -0,0 +1,339 @@
+"""
+Step timings of a tm2py run from its log file.
+
+Python replacement for the log parsing of perf-mon/viz-perf-log-for-tableau.Rmd,
+used by ``tm2py-utils perf`` (cli.py) and runnable on its own:
+
+    python perf_log.py tm2py_run_20250620_1522.log [--baseline tm2py_run_20250421_0733.log] [-o out]
+
+- the log is read line by line, so multi-day logs are parsed in constant memory;
+  lines look like ``20-Jun-2025 (17:08:24) STATUS:   Start Run EA highway assignment``
+- ``Start X`` / ``End X`` pairs become steps nested by their order in the log: an End
+  closes the most recent open step of the same name, steps left open by it (or by the
+  end of the log) are closed at that time and flagged ``closed=False``
+- ``Start iteration N`` has no End: each iteration is a root step lasting until the
+  next iteration starts or the log ends
+- every step gets its iteration, its time period (EA/AM/MD/PM/EV named in it or in a
+  parent step), duration, self time (duration not spent in child steps) and the
+  number of warnings logged while it was the innermost open step
+
+Outputs (write_outputs):
+
+- ``<log>_steps.parquet``: one row per step, with peak RSS, CPU seconds and I/O bytes
+  when --samples gives a resource_sampler series of the run (step_resources)
+- ``<log>.folded``: self seconds per step path in the folded-stack format read by
+  flamegraph.pl and speedscope
+- ``<log>_regressions.csv`` with --baseline: total time per (iteration, step path)
+  against the baseline run, flagged where slower by more than the thresholds
+"""
+import argparse
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LINE_PATTERN = re.compile(r"^(\d{2}-\w{3}-\d{4}) \((\d{2}:\d{2}:\d{2})\)\s+(\w+):(\s*)(.*?)\s*$")
+ITERATION_PATTERN = re.compile(r"^iteration (\d+)$")
+PERIOD_PATTERN = re.compile(r"\b(EA|AM|MD|PM|EV)\b")
+
+TIMESTAMP_FORMAT = "%d-%b-%Y %H:%M:%S"
+WARNING_LEVELS = ("WARN", "WARNING")
+
+# separator of step names in a step path (the folded-stack format uses ";")
+PATH_SEPARATOR = ";"
+
+STEP_COLUMNS = [
+    "step_id", "parent_id", "depth", "iteration", "period", "name", "path", "occurrence",
+    "level", "start", "end", "duration_s", "self_s", "warnings", "closed",
+]
+
+
+@lru_cache(maxsize=4096)
+def _timestamp(date, time):
+    return datetime.strptime(f"{date} {time}", TIMESTAMP_FORMAT)
+
+
+def read_events(log_file):
+    """
+    Yield (timestamp, level, message) for every timestamped line of a tm2py log.
+
+    Lines that don't start with a timestamp (tracebacks, wrapped messages) are skipped.
+    """
+    with open(log_file, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            match = LINE_PATTERN.match(line)
+            if match is None:
+                continue
+            date, time, level, _, message = match.groups()
+            yield _timestamp(date, time), level, message
+
+
+def parse_steps(events):
+    """
+    Nested steps of a stream of (timestamp, level, message) log events.
+
+    Returns:
+        DataFrame with one row per step in start order, columns STEP_COLUMNS
+    """
+    steps = []
+    stack = []  # indices into steps of the open steps, innermost last
+    last_time = None
+
+    def open_step(time, level, name):
+        parent = steps[stack[-1]] if stack else None
+        period = PERIOD_PATTERN.search(name)
+        steps.append({
+            "step_id": len(steps),
+            "parent_id": parent["step_id"] if parent else -1,
+            "depth": len(stack),
+            "iteration": parent["iteration"] if parent else None,
+            "period": period.group(1) if period else (parent["period"] if parent else None),
+            "name": name,
+            "path": f"{parent['path']}{PATH_SEPARATOR}{name}" if parent else name,
+            "level": level,
+            "start": time,
+            "end": None,
+            "warnings": 0,
+            "closed": False,
+        })
+        stack.append(len(steps) - 1)
+
+    def close_to(position, time, closed=True):
+        """End the open steps from stack[position] up; those above it were never closed."""
+        for index in stack[position + 1:]:
+            steps[index]["end"] = time
+        steps[stack[position]].update(end=time, closed=closed)
+        del stack[position:]
+
+    for time, level, message in events:
+        last_time = time
+        if message.startswith("Start "):
+            name = message[6:]
+            iteration = ITERATION_PATTERN.match(name)
+            if iteration:
+                # an iteration ends where the next starts
+                if stack:
+                    close_to(0, time, closed=ITERATION_PATTERN.match(steps[stack[0]]["name"]) is not None)
+                open_step(time, level, name)
+                steps[-1]["iteration"] = int(iteration.group(1))
+            else:
+                open_step(time, level, name)
+        elif message.startswith("End "):
+            name = message[4:]
+            position = next((i for i in range(len(stack) - 1, -1, -1) if steps[stack[i]]["name"] == name), None)
+            if position is None:
+                logger.debug(f"Ignoring End without Start at {time}: {name}")
+                continue
+            close_to(position, time)
+        elif level in WARNING_LEVELS and stack:
+            steps[stack[-1]]["warnings"] += 1
+
+    # steps still open at the end of the log; iterations close normally there
+    for index in stack:
+        steps[index]["end"] = last_time
+        steps[index]["closed"] = ITERATION_PATTERN.match(steps[index]["name"]) is not None
+
+    if not steps:
+        return pd.DataFrame(columns=STEP_COLUMNS)
+    df = pd.DataFrame(steps)
+    df["start"] = pd.to_datetime(df["start"])
+    df["end"] = pd.to_datetime(df["end"])
+    df["duration_s"] = (df["end"] - df["start"]).dt.total_seconds()
+
+    # self time: duration not covered by the children
+    child_time = df.loc[df["parent_id"] >= 0].groupby("parent_id")["duration_s"].sum()
+    df["self_s"] = (df["duration_s"] - df["step_id"].map(child_time).fillna(0)).clip(lower=0)
+
+    # repeated steps of the same path (e.g. "Transit assignments for a time period") are numbered
+    df["occurrence"] = df.groupby("path").cumcount()
+    df["iteration"] = df["iteration"].astype("Int64")
+    return df[STEP_COLUMNS]
+
+
+def parse_log(log_file):
+    """Nested steps of a tm2py log file (see parse_steps)."""
+    logger.info(f"Parsing {log_file}")
+    return parse_steps(read_events(log_file))
+
+
+def step_resources(steps, samples):
+    """
+    Resource use of each step from a resource_sampler series of the run.
+
+    Cumulative counters (CPU seconds, read/write bytes) are interpolated at the step
+    start and end; peak RSS is the largest sample within the step (or the nearer
+    sample at its start/end when the step is shorter than the interval).
+
+    Args:
+        steps (DataFrame): parse_log output
+        samples (DataFrame): resource_sampler samples (timestamp, cpu_s, rss_bytes,
+            read_bytes, write_bytes)
+    Returns:
+        steps with peak_rss_bytes, cpu_s, cpu_percent, read_bytes and write_bytes
+        columns; NaN for steps outside the sampled period
+    """
+    steps = steps.copy()
+    samples = samples.sort_values("timestamp")
+    if samples.empty:
+        for column in ["peak_rss_bytes", "cpu_s", "cpu_percent", "read_bytes", "write_bytes"]:
+            steps[column] = np.nan
+        return steps
+    t = samples["timestamp"].to_numpy("datetime64[ns]").astype(np.int64)
+    start = steps["start"].to_numpy("datetime64[ns]").astype(np.int64)
+    end = steps["end"].to_numpy("datetime64[ns]").astype(np.int64)
+    sampled = (end >= t[0]) & (start <= t[-1])
+
+    for column in ["cpu_s", "read_bytes", "write_bytes"]:
+        counter = samples[column].to_numpy(dtype=float)
+        steps[column] = np.where(sampled, np.interp(end, t, counter) - np.interp(start, t, counter), np.nan)
+    steps["cpu_percent"] = 100 * steps["cpu_s"] / steps["duration_s"].where(steps["duration_s"] > 0)
+
+    rss = samples["rss_bytes"].to_numpy(dtype=float)
+    first = np.searchsorted(t, start, side="left")
+    last = np.searchsorted(t, end, side="right")
+    peak = np.full(len(steps), np.nan)
+    for i in np.flatnonzero(sampled):
+        low, high = first[i], last[i]
+        if low == high:
+            # no sample within the step: the samples either side of it
+            low, high = max(low - 1, 0), min(high + 1, len(t))
+        peak[i] = rss[low:high].max()
+    steps["peak_rss_bytes"] = peak
+    return steps
+
+
+def folded_stacks(steps):
+    """Self seconds summed by step path, as ``path seconds`` lines (folded-stack format)."""
+    folded = steps.groupby("path", sort=True)["self_s"].sum()
+    folded = folded[folded > 0]
+    return [f"{path} {int(round(seconds))}" for path, seconds in folded.items()]
+
+
+def summarize(steps, max_depth=2):
+    """
+    Total and self time by step path down to max_depth, across iterations.
+
+    Iteration roots are folded together ("iteration *") so each model step appears
+    once with its total over the run.
+    """
+    df = steps.loc[steps["depth"] <= max_depth].copy()
+    df["key"] = df["path"].str.replace(r"^iteration \d+", "iteration *", regex=True)
+    summary = df.groupby("key", sort=False).agg(
+        depth=("depth", "first"),
+        count=("step_id", "size"),
+        total_s=("duration_s", "sum"),
+        self_s=("self_s", "sum"),
+        first_start=("start", "min"),
+        **({"peak_rss_bytes": ("peak_rss_bytes", "max"), "cpu_s_used": ("cpu_s", "sum")}
+           if "peak_rss_bytes" in df else {}),
+    )
+    return summary.sort_values("first_start").drop(columns="first_start")
+
+
+def format_summary(summary, width=40):
+    """Indented tree of a summarize() table with bars proportional to total time."""
+    if summary.empty:
+        return "(no steps)"
+    longest = summary["total_s"].max()
+    lines = []
+    for row in summary.itertuples():
+        name = "  " * row.depth + row.Index.split(PATH_SEPARATOR)[-1]
+        bar = "#" * max(1, int(round(width * row.total_s / longest))) if longest else ""
+        count = f" x{row.count}" if row.count > 1 else ""
+        resources = (f" {row.peak_rss_bytes / 2**30:>7.1f} GB peak {row.cpu_s_used / 3600:>8.2f} h cpu"
+                     if "peak_rss_bytes" in summary else "")
+        lines.append(f"{name[:60]:<60} {row.total_s / 3600:>8.2f} h {row.self_s / 3600:>8.2f} h self"
+                     f"{resources} {bar}{count}")
+    return "\n".join(lines)
+
+
+def compare_runs(steps, baseline, threshold=0.1, min_seconds=60):
+    """
+    Total time per (iteration, step path) of a run against a baseline run.
+
+    Args:
+        steps (DataFrame): parse_log of the run
+        baseline (DataFrame): parse_log of the baseline run
+        threshold (float): relative slowdown flagged as a regression
+        min_seconds (float): smallest slowdown flagged, so short steps don't flag on noise
+    Returns:
+        DataFrame with iteration, path, count/total of both runs, delta_s, ratio and
+        regression, slowest delta first; steps missing from either run have NaN totals
+    """
+    def totals(df):
+        return df.groupby(["iteration", "path"], dropna=False).agg(
+            count=("step_id", "size"), total_s=("duration_s", "sum"))
+
+    comparison = totals(steps).join(totals(baseline), how="outer", lsuffix="", rsuffix="_baseline")
+    comparison[["count", "count_baseline"]] = comparison[["count", "count_baseline"]].astype("Int64")
+    comparison["delta_s"] = comparison["total_s"] - comparison["total_s_baseline"]
+    comparison["ratio"] = comparison["total_s"] / comparison["total_s_baseline"].replace(0, np.nan)
+    comparison["regression"] = (comparison["delta_s"] > min_seconds) & (comparison["ratio"] > 1 + threshold)
+    return comparison.reset_index().sort_values("delta_s", ascending=False, na_position="last")
+
+
+def write_outputs(steps, output_dir, stem, baseline=None, threshold=0.1, min_seconds=60):
+    """Write the steps Parquet, folded stacks and (with a baseline) the regression table."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    steps.to_parquet(output_dir / f"{stem}_steps.parquet", index=False)
+    (output_dir / f"{stem}.folded").write_text("\n".join(folded_stacks(steps)) + "\n")
+    outputs = [output_dir / f"{stem}_steps.parquet", output_dir / f"{stem}.folded"]
+    if baseline is not None:
+        comparison = compare_runs(steps, baseline, threshold, min_seconds)
+        comparison.to_csv(output_dir / f"{stem}_regressions.csv", index=False)
+        outputs.append(output_dir / f"{stem}_regressions.csv")
+    return outputs
+
+
+def parse_cli_perf(args):
+    steps = parse_log(args.log_file)
+    if args.samples:
+        steps = step_resources(steps, pd.read_parquet(args.samples))
+    baseline = parse_log(args.baseline) if args.baseline else None
+    stem = Path(args.log_file).stem
+    output_dir = Path(args.output_dir) if args.output_dir else Path(args.log_file).parent
+    outputs = write_outputs(steps, output_dir, stem, baseline, args.threshold, args.min_seconds)
+
+    print(f"{Path(args.log_file).name}: {len(steps):,} steps, "
+          f"{steps['iteration'].nunique()} iterations, "
+          f"{(steps['end'].max() - steps['start'].min()).total_seconds() / 3600:.2f} h")
+    print(format_summary(summarize(steps, args.depth)))
+    if baseline is not None:
+        regressions = compare_runs(steps, baseline, args.threshold, args.min_seconds)
+        regressions = regressions.loc[regressions["regression"]]
+        print(f"\n{len(regressions)} steps slower than {Path(args.baseline).name} "
+              f"by more than {args.threshold:.0%} and {args.min_seconds:g} s")
+        for row in regressions.head(args.top).itertuples():
+            print(f"  iteration {row.iteration}: {row.path.split(PATH_SEPARATOR)[-1][:60]:<60} "
+                  f"{row.total_s_baseline / 60:>8.1f} -> {row.total_s / 60:>8.1f} min ({row.ratio:.2f}x)")
+    for output in outputs:
+        print(f"Wrote {output}")
+
+def add_perf_arguments(parser):
+    parser.add_argument("log_file", help="tm2py run log (tm2py_run_*.log)")
+    parser.add_argument("--baseline", help="Log of a baseline run to compare step times against")
+    parser.add_argument("--samples", help="resource_sampler Parquet of the run, to add peak memory, CPU and I/O per step")
+    parser.add_argument("-o", "--output-dir", help="Directory for the outputs (default: next to the log)")
+    parser.add_argument("--depth", type=int, default=2, help="Deepest step level in the printed summary (default: 2)")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown flagged as a regression (default: 0.1)")
+    parser.add_argument("--min-seconds", type=float, default=60,
+                        help="Smallest slowdown in seconds flagged as a regression (default: 60)")
+    parser.add_argument("--top", type=int, default=20, help="Regressions to print (default: 20)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Step timings of a tm2py run log")
+    add_perf_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parse_cli_perf(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Sample CPU, memory and disk I/O of a process tree to Parquet.
+
+Portable (psutil) replacement for the PerfMon counters of perf-mon, used by
+``tm2py-utils sample`` (cli.py) and runnable on its own:
+
+    python resource_sampler.py -o run_samples.parquet -- python -m tm2py.run ...
+    python resource_sampler.py -o run_samples.parquet --pid 12345
+
+- a background thread samples the process and all its descendants every interval
+  seconds: cumulative CPU seconds, RSS, cumulative disk read/write bytes and the
+  number of processes, plus system CPU % and available memory
+- per-process counters are differenced between samples (keyed by pid and creation
+  time), so the cumulative columns never drop when a child exits; the CPU and I/O
+  of a child between its last sample and its exit are not counted
+- samples are appended to the Parquet file as a row group every FLUSH_SAMPLES
+  samples, so a long run that dies keeps its series
+
+``tm2py-utils perf LOG --samples run_samples.parquet`` joins the series onto the
+steps of the run log (perf_log.step_resources): peak RSS, CPU seconds and I/O bytes
+per step.
+"""
+import argparse
+import logging
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import psutil
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+INTERVAL = 1.0
+FLUSH_SAMPLES = 300
+
+SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("ms")),
+    ("processes", pa.int32()),
+    ("cpu_s", pa.float64()),
+    ("cpu_percent", pa.float32()),
+    ("rss_bytes", pa.int64()),
+    ("read_bytes", pa.int64()),
+    ("write_bytes", pa.int64()),
+    ("system_cpu_percent", pa.float32()),
+    ("system_available_bytes", pa.int64()),
+])
+
+
+class ResourceSampler:
+    """
+    Background sampler of a process tree.
+
+    Args:
+        pid (int): root process (default: this process)
+        output (Path): Parquet file written by the sampler
+        interval (float): seconds between samples
+        include_children (bool): sample the descendants of the root too
+
+    Usage:
+        with ResourceSampler(process.pid, "samples.parquet"):
+            process.wait()
+    """
+
+    def __init__(self, pid=None, output="samples.parquet", interval=INTERVAL, include_children=True):
+        self.root = psutil.Process(pid)
+        self.output = Path(output)
+        self.interval = interval
+        self.include_children = include_children
+        self._counters = {}  # (pid, create_time) -> (cpu_s, read_bytes, write_bytes)
+        self._totals = [0.0, 0, 0]
+        self._last = None
+        self._rows = []
+        self._writer = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ResourceSampler", daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        # counters accumulated before the sampler started are not attributed to the run
+        self._read_processes(baseline=True)
+        psutil.cpu_percent()
+        self._last = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+        logger.info(f"Wrote resource samples to {self.output}")
+
+    def wait(self):
+        """Block until the root process exits."""
+        while self._thread.is_alive():
+            self._thread.join(self.interval)
+
+    def _processes(self):
+        try:
+            processes = [self.root]
+            if self.include_children:
+                processes += self.root.children(recursive=True)
+            return processes
+        except psutil.NoSuchProcess:
+            return []
+
+    def _read_processes(self, baseline=False):
+        """Add the counter increments since the last sample; returns (processes, rss)."""
+        count, rss = 0, 0
+        for process in self._processes():
+            try:
+                with process.oneshot():
+                    key = (process.pid, process.create_time())
+                    cpu = process.cpu_times()
+                    memory = process.memory_info()
+                    try:
+                        io = process.io_counters()
+                        read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                    except (AttributeError, psutil.AccessDenied):
+                        # no per-process I/O counters on macOS
+                        read_bytes = write_bytes = 0
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+            current = (cpu.user + cpu.system, read_bytes, write_bytes)
+            previous = self._counters.get(key, current if baseline else (0.0, 0, 0))
+            for i in range(3):
+                self._totals[i] += max(current[i] - previous[i], 0)
+            self._counters[key] = current
+            count += 1
+            rss += memory.rss
+        return count, rss
+
+    def sample(self):
+        """Take one sample and buffer it."""
+        cpu_before = self._totals[0]
+        processes, rss = self._read_processes()
+        now = time.monotonic()
+        elapsed, self._last = now - self._last, now
+        self._rows.append({
+            "timestamp": datetime.now(),
+            "processes": processes,
+            "cpu_s": self._totals[0],
+            "cpu_percent": 100 * (self._totals[0] - cpu_before) / elapsed if elapsed > 0 else 0.0,
+            "rss_bytes": rss,
+            "read_bytes": self._totals[1],
+            "write_bytes": self._totals[2],
+            "system_cpu_percent": psutil.cpu_percent(),
+            "system_available_bytes": psutil.virtual_memory().available,
+        })
+        if len(self._rows) >= FLUSH_SAMPLES:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=SCHEMA)
+        if self._writer is None:
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(self.output, SCHEMA, compression="zstd")
+        self._writer.write_table(table)
+        self._rows = []
+
+    def _run(self):
+        self.sample()
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if not self.root.is_running():
+                break
+        # last sample so short runs and the final step get an end point
+        if self._stop.is_set():
+            self.sample()
+
+
+def sample_command(command, output, interval=INTERVAL):
+    """Run a command, sampling its process tree until it exits; returns its exit code."""
+    process = subprocess.Popen(command)
+    with ResourceSampler(process.pid, output, interval):
+        return_code = process.wait()
+    return return_code
+
+
+def sample_pid(pid, output, interval=INTERVAL):
+    """Sample a running process tree until the process exits or the sampler is interrupted."""
+    sampler = ResourceSampler(pid, output, interval)
+    sampler.start()
+    try:
+        sampler.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+
+
+def parse_cli_sample(args):
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if (args.pid is None) == (not command):
+        raise SystemExit("Give either --pid or a command to run")
+    if args.pid is not None:
+        sample_pid(args.pid, args.output, args.interval)
+    else:
+        sys.exit(sample_command(command, args.output, args.interval))
+
+def add_sample_arguments(parser):
+    parser.add_argument("-o", "--output", default="samples.parquet", help="Parquet file of samples (default: samples.parquet)")
+    parser.add_argument("-i", "--interval", type=float, default=INTERVAL,
+                        help=f"Seconds between samples (default: {INTERVAL})")
+    parser.add_argument("--pid", type=int, help="Sample a running process (and its children) instead of a command")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Command to run and sample, after --")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample CPU, memory and disk I/O of a process tree")
+    add_sample_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parse_cli_sample(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,67 @@
 """
-Quick preview of TM1 RData files - exports just first 10,000 rows for validation testing
+Reproducible sample of TM1 RData files - exports the same random households from every table for validation testing
+
+Rows are kept by a seeded hash of hh_id (see tm1_rdata.py), so households, persons,
+tours and trips samples stay consistent with each other and the same seed always
+gives the same sample.
+
+Usage:
+    python sample_tm1_rdata.py [--fraction 0.01] [--seed 0] [--workers 2]
 """
-import pyreadr
-import pandas as pd
+import argparse
+import logging
+
 from pathlib import Path
 
+from tm1_rdata import SAMPLE_KEY, convert_rdata_files
+
 # Directories
 rdata_dir = Path(r"M:\Application\Model One\RTP2025\IncrementalProgress\2023_TM161_IPA_35\OUTPUT\updated_output")
-output_dir = Path(r"M:\Application\Model One\RTP2025\IncrementalProgress\2023_TM161_IPA_35\OUTPUT\ctramp_csv_sample")
-
-# Create output directory
-output_dir.mkdir(parents=True, exist_ok=True)
+output_dir = Path(r"M:\Application\Model One\RTP2025\IncrementalProgress\2023_TM161_IPA_35\OUTPUT\ctramp_parquet_sample")
 
-# Sample size
-SAMPLE_SIZE = 10000
+# Share of households sampled
+SAMPLE_FRACTION = 0.01
+SEED = 0
 
 # Files to convert
 rdata_files = {
-    "households.rdata": "householdData_sample.csv",
-    "persons.rdata": "personData_sample.csv",
-    "tours.rdata": "indivTourData_sample.csv",
-    "trips.rdata": "indivTripData_sample.csv",
+    "households.rdata": "householdData_sample.parquet",
+    "persons.rdata": "personData_sample.parquet",
+    "tours.rdata": "indivTourData_sample.parquet",
+    "trips.rdata": "indivTripData_sample.parquet",
 }
 
-print("=" * 80)
-print("TM1 RData Sample Extractor (First 10K rows)")
-print("=" * 80)
-print(f"Source: {rdata_dir}")
-print(f"Output: {output_dir}")
-print()
 
-for rdata_file, csv_file in rdata_files.items():
-    rdata_path = rdata_dir / rdata_file
-    csv_path = output_dir / csv_file
-    
-    print(f"Processing: {rdata_file}")
-    
-    if not rdata_path.exists():
-        print(f"  [SKIP] File not found")
-        continue
-    
-    try:
-        # Read .rdata file
-        import time
-        start = time.time()
-        result = pyreadr.read_r(str(rdata_path))
-        read_time = time.time() - start
-        
-        if len(result) == 0:
-            print(f"  [ERROR] No objects found in file")
-            continue
-        
-        # Get the first dataframe
-        obj_name = list(result.keys())[0]
-        df = result[obj_name]
-        
-        print(f"  Read time: {read_time:.1f}s")
-        print(f"  Object: {obj_name}")
-        print(f"  Full size: {len(df):,} rows, {len(df.columns)} columns")
-        
-        # Take sample
-        if len(df) > SAMPLE_SIZE:
-            df_sample = df.head(SAMPLE_SIZE)
-            print(f"  Sampling: {SAMPLE_SIZE:,} rows (first {SAMPLE_SIZE} records)")
-        else:
-            df_sample = df
-            print(f"  Using all rows (< {SAMPLE_SIZE:,})")
-        
-        # Show columns
-        col_preview = ', '.join(df.columns[:15].tolist())
-        if len(df.columns) > 15:
-            col_preview += f", ... ({len(df.columns)} total)"
-        print(f"  Columns: {col_preview}")
-        
-        # Save sample to CSV
-        write_start = time.time()
-        df_sample.to_csv(csv_path, index=False)
-        write_time = time.time() - write_start
-        
-        size_mb = csv_path.stat().st_size / (1024 * 1024)
-        print(f"  [OK] Saved: {csv_file} ({size_mb:.1f} MB, took {write_time:.1f}s)")
-        
-    except Exception as e:
-        print(f"  [ERROR] {type(e).__name__}: {e}")
-    
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible household sample of TM1 RData files")
+    parser.add_argument("--rdata-dir", type=Path, default=rdata_dir, help="Directory of the .rdata files")
+    parser.add_argument("--output-dir", type=Path, default=output_dir, help="Directory of the Parquet samples")
+    parser.add_argument("--fraction", type=float, default=SAMPLE_FRACTION,
+                        help=f"Share of households kept (default: {SAMPLE_FRACTION})")
+    parser.add_argument("--seed", type=int, default=SEED, help=f"Sample seed (default: {SEED})")
+    parser.add_argument("--key", default=SAMPLE_KEY, help=f"Column sampled on (default: {SAMPLE_KEY})")
+    parser.add_argument("--workers", type=int, default=None, help="Files converted in parallel (default: all cores)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    print("=" * 80)
+    print(f"TM1 RData Sample Extractor ({args.fraction:.1%} of {args.key}, seed {args.seed})")
+    print("=" * 80)
+    print(f"Source: {args.rdata_dir}")
+    print(f"Output: {args.output_dir}")
     print()
 
-print("=" * 80)
-print("SAMPLE EXTRACTION COMPLETE")
-print("=" * 80)
-print(f"Sample files saved to: {output_dir}")
-print("\nNow you can run validation on the sample directory to test the data model.")
+    results = convert_rdata_files(args.rdata_dir, args.output_dir, rdata_files, args.workers,
+                                  sample_fraction=args.fraction, sample_key=args.key, seed=args.seed)
+
+    print()
+    print(results.to_string(index=False))
+    print("=" * 80)
+    print("SAMPLE EXTRACTION COMPLETE")
+    print("=" * 80)
+    print(f"Sample files saved to: {args.output_dir}")
+    print("\nNow you can run validation on the sample directory to test the data model.")
+
+
+if __name__ == "__main__":
+    main()
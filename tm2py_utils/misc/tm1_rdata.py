@@ -0,0 +1,190 @@
+"""
+Convert TM1 RData outputs to typed, compressed Parquet.
+
+Used by convert_tm1_rdata_to_csv.py (full tables) and sample_tm1_rdata.py
+(reproducible samples):
+
+    from tm1_rdata import convert_rdata_files
+    convert_rdata_files(rdata_dir, output_dir, {"trips.rdata": "indivTripData_final.parquet"})
+
+- an RData file is one compressed serialized object, so it cannot be read in
+  pieces, but the loaded table is never copied: it is written as zstd Parquet in
+  row groups of ROW_GROUP_SIZE rows, one slice converted at a time
+- dtypes are narrowed without loss: whole-number doubles (R stores most ids and
+  counts as numeric) become nullable integers, 64-bit integers that fit become
+  32-bit; float32 is opt-in since it rounds values
+- R factors arrive as pandas categoricals and are written as Parquet dictionaries,
+  so their levels (and level order) survive the round trip
+- files are converted in parallel processes, largest first; each process holds
+  one table, so lower max_workers when the largest tables do not fit max_workers
+  times in memory
+- samples select rows by a seeded hash of a key column (hh_id by default), so the
+  same households are kept in every table (households, persons, tours, trips) and
+  the same seed gives the same sample on every run; files without the key are
+  sampled by row position
+"""
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyreadr
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP_SIZE = 1_000_000
+SAMPLE_KEY = "hh_id"
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def read_rdata_frame(rdata_path):
+    """(object name, data frame) of the first object of an RData file (TM1 files hold one)."""
+    result = pyreadr.read_r(str(rdata_path))
+    if not result:
+        raise ValueError(f"No objects found in {rdata_path}")
+    return next(iter(result.items()))
+
+
+def optimize_dtypes(df, float32=False):
+    """Narrow column dtypes in place without changing values (float32 rounds, opt-in)."""
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_float_dtype(values):
+            finite = values.dropna()
+            if len(finite) and np.all(np.isfinite(finite)) and np.all(np.mod(finite, 1) == 0):
+                fits = finite.min() >= INT32_MIN and finite.max() <= INT32_MAX
+                df[col] = values.astype("Int32" if fits else "Int64")
+            elif float32:
+                df[col] = values.astype("float32")
+        elif pd.api.types.is_integer_dtype(values) and values.dtype.itemsize > 4:
+            if len(values) == 0 or (values.min() >= INT32_MIN and values.max() <= INT32_MAX):
+                df[col] = values.astype("Int32" if pd.api.types.is_extension_array_dtype(values) else "int32")
+    return df
+
+
+def sample_mask(df, fraction, key=SAMPLE_KEY, seed=0):
+    """
+    Boolean mask keeping about fraction of the rows, by a seeded hash of df[key].
+
+    Rows sharing a key value are kept or dropped together, in every table; without
+    the key column the row position is hashed. The seed is hashed as a second column
+    with the key, as hash_pandas_object ignores hash_key for numbers.
+
+    >>> ids = pd.DataFrame({"hh_id": np.arange(100_000)})
+    >>> bool((sample_mask(ids, 0.01, seed=1) == sample_mask(ids, 0.01, seed=1)).all())
+    True
+    >>> bool((sample_mask(ids, 0.01, seed=1) != sample_mask(ids, 0.01, seed=2)).any())
+    True
+    """
+    hash_key = f"{seed:016d}"[-16:]
+    values = df[key] if key in df.columns else pd.Series(np.arange(len(df)))
+    if pd.api.types.is_numeric_dtype(values) and np.all(np.mod(values.dropna(), 1) == 0):
+        # the same id hashes alike whether a table stores it as R integer or numeric
+        values = values.fillna(-1).astype("int64")
+    keys = pd.DataFrame({"key": values.to_numpy(), "seed": np.full(len(values), seed, dtype="int64")})
+    hashes = pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key).to_numpy()
+    return (hashes >> np.uint64(11)) < np.uint64(fraction * 2**53)
+
+
+def write_parquet(df, parquet_path, row_group_size=ROW_GROUP_SIZE):
+    """Write df to parquet_path in row groups, atomically."""
+    parquet_path = Path(parquet_path)
+    parquet_path.parent.mkdir(parents=True, exist_ok=True)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    fd, tmp_path = tempfile.mkstemp(dir=parquet_path.parent, suffix=".parquet.tmp")
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            for start in range(0, max(len(df), 1), row_group_size):
+                chunk = df.iloc[start:start + row_group_size]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        os.replace(tmp_path, parquet_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def rdata_to_parquet(rdata_path, parquet_path, row_group_size=ROW_GROUP_SIZE, sample_fraction=None,
+                     sample_key=SAMPLE_KEY, seed=0, float32=False):
+    """
+    Convert the data frame of one RData file to Parquet.
+
+    Args:
+        rdata_path (Path): TM1 .rdata file
+        parquet_path (Path): output Parquet file
+        row_group_size (int): rows per Parquet row group
+        sample_fraction (float): keep this fraction of sample_key values (default: all rows)
+        sample_key (str): column sampled on
+        seed (int): sample seed
+        float32 (bool): store non-integral doubles as float32
+
+    Returns:
+        dict: file, object, rows read and written, columns, seconds, MB written
+    """
+    start = time.time()
+    obj_name, df = read_rdata_frame(rdata_path)
+    rows = len(df)
+    if sample_fraction is not None:
+        df = df.loc[sample_mask(df, sample_fraction, sample_key, seed)].reset_index(drop=True)
+    optimize_dtypes(df, float32)
+    write_parquet(df, parquet_path, row_group_size)
+    return {
+        "file": Path(rdata_path).name,
+        "object": obj_name,
+        "rows": rows,
+        "written": len(df),
+        "columns": len(df.columns),
+        "seconds": round(time.time() - start, 1),
+        "size_mb": round(Path(parquet_path).stat().st_size / 2**20, 1),
+    }
+
+
+def convert_rdata_files(rdata_dir, output_dir, rdata_files, max_workers=None, **kwargs):
+    """
+    Convert RData files to Parquet in parallel processes, largest first.
+
+    Args:
+        rdata_dir (Path): directory of the .rdata files
+        output_dir (Path): directory of the Parquet files
+        rdata_files (dict): .rdata file name -> Parquet file name
+        max_workers (int): parallel conversions; None uses os.cpu_count()
+        **kwargs: row_group_size, sample_fraction, sample_key, seed, float32 of rdata_to_parquet
+
+    Returns:
+        DataFrame: one row per converted file (see rdata_to_parquet); missing files
+        are skipped and failed files reported with their error
+    """
+    rdata_dir, output_dir = Path(rdata_dir), Path(output_dir)
+    tasks = []
+    for rdata_file, parquet_file in rdata_files.items():
+        rdata_path = rdata_dir / rdata_file
+        if not rdata_path.exists():
+            logger.warning(f"[SKIP] {rdata_file} not found")
+            continue
+        tasks.append((rdata_path, output_dir / parquet_file))
+    tasks.sort(key=lambda task: task[0].stat().st_size, reverse=True)
+
+    results = []
+    workers = min(max_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(rdata_to_parquet, rdata_path, parquet_path, **kwargs): rdata_path
+                   for rdata_path, parquet_path in tasks}
+        for future in as_completed(futures):
+            rdata_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"[ERROR] {rdata_path.name}: {type(e).__name__}: {e}")
+                results.append({"file": rdata_path.name, "error": f"{type(e).__name__}: {e}"})
+                continue
+            logger.info(f"[OK] {result['file']} ({result['object']}): {result['written']:,} of {result['rows']:,} rows, "
+                        f"{result['columns']} columns, {result['size_mb']} MB in {result['seconds']}s")
+            results.append(result)
+    return pd.DataFrame(results)
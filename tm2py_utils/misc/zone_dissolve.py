@@ -0,0 +1,213 @@
+"""
+Zone geometry builds shared by the MAZ/TAZ tools.
+
+Dissolves a polygon coverage (census blocks, MAZs) into zones, as
+``GeoDataFrame.dissolve`` does, for maz_taz_checker.py and
+popsim_tm2_crosswalk_creator.py:
+
+- zones are unioned with shapely 2's coverage union, which only has to drop the
+  edges shared by adjacent polygons instead of running a full overlay; any zone
+  whose coverage union comes out invalid (input that isn't a clean coverage) is
+  redone with a regular union
+- whole zones are partitioned (e.g. by county) and the partitions are unioned
+  across a process pool
+- perimeter, area, part count and centroids are computed with vectorized
+  shapely calls on one projected copy of the layer
+- dissolved layers can be cached as GeoParquet, keyed by a hash of the zone
+  assignment (the crosswalk), the input geometries and the aggregation, so
+  re-running with an unchanged crosswalk reads the zones back instead
+
+Usage:
+
+    from tm2py_utils.misc.zone_dissolve import dissolve_zones, shape_metrics
+
+    maz_gdf = dissolve_zones(blocks_gdf, ['maz', 'COUNTYFP10'], {'ALAND10': 'sum'},
+                             partition='COUNTYFP10', cache_dir=Path('cache'))
+    metrics = shape_metrics(maz_gdf.geometry, 'EPSG:2227')
+
+The result has one row per zone, sorted by the ``by`` columns, with those
+columns, the aggregated columns and the dissolved geometry.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# below this many input polygons the unions are computed in-process
+PARALLEL_MIN_GEOMETRIES = 20000
+
+# bump to invalidate cached layers after a change to the dissolve
+CACHE_VERSION = 1
+
+
+def _union_groups(geoms, codes, coverage=True):
+    """
+    Union geometries by group code.
+
+    Args:
+        geoms: array of polygons
+        codes: group code of each polygon, sorted ascending
+        coverage: use coverage union (polygons of a group don't overlap)
+    Returns:
+        (group codes, unioned geometry per group)
+    """
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.zeros(0, dtype=int)
+    ends = np.r_[starts[1:], len(codes)]
+    union = shapely.coverage_union_all if coverage else shapely.union_all
+    unioned = np.array([union(geoms[start:end]) for start, end in zip(starts, ends)], dtype=object)
+
+    if coverage and len(unioned):
+        invalid = np.flatnonzero(~shapely.is_valid(unioned))
+        if len(invalid):
+            logger.debug(f"Coverage union invalid for {len(invalid)} zones; using union_all")
+            for i in invalid:
+                unioned[i] = shapely.union_all(shapely.make_valid(geoms[starts[i]:ends[i]]))
+    return codes[starts], unioned
+
+
+def dissolve_geometries(geoms, codes, partitions=None, coverage=True, max_workers=None):
+    """
+    Union geometries by group code, partition by partition in parallel.
+
+    Args:
+        geoms: array of polygons
+        codes: integer group code (0..n_groups-1) of each polygon
+        partitions: integer partition of each polygon; every group is unioned in the
+            partition of its first polygon, so groups are never split
+        coverage: use coverage union
+        max_workers: process pool size; None uses os.cpu_count(), 1 disables the pool
+    Returns:
+        np.ndarray of unioned geometries indexed by group code
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    codes = np.asarray(codes)
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    if partitions is None:
+        partitions = np.zeros(len(codes), dtype=int)
+
+    # partition of each group (that of its first polygon), then sort by (partition, group)
+    first = np.full(n_groups, len(codes))
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    group_partition = np.asarray(partitions)[first]
+    order = np.lexsort((codes, group_partition[codes]))
+    geoms, codes, polygon_partition = geoms[order], codes[order], group_partition[codes[order]]
+    bounds = np.flatnonzero(np.r_[True, polygon_partition[1:] != polygon_partition[:-1], True])
+    tasks = [(geoms[start:end], codes[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    logger.debug(f"Dissolving {len(geoms):,} polygons into {n_groups:,} zones in {len(tasks)} partitions")
+    if workers <= 1 or len(geoms) < PARALLEL_MIN_GEOMETRIES:
+        results = [_union_groups(task_geoms, task_codes, coverage) for task_geoms, task_codes in tasks]
+    else:
+        # largest partitions first so the pool isn't left waiting on one at the end
+        tasks.sort(key=lambda task: -len(task[0]))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                _union_groups,
+                [task_geoms for task_geoms, _ in tasks],
+                [task_codes for _, task_codes in tasks],
+                [coverage] * len(tasks),
+            ))
+
+    dissolved = np.empty(n_groups, dtype=object)
+    for group_codes, unioned in results:
+        dissolved[group_codes] = unioned
+    return dissolved
+
+
+def cache_key(gdf, by, aggfunc, coverage):
+    """sha256 of the zone assignment, geometries, CRS and aggregation of a dissolve."""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_VERSION}|{by}|{sorted(aggfunc.items())}|{coverage}|{gdf.crs.to_wkt() if gdf.crs else None}|".encode())
+    columns = by + [column for column in aggfunc if column not in by]
+    digest.update(pd.util.hash_pandas_object(gdf[columns], index=False).to_numpy().tobytes())
+    digest.update(b"".join(shapely.to_wkb(np.asarray(gdf.geometry.values))))
+    return digest.hexdigest()
+
+
+def _store(path, gdf):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".parquet.tmp")
+    os.close(fd)
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def dissolve_zones(gdf, by, aggfunc=None, partition=None, coverage=True, max_workers=None,
+                   cache_dir=None, name="zones"):
+    """
+    Dissolve polygons into zones, like ``gdf.dissolve(by, aggfunc=aggfunc, as_index=False)``.
+
+    Args:
+        gdf (GeoDataFrame): polygons with the zone columns in ``by``
+        by (str or list): zone columns
+        aggfunc (dict): column -> aggregation for the other columns to keep (default: none)
+        partition (str): column to split the work by (e.g. county); zones are unioned
+            in the partition of their first polygon
+        coverage (bool): the polygons form a coverage (no overlaps), as census blocks do
+        max_workers (int): process pool size; None uses os.cpu_count(), 1 runs in-process
+        cache_dir (Path): if given, the dissolved layer is read from / written to here
+        name (str): prefix of the cached file
+    Returns:
+        GeoDataFrame with one row per zone, sorted by ``by``, in the CRS of gdf
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    aggfunc = dict(aggfunc or {})
+
+    path = None
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        path = Path(cache_dir) / f"{name}-{cache_key(gdf, by, aggfunc, coverage)[:16]}.parquet"
+        if path.exists():
+            logger.info(f"Reading dissolved {name} from {path}")
+            return gpd.read_parquet(path)
+
+    # rows with a missing zone are dropped, as in GeoDataFrame.dissolve
+    gdf = gdf.loc[gdf[by].notna().all(axis=1).to_numpy()]
+    grouped = gdf.groupby(by, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    if aggfunc:
+        zones = grouped.agg(aggfunc).reset_index()
+    else:
+        zones = grouped.size().reset_index()[by]
+    partitions = pd.factorize(gdf[partition])[0] if partition else None
+
+    geometry = dissolve_geometries(gdf.geometry.values, codes, partitions, coverage, max_workers)
+    zones = gpd.GeoDataFrame(zones, geometry=geometry, crs=gdf.crs)
+    logger.info(f"Dissolved {len(gdf):,} polygons into {len(zones):,} {name}")
+
+    if path is not None:
+        _store(path, zones)
+    return zones
+
+
+def shape_metrics(geoms, local_crs, centroid_crs="EPSG:4326"):
+    """
+    Part count, perimeter, area and centroid of each geometry.
+
+    Args:
+        geoms (GeoSeries): geometries with a CRS
+        local_crs: projected CRS for lengths, areas and centroids
+        centroid_crs: CRS of the returned centroid coordinates
+    Returns:
+        DataFrame with partcount, perimeter and area (in local_crs units) and
+        centroid_x, centroid_y (in centroid_crs), indexed like geoms
+    """
+    projected = np.asarray(geoms.to_crs(local_crs).values)
+    centroids = gpd.GeoSeries(shapely.centroid(projected), crs=local_crs).to_crs(centroid_crs)
+    return pd.DataFrame({
+        'partcount': shapely.get_num_geometries(np.asarray(geoms.values)),
+        'perimeter': shapely.length(projected),
+        'area': shapely.area(projected),
+        'centroid_x': shapely.get_x(np.asarray(centroids.values)),
+        'centroid_y': shapely.get_y(np.asarray(centroids.values)),
+    }, index=geoms.index)
@@ -1,48 +1,34 @@
 # Intended for comparing all skims located in a folder where there are multiple model runs in subdirectctories 
-# outputs long format table and a geometry, for viewing in tablaue
+# outputs skim difference statistics and top changed OD pairs per run and a geometry, for viewing in tablaue
 # %%
 import pandas as pd
-import openmatrix as omx
 from pathlib import Path
 import geopandas as gpd
-from importlib import Path
-import pandas as pd
 
-import numpy as np
+from skim_diff import compare_skim_sets
 
 network_fid_path = Path(
     r"Z:\MTC\US0024934.9168\Task_3_runtime_improvements\3.1_network_fidelity\run_result"
 )
 # network_fid_path = Path(r"D:\TEMP\TM2.2.1.1-0.05")
 
-consolidated_table_path = Path(r"Z:\MTC\US0024934.9168\Task_3_runtime_improvements\3.1_network_fidelity\output_summaries\skim_data\skims.csv")
+skim_diff_path = Path(r"Z:\MTC\US0024934.9168\Task_3_runtime_improvements\3.1_network_fidelity\output_summaries\skim_data")
 skims_with_geom_dump = Path(r"D:\TEMP\output_summaries")
 # %%
-
-
-def read_matrix_as_long_df(path: Path, run_name):
-    run = omx.open_file(path, "r")
-    am_time = np.array(run["AM_da_time"])
-    index_lables = list(range(am_time.shape[0]))
-    return (
-        pd.DataFrame(am_time, index=index_lables, columns=index_lables)
-        .stack()
-        .rename(run_name)
-        .to_frame()
-    )
+# every run directory with skims; the first is the base the others are compared against
+run_dirs = sorted(path for path in network_fid_path.iterdir() if path.is_dir() and any(path.rglob("*_taz.omx")))
+base_run, other_runs = run_dirs[0], {path.name: path for path in run_dirs[1:]}
+print(f"base {base_run.name}, comparing {list(other_runs)}")
 
 # %%
-all_skims = []
-for skim_matrix_path in network_fid_path.rglob("*AM_taz.omx"):
-    print(skim_matrix_path)
-    run_name = skim_matrix_path.parts[6]
-    all_skims.append(read_matrix_as_long_df(skim_matrix_path, run_name))
-
-all_skims = pd.concat(all_skims, axis=1)
+# matrices are streamed in row blocks, so all periods and matrices fit in memory
+# max_workers=1: this cell script has no __main__ guard, which worker processes need on Windows
+# (run skim_diff.py from the command line to compare in parallel)
+skim_stats, skim_top_changes = compare_skim_sets(
+    base_run, other_runs, skim_diff_path, pattern="**/*_taz.omx", max_workers=1
+)
 # %%
-# %%%
-# output skims in long format for processing
-all_skims.to_csv(consolidated_table_path)
+skim_stats.query("matrix == 'AM_da_time'")
 #%%
 all_files = []
 for file in skims_with_geom_dump.glob("*_roadway_network.geojson"):
@@ -3,12 +3,11 @@
 #  "run_*/Scenario_*/emme_links.shp"
 # and then concatinate the links into a single file for comparisons 
 # %%
-import geopandas as gpd
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from tqdm import tqdm
-from shapely.geometry import LineString
+
+from link_store import read_link_results, read_links, update_link_store, wide_link_table
 
 input_dir = Path(
     r"Z:\MTC\US0024934.9168\Task_3_runtime_improvements\3.1_network_fidelity\run_result"
@@ -20,6 +19,9 @@ wide_links_table_output_path = Path(
 
 output_dir = input_dir / "consolidated_3"
 
+# geometry once per link, per run/scenario attributes as Parquet columns; see link_store.py
+link_store_dir = output_dir / "link_store"
+
 
 # in_file = next(input_dir.rglob('emme_links.shp'))
 # print("reading", in_file)
@@ -32,141 +34,24 @@ scenarios_to_consolidate = (11, 12, 13, 14, 15)
 runs_to_consolidate = (3, 4)
 # %%
 
-
-def read_file_and_tag(
-    path: Path,
-    columns_to_filter=(
-        "@ft",
-        "VOLAU",
-        "@capacity",
-        "run_number",
-        "scenario_number",
-        "#link_id",
-        "geometry",
-    ),
-) -> pd.DataFrame:
-    scenario = file.parent.stem
-    scenario_number = int(scenario.split("_")[-1])
-    if scenario_number not in scenarios_to_consolidate:
-        return None
-
-    run = file.parent.parent.stem
-    run_number = int(run.split("_")[-1])
-    if run_number not in runs_to_consolidate:
-        return None
-
-    return_gdf = gpd.read_file(path, engine="pyogrio")
-
-    return_gdf["scenario"] = scenario
-    return_gdf["scenario_number"] = scenario_number
-    return_gdf["run"] = run
-    return_gdf["run_number"] = run_number
-
-    if "VOLAU" not in return_gdf.columns:
-        print(return_gdf.columns)
-        print("... No VOLAU, filling with zero")
-        return_gdf["VOLAU"] = 0
-
-    return_gdf = return_gdf[list(columns_to_filter)]
-
-    # assert return_gdf["#link_id"].is_unique
-
-    return return_gdf
-
-
-def get_linestring_direction(linestring: LineString) -> str:
-    if not isinstance(linestring, LineString) or len(linestring.coords) < 2:
-        raise ValueError("Input must be a LineString with at least two coordinates")
-
-    start_point = linestring.coords[0]
-    end_point = linestring.coords[-1]
-
-    delta_x = end_point[0] - start_point[0]
-    delta_y = end_point[1] - start_point[1]
-
-    if abs(delta_x) > abs(delta_y):
-        if delta_x > 0:
-            return "East"
-        else:
-            return "West"
-    else:
-        if delta_y > 0:
-            return "North"
-        else:
-            return "South"
-
-
-# %%
-
-print("Reading Links...", end="")
-all_links = []
-for file in tqdm(input_dir.rglob("run_*/Scenario_*/emme_links.shp")):
-    print(file)
-    all_links.append(read_file_and_tag(file))
-links_table = pd.concat(all_links)
-
+print("Updating link store...")
+update_link_store(
+    link_store_dir, input_dir, runs=runs_to_consolidate, scenarios=scenarios_to_consolidate
+)
+links_table = read_link_results(
+    link_store_dir,
+    ["@ft", "VOLAU", "@capacity"],
+    runs=runs_to_consolidate,
+    scenarios=scenarios_to_consolidate,
+).rename(columns={"run": "run_number", "scenario": "scenario_number"})
+links_table["saturation"] = links_table["VOLAU"] / links_table["@capacity"]
 print("done")
+
 # %%
-scen_map = {11: "EA", 12: "AM", 13: "MD", 14: "PM", 15: "EV"}
-
-
-def get_return_first_gem(row):
-    geom_columns = [col for col in row.index if "geometry" in col]
-    return [
-        row[col]
-        for col in geom_columns
-        if (row[col] is not None) and (row[col] != np.NAN)
-    ][0]
-
-
-def combine_tables(dfs, columns_same):
-    return_frame = dfs[0][columns_same]
-
-    for df in dfs:
-        run_number = df["run_number"].iloc[0]
-
-        scen_number = df["scenario_number"].iloc[0]
-        scen_number = scen_map[scen_number]
-        df["saturation"] = df["VOLAU"] / df["@capacity"]
-
-        df = df[["#link_id", "@capacity", "VOLAU", "geometry", "@ft"]].rename(
-            columns={
-                "@capacity": f"capacity_run{run_number}_scen{scen_number}",
-                "VOLAU": f"@volau_run{run_number}_scen{scen_number}",
-                "saturation": f"@saturation_run{run_number}_scen{scen_number}",
-                "geometry": f"geometry_run{run_number}_scen{scen_number}",
-                "@ft": f"ft_run{run_number}_scen{scen_number}",
-            }
-        )
-        # if there are link_ids that are not in the right frame
-        return_frame = return_frame.merge(
-            df, how="outer", on="#link_id", validate="1:1"
-        )
-        geometry = return_frame.apply(get_return_first_gem, axis=1)
-        # remove geometries that are not main geometry
-        return_frame = return_frame.drop(
-            columns=[col for col in return_frame.columns if "geometry_" in col]
-        )
-        return_frame["geometry"] = geometry
-
-    return return_frame
-
-
-all_links_no_none = [
-    links
-    for links in all_links
-    if (links is not None) and (links["#link_id"].is_unique)
-]
-links_wide_table = combine_tables(all_links_no_none, ["#link_id", "geometry"])
-
-links_wide_table["direction"] = links_wide_table["geometry"].apply(
-    get_linestring_direction
+# one column per run/scenario and measure, the highest facility type across runs as ft
+links_wide_table = wide_link_table(
+    link_store_dir, runs=runs_to_consolidate, scenarios=scenarios_to_consolidate
 )
-# %%
-ft_cols = [col for col in links_wide_table.columns if "ft_" in col]
-
-links_wide_table["ft"] = links_wide_table[ft_cols].max(axis=1)
-links_wide_table = links_wide_table.drop(columns=ft_cols)
 
 # %%
 links_wide_table.to_file(
@@ -177,22 +62,15 @@ links_wide_table.to_file(
 # %%
 num_iter = {(3, 11): 3, (3, 12): 10, (3, 13): 10, (3, 14): 19, (3, 15): 4, (4, 12): 20}
 # %%
-all_links_no_none = [
-    links for links in all_links if (links is not None)
-]  # and (links["#link_id"].is_unique)]
-for df in all_links_no_none:
-    df["saturation"] = df["VOLAU"] / df["@capacity"]
-ft6_sat = [
-    (
-        link["run_number"].iloc[0],
-        link["scenario_number"].iloc[0],
-        (link.loc[link["@ft"] == 6, "saturation"] > 1).mean(),
-    )
-    for link in all_links_no_none
-]
+ft6_sat = (
+    links_table.loc[links_table["@ft"] == 6]
+    .assign(oversaturated=lambda df: df["saturation"] > 1)
+    .groupby(["run_number", "scenario_number"])["oversaturated"]
+    .mean()
+)
 
 y = [val for val in num_iter.values()]
-x = [x[-1] for x in ft6_sat]
+x = [ft6_sat.get(key, np.nan) for key in num_iter]
 col = [val[0] for val in num_iter.keys()]
 
 # %%
@@ -214,31 +92,26 @@ plt.show()
 # %%
 import matplotlib.pyplot as plt
 
-data = [links_wide_table[col] for col in links_wide_table.iloc[:, 2:].columns]
+data = [links_wide_table[col] for col in links_wide_table.filter(regex=r"_run\d+_scen").columns]
 
 fig = plt.boxplot(data)
 fig.show()
 
 # --------------------------------------------------------------------------
 # %%
-links_table["direction"] = links_table["geometry"].apply(get_linestring_direction)
+links_table = read_links(link_store_dir).merge(links_table, on=["A", "B"])
 # %%
 links_table.to_file(output_dir / "all_data.geojson", index=False)
 
 
 # %%
 def get_link_counts(df: pd.DataFrame):
-    ret_val = df.value_counts("@ft").sort_index().to_frame().T
-    total = ret_val.sum(axis=1)
-    total_minus_8 = total - ret_val[8.0].iloc[0]
-    ret_val["total"] = total
-    ret_val["total_minus_8"] = total_minus_8
-
-    ret_val["run_number"] = df["run_number"].iloc[0]
-    ret_val["scenario_number"] = df["scenario_number"].iloc[0]
-    return ret_val
+    ret_val = df.pivot_table(
+        index=["run_number", "scenario_number"], columns="@ft", values="A", aggfunc="size", fill_value=0
+    )
+    ret_val["total"] = ret_val.sum(axis=1)
+    ret_val["total_minus_8"] = ret_val["total"] - ret_val.get(8.0, 0)
+    return ret_val.reset_index()
 
 
-pd.concat([get_link_counts(df) for df in all_links]).sort_values(
-    by=["run_number", "scenario_number"]
-)
+get_link_counts(links_table).sort_values(by=["run_number", "scenario_number"])
@@ -1,7 +1,9 @@
 
 import logging
+from pathlib import Path
 import requests
 import pandas as pd
+from tm2py_utils.misc.census_fetch import CensusFetchClient, CTPP_API_URL
 
 ## Config Logging
 logging.basicConfig(
@@ -14,6 +16,11 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__) 
 
+# Shared concurrent, cached fetch client. Set TM2PY_CENSUS_FETCH_MODE=replay
+# to rebuild the CTPP tables offline from cached responses.
+CACHE_DIR = Path(__file__).parent / 'cache' / 'census_api'
+client = CensusFetchClient.from_config({'cache_dir': CACHE_DIR, 'max_workers': 6})
+
 
 def pull_ctpp_data(
         year = 2021, 
@@ -60,9 +67,7 @@ def _pull_ctpp_data(
 
     try:
         logger.info("Requesting CTPP data from CTPP API")
-        response = requests.get(base_url, params = query_params, headers = header)
-        response.raise_for_status()
-        data = response.json()
+        data = client.get_json(base_url, params = query_params, headers = header)
         data = data['data']
         df = pd.DataFrame(data, columns = data[0])
         logger.info(f"Retrieved {len(data)} records from CTPP API")
@@ -127,7 +132,7 @@ def _get_base_ctpp_url(
         str: The applicable CTPP API url to query
     
     """
-    base_url = f'https://ctppdata.transportation.org/api/{type}/{year}'
+    base_url = f'{CTPP_API_URL}/{type}/{year}'
     
     return base_url
 
@@ -144,7 +149,7 @@ def get_variable_list(
         dict: dictionary with name and label
     
     """
-    base_url = f"https://ctppdata.transportation.org/api/groups/{table_id}/variables"
+    base_url = f"{CTPP_API_URL}/groups/{table_id}/variables"
     params = {
         'year': year
     }
@@ -156,9 +161,7 @@ def get_variable_list(
 
     try:
         logger.info("Requesting CTPP variable data from CTPP API")        
-        rq = requests.get(base_url, params, headers = header)
-        rq.raise_for_status()
-        variable = rq.json()
+        variable = client.get_json(base_url, params, headers = header)
         variable = variable['data']
         variable_df = pd.DataFrame(variable, columns = variable[0])
         variable_df.loc[variable_df['name'].str.contains('_m'), 'label'] = variable_df['label'] + "_MOE"
@@ -186,7 +189,9 @@ table_dict = {
 }
 year = 2021
 
-for table_id, table_name in table_dict.items():
+def export_ctpp_table(item):
+    """Pull one CTPP table with readable column names and write it to csv."""
+    table_id, table_name = item
     logging.info(f"Pulling CTPP data for {table_id}")
     variable_dict = get_variable_list(year, table_id)
     df = pull_ctpp_data(year, table_id, 'county')
@@ -195,4 +200,8 @@ for table_id, table_name in table_dict.items():
     df.rename(columns = variable_dict, inplace = True)
     df.to_csv(f"E:/GitHub/tm2/tm2py-utils/tm2py_utils/summary/data/{year}_CTPP_{table_name}.csv", index= False)
 
+# tables are pulled concurrently; cached tables are served from disk
+client.map(export_ctpp_table, list(table_dict.items()))
+client.log_stats()
+
 # %%
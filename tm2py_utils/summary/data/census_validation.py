@@ -5,6 +5,7 @@ from mtcpy import credentials
 from mtcpy import constants
 import pandas as pd
 import requests
+from tm2py_utils.misc.census_fetch import CensusFetchClient, CENSUS_API_URL
 
 # Configure logging
 logging.basicConfig(
@@ -17,6 +18,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Shared concurrent, cached fetch client. Set TM2PY_CENSUS_FETCH_MODE=replay
+# to rebuild the validation tables offline from cached responses.
+CACHE_DIR = Path(__file__).parent / 'cache' / 'census_api'
+# The key is the mtcpy Census credential the mtcpy.census pulls used, so requests stay under
+# the keyed rate limit rather than the daily limit of keyless calls.
+client = CensusFetchClient.from_config({'cache_dir': CACHE_DIR}, census.get_census_creds())
+
+STATE_CODE = '06'
+BAY_AREA_COUNTY_FIPS = ['001', '013', '041', '055', '075', '081', '085', '095', '097']
+
+
+def _county_table_request(year: int, acs_type: str, table_id):
+    """Build the request for one ACS table (group id or variable list) for the Bay Area counties."""
+    variables = list(table_id) if isinstance(table_id, list) else [f'group({table_id})']
+    return client.census_request(
+        year, f'acs/{acs_type}', ['NAME'] + variables,
+        f"county:{','.join(BAY_AREA_COUNTY_FIPS)}", state=STATE_CODE
+    )
+
+
+def _county_table(body, estimate_columns) -> pd.DataFrame:
+    """Convert a county-level ACS response to one row per county name with numeric estimates."""
+    table = pd.DataFrame(body[1:], columns=body[0])
+    table['county'] = table['NAME'].str.replace(' County, California', '', regex=False)
+    columns = [c for c in estimate_columns if c in table.columns]
+    table[columns] = table[columns].apply(pd.to_numeric, errors='coerce')
+    return table[['county'] + columns]
+
 
 def pull_acs_tables(table_ids: dict, year: int = 2023) -> dict:
     """Pull 1-Year ACS data for specified table IDs and process into summaries.
@@ -30,7 +59,7 @@ def pull_acs_tables(table_ids: dict, year: int = 2023) -> dict:
     logger.info(f"Processing {len(table_ids)} tables: {list(table_ids.keys())}")
     
     results = {}
-    variables = census.pull_acs_variables_dict(year=year, acs_type='acs1')
+    variables = client.get_json(f"{CENSUS_API_URL}/{year}/acs/acs1/variables.json")
     logger.info(f"Retrieved {len(variables.get('variables', {}))} variables from ACS")
     
     variables_df = pd.DataFrame.from_dict(variables['variables'], orient='index')
@@ -38,28 +67,30 @@ def pull_acs_tables(table_ids: dict, year: int = 2023) -> dict:
     variables_df['label'] = variables_df['label'].str.replace("!!", " ")
     logger.debug(f"Variables DataFrame shape: {variables_df.shape}")
 
-    for table_name, table_id in table_ids.items():
+    # Fetch every table concurrently; failures are handled per table below
+    def fetch_table(table_id):
+        try:
+            return client.fetch(_county_table_request(year, 'acs1', table_id))
+        except Exception as e:
+            return e
+
+    responses = client.map(fetch_table, list(table_ids.values()))
+
+    for (table_name, table_id), body in zip(table_ids.items(), responses):
         try:
             logger.info(f"Processing table: {table_name} (ID: {table_id})")
+            if isinstance(body, Exception):
+                raise body
             
             if isinstance(table_id, list):
                 logger.debug(f"  Using variable list with {len(table_id)} variables")
-                table = census.pull_acs_data(
-                    year=year,
-                    acs_type='acs1',
-                    variable_list=table_id,
-                    geography_level='county'
-                )
                 table_variables = variables_df.loc[table_id]
             else:
                 logger.debug(f"  Using table ID: {table_id}")
-                table = census.pull_acs_data(
-                    year=year,
-                    acs_type='acs1',
-                    table_id=table_id,
-                    geography_level="county"
-                )
                 table_variables = variables_df[variables_df['group'] == table_id]
+                # group() also returns margins of error and annotations; keep estimates
+                table_variables = table_variables[table_variables.index.str.endswith('E')]
+            table = _county_table(body, table_variables.index)
             
             logger.info(f"  Retrieved {len(table)} rows for {table_name}")
             
@@ -113,9 +144,7 @@ def pull_pums_data(year: int = 2023) -> pd.DataFrame:
     bay_area_puma = set(puma_to_county.keys())
     logger.info(f"Bay Area PUMAs: {len(bay_area_puma)} areas across {len(county_to_puma)} counties")
     
-    url = "https://api.census.gov/data/2023/acs/acs1/pums"
-    api_key = census.get_census_creds
-    logger.debug("Retrieved Census API credentials")
+    url = f"{CENSUS_API_URL}/{year}/acs/acs1/pums"
     
     params = {
         "get": "SERIALNO,HINCP,VEH,WGTP,ADJINC,PUMA",
@@ -126,9 +155,7 @@ def pull_pums_data(year: int = 2023) -> pd.DataFrame:
     
     try:
         logger.info("Requesting PUMS data from Census API")
-        response = requests.get(url, params)
-        response.raise_for_status()
-        data = response.json()
+        data = client.get_json(url, params)
         logger.info(f"Retrieved {len(data)} records from PUMS API")
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to retrieve PUMS data: {str(e)}", exc_info=True)
@@ -246,6 +273,7 @@ def main():
         logger.info("Phase 3: Aggregating and saving results")
         vehicles_by_income = aggregate_vehicles_by_income(puma_table)
         
+        client.log_stats()
         logger.info("=" * 60)
         logger.info("Census Validation Script Completed Successfully")
         logger.info("=" * 60)
@@ -1,112 +1,264 @@
-import sqlite3
-import os
+"""
+Export an EMME logbook (project.mlbk, sqlite) to text, Parquet or JSONL.
+
+Usage:
+    python emme_logbook_export.py project.mlbk emme_logbook.txt
+    python emme_logbook_export.py project.mlbk logbook.parquet --since 2024-03-01 --tag "inro.emme.traffic*"
+    python emme_logbook_export.py project.mlbk logbook.jsonl --pattern "warning|error"
+
+- elements are read a page at a time per session (keyset pagination on element_id),
+  with the attributes of the page only, so memory does not grow with the logbook
+- attribute values are decoded as they are read: text as is, blobs as UTF-8,
+  zlib-compressed blobs inflated first, other binary values base64 encoded
+- .parquet / .jsonl outputs are structured, one row per logbook entry: session,
+  element and parent ids, depth and tag path in the entry tree, begin / end /
+  duration from the begin_* / end_* attributes, cleaned description, raw text and
+  all attributes (a map in Parquet, an object in JSONL)
+- any other extension writes the readable text export
+- filters: --since / --until on the entry begin time, --tag globs on the entry tag,
+  --pattern regular expression searched in tag, description and attribute values
+"""
+import argparse
+import base64
+import fnmatch
+import json
 import re
+import sqlite3
+import zlib
 from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # Input and output paths
 input_file = r"E:\TM2_LU_2023_Full\emme_project\Logbook\project.mlbk"
 output_file = r"E:\TM2_LU_2023_Full\emme_project\emme_logbook.txt"
 
-def export_logbook_to_text(input_file, output_file):
-    conn = sqlite3.connect(input_file)
-    cursor = conn.cursor()
-    
-    # Get all documents (sessions) with their elements and attributes
-    query = """
-    SELECT 
-        d.document_id,
-        d.title as session_title,
-        e.element_id,
-        e.parent_id,
-        e.tag,
-        e.text,
-        a.name as attr_name,
-        a.value as attr_value
-    FROM documents d
-    LEFT JOIN elements e ON d.document_id = e.document_id
-    LEFT JOIN attributes a ON e.element_id = a.element_id
-    ORDER BY d.document_id, e.element_id, a.name
+PAGE_SIZE = 5000
+ROW_GROUP_SIZE = 50000
+
+SCHEMA = pa.schema([
+    ("document_id", pa.int64()),
+    ("session_title", pa.string()),
+    ("element_id", pa.int64()),
+    ("parent_id", pa.int64()),
+    ("depth", pa.int32()),
+    ("path", pa.string()),
+    ("tag", pa.string()),
+    ("description", pa.string()),
+    ("text", pa.string()),
+    ("begin", pa.timestamp("ms")),
+    ("end", pa.timestamp("ms")),
+    ("duration_s", pa.float64()),
+    ("attributes", pa.map_(pa.string(), pa.string())),
+])
+
+
+def decode_value(value):
+    """Attribute value as text; blobs are decoded (inflated if zlib-compressed)."""
+    if value is None or isinstance(value, str):
+        return value
+    if not isinstance(value, (bytes, memoryview)):
+        return str(value)
+    value = bytes(value)
+    if value[:1] == b"\x78":
+        try:
+            value = zlib.decompress(value)
+        except zlib.error:
+            pass
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return "base64:" + base64.b64encode(value).decode("ascii")
+
+
+def parse_timestamp(value):
+    """Naive local datetime of a logbook time attribute (ISO text or epoch seconds), else None."""
+    if not value:
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value.strip())
+        return timestamp.astimezone().replace(tzinfo=None) if timestamp.tzinfo else timestamp
+    except ValueError:
+        pass
+    try:
+        return datetime.fromtimestamp(float(value))
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def entry_times(attributes):
+    """(begin, end, duration_s) from the first begin_* and end_* attributes."""
+    begin = next((v for k, v in attributes.items() if k.startswith("begin_") and v), None)
+    end = next((v for k, v in attributes.items() if k.startswith("end_") and v), None)
+    begin, end = parse_timestamp(begin), parse_timestamp(end)
+    duration = (end - begin).total_seconds() if begin and end else None
+    return begin, end, duration
+
+
+def iter_elements(conn, page_size=PAGE_SIZE):
+    """
+    Yield the logbook elements session by session in element_id order.
+
+    Each element is a dict with document_id, session_title, element_id, parent_id,
+    depth, path, tag, text and attributes ({name: decoded value}). Elements are read
+    page_size at a time with only the attributes of that page.
     """
-    
-    cursor.execute(query)
-    results = cursor.fetchall()
-    
+    documents = conn.execute("SELECT document_id, title FROM documents ORDER BY document_id").fetchall()
+    for document_id, session_title in documents:
+        # element_id -> (depth, path) of the session's entries, to place children in the tree
+        tree = {}
+        last_id = -1
+        while True:
+            elements = conn.execute(
+                """
+                SELECT element_id, parent_id, tag, text FROM elements
+                WHERE document_id = ? AND element_id > ?
+                ORDER BY element_id LIMIT ?
+                """,
+                (document_id, last_id, page_size),
+            ).fetchall()
+            if not elements:
+                break
+            first_id, last_id = elements[0][0], elements[-1][0]
+            attributes = {}
+            cursor = conn.execute(
+                """
+                SELECT a.element_id, a.name, a.value FROM attributes a
+                JOIN elements e ON a.element_id = e.element_id
+                WHERE e.document_id = ? AND a.element_id BETWEEN ? AND ?
+                ORDER BY a.element_id, a.name
+                """,
+                (document_id, first_id, last_id),
+            )
+            while rows := cursor.fetchmany(page_size):
+                for element_id, name, value in rows:
+                    attributes.setdefault(element_id, {})[name] = decode_value(value)
+
+            for element_id, parent_id, tag, text in elements:
+                parent_depth, parent_path = tree.get(parent_id, (-1, ""))
+                depth = parent_depth + 1
+                path = f"{parent_path};{tag or ''}" if parent_path else (tag or "")
+                tree[element_id] = (depth, path)
+                yield {
+                    "document_id": document_id,
+                    "session_title": session_title,
+                    "element_id": element_id,
+                    "parent_id": parent_id,
+                    "depth": depth,
+                    "path": path,
+                    "tag": tag,
+                    "text": text,
+                    "attributes": attributes.get(element_id, {}),
+                }
+
+
+def element_matches(element, since=None, until=None, tags=None, pattern=None):
+    """Whether an element passes the date range, tag globs and text pattern filters."""
+    if tags and not any(fnmatch.fnmatchcase(element["tag"] or "", tag) for tag in tags):
+        return False
+    if since or until:
+        begin = element["begin"]
+        if begin is None or (since and begin < since) or (until and begin >= until):
+            return False
+    if pattern is not None:
+        values = [element["tag"] or "", element["description"], *element["attributes"].values()]
+        if not any(value and pattern.search(value) for value in values):
+            return False
+    return True
+
+
+def iter_entries(input_file, since=None, until=None, tags=None, pattern=None, page_size=PAGE_SIZE):
+    """Logbook elements with timings and cleaned description, filtered."""
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern, re.IGNORECASE)
+    conn = sqlite3.connect(f"{Path(input_file).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        for element in iter_elements(conn, page_size):
+            element["begin"], element["end"], element["duration_s"] = entry_times(element["attributes"])
+            element["description"] = clean_html_content(element["text"])
+            if element_matches(element, since, until, tags, pattern):
+                yield element
+    finally:
+        conn.close()
+
+
+def write_parquet(entries, output_file, row_group_size=ROW_GROUP_SIZE):
+    rows = []
+    with pq.ParquetWriter(output_file, SCHEMA, compression="zstd") as writer:
+        for entry in entries:
+            rows.append(dict(entry, attributes=list(entry["attributes"].items())))
+            if len(rows) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+
+
+def write_jsonl(entries, output_file):
+    with open(output_file, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps({name: entry[name] for name in SCHEMA.names}, default=str) + "\n")
+
+
+def write_text(entries, output_file):
     with open(output_file, "w", encoding="utf-8") as f:
         current_session = None
-        current_element = None
-        element_data = {}
-        
-        for row in results:
-            doc_id, session_title, elem_id, parent_id, tag, text, attr_name, attr_value = row
-            
+        for entry in entries:
             # New session
-            if current_session != doc_id:
-                if current_session is not None:
-                    # Write the last element if exists
-                    if current_element is not None:
-                        write_element_to_file(f, element_data)
-                
-                current_session = doc_id
-                current_element = None
-                element_data = {}
-                
+            if current_session != entry["document_id"]:
+                current_session = entry["document_id"]
                 f.write("=" * 60 + "\n")
-                f.write(f"SESSION: {session_title}\n")
+                f.write(f"SESSION: {entry['session_title']}\n")
                 f.write("=" * 60 + "\n")
-            
-            # New element within session
-            if elem_id and current_element != elem_id:
-                # Write previous element if exists
-                if current_element is not None:
-                    write_element_to_file(f, element_data)
-                
-                current_element = elem_id
-                element_data = {
-                    'element_id': elem_id,
-                    'parent_id': parent_id,
-                    'tag': tag,
-                    'text': text,
-                    'attributes': {}
-                }
-            
-            # Add attribute to current element
-            if attr_name and attr_value and current_element:
-                element_data['attributes'][attr_name] = attr_value
-        
-        # Write the last element
-        if current_element is not None:
-            write_element_to_file(f, element_data)
-    
-    conn.close()
+            write_element_to_file(f, entry)
+
+
+def export_logbook(input_file, output_file, since=None, until=None, tags=None, pattern=None, page_size=PAGE_SIZE):
+    """Export the logbook entries passing the filters; the format follows the output extension."""
+    entries = iter_entries(input_file, since, until, tags, pattern, page_size)
+    suffix = Path(output_file).suffix.lower()
+    if suffix == ".parquet":
+        write_parquet(entries, output_file)
+    elif suffix == ".jsonl":
+        write_jsonl(entries, output_file)
+    else:
+        write_text(entries, output_file)
     print(f"Logbook exported to: {output_file}")
 
+
+def export_logbook_to_text(input_file, output_file):
+    export_logbook(input_file, output_file)
+
+
 def write_element_to_file(f, element_data):
     """Write a single element's data to the output file"""
     if not element_data:
         return
-        
+
     tag = element_data.get('tag', '')
     text = element_data.get('text', '')
-    attributes = element_data.get('attributes', {})
-    
+    attributes = {name: value for name, value in element_data.get('attributes', {}).items() if name and value}
+
     # Skip elements that are just containers or have no meaningful content
     if not tag and not text and not attributes:
         return
-    
+
     # Extract timestamp from attributes
     timestamp = ""
     for attr_name, attr_value in attributes.items():
         if attr_name.startswith('begin_') and attr_value:
             timestamp = attr_value
             break
-    
+
     # Write element information
     if tag:
         f.write(f"Action: {tag}\n")
-    
+
     if timestamp:
         f.write(f"Time: {timestamp}\n")
-    
+
     # Write other meaningful attributes
     for attr_name, attr_value in attributes.items():
         if not attr_name.startswith('begin_') and not attr_name.startswith('end_') and not attr_name.startswith('cookie_'):
@@ -116,31 +268,44 @@ def write_element_to_file(f, element_data):
                 f.write(f"Module: {attr_value}\n")
             elif attr_value and len(str(attr_value)) < 200:  # Avoid very long attribute values
                 f.write(f"{attr_name}: {attr_value}\n")
-    
+
     # Write text content (clean HTML if present)
     if text:
         clean_text = clean_html_content(text)
         if clean_text.strip():
             f.write(f"Description: {clean_text}\n")
-    
+
     f.write("-" * 40 + "\n")
 
 def clean_html_content(text):
     """Clean HTML content to extract meaningful text"""
     if not text:
         return ""
-    
+
     # Remove HTML tags
     clean = re.sub(r'<[^>]+>', '', text)
-    
+
     # Remove script content
     clean = re.sub(r'<script.*?</script>', '', clean, flags=re.DOTALL)
-    
+
     # Clean up whitespace
     clean = re.sub(r'\s+', ' ', clean)
     clean = clean.strip()
-    
+
     return clean
 
+def main():
+    parser = argparse.ArgumentParser(description="Export an EMME logbook to text, Parquet or JSONL")
+    parser.add_argument("input_file", nargs="?", default=input_file, help="EMME logbook (project.mlbk)")
+    parser.add_argument("output_file", nargs="?", default=output_file,
+                        help="Output file; .parquet and .jsonl are structured, anything else is text")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Entries beginning at or after this time")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Entries beginning before this time")
+    parser.add_argument("--tag", nargs="+", help="Entry tag globs, e.g. 'inro.emme.traffic*'")
+    parser.add_argument("--pattern", help="Regular expression searched in tag, description and attributes")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help=f"Elements read per query (default: {PAGE_SIZE})")
+    args = parser.parse_args()
+    export_logbook(args.input_file, args.output_file, args.since, args.until, args.tag, args.pattern, args.page_size)
+
 if __name__ == "__main__":
-    export_logbook_to_text(input_file, output_file)
\ No newline at end of file
+    main()
@@ -0,0 +1,354 @@
+"""
+Multi-Run Link Results Store
+
+Keeps the assigned link results of many model runs in one columnar store, so runs
+can be compared with vectorized column operations instead of merging one
+shapefile after another into a growing wide frame.
+
+Layout:
+
+    <store_dir>/
+        _store_index.csv                        one row per (run, scenario) added
+        links.parquet                           GeoParquet: A, B, geometry, direction - once per link
+        results/run=3/scenario=12/part-0.parquet
+        results/run=4/scenario=12/part-0.parquet
+        ...
+
+Links are keyed by their (A, B) node ids. The geometry of a link is stored the
+first time it is seen; later runs only read and store their attribute columns
+(VOLAU, @capacity, @ft, ...), which is all a shapefile read without geometry costs.
+
+update_link_store only reads the emme_links.shp files that are new or changed
+since they were added, so the store grows incrementally as runs finish.
+
+Usage:
+    python link_store.py <store_dir> <run_result_dir> [--runs 3 4] [--scenarios 11 12 13 14 15]
+
+Reading it back:
+    from link_store import read_link_results, wide_link_results, compare_link_results
+
+    volumes = wide_link_results(store_dir, "VOLAU")                # (A, B) x (run, scenario)
+    change = compare_link_results(store_dir, "VOLAU", base_run=3)  # each run minus run 3, per scenario
+"""
+
+import argparse
+import logging
+import os
+import re
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pyogrio
+import shapely
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = '_store_index.csv'
+LINKS_FILE = 'links.parquet'
+RESULTS_DIR = 'results'
+
+LINKS_PATTERN = 'run_*/Scenario_*/emme_links.shp'
+RUN_PATTERN = re.compile(r'run_(\d+)$')
+SCENARIO_PATTERN = re.compile(r'Scenario_(\d+)$')
+
+KEY_COLUMNS = ['A', 'B']
+# node id columns of the EMME link export, renamed to KEY_COLUMNS
+NODE_COLUMNS = [('INODE', 'JNODE'), ('A', 'B'), ('I', 'J')]
+
+DEFAULT_COLUMNS = ('@ft', 'VOLAU', '@capacity', '#link_id')
+
+SCENARIO_PERIODS = {11: 'EA', 12: 'AM', 13: 'MD', 14: 'PM', 15: 'EV'}
+
+
+def _partition_dir(store_dir: Path, run: int, scenario: int) -> Path:
+    return Path(store_dir) / RESULTS_DIR / f"run={run}" / f"scenario={scenario}"
+
+
+def read_index(store_dir: Path) -> pd.DataFrame:
+    """Read the store index (one row per run/scenario)."""
+    index_path = Path(store_dir) / INDEX_FILE
+    if not index_path.exists():
+        return pd.DataFrame(columns=['run', 'scenario', 'source', 'source_mtime', 'links', 'added'])
+    return pd.read_csv(index_path)
+
+
+def _write_index(store_dir: Path, index: pd.DataFrame):
+    index = index.sort_values(['run', 'scenario']).reset_index(drop=True)
+    tmp = Path(store_dir) / f"{INDEX_FILE}.tmp"
+    index.to_csv(tmp, index=False)
+    os.replace(tmp, Path(store_dir) / INDEX_FILE)
+
+
+def find_link_files(input_dir: Path, pattern: str = LINKS_PATTERN) -> List[Tuple[int, int, Path]]:
+    """(run, scenario, path) of every run_<n>/Scenario_<m>/emme_links.shp under input_dir."""
+    found = []
+    for path in sorted(Path(input_dir).glob(pattern)):
+        run = RUN_PATTERN.search(path.parent.parent.name)
+        scenario = SCENARIO_PATTERN.search(path.parent.name)
+        if run and scenario:
+            found.append((int(run.group(1)), int(scenario.group(1)), path))
+    return found
+
+
+def _node_columns(fields: Iterable[str]) -> Tuple[str, str]:
+    fields = set(fields)
+    for a, b in NODE_COLUMNS:
+        if a in fields and b in fields:
+            return a, b
+    raise ValueError(f"No link node id columns {NODE_COLUMNS} in {sorted(fields)}")
+
+
+def read_link_attributes(path: Path, columns: Iterable[str] = DEFAULT_COLUMNS) -> pd.DataFrame:
+    """
+    Link attributes of one emme_links.shp without geometry, keyed by A, B.
+
+    Missing VOLAU (unassigned scenarios) is filled with zero, other missing columns
+    with NaN; duplicate (A, B) rows keep the first.
+    """
+    fields = pyogrio.read_info(path)['fields']
+    a, b = _node_columns(fields)
+    present = [column for column in columns if column in fields]
+    df = pyogrio.read_dataframe(path, columns=[a, b] + present, read_geometry=False)
+    df = df.rename(columns={a: 'A', b: 'B'})
+    for column in columns:
+        if column not in df.columns:
+            if column == 'VOLAU':
+                logger.info(f"... No VOLAU in {path}, filling with zero")
+                df[column] = 0.0
+            else:
+                df[column] = np.nan
+    df['A'] = df['A'].astype('int64')
+    df['B'] = df['B'].astype('int64')
+    duplicated = df.duplicated(KEY_COLUMNS)
+    if duplicated.any():
+        logger.warning(f"{duplicated.sum()} duplicate (A, B) links in {path}, keeping the first")
+        df = df[~duplicated]
+    return df[KEY_COLUMNS + list(columns)].reset_index(drop=True)
+
+
+def link_directions(geometry: gpd.GeoSeries) -> np.ndarray:
+    """North/South/East/West of each line from its first to its last vertex (dominant axis)."""
+    geoms = np.asarray(geometry.values)
+    start = shapely.get_coordinates(shapely.get_point(geoms, 0))
+    end = shapely.get_coordinates(shapely.get_point(geoms, -1))
+    delta = end - start
+    east_west = np.abs(delta[:, 0]) > np.abs(delta[:, 1])
+    return np.where(
+        east_west,
+        np.where(delta[:, 0] > 0, 'East', 'West'),
+        np.where(delta[:, 1] > 0, 'North', 'South'),
+    )
+
+
+def read_links(store_dir: Path) -> gpd.GeoDataFrame:
+    """Link geometries of the store: A, B, direction, geometry."""
+    path = Path(store_dir) / LINKS_FILE
+    if not path.exists():
+        return gpd.GeoDataFrame(columns=KEY_COLUMNS + ['direction', 'geometry'], geometry='geometry')
+    return gpd.read_parquet(path)
+
+
+def _add_link_geometries(store_dir: Path, path: Path, keys: pd.DataFrame) -> int:
+    """Store the geometry of links of path that the store doesn't have yet; returns how many."""
+    links_path = Path(store_dir) / LINKS_FILE
+    stored = pq.read_table(links_path, columns=KEY_COLUMNS).to_pandas() if links_path.exists() else None
+    if stored is not None:
+        new = keys.merge(stored, on=KEY_COLUMNS, how='left', indicator=True)['_merge'].eq('left_only').to_numpy()
+        if not new.any():
+            return 0
+    a, b = _node_columns(pyogrio.read_info(path)['fields'])
+    gdf = pyogrio.read_dataframe(path, columns=[a, b]).rename(columns={a: 'A', b: 'B'})
+    gdf[KEY_COLUMNS] = gdf[KEY_COLUMNS].astype('int64')
+    gdf = gdf.drop_duplicates(KEY_COLUMNS)
+    if stored is not None:
+        gdf = gdf.merge(stored, on=KEY_COLUMNS, how='left', indicator=True)
+        gdf = gpd.GeoDataFrame(gdf[gdf['_merge'] == 'left_only'].drop(columns='_merge'), crs=gdf.crs)
+    gdf['direction'] = link_directions(gdf.geometry)
+    gdf = gdf[KEY_COLUMNS + ['direction', 'geometry']]
+
+    if stored is not None:
+        existing = read_links(store_dir)
+        gdf = pd.concat([existing, gdf.to_crs(existing.crs) if existing.crs else gdf], ignore_index=True)
+    tmp = links_path.with_suffix('.parquet.tmp')
+    gdf.to_parquet(tmp, index=False)
+    os.replace(tmp, links_path)
+    return int(len(gdf) - (len(stored) if stored is not None else 0))
+
+
+def add_run_scenario(store_dir: Path, run: int, scenario: int, path: Path,
+                     columns: Iterable[str] = DEFAULT_COLUMNS) -> int:
+    """
+    Store the link results of one run/scenario, replacing any earlier version.
+
+    Returns:
+        Number of links
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    df = read_link_attributes(path, columns)
+    new_links = _add_link_geometries(store_dir, path, df[KEY_COLUMNS])
+
+    leaf = _partition_dir(store_dir, run, scenario)
+    if leaf.exists():
+        shutil.rmtree(leaf)
+    leaf.mkdir(parents=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), leaf / 'part-0.parquet', compression='zstd')
+
+    index = read_index(store_dir)
+    index = index[~((index['run'] == run) & (index['scenario'] == scenario))]
+    row = {
+        'run': run,
+        'scenario': scenario,
+        'source': str(path),
+        'source_mtime': path.stat().st_mtime,
+        'links': len(df),
+        'added': datetime.now().isoformat(timespec='seconds'),
+    }
+    index = pd.concat([index, pd.DataFrame([row])], ignore_index=True) if len(index) else pd.DataFrame([row])
+    _write_index(store_dir, index)
+    logger.info(f"Stored run {run} scenario {scenario}: {len(df):,} links ({new_links:,} new geometries)")
+    return len(df)
+
+
+def update_link_store(
+    store_dir: Path,
+    input_dir: Path,
+    runs: Optional[Iterable[int]] = None,
+    scenarios: Optional[Iterable[int]] = None,
+    columns: Iterable[str] = DEFAULT_COLUMNS,
+    pattern: str = LINKS_PATTERN,
+) -> List[Tuple[int, int]]:
+    """
+    Add the run/scenario link files under input_dir that are new or changed.
+
+    Args:
+        store_dir: Store directory (created if needed)
+        input_dir: Directory holding run_<n>/Scenario_<m>/emme_links.shp
+        runs: Run numbers to store (default: all)
+        scenarios: Scenario numbers to store (default: all)
+        columns: Link attribute columns to store
+
+    Returns:
+        (run, scenario) pairs added or replaced
+    """
+    store_dir = Path(store_dir)
+    index = read_index(store_dir)
+    stored = {(row.run, row.scenario): row.source_mtime for row in index.itertuples()}
+    runs = set(runs) if runs is not None else None
+    scenarios = set(scenarios) if scenarios is not None else None
+
+    added = []
+    for run, scenario, path in find_link_files(input_dir, pattern):
+        if (runs is not None and run not in runs) or (scenarios is not None and scenario not in scenarios):
+            continue
+        if stored.get((run, scenario)) == path.stat().st_mtime:
+            continue
+        add_run_scenario(store_dir, run, scenario, path, columns)
+        added.append((run, scenario))
+    logger.info(f"Link store {store_dir}: {len(added)} run/scenarios added, {len(read_index(store_dir))} stored")
+    return added
+
+
+def read_link_results(
+    store_dir: Path,
+    columns: Optional[List[str]] = None,
+    runs: Optional[Iterable[int]] = None,
+    scenarios: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    """
+    Long table of link results: A, B, run, scenario and the requested columns.
+
+    Only the requested partitions and columns are read.
+    """
+    dataset = ds.dataset(Path(store_dir) / RESULTS_DIR, format='parquet', partitioning='hive')
+    filter_ = None
+    if runs is not None:
+        filter_ = ds.field('run').isin(list(runs))
+    if scenarios is not None:
+        scenario_filter = ds.field('scenario').isin(list(scenarios))
+        filter_ = scenario_filter if filter_ is None else filter_ & scenario_filter
+    read_columns = None if columns is None else KEY_COLUMNS + ['run', 'scenario'] + list(columns)
+    return dataset.to_table(columns=read_columns, filter=filter_).to_pandas()
+
+
+def wide_link_results(
+    store_dir: Path,
+    column: str,
+    runs: Optional[Iterable[int]] = None,
+    scenarios: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    """One attribute as a (A, B) x (run, scenario) table; links missing from a run are NaN."""
+    long = read_link_results(store_dir, [column], runs, scenarios)
+    return long.pivot(index=KEY_COLUMNS, columns=['run', 'scenario'], values=column).sort_index(axis=1)
+
+
+def compare_link_results(
+    store_dir: Path,
+    column: str,
+    base_run: int,
+    runs: Optional[Iterable[int]] = None,
+    scenarios: Optional[Iterable[int]] = None,
+    relative: bool = False,
+) -> pd.DataFrame:
+    """
+    Each run's attribute minus (or divided by, with relative=True) the base run's, per scenario.
+
+    Returns:
+        (A, B) x (run, scenario) table, without the base run
+    """
+    runs = None if runs is None else set(runs) | {base_run}
+    wide = wide_link_results(store_dir, column, runs, scenarios)
+    base = wide.xs(base_run, axis=1, level='run')
+    aligned = base.reindex(columns=wide.columns.get_level_values('scenario')).set_axis(wide.columns, axis=1)
+    compared = wide / aligned if relative else wide - aligned
+    return compared.drop(columns=base_run, level='run')
+
+
+def wide_link_table(
+    store_dir: Path,
+    runs: Optional[Iterable[int]] = None,
+    scenarios: Optional[Iterable[int]] = None,
+) -> gpd.GeoDataFrame:
+    """
+    The wide geometry table of compile_model_runs: per run/scenario capacity, volume and
+    saturation columns (capacity_run3_scenAM, @volau_run3_scenAM, @saturation_run3_scenAM),
+    the highest facility type across runs (ft), direction and geometry.
+    """
+    long = read_link_results(store_dir, ['@capacity', 'VOLAU', '@ft'], runs, scenarios)
+    long['saturation'] = long['VOLAU'] / long['@capacity']
+    wide = long.pivot(index=KEY_COLUMNS, columns=['run', 'scenario'], values=['@capacity', 'VOLAU', 'saturation'])
+    wide = wide.sort_index(axis=1, level=['run', 'scenario'], sort_remaining=False)
+    prefixes = {'@capacity': 'capacity', 'VOLAU': '@volau', 'saturation': '@saturation'}
+    wide.columns = [
+        f"{prefixes[value]}_run{run}_scen{SCENARIO_PERIODS.get(scenario, scenario)}"
+        for value, run, scenario in wide.columns
+    ]
+    wide['ft'] = long.groupby(KEY_COLUMNS)['@ft'].max()
+    links = read_links(store_dir)
+    return links.merge(wide.reset_index(), on=KEY_COLUMNS, how='inner')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add model run link results to a multi-run link store')
+    parser.add_argument('store_dir', type=Path, help='Link store directory')
+    parser.add_argument('input_dir', type=Path, help='Directory holding run_*/Scenario_*/emme_links.shp')
+    parser.add_argument('--runs', type=int, nargs='+', help='Run numbers to add (default: all)')
+    parser.add_argument('--scenarios', type=int, nargs='+', help='Scenario numbers to add (default: all)')
+    parser.add_argument('--columns', nargs='+', default=list(DEFAULT_COLUMNS), help='Link attributes to store')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+    update_link_store(args.store_dir, args.input_dir, args.runs, args.scenarios, args.columns)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Skim Differences Between Model Runs
+
+Compares every matrix of the OMX skims of one or more model runs against a base
+run without building long origin/destination tables: matrices are streamed in
+blocks of rows, and per matrix only running statistics, a fixed-size sample and
+the top-k changed OD pairs are kept, so memory does not grow with the number of
+zones, matrices or runs.
+
+For each (run, skim file, matrix):
+
+- cells compared (finite in both runs), cells changed by more than the tolerance,
+  sums, mean / mean absolute / RMS / min / max difference
+- percentiles of the difference and of the ratio (run / base, where base != 0),
+  exact up to SAMPLE_SIZE cells and estimated from a uniform sample of that many
+  cells beyond
+- the top_k OD pairs with the largest absolute difference
+
+Outputs (compare_skim_sets):
+
+    <output_dir>/skim_diff_stats.parquet    one row per run, file and matrix
+    <output_dir>/skim_diff_top.parquet      top_k OD pairs per run, file and matrix
+    <output_dir>/<run>/<file>               with write_omx: run - base for every matrix, same zone mapping
+
+Usage:
+    python skim_diff.py <base_run_dir> <run_dir> [<run_dir> ...] -o <output_dir> [--pattern "*_taz.omx"]
+        [--matrices AM_da_time AM_da_dist] [--write-omx] [-j 4]
+
+Skim files are matched by their path relative to each run directory.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import openmatrix as omx
+import pandas as pd
+import tables
+
+logger = logging.getLogger(__name__)
+
+BLOCK_ROWS = 256
+TOP_K = 100
+SAMPLE_SIZE = 1_000_000
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+STATS_FILE = 'skim_diff_stats.parquet'
+TOP_FILE = 'skim_diff_top.parquet'
+
+
+class ValueSample:
+    """Uniform sample without replacement of a stream of values (the size values with the smallest random keys)."""
+
+    def __init__(self, size: int, rng: np.random.Generator):
+        self.size = size
+        self.rng = rng
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+
+    def _keep_smallest(self, keys, values):
+        if len(keys) <= self.size:
+            return keys, values
+        keep = np.argpartition(keys, self.size)[:self.size]
+        return keys[keep], values[keep]
+
+    def add(self, values: np.ndarray):
+        keys, values = self._keep_smallest(self.rng.random(len(values)), values)
+        self.keys, self.values = self._keep_smallest(np.concatenate([self.keys, keys]),
+                                                     np.concatenate([self.values, values]))
+
+    def percentiles(self, q) -> np.ndarray:
+        if not len(self.values):
+            return np.full(len(q), np.nan)
+        return np.percentile(self.values, q)
+
+
+class TopChanges:
+    """The k cells with the largest absolute difference seen so far."""
+
+    COLUMNS = ['row', 'col', 'base_value', 'run_value', 'diff']
+
+    def __init__(self, k: int):
+        self.k = k
+        self.cells = {column: np.empty(0) for column in self.COLUMNS}
+
+    def add(self, rows, cols, base, run, diff):
+        block = {'row': rows, 'col': cols, 'base_value': base, 'run_value': run, 'diff': diff}
+        if len(diff) > self.k:
+            keep = np.argpartition(-np.abs(diff), self.k)[:self.k]
+            block = {column: values[keep] for column, values in block.items()}
+        merged = {column: np.concatenate([self.cells[column], block[column]]) for column in self.COLUMNS}
+        if len(merged['diff']) > self.k:
+            keep = np.argpartition(-np.abs(merged['diff']), self.k)[:self.k]
+            merged = {column: values[keep] for column, values in merged.items()}
+        self.cells = merged
+
+    def frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.cells)
+        df = df.iloc[np.argsort(-np.abs(df['diff'].to_numpy()), kind='stable')].reset_index(drop=True)
+        df[['row', 'col']] = df[['row', 'col']].astype('int64')
+        df.insert(0, 'rank', np.arange(1, len(df) + 1))
+        return df
+
+
+def zone_labels(omx_file, mapping: Optional[str] = None) -> np.ndarray:
+    """Zone ids of the rows/columns: the given (or first) OMX mapping, else 1..n."""
+    mappings = omx_file.list_mappings()
+    if mapping is None and mappings:
+        mapping = mappings[0]
+    if mapping is not None and mapping in mappings:
+        return np.asarray(omx_file.root.lookup[mapping][:])
+    return np.arange(1, omx_file.shape()[0] + 1)
+
+
+def compare_omx(
+    base_path: Path,
+    run_path: Path,
+    matrices: Optional[List[str]] = None,
+    block_rows: int = BLOCK_ROWS,
+    top_k: int = TOP_K,
+    tolerance: float = 0.0,
+    sample_size: int = SAMPLE_SIZE,
+    diff_path: Optional[Path] = None,
+    mapping: Optional[str] = None,
+    seed: int = 0,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compare the matrices of one skim file of a run against the base run's, block by block.
+
+    Args:
+        base_path: Base run OMX file
+        run_path: Compared run OMX file
+        matrices: Matrix names to compare (default: all present in both files)
+        block_rows: Rows read per block
+        top_k: Largest absolute differences kept per matrix
+        tolerance: Absolute difference above which a cell counts as changed
+        sample_size: Cells sampled per matrix for the percentiles
+        diff_path: If given, run - base of each matrix is written to this OMX file
+        mapping: OMX mapping giving the zone ids of top_k rows (default: first mapping)
+        seed: Seed of the percentile sample
+
+    Returns:
+        (statistics with one row per matrix, top_k OD pairs per matrix)
+    """
+    stats_rows, top_frames = [], []
+    with omx.open_file(str(base_path), 'r') as base_file, omx.open_file(str(run_path), 'r') as run_file:
+        if tuple(base_file.shape()) != tuple(run_file.shape()):
+            raise ValueError(f"{run_path} has shape {run_file.shape()}, {base_path} has {base_file.shape()}")
+        names = base_file.list_matrices() if matrices is None else list(matrices)
+        missing = [name for name in names if name not in run_file.list_matrices() or name not in base_file.list_matrices()]
+        if missing:
+            logger.warning(f"Matrices not in both {base_path.name} files, skipped: {missing}")
+        names = [name for name in names if name not in missing]
+        zones = zone_labels(base_file, mapping)
+        n_rows, n_cols = base_file.shape()
+
+        diff_file = None
+        if diff_path is not None:
+            Path(diff_path).parent.mkdir(parents=True, exist_ok=True)
+            diff_file = omx.open_file(str(diff_path), 'w')
+            for name in base_file.list_mappings():
+                diff_file.create_mapping(name, base_file.root.lookup[name][:])
+
+        try:
+            for name in names:
+                base_matrix, run_matrix = base_file[name], run_file[name]
+                diff_matrix = None
+                if diff_file is not None:
+                    diff_matrix = diff_file.create_matrix(name, atom=tables.Float32Atom(), shape=(n_rows, n_cols))
+
+                sample_diff = ValueSample(sample_size, np.random.default_rng(seed))
+                sample_ratio = ValueSample(sample_size, np.random.default_rng(seed + 1))
+                top = TopChanges(top_k)
+                count = changed = 0
+                base_sum = run_sum = diff_sum = abs_sum = square_sum = 0.0
+                diff_min, diff_max = np.inf, -np.inf
+
+                for start in range(0, n_rows, block_rows):
+                    end = min(start + block_rows, n_rows)
+                    base = np.asarray(base_matrix[start:end], dtype=np.float64)
+                    run = np.asarray(run_matrix[start:end], dtype=np.float64)
+                    diff = run - base
+                    if diff_matrix is not None:
+                        diff_matrix[start:end] = diff
+
+                    valid = np.isfinite(base) & np.isfinite(run)
+                    rows, cols = np.nonzero(valid)
+                    b, r, d = base[valid], run[valid], diff[valid]
+                    count += len(d)
+                    changed += int((np.abs(d) > tolerance).sum())
+                    base_sum += b.sum()
+                    run_sum += r.sum()
+                    diff_sum += d.sum()
+                    abs_sum += np.abs(d).sum()
+                    square_sum += np.square(d).sum()
+                    if len(d):
+                        diff_min, diff_max = min(diff_min, d.min()), max(diff_max, d.max())
+                    sample_diff.add(d)
+                    nonzero = b != 0
+                    sample_ratio.add(r[nonzero] / b[nonzero])
+                    top.add(rows + start, cols, b, r, d)
+
+                stats = {
+                    'matrix': name,
+                    'cells': count,
+                    'changed': changed,
+                    'base_sum': base_sum,
+                    'run_sum': run_sum,
+                    'diff_sum': diff_sum,
+                    'mean_diff': diff_sum / count if count else np.nan,
+                    'mean_abs_diff': abs_sum / count if count else np.nan,
+                    'rmse': np.sqrt(square_sum / count) if count else np.nan,
+                    'min_diff': diff_min if count else np.nan,
+                    'max_diff': diff_max if count else np.nan,
+                    'sampled': count > sample_size,
+                }
+                for q, value in zip(PERCENTILES, sample_diff.percentiles(PERCENTILES)):
+                    stats[f'diff_p{q:02d}'] = value
+                for q, value in zip(PERCENTILES, sample_ratio.percentiles(PERCENTILES)):
+                    stats[f'ratio_p{q:02d}'] = value
+                stats_rows.append(stats)
+
+                top_df = top.frame()
+                top_df.insert(0, 'matrix', name)
+                top_df.insert(2, 'origin', zones[top_df['row'].to_numpy()])
+                top_df.insert(3, 'destination', zones[top_df['col'].to_numpy()])
+                top_df['ratio'] = top_df['run_value'] / top_df['base_value'].where(top_df['base_value'] != 0)
+                top_frames.append(top_df.drop(columns=['row', 'col']))
+        finally:
+            if diff_file is not None:
+                diff_file.close()
+
+    stats_df = pd.DataFrame(stats_rows)
+    top_df = pd.concat(top_frames, ignore_index=True) if top_frames else pd.DataFrame()
+    return stats_df, top_df
+
+
+def _compare_task(args):
+    run, relative_path, base_path, run_path, kwargs = args
+    logger.info(f"Comparing {run} {relative_path}")
+    stats, top = compare_omx(base_path, run_path, **kwargs)
+    for df in (stats, top):
+        df.insert(0, 'run', run)
+        df.insert(1, 'file', relative_path)
+    return stats, top
+
+
+def compare_skim_sets(
+    base_dir: Path,
+    run_dirs: Dict[str, Path],
+    output_dir: Path,
+    pattern: str = '*.omx',
+    matrices: Optional[List[str]] = None,
+    write_omx: bool = False,
+    max_workers: Optional[int] = None,
+    **kwargs,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compare the skims of each run against the base run, file by file.
+
+    Args:
+        base_dir: Skim directory of the base run
+        run_dirs: Run name -> skim directory of each compared run
+        output_dir: Directory for the Parquet outputs (and diff OMX files)
+        pattern: Glob of the skim files, relative to the run directories
+        matrices: Matrix names to compare (default: all in both files)
+        write_omx: Also write run - base OMX files
+        max_workers: Processes comparing files in parallel; None uses os.cpu_count()
+        **kwargs: block_rows, top_k, tolerance, sample_size, mapping of compare_omx
+
+    Returns:
+        (statistics, top changes) - also written to output_dir
+    """
+    base_dir, output_dir = Path(base_dir), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = []
+    for relative_path in sorted(path.relative_to(base_dir) for path in base_dir.glob(pattern)):
+        for run, run_dir in run_dirs.items():
+            run_path = Path(run_dir) / relative_path
+            if not run_path.exists():
+                logger.warning(f"{run} has no {relative_path}, skipped")
+                continue
+            diff_path = output_dir / run / relative_path if write_omx else None
+            tasks.append((run, relative_path.as_posix(), base_dir / relative_path, run_path,
+                          dict(kwargs, matrices=matrices, diff_path=diff_path)))
+    logger.info(f"Comparing {len(tasks)} skim files of {len(run_dirs)} runs against {base_dir}")
+
+    workers = min(max_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers <= 1:
+        results = [_compare_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_compare_task, tasks))
+
+    stats = pd.concat([result[0] for result in results], ignore_index=True) if results else pd.DataFrame()
+    top = pd.concat([result[1] for result in results], ignore_index=True) if results else pd.DataFrame()
+    stats.to_parquet(output_dir / STATS_FILE, index=False)
+    top.to_parquet(output_dir / TOP_FILE, index=False)
+    logger.info(f"Wrote {output_dir / STATS_FILE} and {output_dir / TOP_FILE}")
+    return stats, top
+
+
+def run_names(run_dirs: List[Path]) -> Dict[str, Path]:
+    """
+    Run name -> skim directory: the directory names, or the paths relative to their
+    common parent when names repeat (e.g. run_a/skims and run_b/skims).
+    """
+    names = [Path(run_dir).name for run_dir in run_dirs]
+    if len(set(names)) < len(names):
+        resolved = [Path(run_dir).resolve() for run_dir in run_dirs]
+        parent = Path(os.path.commonpath(resolved))
+        names = [path.relative_to(parent).as_posix() for path in resolved]
+        if len(set(names)) < len(names):
+            raise ValueError(f"Run directories given more than once: {', '.join(map(str, run_dirs))}")
+    return dict(zip(names, run_dirs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare OMX skims of model runs against a base run')
+    parser.add_argument('base_dir', type=Path, help='Skim directory of the base run')
+    parser.add_argument('run_dirs', type=Path, nargs='+', help='Skim directories of the runs to compare')
+    parser.add_argument('-o', '--output-dir', type=Path, required=True, help='Output directory')
+    parser.add_argument('--pattern', default='*.omx', help='Glob of the skim files (default: *.omx)')
+    parser.add_argument('--matrices', nargs='+', help='Matrices to compare (default: all)')
+    parser.add_argument('--block-rows', type=int, default=BLOCK_ROWS, help=f'Rows per block (default: {BLOCK_ROWS})')
+    parser.add_argument('--top-k', type=int, default=TOP_K, help=f'Largest changes kept per matrix (default: {TOP_K})')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='Absolute difference counted as a change')
+    parser.add_argument('--write-omx', action='store_true', help='Write run - base OMX files')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Parallel processes (default: all cores)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s', handlers=[logging.StreamHandler(sys.stdout)])
+    run_dirs = run_names(args.run_dirs)
+    compare_skim_sets(args.base_dir, run_dirs, args.output_dir, args.pattern, args.matrices, args.write_omx,
+                      args.workers, block_rows=args.block_rows, top_k=args.top_k, tolerance=args.tolerance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""
+Multi-Run Summary Cube Builder
+
+Stores every validation summary for every model run and observed source in ONE
+partitioned Parquet dataset, so dashboards can query it directly instead of
+stacking per-run CSV files and re-pivoting them in the UI.
+
+Layout (hive partitioning, partition values are URL-encoded):
+
+    <cube_dir>/
+        _cube_index.csv
+        summary=auto_ownership_by_county/
+            run=2023%20TM2.2%20v05/geography=county/part-0.parquet
+            run=ACS%202023/geography=county/part-0.parquet
+        summary=tour_mode_distribution/
+            ...
+
+Each partition holds the summary dimensions (as string labels), the count and
+measure columns, a precomputed `share`, and - for model runs - the matching
+observed values and differences (`share_observed`, `share_diff`, ...).
+
+Adding a run only writes that run's partitions; nothing else is rewritten.
+Adding or replacing an observed source refreshes the difference columns of the
+model partitions for the summaries it covers.
+
+Usage:
+    python build_summary_cube.py <cube_dir> --run "NAME=<summary_dir>" [--observed "NAME=<summary_dir>"]
+    python build_summary_cube.py <cube_dir> --dashboard-dir <legacy_dashboard_dir> --observed-dataset "ACS 2023"
+
+Example:
+    python build_summary_cube.py "outputs/cube" --run "2023 TM2.2 v05=C:/summaries/2023_v05" --observed "BATS 2023=E:/bats/summaries"
+
+Reading it back:
+    from build_summary_cube import load_cube
+    df = load_cube("outputs/cube", "auto_ownership_by_county", runs=["2023 TM2.2 v05"])
+"""
+
+import argparse
+import logging
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import yaml
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger(__name__)
+
+# ASCII-safe symbols for Windows compatibility
+CHECK = '[OK]'
+WARN = '[WARN]'
+ERROR = '[ERROR]'
+INFO = '[INFO]'
+
+INDEX_FILE = '_cube_index.csv'
+
+MODEL = 'model'
+OBSERVED = 'observed'
+
+# Dimension columns that identify the geography of a summary, finest first
+GEOGRAPHY_COLUMNS = {
+    'maz': 'maz',
+    'mgra': 'maz',
+    'taz': 'taz',
+    'superdistrict': 'superdistrict',
+    'district': 'district',
+    'county': 'county',
+    'county_name': 'county',
+}
+REGIONAL = 'regional'
+
+# Count columns used when a summary is not described by the data model
+KNOWN_COUNT_COLUMNS = ['households', 'persons', 'workers', 'tours', 'tours_active', 'trips', 'count']
+MEASURE_PREFIXES = ('mean_', 'avg_', 'total_', 'sum_')
+
+
+def _encode(value: str) -> str:
+    """URL-encode a partition value the way pyarrow's hive partitioning decodes it."""
+    return quote(str(value), safe='')
+
+
+def _partition_dir(cube_dir: Path, summary: str, run: Optional[str] = None, geography: Optional[str] = None) -> Path:
+    path = cube_dir / f"summary={_encode(summary)}"
+    if run is not None:
+        path = path / f"run={_encode(run)}"
+    if geography is not None:
+        path = path / f"geography={_encode(geography)}"
+    return path
+
+
+def load_summary_definitions(config_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Load the `summaries:` section of a data model YAML.
+
+    Args:
+        config_path: Path to data model YAML. If None, uses default ctramp_data_model.yaml
+
+    Returns:
+        Dictionary of summary name to summary specification
+    """
+    if config_path is None:
+        config_path = Path(__file__).parent / 'data_model' / 'ctramp_data_model.yaml'
+
+    if not config_path.exists():
+        logger.warning(f"{WARN} Data model not found, inferring summary columns: {config_path}")
+        return {}
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    return config.get('summaries', {}) or {}
+
+
+def read_summary_dir(summary_dir: Path) -> Dict[str, pd.DataFrame]:
+    """
+    Read every summary CSV written by summarize_model_run.py for one run.
+
+    Args:
+        summary_dir: Directory of summary CSV files
+
+    Returns:
+        Dictionary of summary name (file stem) to DataFrame
+    """
+    summaries = {}
+    for csv_path in sorted(Path(summary_dir).glob('*.csv')):
+        if csv_path.stem == 'summary_index':
+            continue
+        df = pd.read_csv(csv_path)
+        summaries[csv_path.stem] = df.drop(columns=['dataset'], errors='ignore')
+    return summaries
+
+
+def _normalize_name(name: str) -> str:
+    return name.lower().replace(' ', '_').replace('.', '_')
+
+
+def read_dashboard_dir(dashboard_dir: Path) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Read a legacy multi-run dashboard directory (run_all.py output).
+
+    Those directories hold per-run files with the run name in the file name
+    (`auto_ownership_by_county_2023 TM2.2 v05.csv`) plus combined files stacking
+    every run. Rows are split by their `dataset` column and the run suffix is
+    stripped from the file name, so each (summary, run) pair is read once.
+
+    Args:
+        dashboard_dir: Directory of legacy dashboard CSV files
+
+    Returns:
+        Dictionary of run name to {summary name: DataFrame}
+    """
+    runs: Dict[str, Dict[str, pd.DataFrame]] = {}
+    for csv_path in sorted(Path(dashboard_dir).glob('*.csv')):
+        if csv_path.stem == 'summary_index':
+            continue
+        df = pd.read_csv(csv_path)
+        if 'dataset' not in df.columns:
+            logger.warning(f"  {WARN} No 'dataset' column, skipping {csv_path.name}")
+            continue
+
+        stem = _normalize_name(csv_path.stem)
+        for run_name, run_df in df.groupby('dataset', sort=False):
+            suffix = '_' + _normalize_name(str(run_name))
+            summary_name = csv_path.stem[:-len(suffix)] if stem.endswith(suffix) else csv_path.stem
+            run_summaries = runs.setdefault(str(run_name), {})
+            if summary_name not in run_summaries:
+                run_summaries[summary_name] = run_df.drop(columns=['dataset']).reset_index(drop=True)
+    return runs
+
+
+def split_columns(df: pd.DataFrame, summary_config: Optional[Dict[str, Any]] = None) -> Tuple[List[str], Optional[str], List[str]]:
+    """
+    Split summary columns into dimensions, the count column and other measures.
+
+    Uses the summary definition from the data model when available, otherwise
+    falls back to known count names and the mean_/total_ naming convention.
+
+    Returns:
+        Tuple of (dimension columns, count column or None, measure columns)
+    """
+    columns = [c for c in df.columns if c not in ('share', 'dataset')]
+
+    if summary_config:
+        group_by = summary_config.get('group_by', [])
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        count_col = summary_config.get('count_name', 'count')
+        count_col = count_col if count_col in df.columns else None
+        dims = [c for c in group_by if c in df.columns]
+        # expand_time_periods and similar handlers add their own label columns
+        extra = [c for c in columns if c not in dims and c != count_col
+                 and not pd.api.types.is_numeric_dtype(df[c])]
+        dims += extra
+    else:
+        count_col = next((c for c in KNOWN_COUNT_COLUMNS if c in df.columns), None)
+        dims = [c for c in columns if c != count_col and not c.startswith(MEASURE_PREFIXES)
+                and not pd.api.types.is_float_dtype(df[c])]
+
+    measures = [c for c in columns if c not in dims and c != count_col]
+    return dims, count_col, measures
+
+
+def detect_geography(dims: List[str]) -> Tuple[str, Optional[str]]:
+    """
+    Return the geography level of a summary and the column that carries it.
+
+    Summaries without a geography dimension are 'regional'.
+    """
+    for col, level in GEOGRAPHY_COLUMNS.items():
+        if col in dims:
+            return level, col
+    return REGIONAL, None
+
+
+def _dimension_labels(series: pd.Series) -> pd.Series:
+    """Convert a dimension column to string labels (1.0 -> '1') so runs always share a schema."""
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.dropna()
+        if (values == values.round()).all():
+            return series.astype('Int64').astype('string')
+    return series.astype('string')
+
+
+def prepare_summary(df: pd.DataFrame, summary_config: Optional[Dict[str, Any]] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Standardize one summary table for the cube and precompute its shares.
+
+    Shares follow summarize_model_run.generate_summary: within `share_within`
+    groups when configured, otherwise within each geography (or the region),
+    and not at all for summaries of means. Existing share columns are replaced,
+    which also normalizes older outputs that stored shares as percents.
+
+    Returns:
+        Tuple of (prepared DataFrame, column metadata)
+    """
+    dims, count_col, measures = split_columns(df, summary_config)
+    geography, geography_col = detect_geography(dims)
+
+    out = df[dims + ([count_col] if count_col else []) + measures].copy()
+    for col in dims:
+        out[col] = _dimension_labels(out[col])
+
+    summary_config = summary_config or {}
+    has_aggregations = bool(summary_config.get('aggregations'))
+    if count_col and (summary_config.get('share_within') or
+                      (not has_aggregations and summary_config.get('calculate_share', True))):
+        share_within = summary_config.get('share_within', [])
+        if isinstance(share_within, str):
+            share_within = [share_within]
+        share_within = [c for c in share_within if c in dims]
+        if geography_col and geography_col not in share_within:
+            share_within = [geography_col] + share_within
+
+        if share_within:
+            totals = out.groupby(share_within, dropna=False)[count_col].transform('sum')
+        else:
+            totals = pd.Series(out[count_col].sum(), index=out.index)
+        out['share'] = out[count_col] / totals.where(totals != 0)
+        measures = measures + ['share']
+
+    meta = {
+        'dimensions': dims,
+        'count_column': count_col,
+        'value_columns': ([count_col] if count_col else []) + measures,
+        'geography': geography,
+    }
+    return out, meta
+
+
+def add_observed_differences(model_df: pd.DataFrame, observed_df: pd.DataFrame, value_columns: List[str]) -> pd.DataFrame:
+    """
+    Attach observed values and model-minus-observed differences to a model summary.
+
+    Rows are matched on the dimensions both tables share; `<col>_observed` and
+    `<col>_diff` columns are added for every value column present in both.
+    """
+    model_df = model_df.drop(columns=[c for c in model_df.columns
+                                      if c.endswith(('_observed', '_diff'))], errors='ignore')
+    numeric = [c for c in value_columns if c in observed_df.columns]
+    keys = [c for c in model_df.columns if c in observed_df.columns
+            and c not in numeric and not pd.api.types.is_numeric_dtype(model_df[c])]
+    if not keys or not numeric:
+        return model_df
+
+    observed = observed_df[keys + numeric].groupby(keys, dropna=False, as_index=False)[numeric].sum()
+    observed = observed.rename(columns={c: f"{c}_observed" for c in numeric})
+    merged = model_df.merge(observed, on=keys, how='left')
+    for col in numeric:
+        merged[f"{col}_diff"] = merged[col] - merged[f"{col}_observed"]
+    return merged
+
+
+def _write_partition(cube_dir: Path, summary: str, run: str, geography: str, df: pd.DataFrame):
+    run_dir = _partition_dir(cube_dir, summary, run)
+    if run_dir.exists():
+        shutil.rmtree(run_dir)
+    leaf = _partition_dir(cube_dir, summary, run, geography)
+    leaf.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+    pq.write_table(table, leaf / 'part-0.parquet', compression='zstd')
+
+
+def _read_partition(cube_dir: Path, summary: str, run: str) -> Optional[pd.DataFrame]:
+    files = sorted(_partition_dir(cube_dir, summary, run).glob('geography=*/*.parquet'))
+    if not files:
+        return None
+    return pd.concat([pq.read_table(f).to_pandas() for f in files], ignore_index=True)
+
+
+def read_index(cube_dir: Path) -> pd.DataFrame:
+    """Read the cube index (one row per summary/run partition)."""
+    index_path = Path(cube_dir) / INDEX_FILE
+    if not index_path.exists():
+        return pd.DataFrame(columns=['summary', 'run', 'source_type', 'geography', 'reference',
+                                     'rows', 'dimensions', 'value_columns', 'updated'])
+    return pd.read_csv(index_path, keep_default_na=False)
+
+
+def _write_index(cube_dir: Path, index: pd.DataFrame):
+    index = index.sort_values(['summary', 'source_type', 'run']).reset_index(drop=True)
+    index.to_csv(Path(cube_dir) / INDEX_FILE, index=False)
+
+
+def _pick_reference(index: pd.DataFrame, summary: str, reference: Optional[str]) -> Optional[str]:
+    observed = index[(index['summary'] == summary) & (index['source_type'] == OBSERVED)]['run'].tolist()
+    if reference is not None:
+        return reference if reference in observed else None
+    return sorted(observed)[0] if observed else None
+
+
+def add_source(
+    cube_dir: Path,
+    source_name: str,
+    summaries: Dict[str, pd.DataFrame],
+    source_type: str = MODEL,
+    summary_definitions: Optional[Dict[str, Any]] = None,
+    reference: Optional[str] = None,
+) -> int:
+    """
+    Add (or replace) one run or observed source in the cube.
+
+    Only the partitions of `source_name` are written. For model runs, differences
+    are computed against the observed source `reference` (default: the first
+    observed source holding that summary). For observed sources, the difference
+    columns of existing model partitions of the same summaries are refreshed.
+
+    Args:
+        cube_dir: Root directory of the cube
+        source_name: Run or observed source name (e.g. "2023 TM2.2 v05", "ACS 2023")
+        summaries: Dictionary of summary name to summary DataFrame
+        source_type: 'model' or 'observed'
+        summary_definitions: `summaries:` section of the data model
+        reference: Observed source to difference model runs against
+
+    Returns:
+        Number of partitions written
+    """
+    cube_dir = Path(cube_dir)
+    cube_dir.mkdir(parents=True, exist_ok=True)
+    summary_definitions = summary_definitions or {}
+    index = read_index(cube_dir)
+    index = index[~((index['run'] == source_name) & index['summary'].isin(list(summaries)))]
+    timestamp = datetime.now().isoformat(timespec='seconds')
+
+    logger.info(f"Adding {source_type} source '{source_name}' ({len(summaries)} summaries)")
+    new_rows = []
+    written = 0
+    for summary_name, df in summaries.items():
+        if df.empty:
+            logger.warning(f"  {WARN} {summary_name}: empty, skipping")
+            continue
+        prepared, meta = prepare_summary(df, summary_definitions.get(summary_name))
+
+        ref = None
+        if source_type == MODEL:
+            ref = _pick_reference(index, summary_name, reference)
+            observed = _read_partition(cube_dir, summary_name, ref) if ref else None
+            if observed is not None:
+                prepared = add_observed_differences(prepared, observed, meta['value_columns'])
+
+        _write_partition(cube_dir, summary_name, source_name, meta['geography'], prepared)
+        written += 1
+        new_rows.append({
+            'summary': summary_name,
+            'run': source_name,
+            'source_type': source_type,
+            'geography': meta['geography'],
+            'reference': ref or '',
+            'rows': len(prepared),
+            'dimensions': ';'.join(meta['dimensions']),
+            'value_columns': ';'.join(meta['value_columns']),
+            'updated': timestamp,
+        })
+        logger.info(f"  {CHECK} {summary_name}: {len(prepared):,} rows [{meta['geography']}]"
+                    + (f" vs {ref}" if ref else ""))
+
+    index = pd.concat([index, pd.DataFrame(new_rows)], ignore_index=True)
+
+    if source_type == OBSERVED:
+        index = _refresh_differences(cube_dir, index, [r['summary'] for r in new_rows], reference)
+
+    _write_index(cube_dir, index)
+    return written
+
+
+def _refresh_differences(cube_dir: Path, index: pd.DataFrame, summary_names: List[str],
+                         reference: Optional[str]) -> pd.DataFrame:
+    """Recompute difference columns of model partitions after an observed source changed."""
+    index = index.copy()
+    for summary_name in summary_names:
+        ref = _pick_reference(index, summary_name, reference)
+        if ref is None:
+            continue
+        observed = _read_partition(cube_dir, summary_name, ref)
+        model_rows = index[(index['summary'] == summary_name) & (index['source_type'] == MODEL)]
+        for row_id, row in model_rows.iterrows():
+            model_df = _read_partition(cube_dir, summary_name, row['run'])
+            if model_df is None:
+                continue
+            value_columns = [c for c in str(row['value_columns']).split(';') if c]
+            refreshed = add_observed_differences(model_df, observed, value_columns)
+            _write_partition(cube_dir, summary_name, row['run'], row['geography'], refreshed)
+            index.loc[row_id, 'reference'] = ref
+            logger.info(f"  {INFO} Refreshed differences: {summary_name} / {row['run']} vs {ref}")
+    return index
+
+
+def load_cube(
+    cube_dir: Path,
+    summary: str,
+    runs: Optional[List[str]] = None,
+    geography: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Load one summary from the cube for any subset of runs.
+
+    Partitions of the same summary can carry different columns (observed
+    sources have no difference columns, and a count may be int64 in one run
+    and double in another), so their schemas are unified with type promotion,
+    every partition is read as the unified schema and missing columns come
+    back as nulls.
+
+    Args:
+        cube_dir: Root directory of the cube
+        summary: Summary name
+        runs: Optional list of run/observed source names to keep
+        geography: Optional geography level to keep
+
+    Returns:
+        DataFrame with `run` and `geography` columns plus the summary columns
+    """
+    summary_dir = _partition_dir(Path(cube_dir), summary)
+    if not summary_dir.exists():
+        return pd.DataFrame()
+
+    partitioning = ds.partitioning(pa.schema([('run', pa.string()), ('geography', pa.string())]), flavor='hive')
+    dataset = ds.dataset(summary_dir, format='parquet', partitioning=partitioning)
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in dataset.get_fragments()]
+                              + [partitioning.schema], promote_options='permissive')
+    dataset = ds.dataset(summary_dir, format='parquet', partitioning=partitioning, schema=schema)
+
+    expression = None
+    if runs is not None:
+        expression = ds.field('run').isin(list(runs))
+    if geography is not None:
+        geo_filter = ds.field('geography') == geography
+        expression = geo_filter if expression is None else expression & geo_filter
+
+    df = dataset.to_table(filter=expression).to_pandas()
+    front = ['run', 'geography']
+    return df[front + [c for c in df.columns if c not in front]]
+
+
+def _parse_source(value: str) -> Tuple[str, Path]:
+    if '=' not in value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=DIRECTORY, got '{value}'")
+    name, directory = value.split('=', 1)
+    return name.strip(), Path(directory.strip())
+
+
+def main():
+    """Main execution function."""
+    parser = argparse.ArgumentParser(
+        description='Build or append to the partitioned multi-run summary cube',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('cube_dir', type=str, help='Root directory of the summary cube')
+    parser.add_argument('--run', action='append', default=[], type=_parse_source,
+                        help='Model run summaries as NAME=DIRECTORY (repeatable)')
+    parser.add_argument('--observed', action='append', default=[], type=_parse_source,
+                        help='Observed summaries as NAME=DIRECTORY (repeatable)')
+    parser.add_argument('--dashboard-dir', action='append', default=[], type=Path,
+                        help='Legacy multi-run dashboard directory to import (repeatable)')
+    parser.add_argument('--observed-dataset', action='append', default=[],
+                        help='Dataset name in a dashboard directory that is observed data (repeatable)')
+    parser.add_argument('--reference', type=str,
+                        help='Observed source to difference model runs against (default: first available)')
+    parser.add_argument('--config', type=str,
+                        help='Path to data model config YAML file (default: ctramp_data_model.yaml)')
+
+    args = parser.parse_args()
+    cube_dir = Path(args.cube_dir)
+    definitions = load_summary_definitions(Path(args.config) if args.config else None)
+
+    # Observed sources go first so model runs can be differenced against them
+    observed_sources = []
+    model_sources = []
+    for name, directory in args.observed:
+        observed_sources.append((name, read_summary_dir(directory)))
+    for directory in args.dashboard_dir:
+        for name, summaries in read_dashboard_dir(directory).items():
+            target = observed_sources if name in args.observed_dataset else model_sources
+            target.append((name, summaries))
+    for name, directory in args.run:
+        model_sources.append((name, read_summary_dir(directory)))
+
+    if not observed_sources and not model_sources:
+        parser.error("Provide at least one --run, --observed or --dashboard-dir")
+
+    written = 0
+    for name, summaries in observed_sources:
+        written += add_source(cube_dir, name, summaries, OBSERVED, definitions, args.reference)
+    for name, summaries in model_sources:
+        written += add_source(cube_dir, name, summaries, MODEL, definitions, args.reference)
+
+    logger.info("")
+    logger.info(f"{CHECK} Wrote {written} partitions to {cube_dir.absolute()}")
+
+
+if __name__ == '__main__':
+    main()
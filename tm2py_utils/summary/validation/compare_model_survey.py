@@ -37,6 +37,16 @@ def load_csv(data_dir: Path, filename: str, dataset_name: str) -> pd.DataFrame:
     return df
 
 
+def load_cube_summary(cube_dir: Path, filename: str) -> pd.DataFrame:
+    """Load one summary for every run from the summary cube (see build_summary_cube.py)."""
+    from build_summary_cube import load_cube
+
+    df = load_cube(cube_dir, Path(filename).stem)
+    if df.empty:
+        return df
+    return df.rename(columns={'run': 'dataset'})
+
+
 def create_bar_chart(
     df: pd.DataFrame,
     x: str,
@@ -133,18 +143,29 @@ def main():
         value=r"M:\Application\Model One\RTP2025\IncrementalProgress\2023_TM161_IPA_35\OUTPUT\summaries_test"
     )
     
+    cube_dir = st.sidebar.text_input(
+        "Summary Cube Directory (optional, replaces the two directories above)",
+        value=""
+    )
+    
     survey_path = Path(survey_dir)
     model_path = Path(model_dir)
+    cube_path = Path(cube_dir) if cube_dir else None
     
     # Check if directories exist
-    if not survey_path.exists():
+    if cube_path is not None:
+        if not cube_path.exists():
+            st.error(f"⚠️ Summary cube not found: {cube_dir}")
+            return
+        st.sidebar.success("✅ Summary cube found")
+    elif not survey_path.exists():
         st.error(f"⚠️ Survey directory not found: {survey_dir}")
         return
-    if not model_path.exists():
+    elif not model_path.exists():
         st.error(f"⚠️ Model directory not found: {model_dir}")
         return
-    
-    st.sidebar.success("✅ Both directories found")
+    else:
+        st.sidebar.success("✅ Both directories found")
     
     # Load dashboard config
     config_path = current_dir / "dashboard-model-survey-comparison.yaml"
@@ -179,12 +200,16 @@ def main():
                     y = props.get('y', '')
                     title = chart_config.get('title', '')
                     
-                    # Load data from both sources
-                    survey_df = load_csv(survey_path, filename, 'BATS Survey')
-                    model_df = load_csv(model_path, filename, 'TM1 Model')
-                    
-                    # Combine dataframes
-                    combined_df = pd.concat([survey_df, model_df], ignore_index=True)
+                    if cube_path is not None:
+                        # All runs and observed sources come from one query
+                        combined_df = load_cube_summary(cube_path, filename)
+                    else:
+                        # Load data from both sources
+                        survey_df = load_csv(survey_path, filename, 'BATS Survey')
+                        model_df = load_csv(model_path, filename, 'TM1 Model')
+                        
+                        # Combine dataframes
+                        combined_df = pd.concat([survey_df, model_df], ignore_index=True)
                     
                     if not combined_df.empty:
                         fig = create_bar_chart(combined_df, x, y, title)
@@ -148,12 +148,32 @@ def find_latest_iteration_file(ctramp_dir: Path, pattern: str) -> Optional[Path]
     return matches[0]  # Fallback to first match
 
 
+def read_ctramp_file(file_path: Path) -> pd.DataFrame:
+    """
+    Read a CTRAMP output file, CSV or Parquet (TM1 outputs converted by
+    misc/convert_tm1_rdata_to_csv.py).
+    
+    Parquet columns are read back as the CSV would be: R factors (categoricals)
+    as plain values, nullable integers as int64 (float64 when they have gaps).
+    """
+    if file_path.suffix.lower() != '.parquet':
+        return pd.read_csv(file_path)
+    
+    df = pd.read_parquet(file_path)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+        elif isinstance(df[col].dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype('float64' if df[col].isna().any() else 'int64')
+    return df
+
+
 def load_ctramp_data(ctramp_dir: Path, data_model: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
     """
     Load CTRAMP output files into dataframes with proper column names.
     
     Args:
-        ctramp_dir: Directory containing CTRAMP output CSV files
+        ctramp_dir: Directory containing CTRAMP output CSV (or Parquet) files
         data_model: Data model configuration with input schema
     
     Returns:
@@ -180,6 +200,9 @@ def load_ctramp_data(ctramp_dir: Path, data_model: Dict[str, Any]) -> Dict[str,
         # Find the file
         file_pattern = schema['file_pattern']
         file_path = find_latest_iteration_file(ctramp_dir, file_pattern)
+        if file_path is None and file_pattern.endswith('.csv'):
+            # Parquet outputs (e.g. converted TM1 runs) carry the same names
+            file_path = find_latest_iteration_file(ctramp_dir, file_pattern[:-len('.csv')] + '.parquet')
         
         if file_path is None:
             logger.warning(f"  {WARN} File not found matching pattern: {file_pattern}")
@@ -187,8 +210,8 @@ def load_ctramp_data(ctramp_dir: Path, data_model: Dict[str, Any]) -> Dict[str,
         
         logger.info(f"  File: {file_path.name}")
         
-        # Load the CSV
-        df = pd.read_csv(file_path)
+        # Load the file
+        df = read_ctramp_file(file_path)
         logger.info(f"  Rows: {len(df):,}")
         
         # Rename columns to canonical names